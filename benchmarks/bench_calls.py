@@ -0,0 +1,42 @@
+"""
+Whole calls against the bundled SIP test server on 127.0.0.1.
+"""
+
+import logging
+import time
+
+from harness import benchmark
+
+from simplesip import CallState, SimpleSIPClient, SIPTestServer
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise RuntimeError("SIP test server did not respond in time")
+        time.sleep(0)
+
+
+@benchmark('call.invite_bye', 'calls')
+def invite_bye():
+    """INVITE → 200 OK → ACK, then BYE → 200 OK, with no media"""
+    server = SIPTestServer(host='127.0.0.1', port=0, media='none').start()
+    server.logger.setLevel(logging.WARNING)
+    client = SimpleSIPClient('alice', 'secret', *server.address, local_port=0)
+    client.local_rtp_port = 0
+    client.rtp_probes = False
+    client.logger.setLevel(logging.WARNING)
+    client.connect()
+
+    def op():
+        byes = server.stats['byes_received']
+        client.make_call('1000')
+        if client.wait_for(CallState.CONNECTED, timeout=2) is None:
+            raise RuntimeError("call was not answered")
+        client.hangup_call()
+        _wait_until(lambda: server.stats['byes_received'] > byes)
+
+    yield op
+    client.disconnect()
+    server.stop()
@@ -0,0 +1,48 @@
+"""
+G.711 and G.722 encode/decode of one 20ms frame.
+"""
+
+from harness import benchmark
+from fixtures import make_client, pcm_frame
+
+
+@benchmark('codec.pcmu_encode', 'codecs')
+def pcmu_encode():
+    client = make_client()
+    pcm = pcm_frame()
+    yield lambda: client._pcm_to_ulaw(pcm)
+
+
+@benchmark('codec.pcmu_decode', 'codecs')
+def pcmu_decode():
+    client = make_client()
+    payload = client._pcm_to_ulaw(pcm_frame())
+    yield lambda: client._ulaw_to_pcm(payload)
+
+
+@benchmark('codec.pcma_encode', 'codecs')
+def pcma_encode():
+    client = make_client()
+    pcm = pcm_frame()
+    yield lambda: client._pcm_to_alaw(pcm)
+
+
+@benchmark('codec.pcma_decode', 'codecs')
+def pcma_decode():
+    client = make_client()
+    payload = client._pcm_to_alaw(pcm_frame())
+    yield lambda: client._alaw_to_pcm(payload)
+
+
+@benchmark('codec.g722_encode', 'codecs')
+def g722_encode():
+    client = make_client()
+    pcm = pcm_frame(sample_rate=16000)
+    yield lambda: client._g722_encode(pcm)
+
+
+@benchmark('codec.g722_decode', 'codecs')
+def g722_decode():
+    client = make_client()
+    payload = client._g722_encode(pcm_frame(sample_rate=16000))
+    yield lambda: client._g722_decode(payload)
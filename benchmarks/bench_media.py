@@ -0,0 +1,106 @@
+"""
+Jitter buffer throughput and end-to-end media loopback.
+
+The ``*.metrics_off`` variants run the same operation with every metric
+replaced by a no-op; the gap to the plain benchmark is the metrics overhead.
+"""
+
+import socket
+import threading
+
+from harness import benchmark
+from fixtures import make_client, metrics_off, pcm_frame
+
+
+@benchmark('media.jitter_buffer', 'media')
+def jitter_buffer():
+    client = make_client()
+    client.set_audio_callback(lambda pcm, fmt, play_time: None, 'pcm')
+    pcm = pcm_frame()
+    state = {'timestamp': 0}
+
+    def op():
+        state['timestamp'] += 160
+        client._add_to_jitter_buffer(pcm, state['timestamp'])
+
+    yield op
+
+
+def _receive_pcmu():
+    """Decode, jitter buffer and callback for one received PCMU payload"""
+    client = make_client()
+    client.set_audio_callback(lambda pcm, fmt, play_time: None, 'pcm')
+    payload = client._pcm_to_ulaw(pcm_frame())
+    state = {'timestamp': 0}
+
+    def op():
+        state['timestamp'] += 160
+        client._handle_pcmu_payload(payload, state['timestamp'])
+
+    yield op
+
+
+@benchmark('media.receive_pcmu', 'media')
+def receive_pcmu():
+    yield from _receive_pcmu()
+
+
+@benchmark('media.receive_pcmu.metrics_off', 'media')
+def receive_pcmu_metrics_off():
+    with metrics_off():
+        yield from _receive_pcmu()
+
+
+def _loopback(codec, payload_type, sample_rate):
+    """Encode and send on one client, receive, decode and deliver on another"""
+    sender = make_client()
+    receiver = make_client()
+
+    receiver.rtp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.rtp_sock.bind(('127.0.0.1', 0))
+    receiver.rtp_sock.settimeout(0.2)
+    receiver.negotiated_codec = codec
+    receiver.negotiated_payload_type = payload_type
+
+    sender.rtp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.remote_rtp_info = receiver.rtp_sock.getsockname()
+    sender.negotiated_codec = codec
+    sender.negotiated_payload_type = payload_type
+
+    delivered = threading.Event()
+    receiver.set_audio_callback(lambda pcm, fmt, play_time: delivered.set(), 'pcm')
+    receiver.running = True
+    thread = threading.Thread(target=receiver._rtp_receive_thread, daemon=True)
+    thread.start()
+
+    pcm = pcm_frame(sample_rate=sample_rate)
+
+    def op():
+        delivered.clear()
+        sender._send_rtp_payload(sender._encode_payload(pcm, codec), payload_type, 160)
+        if not delivered.wait(1.0):
+            raise RuntimeError("loopback packet was not delivered")
+
+    try:
+        yield op
+    finally:
+        receiver.running = False
+        thread.join(1.0)
+        receiver.rtp_sock.close()
+        sender.rtp_sock.close()
+
+
+@benchmark('media.loopback_pcmu', 'media')
+def loopback_pcmu():
+    yield from _loopback('PCMU', 0, 8000)
+
+
+@benchmark('media.loopback_pcmu.metrics_off', 'media')
+def loopback_pcmu_metrics_off():
+    with metrics_off():
+        yield from _loopback('PCMU', 0, 8000)
+
+
+@benchmark('media.loopback_g722', 'media')
+def loopback_g722():
+    yield from _loopback('G722', 9, 16000)
@@ -0,0 +1,50 @@
+"""
+RTP header packing and unpacking, and the client's send path.
+"""
+
+import socket
+import struct
+
+from harness import benchmark
+from fixtures import make_client
+
+
+@benchmark('rtp.pack_header', 'rtp')
+def pack_header():
+    pack = struct.pack
+    yield lambda: pack('!BBHII', 0x80, 0, 12345, 987654321, 0x11223344)
+
+
+@benchmark('rtp.unpack_header', 'rtp')
+def unpack_header():
+    packet = struct.pack('!BBHII', 0x80, 0, 12345, 987654321, 0x11223344) + bytes(160)
+    unpack = struct.unpack
+
+    def op():
+        header = unpack('!BBHII', packet[:12])
+        return packet[12 + (header[0] & 0x0F) * 4:]
+
+    yield op
+
+
+@benchmark('rtp.send_payload', 'rtp')
+def send_payload():
+    """Header, sendto and counters for one 20ms PCMU packet"""
+    client = make_client()
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    sink.setblocking(False)
+    client.rtp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.remote_rtp_info = sink.getsockname()
+    payload = bytes(160)
+
+    def op():
+        client._send_rtp_payload(payload, 0, 160)
+        try:
+            sink.recv(2048)
+        except BlockingIOError:
+            pass
+
+    yield op
+    client.rtp_sock.close()
+    sink.close()
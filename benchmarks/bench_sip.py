@@ -0,0 +1,59 @@
+"""
+SIP message parsing and building.
+"""
+
+import socket
+
+from harness import benchmark
+from fixtures import INVITE, OK_200, make_client
+
+
+@benchmark('sip.parse_invite', 'sip')
+def parse_invite():
+    client = make_client()
+    yield lambda: client._parse_sip_message(INVITE)
+
+
+@benchmark('sip.parse_200_ok', 'sip')
+def parse_200_ok():
+    client = make_client()
+    yield lambda: client._parse_sip_message(OK_200)
+
+
+@benchmark('sip.parse_sdp', 'sip')
+def parse_sdp():
+    client = make_client()
+    body = client._parse_sip_message(INVITE)['body']
+    yield lambda: client._parse_sdp_answer(body)
+
+
+@benchmark('sip.build_sdp_offer', 'sip')
+def build_sdp_offer():
+    client = make_client()
+    yield client._generate_sdp_offer
+
+
+@benchmark('sip.build_response', 'sip')
+def build_response():
+    """Build and send a 200 OK with SDP to a local sink"""
+    client = make_client()
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    client.server, client.port = sink.getsockname()
+    client.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.sock.setblocking(False)
+    headers = client._parse_sip_message(INVITE)
+    sdp = client._generate_sdp_offer()
+
+    def op():
+        client._send_response(headers, 200, 'OK', body=sdp)
+        try:
+            while True:
+                sink.recv(4096)
+        except BlockingIOError:
+            pass
+
+    sink.setblocking(False)
+    yield op
+    client.sock.close()
+    sink.close()
@@ -0,0 +1,105 @@
+"""
+Deterministic inputs shared by the benchmarks.
+"""
+
+import contextlib
+import logging
+import math
+import random
+import struct
+
+from simplesip import SimpleSIPClient, metrics
+from simplesip import client as client_module
+
+
+def make_client():
+    """A client that never touches the network unless a benchmark wires sockets"""
+    client = SimpleSIPClient('bench', 'bench', '127.0.0.1')
+    client.local_ip = '127.0.0.1'
+    client.logger.setLevel(logging.WARNING)
+    return client
+
+
+class _NullMetric:
+    """Takes the place of every metric while metrics are off"""
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def labels(self, *values):
+        return self
+
+
+@contextlib.contextmanager
+def metrics_off():
+    """Swap the library's metrics for no-ops, to measure what they cost"""
+    null = _NullMetric()
+    families = {name: value for name, value in vars(metrics).items()
+                if isinstance(value, metrics.MetricFamily)}
+    decode = dict(client_module._DECODE_SECONDS)
+    for name in families:
+        setattr(metrics, name, null)
+    client_module._DECODE_SECONDS.update(dict.fromkeys(decode, null))
+    try:
+        yield
+    finally:
+        for name, family in families.items():
+            setattr(metrics, name, family)
+        client_module._DECODE_SECONDS.update(decode)
+
+
+def pcm_frame(sample_rate=8000, ptime=20, seed=1):
+    """One frame of 16-bit PCM speech-like audio (two tones plus noise)"""
+    rng = random.Random(seed)
+    count = sample_rate * ptime // 1000
+    samples = (
+        int(6000 * math.sin(2 * math.pi * 440 * n / sample_rate)
+            + 3000 * math.sin(2 * math.pi * 1250 * n / sample_rate)
+            + rng.randint(-800, 800))
+        for n in range(count)
+    )
+    return struct.pack(f'<{count}h', *samples)
+
+
+INVITE = (
+    "INVITE sip:alice@127.0.0.1:5060 SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP 127.0.0.2:5060;branch=z9hG4bK776asdhds;rport\r\n"
+    "Max-Forwards: 70\r\n"
+    "From: \"Bob\" <sip:bob@127.0.0.2>;tag=1928301774\r\n"
+    "To: <sip:alice@127.0.0.1>\r\n"
+    "Call-ID: a84b4c76e66710@127.0.0.2\r\n"
+    "CSeq: 314159 INVITE\r\n"
+    "Contact: <sip:bob@127.0.0.2:5060>\r\n"
+    "Allow: INVITE, ACK, CANCEL, OPTIONS, BYE\r\n"
+    "User-Agent: bench\r\n"
+    "Content-Type: application/sdp\r\n"
+    "Content-Length: 210\r\n"
+    "\r\n"
+    "v=0\r\n"
+    "o=bob 2890844526 2890844526 IN IP4 127.0.0.2\r\n"
+    "s=-\r\n"
+    "c=IN IP4 127.0.0.2\r\n"
+    "t=0 0\r\n"
+    "m=audio 49170 RTP/AVP 9 0 8 101\r\n"
+    "a=rtpmap:9 G722/8000\r\n"
+    "a=rtpmap:0 PCMU/8000\r\n"
+    "a=rtpmap:8 PCMA/8000\r\n"
+    "a=rtpmap:101 telephone-event/8000\r\n"
+    "a=fmtp:101 0-16\r\n"
+    "a=sendrecv\r\n"
+)
+
+OK_200 = (
+    "SIP/2.0 200 OK\r\n"
+    "Via: SIP/2.0/UDP 127.0.0.1:5060;branch=z9hG4bKnashds8;received=127.0.0.1\r\n"
+    "From: <sip:alice@127.0.0.1>;tag=9fxced76sl\r\n"
+    "To: <sip:bob@127.0.0.2>;tag=314159\r\n"
+    "Call-ID: 3848276298220188511@127.0.0.1\r\n"
+    "CSeq: 2 REGISTER\r\n"
+    "Contact: <sip:alice@127.0.0.1:5060>;expires=3600\r\n"
+    "Content-Length: 0\r\n"
+    "\r\n"
+)
@@ -0,0 +1,222 @@
+"""
+Timing, allocation and baseline helpers for the benchmark suite.
+
+A benchmark is a generator function that sets up its fixtures, yields a
+zero-argument callable performing one operation, and cleans up after the
+yield. Operations are timed in batches so that timer overhead stays small
+even for sub-microsecond work; per-operation latency percentiles come from
+the batch timings.
+"""
+
+import contextlib
+import gc
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+
+SEED = 1234
+
+_BENCHMARKS = []
+
+
+class Benchmark:
+    """A registered benchmark"""
+
+    def __init__(self, name, group, factory):
+        self.name = name
+        self.group = group
+        self.factory = contextlib.contextmanager(factory)
+
+
+def benchmark(name, group):
+    """Register a generator function as a benchmark"""
+    def register(factory):
+        _BENCHMARKS.append(Benchmark(name, group, factory))
+        return factory
+    return register
+
+
+def registered(pattern=None):
+    """Registered benchmarks whose name or group contains ``pattern``"""
+    return [
+        bench for bench in _BENCHMARKS
+        if not pattern or pattern in bench.name or pattern == bench.group
+    ]
+
+
+def _percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _calibrate(op, batch_seconds):
+    """Number of calls per batch so that one batch takes ~batch_seconds"""
+    inner = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(inner):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= batch_seconds or inner >= 1 << 20:
+            return inner
+        inner *= 2 if elapsed <= 0 else max(2, min(10, int(batch_seconds / elapsed) + 1))
+
+
+def _measure_allocations(op, samples):
+    """Median bytes allocated while running one op, and bytes retained per op"""
+    if not hasattr(tracemalloc, 'reset_peak'):  # Python < 3.9
+        return None, None
+
+    tracemalloc.start()
+    try:
+        op()  # Allocate lazily created state outside the measurement
+        peaks = [0] * samples
+        for i in range(samples):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            op()
+            peaks[i] = tracemalloc.get_traced_memory()[1] - before
+
+        retained_start = tracemalloc.get_traced_memory()[0]
+        for _ in range(samples):
+            op()
+        retained = tracemalloc.get_traced_memory()[0] - retained_start
+    finally:
+        tracemalloc.stop()
+
+    peaks.sort()
+    return _percentile(peaks, 0.5), retained / samples
+
+
+def run_benchmark(bench, repeat=200, batch_seconds=0.002, warmup_seconds=0.05, alloc_samples=100):
+    """Run one benchmark and return its result dict"""
+    random.seed(SEED)
+    with bench.factory() as op:
+        deadline = time.perf_counter() + warmup_seconds
+        while time.perf_counter() < deadline:
+            op()
+
+        inner = _calibrate(op, batch_seconds)
+        gc.collect()
+
+        per_op = []
+        total_ops = 0
+        total_time = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(inner):
+                op()
+            elapsed = time.perf_counter() - start
+            per_op.append(elapsed / inner)
+            total_ops += inner
+            total_time += elapsed
+
+        alloc_bytes, retained_bytes = _measure_allocations(op, alloc_samples)
+
+    per_op.sort()
+    return {
+        'group': bench.group,
+        'ops_per_sec': total_ops / total_time if total_time else 0.0,
+        'p50_us': _percentile(per_op, 0.5) * 1e6,
+        'p99_us': _percentile(per_op, 0.99) * 1e6,
+        'alloc_bytes_per_op': alloc_bytes,
+        'retained_bytes_per_op': retained_bytes,
+        'ops': total_ops,
+        'batch': inner,
+    }
+
+
+def environment():
+    """Interpreter and library versions recorded with each result file"""
+    info = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': SEED,
+    }
+    try:
+        import simplesip
+        info['simplesip'] = simplesip.__version__
+    except Exception:
+        pass
+    try:
+        import numpy
+        info['numpy'] = numpy.__version__
+    except ImportError:
+        info['numpy'] = None
+    info['audioop'] = _has_module('audioop')
+    return info
+
+
+def _has_module(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, results, threshold=0.15):
+    """Compare results against a baseline
+
+    A benchmark regresses when its throughput drops by more than
+    ``threshold`` (as a fraction), or when it allocates more than
+    ``threshold`` more bytes per operation (ignoring changes under 64 bytes).
+
+    Returns:
+        (rows, regressions) where rows are (name, baseline_ops, ops, change)
+        and regressions lists human-readable descriptions
+    """
+    rows = []
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('ops_per_sec'):
+            rows.append((name, None, result['ops_per_sec'], None))
+            continue
+
+        change = result['ops_per_sec'] / base['ops_per_sec'] - 1.0
+        rows.append((name, base['ops_per_sec'], result['ops_per_sec'], change))
+        if change < -threshold:
+            regressions.append(f"{name}: {change:+.1%} ops/s")
+
+        base_alloc = base.get('alloc_bytes_per_op')
+        alloc = result.get('alloc_bytes_per_op')
+        if base_alloc is not None and alloc is not None:
+            if alloc - base_alloc > 64 and alloc > base_alloc * (1 + threshold):
+                regressions.append(f"{name}: allocations {base_alloc:.0f} -> {alloc:.0f} bytes/op")
+    return rows, regressions
+
+
+def format_results(results):
+    lines = [f"{'benchmark':<32} {'ops/s':>12} {'p50_us':>10} {'p99_us':>10} {'alloc_B':>9} {'retain_B':>9}"]
+    for name, r in results.items():
+        alloc = '-' if r['alloc_bytes_per_op'] is None else f"{r['alloc_bytes_per_op']:.0f}"
+        retained = '-' if r['retained_bytes_per_op'] is None else f"{r['retained_bytes_per_op']:.1f}"
+        lines.append(f"{name:<32} {r['ops_per_sec']:>12,.0f} {r['p50_us']:>10.2f} "
+                     f"{r['p99_us']:>10.2f} {alloc:>9} {retained:>9}")
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    lines = [f"{'benchmark':<32} {'baseline':>12} {'current':>12} {'change':>8}"]
+    for name, base, current, change in rows:
+        base_text = '-' if base is None else f"{base:,.0f}"
+        change_text = 'new' if change is None else f"{change:+.1%}"
+        lines.append(f"{name:<32} {base_text:>12} {current:>12,.0f} {change_text:>8}")
+    return '\n'.join(lines)
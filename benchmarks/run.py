@@ -0,0 +1,77 @@
+"""
+Run the offline benchmark suite.
+
+    python benchmarks/run.py                          # run everything
+    python benchmarks/run.py codecs                   # one group or name filter
+    python benchmarks/run.py --save baseline.json     # store results
+    python benchmarks/run.py --compare baseline.json  # fail on regressions
+"""
+
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(1, os.path.dirname(HERE))
+
+import harness  # noqa: E402
+
+import bench_calls  # noqa: E402,F401
+import bench_codecs  # noqa: E402,F401
+import bench_media  # noqa: E402,F401
+import bench_rtp  # noqa: E402,F401
+import bench_sip  # noqa: E402,F401
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="simplesip performance benchmarks")
+    parser.add_argument('filter', nargs='?', help="Run benchmarks whose name contains this, or this group")
+    parser.add_argument('--save', metavar='PATH', help="Write results as JSON")
+    parser.add_argument('--compare', metavar='PATH', help="Compare against a saved baseline")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Allowed fractional slowdown before --compare fails (default 0.15)")
+    parser.add_argument('--repeat', type=int, default=200, help="Timed batches per benchmark")
+    parser.add_argument('--quick', action='store_true', help="Fewer, shorter batches")
+    parser.add_argument('--list', action='store_true', help="List benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    benches = harness.registered(args.filter)
+    if args.list:
+        for bench in benches:
+            print(f"{bench.group:<8} {bench.name}")
+        return 0
+    if not benches:
+        print(f"No benchmarks match {args.filter!r}", file=sys.stderr)
+        return 2
+
+    options = {'repeat': args.repeat}
+    if args.quick:
+        options = {'repeat': 30, 'batch_seconds': 0.001, 'warmup_seconds': 0.01, 'alloc_samples': 20}
+
+    results = {}
+    for bench in benches:
+        print(f"running {bench.name} ...", file=sys.stderr)
+        results[bench.name] = harness.run_benchmark(bench, **options)
+
+    print(harness.format_results(results))
+
+    if args.save:
+        harness.save_results(args.save, results)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        rows, regressions = harness.compare(harness.load_results(args.compare), results, args.threshold)
+        print()
+        print(harness.format_comparison(rows))
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,7 +16,7 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/Awaiskhan404/simplesip",
-    packages=find_packages(exclude=["tests", "examples"]),
+    packages=find_packages(exclude=["tests", "examples", "benchmarks"]),
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
@@ -39,6 +39,8 @@ setup(
     ],
     extras_require={
         "audio": ["pyaudio>=0.2.11"],
+        "srtp": ["cryptography>=3.1"],
+        "fast": ["audioop-lts>=0.2.1; python_version>='3.13'"],
         "dev": [
             "pytest>=6.0",
             "pytest-cov>=2.0",
@@ -50,6 +52,7 @@ setup(
     entry_points={
         "console_scripts": [
             "simplesip-demo=simplesip.examples.demo:main",
+            "simplesip-load=simplesip.loadgen:main",
         ],
     },
     keywords="sip voip rtp audio streaming telephony simple",
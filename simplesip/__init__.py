@@ -2,12 +2,92 @@
 Simple SIP Client Library (simplesip)
 
 A Python library for SIP (Session Initiation Protocol) communication with RTP audio streaming capabilities.
+
+Submodules are imported when one of their names is first used, so
+``import simplesip`` itself stays cheap; diagnostics() reports how long each
+import took and which codec backends were chosen.
 """
 
+import importlib
+import sys
+import time
+
+_started = time.perf_counter()
+
 __version__ = "0.1.2"
 __author__ = "Awais Khan"
 __email__ = "contact@awaiskhan.com.pk"
 
-from .client import SimpleSIPClient
+# Exported name -> submodule that defines it
+_EXPORTS = {
+    "SimpleSIPClient": "client",
+    "CallState": "client",
+    "Bridge": "bridge",
+    "Conference": "conference",
+    "Dialer": "dialer",
+    "OutboundCall": "dialer",
+    "TokenBucket": "dialer",
+    "PromptCache": "prompt_cache",
+    "configure_prompt_cache": "prompt_cache",
+    "get_prompt_cache": "prompt_cache",
+    "REGISTRY": "metrics",
+    "start_metrics_server": "metrics",
+    "Tracer": "tracing",
+    "JSONLTracer": "tracing",
+    "StageProfiler": "tracing",
+    "MultiTracer": "tracing",
+    "SIPTestServer": "server",
+    "ShardSupervisor": "shard",
+    "configure_logging": "log",
+    "shutdown_logging": "log",
+}
+
+__all__ = list(_EXPORTS) + ["diagnostics"]
+
+_import_seconds = {}  # Submodule -> seconds its first import took
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    qualified = f"{__name__}.{module_name}"
+    loaded = qualified in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(qualified)
+    if not loaded:
+        _import_seconds.setdefault(module_name, time.perf_counter() - start)
+    value = getattr(module, name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+def diagnostics():
+    """Python version, codec backends and import times of this process
+
+    Looking up the codec backends loads any not used yet.
+
+    Returns:
+        Dict with ``python``, ``version``, ``codec_backends``,
+        ``codec_probe_seconds``, ``import_seconds`` (package and each
+        submodule imported through it) and ``loaded_modules``
+    """
+    from . import codecs
+
+    return {
+        'python': sys.version.split()[0],
+        'version': __version__,
+        'codec_backends': codecs.backends(),
+        'codec_probe_seconds': codecs.probe_seconds(),
+        'import_seconds': dict(_import_seconds),
+        'loaded_modules': sorted(name[len(__name__) + 1:] for name in sys.modules
+                                 if name.startswith(__name__ + '.')),
+    }
+
 
-__all__ = ["SimpleSIPClient"]
\ No newline at end of file
+_import_seconds['simplesip'] = time.perf_counter() - _started
+del _started
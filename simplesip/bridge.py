@@ -0,0 +1,229 @@
+"""
+RTP bridge between two call legs.
+
+A Bridge connects two SimpleSIPClient calls so that each hears the other,
+for transfers to an agent or B2BUA-style use. When both legs negotiated the
+same codec, received packets are copied into a preallocated buffer and sent
+on with only the sequence number, timestamp and SSRC rewritten into the
+other leg's stream; nothing is decoded. Only legs with different codecs pay
+for one decode and one encode per packet. Telephone events are forwarded
+with the other leg's payload type.
+"""
+
+import struct
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from . import metrics
+from . import red
+from .sdp import CODEC_CLOCK_RATES, CODEC_SAMPLE_RATES, payload_ticks
+
+if TYPE_CHECKING:
+    from .client import SimpleSIPClient
+
+
+_RTP_HEADER = struct.Struct("!BBHII")
+
+_PASSTHROUGH = metrics.BRIDGE_PACKETS.labels("passthrough")
+_TRANSCODED = metrics.BRIDGE_PACKETS.labels("transcoded")
+
+
+def _resample(pcm: bytes, from_rate: int, to_rate: int) -> bytes:
+    """Convert 16-bit mono PCM between rates that are whole multiples of each other"""
+    if from_rate == to_rate:
+        return pcm
+    import numpy as np
+
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.int32)
+    if from_rate % to_rate == 0:
+        # Average each group of samples
+        factor = from_rate // to_rate
+        samples = samples[: len(samples) // factor * factor]
+        return bytes(
+            (samples.reshape(-1, factor).sum(axis=1) // factor).astype("<i2").tobytes()
+        )
+    if to_rate % from_rate == 0:
+        # Interpolate linearly between neighbouring samples
+        factor = to_rate // from_rate
+        following = np.append(samples[1:], samples[-1:])
+        steps = np.arange(factor)
+        out = samples[:, None] + (following - samples)[:, None] * steps // factor
+        return bytes(out.reshape(-1).astype("<i2").tobytes())
+    raise ValueError(f"Cannot resample {from_rate}Hz to {to_rate}Hz")
+
+
+class _Relay:
+    """One direction of a bridge: packets received on ``source`` go out on ``target``"""
+
+    def __init__(
+        self, bridge: "Bridge", source: "SimpleSIPClient", target: "SimpleSIPClient"
+    ) -> None:
+        self.bridge = bridge
+        self.source = source
+        self.target = target
+        self.packets = 0
+        self.transcoded = 0
+        self.dropped = 0
+        self._buffer = bytearray(2048)
+        self._view = memoryview(self._buffer)
+        self._source_ssrc: Optional[int] = None
+        self._seq_offset = 0
+        self._timestamp_offset = 0
+
+    def forward(
+        self,
+        data: bytes,
+        payload_type: int,
+        sequence: int,
+        timestamp: int,
+        ssrc: int,
+        header_length: int,
+    ) -> None:
+        source = self.source
+        target = self.target
+        if not target.media_sending or target.remote_rtp_info is None:
+            self.dropped += 1
+            return
+
+        if data[0] & 0x10:  # Header extension: 4-byte header plus its length in words
+            header_length += 4 + 4 * int.from_bytes(
+                data[header_length + 2 : header_length + 4], "big"
+            )
+        if payload_type == source.negotiated_red_payload_type:
+            # Forward only the primary encoding of redundant audio
+            try:
+                payload_type, _, primary = red.unpack(data[header_length:], timestamp)[
+                    -1
+                ]
+            except ValueError:
+                self.dropped += 1
+                return
+            data = data[:header_length] + primary
+
+        if payload_type == source.dtmf_payload_type:
+            out_type = target.dtmf_payload_type
+        elif source.negotiated_codec == target.negotiated_codec:
+            out_type = target.negotiated_payload_type or 0
+        else:
+            self._transcode(data[header_length:], timestamp)
+            return
+
+        payload_length = len(data) - header_length
+        if payload_length <= 0:
+            return
+        if payload_length > len(self._buffer) - 12:
+            self.dropped += 1
+            return
+
+        with target._rtp_send_lock:
+            if ssrc != self._source_ssrc:
+                # New source stream: continue the target's numbering from here
+                self._source_ssrc = ssrc
+                self._seq_offset = (target.rtp_seq - sequence) % 65536
+                self._timestamp_offset = (target.rtp_timestamp - timestamp) % 4294967296
+            out_seq = (sequence + self._seq_offset) % 65536
+            out_timestamp = (timestamp + self._timestamp_offset) % 4294967296
+
+            # Keep the marker and padding bits; CSRCs and extensions are dropped
+            _RTP_HEADER.pack_into(
+                self._buffer,
+                0,
+                0x80 | (data[0] & 0x20),
+                (data[1] & 0x80) | out_type,
+                out_seq,
+                out_timestamp,
+                target.rtp_ssrc,
+            )
+            self._buffer[12 : 12 + payload_length] = data[header_length:]
+            target._sendto_rtp(self._view[: 12 + payload_length])
+
+            # Local sends after the bridge ends carry on from this packet
+            target.rtp_seq = (out_seq + 1) % 65536
+            target.rtp_timestamp = (
+                out_timestamp
+                + payload_ticks(target.negotiated_codec or "PCMU", payload_length)
+            ) % 4294967296
+
+        self.packets += 1
+        _PASSTHROUGH.inc()
+        metrics.RTP_PACKETS_SENT.inc()
+        metrics.RTP_BYTES_SENT.inc(12 + payload_length)
+
+    def _transcode(self, payload: bytes, timestamp: int) -> None:
+        source = self.source
+        target = self.target
+        source_codec = source.negotiated_codec or "PCMU"
+        target_codec = target.negotiated_codec or "PCMU"
+
+        pcm = source._decode_payload(payload, source_codec)
+        target_rate = CODEC_SAMPLE_RATES[target_codec]
+        pcm = _resample(pcm, CODEC_SAMPLE_RATES[source_codec], target_rate)
+        encoded = target.encode_audio(pcm, target_codec)
+        ticks = len(pcm) // 2 * CODEC_CLOCK_RATES[target_codec] // target_rate
+        target._send_rtp_payload(encoded, target.negotiated_payload_type or 0, ticks)
+
+        self.packets += 1
+        self.transcoded += 1
+        _TRANSCODED.inc()
+
+
+class Bridge:
+    """Relay media between two connected calls
+
+    While bridged, a leg's received audio is no longer decoded or passed to
+    its audio callback; it goes straight to the other leg. Packets are
+    forwarded with the packetization they arrived in.
+
+    Args:
+        leg_a, leg_b: SimpleSIPClient instances with answered calls
+    """
+
+    def __init__(self, leg_a: "SimpleSIPClient", leg_b: "SimpleSIPClient") -> None:
+        if leg_a is leg_b:
+            raise ValueError("Cannot bridge a call to itself")
+        self.leg_a = leg_a
+        self.leg_b = leg_b
+        self._relays = (_Relay(self, leg_a, leg_b), _Relay(self, leg_b, leg_a))
+        self._lock = threading.Lock()
+        self.active = False
+
+    @property
+    def passthrough(self) -> bool:
+        """True if both legs use the same codec and no transcoding happens"""
+        return bool(self.leg_a.negotiated_codec == self.leg_b.negotiated_codec)
+
+    def start(self) -> "Bridge":
+        """Begin relaying; each leg may only be in one bridge at a time"""
+        with self._lock:
+            for leg in (self.leg_a, self.leg_b):
+                if leg._bridge is not None and leg._bridge is not self:
+                    raise RuntimeError(f"Call {leg.call_id} is already bridged")
+            self.leg_a._bridge = self._relays[0]
+            self.leg_b._bridge = self._relays[1]
+            self.active = True
+        return self
+
+    def stop(self) -> None:
+        """Stop relaying; both legs go back to normal receive processing"""
+        with self._lock:
+            for leg, relay in zip((self.leg_a, self.leg_b), self._relays):
+                if leg._bridge is relay:
+                    leg._bridge = None
+            self.active = False
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Packets relayed, transcoded and dropped in each direction"""
+        return {
+            direction: {
+                "packets": relay.packets,
+                "transcoded": relay.transcoded,
+                "dropped": relay.dropped,
+            }
+            for direction, relay in zip(("a_to_b", "b_to_a"), self._relays)
+        }
+
+    def __enter__(self) -> "Bridge":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
@@ -5,12 +5,36 @@ import threading
 import random
 import logging
 import hashlib
-from datetime import datetime
 from collections import deque
 import struct
 import re
 from enum import Enum
 
+from .playback import AudioFile, Playback
+from .prompt_cache import PromptCache, get_prompt_cache
+from .recording import CallRecorder
+from .dtmf import DTMFReceiver, DTMFSender
+from .bridge import Bridge
+from . import metrics
+from . import tracing
+from . import log
+from . import sdp as sdp_engine
+from .sdp import CODEC_RTPMAP, CODEC_SAMPLE_RATES, CODEC_CLOCK_RATES
+from .plc import Concealer
+from . import red
+from . import srtp
+from . import codecs
+from .transactions import PROCEEDING_TTL, Dialog, RecordTable, Transaction
+
+# Request methods counted by name in metrics; anything else is 'other'
+SIP_METHODS = frozenset(['INVITE', 'ACK', 'BYE', 'CANCEL', 'OPTIONS', 'REGISTER', 'PRACK',
+                         'SUBSCRIBE', 'NOTIFY', 'PUBLISH', 'INFO', 'REFER', 'MESSAGE', 'UPDATE'])
+
+_DECODE_SECONDS = {codec: metrics.RTP_DECODE_SECONDS.labels(codec) for codec in CODEC_RTPMAP}
+
+_g722_missing_logged = False  # Warn once per process when G.722 cannot be offered
+
+
 class CallState(Enum):
     IDLE = "idle"
     INVITING = "inviting" 
@@ -19,14 +43,44 @@ class CallState(Enum):
     STREAMING = "streaming"
 
 
+def _as_states(states):
+    """A CallState or an iterable of them, as a frozenset"""
+    if isinstance(states, CallState):
+        return frozenset((states,))
+    return frozenset(states)
+
+
+def parse_sip_message(message):
+    """Parse a SIP message into a dict of lower-cased headers
+    
+    The first line is stored under 'start_line' and the body, if any, under
+    'body'. Repeated headers keep their last value.
+    """
+    head, separator, body = message.partition('\r\n\r\n')
+    lines = head.split('\r\n')
+    headers = {'start_line': lines[0]}
+    
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+    
+    if separator:
+        headers['body'] = body
+    
+    return headers
+
+
 class SimpleSIPClient:
-    def __init__(self, username, password, server, port=5060, call_manager=None):
+    def __init__(self, username, password, server, port=5060, call_manager=None, local_port=5060):
         self.username = username
         self.password = password
         self.server = server
         self.port = port
+        self.local_port = local_port  # 0 picks a free port on connect()
         self.call_manager = call_manager
         self.call_id = None
+        self.call_id_prefix = ''  # Prepended to Call-IDs we create (used for shard routing)
         self.cseq = 1
         self.tag = str(random.randint(100000, 999999))
         self.branch_prefix = "z9hG4bK"
@@ -34,22 +88,58 @@ class SimpleSIPClient:
         self.rtp_sock = None
         self.running = False
         self.auth_info = None
-        self.current_transactions = {}
-        self.dialogs = {}  # Track active dialogs
+        # Call-ID -> Transaction / Dialog; records past their TTL are evicted
+        self.current_transactions = RecordTable()
+        self.dialogs = RecordTable()
+        self._next_sweep = 0.0
         self.audio_buffer = deque(maxlen=10)
         self.remote_rtp_info = None
-        self.local_rtp_port = random.randint(10000, 20000)
+        self.local_rtp_port = random.randint(10000, 20000)  # 0 picks a free port on connect()
+        self.rtp_stats = self._new_rtp_stats()
         self.remote_tag = None
         self.local_ip = None
-        self.call_state = CallState.IDLE
+        
+        # Call state: written through the call_state property, which wakes
+        # wait_for()/wait_for_async() and calls the state listeners
+        self._call_state = CallState.IDLE
+        self._state_changed = threading.Condition()
+        self._state_version = 0
+        self._state_history = deque(maxlen=32)  # (version, state) of recent transitions
+        self._state_listeners = []
         
         # Audio callback system
         self.audio_received_callback = None
         self.audio_callback_format = 'pcmu'  # 'pcmu' or 'pcm'
+        self.recorder = None
+        
+        # RFC 4733 DTMF
+        self.dtmf_payload_type = 101
+        self.dtmf_callback = None
+        self._dtmf_sender = DTMFSender(self, payload_type=self.dtmf_payload_type)
+        self._dtmf_receiver = DTMFReceiver(self._dispatch_dtmf)
+        self._inband_dtmf = None  # Optional Goertzel detector on decoded audio
+        self._inband_batch = None  # Shared BatchDetector the frames go to, if any
+        
+        # RFC 2198 redundant audio: each packet also carries the red_depth
+        # frames before it. 0 leaves RED out of offers and answers.
+        self.red_depth = 0
+        self.red_payload_type = 100
+        self.negotiated_red_payload_type = None
+        self._red_encoder = None
+        self._g722 = None  # G.722 encoder/decoder state of the current call
+        
+        # SRTP (RFC 3711) with SDES keys. Offers use RTP/SAVP when srtp is
+        # True; RTP/SAVP offers with a supported a=crypto are always accepted.
+        self.srtp = False
+        self._srtp = None  # SRTPSession of the current call
+        self._srtp_key = None  # Our master key for the current call
+        self._srtp_remote = None  # (suite, key params) the session was built from
+        
+        # Optional pipeline tracer (see simplesip.tracing); None costs nothing
+        self.tracer = None
         
         # *** CRITICAL 491 FIXES ***
         self.sent_invites = set()
-        self.last_response_time = {}
         self.invite_in_progress = False
         
         # Audio configuration
@@ -59,39 +149,78 @@ class SimpleSIPClient:
         self.negotiated_codec = None  # Track negotiated codec
         self.negotiated_payload_type = None
         
+        # Packetization: ptime is offered (and sent unless the peer asks for
+        # another value), maxptime caps what the peer may send us
+        self.ptime = 20
+        self.maxptime = None
+        self.negotiated_ptime = None
+        self.jitter_target_ms = 50  # Minimum playout delay of the jitter buffer
+        self.packet_loss_concealment = True  # Fill lost packets (see simplesip.plc)
+        self._concealer = Concealer()
+        
+        # Sample rate the audio consumer works at; codecs decoding to it are
+        # preferred so no resampling is needed (None: keep preferred_codecs order)
+        self.native_sample_rate = None
+        self._sdp_cache = {}  # Call-ID -> negotiated media of the dialog
+        
+        # Media direction: local_direction is what we ask for (hold() makes
+        # it sendonly), media_direction what both sides agreed on. Receive
+        # decoding and sending are parked while it does not allow them.
+        self.local_direction = 'sendrecv'
+        self.media_direction = 'sendrecv'
+        self.decode_held_media = False  # Keep decoding music on hold sent to us
+        self._rx_active = True
+        self._tx_active = True
+        self._tx_resumed = threading.Event()
+        self._tx_resumed.set()
+        self._tx_parked_at = None
+        self._bridge = None  # _Relay to another call while bridged
+        self.preferred_codecs = ['G722', 'PCMU']  # Offered in this order
+        
         # RTP sequence number and timestamp
         self.rtp_seq = random.randint(0, 65535)
         self.rtp_timestamp = random.randint(0, 4294967295)
         self.rtp_ssrc = random.randint(0, 4294967295)
+        self._rtp_send_lock = threading.Lock()
         
-        # Configure logging for errors and minimal info
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.StreamHandler()
-            ]
-        )
+        # Connectivity probes after a call is answered: one empty PCMU packet,
+        # then PT0/PT8 packets to the RTP port and its neighbours 2s later
+        self.rtp_probes = True
+        self._rtp_probe_timer = None
+        self._reinvite_timer = None  # Retry of a re-INVITE that got 491
+        
+        # Logging is left to the application (see simplesip.configure_logging)
         self.logger = logging.getLogger(__name__)
 
-    def connect(self):
-        """Connect to the SIP server and initialize RTP socket"""
+    def connect(self, sip_socket=None):
+        """Connect to the SIP server and initialize RTP socket
+        
+        Args:
+            sip_socket: Bound socket (or socket-like object with recvfrom,
+                        sendto, settimeout, getsockname and close) to use for
+                        SIP instead of binding local_port; shard workers pass
+                        the port they share with other processes
+        """
         try:
             self.local_ip = self.get_local_ip()
             
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.sock.bind((self.local_ip, 5060))
+            if sip_socket is not None:
+                self.sock = sip_socket
+            else:
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.sock.bind((self.local_ip, self.local_port))
+                # Enable socket reuse
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.local_port = self.sock.getsockname()[1]
             self.sock.settimeout(0.5)  # Reduced timeout for faster 491 response
             
-            # Enable socket reuse
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
             self.rtp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.rtp_sock.bind((self.local_ip, self.local_rtp_port))
+            self.local_rtp_port = self.rtp_sock.getsockname()[1]
             self.rtp_sock.settimeout(0.1)
             self.rtp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.rtp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            self.logger.info(f"RTP socket bound to {self.local_ip}:{self.local_rtp_port}")
+            self.logger.info("RTP socket bound to %s:%s", self.local_ip, self.local_rtp_port)
             
             self.running = True
             
@@ -104,7 +233,7 @@ class SimpleSIPClient:
             self.register()
             
         except Exception as e:
-            self.logger.error(f"Connection failed: {str(e)}")
+            self.logger.error("Connection failed: %s", e)
             raise
 
     def _keepalive_thread(self):
@@ -116,7 +245,7 @@ class SimpleSIPClient:
                     header = struct.pack('!BBHII', 
                                         0x80, 0, self.rtp_seq, 
                                         self.rtp_timestamp, self.rtp_ssrc)
-                    self.rtp_sock.sendto(header, self.remote_rtp_info)
+                    self._sendto_rtp(header)
                     self.rtp_seq = (self.rtp_seq + 1) % 65536
                 except:
                     pass
@@ -124,28 +253,22 @@ class SimpleSIPClient:
     def register(self):
         """Send initial REGISTER message"""
         branch = self._generate_branch()
-        call_id = f"{random.randint(100000, 999999)}@{self.local_ip}"
+        call_id = self._new_call_id()
         
         msg = f"REGISTER sip:{self.server} SIP/2.0\r\n" \
-              f"Via: SIP/2.0/UDP {self.local_ip}:5060;branch={branch};rport\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch};rport\r\n" \
               f"Max-Forwards: 70\r\n" \
               f"From: <sip:{self.username}@{self.server}>;tag={self.tag}\r\n" \
               f"To: <sip:{self.username}@{self.server}>\r\n" \
               f"Call-ID: {call_id}\r\n" \
               f"CSeq: {self.cseq} REGISTER\r\n" \
-              f"Contact: <sip:{self.username}@{self.local_ip}:5060>;expires=3600\r\n" \
+              f"Contact: <sip:{self.username}@{self.local_ip}:{self.local_port}>;expires=3600\r\n" \
               f"Allow: INVITE, ACK, CANCEL, OPTIONS, BYE, REFER, NOTIFY, MESSAGE, SUBSCRIBE, INFO\r\n" \
               f"User-Agent: BetterSIPClient/1.0\r\n" \
               f"Expires: 3600\r\n" \
               f"Content-Length: 0\r\n\r\n"
         
-        self.current_transactions[call_id] = {
-            'type': 'REGISTER',
-            'start_time': datetime.now(),
-            'branch': branch,
-            'retries': 0,
-            'cseq': self.cseq
-        }
+        self.current_transactions.add(Transaction(call_id, 'REGISTER', branch=branch, cseq=self.cseq))
         
         self._send_message(msg)
         self.cseq += 1
@@ -153,10 +276,10 @@ class SimpleSIPClient:
     def query_server_capabilities(self):
         """Send OPTIONS request to query server codec capabilities"""
         branch = self._generate_branch()
-        call_id = f"{random.randint(100000, 999999)}@{self.local_ip}"
+        call_id = self._new_call_id()
         
         msg = f"OPTIONS sip:{self.server} SIP/2.0\r\n" \
-              f"Via: SIP/2.0/UDP {self.local_ip}:5060;branch={branch};rport\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch};rport\r\n" \
               f"Max-Forwards: 70\r\n" \
               f"From: <sip:{self.username}@{self.server}>;tag={self.tag}\r\n" \
               f"To: <sip:{self.server}>\r\n" \
@@ -166,13 +289,7 @@ class SimpleSIPClient:
               f"Accept: application/sdp\r\n" \
               f"Content-Length: 0\r\n\r\n"
         
-        self.current_transactions[call_id] = {
-            'type': 'OPTIONS',
-            'start_time': datetime.now(),
-            'branch': branch,
-            'retries': 0,
-            'cseq': self.cseq
-        }
+        self.current_transactions.add(Transaction(call_id, 'OPTIONS', branch=branch, cseq=self.cseq))
         
         self._send_message(msg)
         self.cseq += 1
@@ -202,83 +319,288 @@ class SimpleSIPClient:
                 f"a=fmtp:101 0-16\r\n"
                 f"a=sendrecv\r\n")
         else:
-            sdp = (f"v=0\r\n"
-                f"o={self.username} {session_id} 1 IN IP4 {self.local_ip}\r\n"
-                f"s=SIP Call\r\n"
-                f"c=IN IP4 {self.local_ip}\r\n"
-                f"t=0 0\r\n"
-                f"m=audio {self.local_rtp_port} RTP/AVP 9 0 101\r\n"  # G.722 first, PCMU fallback
-                f"a=rtpmap:9 G722/8000\r\n"
-                f"a=rtpmap:0 PCMU/8000\r\n"
-                f"a=rtpmap:101 telephone-event/8000\r\n"
-                f"a=fmtp:101 0-16\r\n"
-                f"a=sendrecv\r\n")
+            offered = [(codec, CODEC_RTPMAP[codec][0]) for codec in self._codec_preferences(offer=True)]
+            session_id, version = self._sdp_origin(self.call_id) if self.call_id else (session_id, 1)
+            if self.srtp:
+                proto = 'RTP/SAVP'
+                crypto = ('1', 'AES_CM_128_HMAC_SHA1_80', f'inline:{self._local_srtp_key()}')
+            else:
+                proto, crypto = 'RTP/AVP', None
+            # telephone-event and RED at every clock offered, so DTMF still
+            # works whichever codec the peer picks
+            taken = (self.red_payload_type,) if self.red_depth else ()
+            dtmf = sdp_engine.clock_payload_types(offered, self.dtmf_payload_type, taken)
+            red_payload_types = None
+            if self.red_depth:
+                # Only where a frame fits in a RED block
+                repeatable = [(codec, pt) for codec, pt in offered
+                              if red.fits(sdp_engine.payload_length(codec, self.ptime))]
+                red_payload_types = sdp_engine.clock_payload_types(
+                    repeatable, self.red_payload_type, taken=dtmf.values())
+            sdp = sdp_engine.build_sdp(
+                self.username, session_id, version, self.local_ip, self.local_rtp_port, offered,
+                dtmf, self.ptime, self.maxptime, self.local_direction,
+                red_payload_types, proto, crypto,
+            )
         return sdp
             
     def _parse_sdp_answer(self, sdp):
         """Parse SDP answer to get remote RTP info and negotiated codec"""
-        lines = sdp.split('\r\n')
-        ip = None
-        port = None
-        rtp_profile = None
-        ice_candidates = []
-        payload_types = []
-        codec_map = {}
-        
-        for line in lines:
-            if line.startswith('c='):
-                parts = line.split()
-                if len(parts) >= 3:
-                    ip = parts[2]
-            elif line.startswith('m=audio'):
-                parts = line.split()
-                if len(parts) >= 3:
-                    try:
-                        port = int(parts[1])
-                        rtp_profile = parts[2]  # RTP/AVP, RTP/SAVPF, etc.
-                        payload_types = [int(pt) for pt in parts[3:] if pt.isdigit()]
-                    except ValueError:
-                        continue
-            elif line.startswith('a=rtpmap:'):
-                parts = line[9:].split(' ', 1)
-                if len(parts) == 2:
-                    pt = int(parts[0])
-                    codec_info = parts[1]
-                    codec_name = codec_info.split('/')[0].upper()
-                    codec_map[pt] = codec_name
-            elif line.startswith('a=candidate:'):
-                ice_candidates.append(line)
-        
-        if payload_types and codec_map:
-            self.negotiated_payload_type = payload_types[0]
-            print(f"Negotiated Payload Type: {self.negotiated_payload_type}")
-            self.negotiated_codec = codec_map.get(self.negotiated_payload_type, 'UNKNOWN')
-            print(f"Codec Map: {codec_map}")
-            if self.negotiated_codec == 'G722':
-                self.logger.info(f"🎵 ✅ G.722 codec negotiated! (PT {self.negotiated_payload_type}) - High quality 16kHz audio")
-                self.audio_sample_rate = 16000  # G.722 uses 16kHz internally
+        tracer = self.tracer
+        if tracer is None:
+            return self._apply_sdp_answer(sdp)
+        
+        span = tracer.start(tracing.SDP_PARSE, self.call_id)
+        try:
+            return self._apply_sdp_answer(sdp)
+        finally:
+            tracer.end(span)
+    
+    def _apply_sdp_answer(self, sdp):
+        """Apply the remote answer to our offer: endpoint, codec and ptime"""
+        cached = self._sdp_cache.get(self.call_id)
+        signature = sdp_engine.media_signature(sdp)
+        if cached is not None and cached['signature'] == signature:
+            # Retransmitted 200 OK or 183 with the same media
+            self._update_media_direction(cached['negotiation'].direction)
+            return True
+        
+        remote = sdp_engine.parse_sdp(sdp)
+        negotiation = sdp_engine.negotiate(remote, self._codec_preferences(), remote_is_offer=False)
+        if negotiation is None:
+            self.logger.error("SDP answer has no usable audio stream or common codec",
+                              extra={'call_id': self.call_id})
+            return False
+        if not self._setup_srtp(negotiation):
+            return False
+        
+        self._apply_negotiation(negotiation)
+        if self.call_id:
+            entry = self._dialog_sdp(self.call_id)
+            entry['signature'] = signature
+            entry['negotiation'] = negotiation
+            entry['answer'] = None
+        return negotiation.remote_address is not None
+    
+    def _answer_offer(self, call_id, sdp):
+        """Negotiate a remote offer and return our answer SDP
+        
+        The answer is cached per dialog: a re-INVITE whose media is unchanged
+        gets the same answer back without renegotiating.
+        
+        Returns:
+            Answer SDP, or None if no codec is acceptable (reply 488)
+        """
+        cached = self._sdp_cache.get(call_id)
+        signature = sdp_engine.media_signature(sdp)
+        if cached is not None and cached['signature'] == signature and cached['answer']:
+            self._update_media_direction(cached['negotiation'].direction)
+            return cached['answer']
+        
+        remote = sdp_engine.parse_sdp(sdp)
+        negotiation = sdp_engine.negotiate(remote, self._codec_preferences(), remote_is_offer=True)
+        if negotiation is None:
+            self.logger.warning("No acceptable codec in SDP offer", extra={'call_id': call_id})
+            return None
+        if not self._setup_srtp(negotiation):
+            return None
+        
+        self._apply_negotiation(negotiation)
+        
+        if self._srtp is not None:
+            tag, suite, _ = negotiation.crypto
+            proto, crypto = negotiation.proto, (tag, suite, f'inline:{self._local_srtp_key()}')
+        else:
+            proto, crypto = 'RTP/AVP', None
+        session_id, version = self._sdp_origin(call_id)
+        answer = sdp_engine.build_sdp(
+            self.username, session_id, version, self.local_ip, self.local_rtp_port,
+            negotiation.codecs, negotiation.dtmf_payload_type, self.ptime, self.maxptime,
+            self.media_direction, negotiation.red_payload_type if self._red_encoder is not None else None,
+            proto, crypto,
+        )
+        entry = self._dialog_sdp(call_id)
+        entry['signature'] = signature
+        entry['negotiation'] = negotiation
+        entry['answer'] = answer
+        return answer
+    
+    def _local_srtp_key(self):
+        """Our SRTP master key, one per call"""
+        if self._srtp_key is None:
+            self._srtp_key = srtp.generate_key()
+        return self._srtp_key
+    
+    def _setup_srtp(self, negotiation):
+        """Start SRTP if the remote SDP is RTP/SAVP with an SDES key we support
+        
+        The session, and the keys derived in it, are kept while the remote
+        key stays the same, e.g. across a re-INVITE for hold.
+        
+        Returns:
+            False if SRTP is required but cannot be set up
+        """
+        if 'SAVP' not in negotiation.proto or negotiation.crypto is None:
+            self._srtp = None
+            self._srtp_remote = None
+            return True
+        
+        _, suite, key_params = negotiation.crypto
+        if self._srtp is not None and self._srtp_remote == (suite, key_params):
+            return True
+        try:
+            self._srtp = srtp.SRTPSession(self._local_srtp_key(), key_params, suite)
+        except (ImportError, ValueError) as e:
+            self.logger.error("❌ Cannot set up SRTP: %s", e)
+            self._srtp = None
+            return False
+        self._srtp_remote = (suite, key_params)
+        self.logger.info("🔒 SRTP enabled (%s)", suite)
+        return True
+    
+    def _dialog_sdp(self, call_id):
+        """SDP cache entry of a dialog, created on first use"""
+        entry = self._sdp_cache.get(call_id)
+        if entry is None:
+            entry = self._sdp_cache[call_id] = {
+                'signature': None,
+                'negotiation': None,
+                'answer': None,
+                'origin': None,
+            }
+        return entry
+    
+    def _sdp_origin(self, call_id):
+        """(session id, version) for the next SDP we send in a dialog
+        
+        The version goes up with every offer or changed answer (RFC 3264 8).
+        """
+        entry = self._dialog_sdp(call_id)
+        if entry['origin'] is None:
+            entry['origin'] = [int(time.time()), 1]
+        else:
+            entry['origin'][1] += 1
+        return tuple(entry['origin'])
+    
+    def _codec_preferences(self, offer=False):
+        """Codecs to offer, or to accept from the peer, best first
+        
+        preferred_codecs come first (ranked by the consumer's sample rate);
+        when accepting, any other codec we can decode is still better than
+        rejecting the call.
+        """
+        preferences = list(self.preferred_codecs)
+        if not offer:
+            preferences += [codec for codec in CODEC_RTPMAP if codec not in preferences]
+        if 'G722' in preferences and not codecs.g722_available():
+            global _g722_missing_logged
+            if not _g722_missing_logged:
+                _g722_missing_logged = True
+                self.logger.warning("G.722 disabled: the 'G722' package is not installed")
+            preferences.remove('G722')
+        return sdp_engine.rank_codecs(preferences, self.native_sample_rate)
+    
+    def _apply_negotiation(self, negotiation):
+        """Switch media to the outcome of an offer/answer exchange"""
+        self.negotiated_payload_type = negotiation.payload_type
+        self.negotiated_codec = negotiation.codec
+        self.negotiated_ptime = self._choose_ptime(negotiation.ptime, negotiation.maxptime)
+        if negotiation.dtmf_payload_type is not None:
+            self.dtmf_payload_type = negotiation.dtmf_payload_type
+            self._dtmf_sender.payload_type = negotiation.dtmf_payload_type
+        clock = CODEC_CLOCK_RATES[negotiation.codec]
+        self._dtmf_sender.clock_rate = self._dtmf_receiver.clock_rate = clock
+        if self.red_depth and negotiation.red_payload_type is not None:
+            self.negotiated_red_payload_type = negotiation.red_payload_type
+            length = sdp_engine.payload_length(negotiation.codec, self.negotiated_ptime)
+            if red.fits(length):
+                self._red_encoder = red.RedundancyEncoder(self.red_depth)
             else:
-                self.logger.info(f"🎵 📻 Fallback codec: {self.negotiated_codec} (PT {self.negotiated_payload_type}) - Standard quality")
+                self._red_encoder = None
+                self.logger.info("RED not sent: %d-byte %s frames are too long for a RED block",
+                                 length, negotiation.codec, extra={'call_id': self.call_id})
+        else:
+            self.negotiated_red_payload_type = None
+            self._red_encoder = None
+        self.logger.debug("Negotiated codecs %s", negotiation.codecs, extra={'call_id': self.call_id})
         
-        if ip and port:
-            self.remote_rtp_info = (ip, port)
-            self.logger.info(f"SDP accepted - RTP endpoint: {ip}:{port}")
-            self.logger.info(f"🔗 RTP connection: {self.local_ip}:{self.local_rtp_port} ↔ {ip}:{port}")
-            
-            if rtp_profile:
-                self.logger.info(f"🔒 RTP Profile: {rtp_profile}")
-                if 'SAVPF' in rtp_profile or 'SAVP' in rtp_profile:
-                    self.logger.warning(f"⚠️  Server wants secure RTP ({rtp_profile}) but client only supports plain RTP/AVP")
-                    self.logger.warning(f"⚠️  RTP packets may not be received due to encryption/ICE requirements")
-                    
-                    if ice_candidates:
-                        self.logger.info(f"🧊 Trying to find plain RTP endpoint from {len(ice_candidates)} ICE candidates...")
-                        for candidate in ice_candidates[:3]:  # Try first 3 candidates
-                            self.logger.info(f"🧊 ICE candidate: {candidate}")
+        if self.negotiated_codec == 'G722':
+            self.logger.info("🎵 ✅ G.722 codec negotiated! (PT %s) - High quality 16kHz audio",
+                             self.negotiated_payload_type)
+        else:
+            self.logger.info("🎵 📻 Fallback codec: %s (PT %s) - Standard quality",
+                             self.negotiated_codec, self.negotiated_payload_type)
+        self.audio_sample_rate = sdp_engine.CODEC_SAMPLE_RATES[self.negotiated_codec]
+        self._update_media_direction(negotiation.direction)
+        
+        if negotiation.remote_address is None:
+            self.logger.error("SDP parsing failed - no valid RTP endpoint found")
+            return
+        
+        ip, port = negotiation.remote_address
+        self.remote_rtp_info = (ip, port)
+        self.logger.info("SDP accepted - RTP endpoint: %s:%s", ip, port)
+        self.logger.info("🔗 RTP connection: %s:%s ↔ %s:%s", self.local_ip, self.local_rtp_port, ip, port)
+        
+        rtp_profile = negotiation.proto
+        self.logger.info("🔒 RTP Profile: %s", rtp_profile)
+        if 'SAVP' in rtp_profile and self._srtp is None:
+            self.logger.warning("⚠️  Server wants secure RTP (%s) without an SDES key; "
+                                "DTLS-SRTP is not supported", rtp_profile)
+            self.logger.warning("⚠️  RTP packets may not be received due to encryption/ICE requirements")
             
-            return True
-        self.logger.error("SDP parsing failed - no valid RTP endpoint found")
-        return False
+            ice_candidates = [a for a in negotiation.media.attributes if a.startswith('candidate:')]
+            if ice_candidates:
+                self.logger.info("🧊 Trying to find plain RTP endpoint from %s ICE candidates...", len(ice_candidates))
+                for candidate in ice_candidates[:3]:  # Try first 3 candidates
+                    self.logger.info("🧊 ICE candidate: a=%s", candidate)
+    
+    def _update_media_direction(self, remote_direction):
+        """Agree on a direction from the remote SDP's and our local_direction"""
+        mirrored = sdp_engine.ANSWER_DIRECTIONS.get(remote_direction, 'sendrecv')
+        self._set_media_direction(sdp_engine.intersect_directions(self.local_direction, mirrored))
+    
+    def _set_media_direction(self, direction):
+        """Park or resume receive decoding and sending for ``direction``"""
+        send, receive = sdp_engine.direction_allows(direction)
+        previous = self.media_direction
+        self.media_direction = direction
+        self._rx_active = receive and (direction == 'sendrecv' or self.decode_held_media)
+        
+        if send and not self._tx_active:
+            with self._rtp_send_lock:
+                # Sequence numbers continue; the timestamp covers the pause
+                if self._tx_parked_at is not None:
+                    clock = CODEC_CLOCK_RATES.get(self.negotiated_codec or 'PCMU', 8000)
+                    paused = int((time.monotonic() - self._tx_parked_at) * clock)
+                    self.rtp_timestamp = (self.rtp_timestamp + paused) % 4294967296
+                    self._tx_parked_at = None
+                self._tx_active = True
+            self._tx_resumed.set()
+        elif not send and self._tx_active:
+            with self._rtp_send_lock:
+                self._tx_active = False
+                self._tx_parked_at = time.monotonic()
+            self._tx_resumed.clear()
+        
+        if direction != previous:
+            self.logger.info("⏯️ Media direction %s → %s (receive %s, send %s)", previous, direction,
+                             'on' if self._rx_active else 'parked', 'on' if self._tx_active else 'parked')
+    
+    def _wait_for_send(self, stop_event=None):
+        """Block while sending is parked; False if the call or caller stopped"""
+        while self.running and not self._tx_active:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            self._tx_resumed.wait(0.5)
+        return self.running
+    
+    def _choose_ptime(self, remote_ptime, remote_maxptime):
+        """Packetization to send with: the peer's ptime, else ours, capped by its maxptime"""
+        ptime = remote_ptime or self.ptime
+        if remote_maxptime:
+            ptime = min(ptime, remote_maxptime)
+        return max(10, ptime)
     
     def _send_test_rtp_packet(self):
         """Send a test RTP packet to verify connection"""
@@ -293,103 +615,350 @@ class SimpleSIPClient:
                                 self.rtp_timestamp,
                                 self.rtp_ssrc)
             
-            self.rtp_sock.sendto(header, self.remote_rtp_info)
-            self.logger.info(f"📤 Test RTP packet sent to {self.remote_rtp_info}")
+            self._sendto_rtp(header)
+            self.logger.info("📤 Test RTP packet sent to %s", self.remote_rtp_info)
             
             self.rtp_seq = (self.rtp_seq + 1) % 65536
             
         except Exception as e:
-            self.logger.error(f"Error sending test RTP packet: {str(e)}")
+            self.logger.error("Error sending test RTP packet: %s", e)
             
-        import threading
-        threading.Timer(2.0, self._send_multiple_rtp_tests).start()
+        timer = threading.Timer(2.0, self._send_multiple_rtp_tests, (self.call_id,))
+        timer.daemon = True
+        self._rtp_probe_timer = timer
+        timer.start()
     
-    def _send_multiple_rtp_tests(self):
+    def _send_multiple_rtp_tests(self, call_id):
         """Send RTP test packets with different configurations"""
-        if not self.remote_rtp_info or not self.running:
-            return
+        self._rtp_probe_timer = None
+        remote = self.remote_rtp_info
+        if not remote or not self.running or call_id != self.call_id or self._srtp is not None:
+            return  # Under SRTP, reusing sequence numbers would reuse keystream
             
         test_ports = [
-            self.remote_rtp_info[1],  # Original port
-            self.remote_rtp_info[1] + 1,  # RTCP port  
-            self.remote_rtp_info[1] - 1,  # Alternative port
+            remote[1],  # Original port
+            remote[1] + 1,  # RTCP port  
+            remote[1] - 1,  # Alternative port
         ]
         
         for port_offset, port in enumerate(test_ports):
             try:
-                test_endpoint = (self.remote_rtp_info[0], port)
+                test_endpoint = (remote[0], port)
                 
                 for pt in [0, 8]:  # PCMU and PCMA
                     header = struct.pack('!BBHII', 
                                         0x80,  # Version=2
                                         pt,    # Payload type
-                                        self.rtp_seq + port_offset,
+                                        (self.rtp_seq + port_offset) % 65536,
                                         self.rtp_timestamp,
                                         self.rtp_ssrc)
                     
                     payload = bytes([0x80] * 20)  # Short silence
                     self.rtp_sock.sendto(header + payload, test_endpoint)
-                    self.logger.info(f"🔍 Test RTP PT{pt} sent to {test_endpoint}")
+                    self.logger.info("🔍 Test RTP PT%s sent to %s", pt, test_endpoint)
                     
                 time.sleep(0.1)
                 
             except Exception as e:
-                self.logger.error(f"Error in RTP test to {test_endpoint}: {str(e)}")
+                self.logger.error("Error in RTP test to %s: %s", test_endpoint, e)
     
     def send_audio(self, audio_data):
         """Improved audio transmission with codec-aware encoding"""
-        if not self.remote_rtp_info or not audio_data or not self.running:
+        tracer = self.tracer
+        if tracer is None:
+            return self._send_audio(audio_data)
+        
+        span = tracer.start(tracing.SEND_AUDIO, self.call_id)
+        try:
+            return self._send_audio(audio_data)
+        finally:
+            tracer.end(span)
+    
+    def _send_audio(self, audio_data):
+        """Encode a PCM buffer and pace it out in RTP packets of the negotiated ptime"""
+        if not self.remote_rtp_info or not audio_data or not self.running or not self._tx_active:
             return
             
         try:
             payload_type = self.negotiated_payload_type or 0
             codec = self.negotiated_codec or 'PCMU'
             
-            if codec == 'G722':
-                encoded_data = self._g722_encode(audio_data)
-                samples_per_packet = 160  # G.722 RTP clock is still 8kHz
-            elif codec == 'PCMA':
-                encoded_data = self._pcm_to_alaw(audio_data)
-                samples_per_packet = 160
-            else:  # PCMU or fallback
-                encoded_data = self._pcm_to_ulaw(audio_data)
-                samples_per_packet = 160
-            
-            if codec == 'G722':
-                chunk_size = 80
-            else:
-                chunk_size = samples_per_packet  # PCMU/PCMA: 160 bytes for 20ms
+            tracer = self.tracer
+            span = tracer.start(tracing.RTP_ENCODE, self.call_id) if tracer is not None else None
+            encoded_data = self._encode_payload(audio_data, codec)
+            if span is not None:
+                tracer.end(span)
+            config = self.get_audio_config()
+            chunk_size = config['payload_size']
+            interval = config['ptime'] / 1000.0
             
-            self.logger.debug(f"Audio: {len(encoded_data)} bytes encoded, {chunk_size} bytes per packet")
+            self.logger.debug("Audio: %d bytes encoded, %d bytes per packet", len(encoded_data), chunk_size,
+                              extra={'call_id': self.call_id, 'category': log.AUDIO})
             
+            next_send = time.monotonic()
             for i in range(0, len(encoded_data), chunk_size):
                 chunk = encoded_data[i:i+chunk_size]
                 if not chunk:
                     continue
-                    
-                header = struct.pack('!BBHII', 
-                                    0x80,  # Version=2, P=0, X=0, CC=0
-                                    payload_type,  # Use negotiated payload type
-                                    self.rtp_seq,
-                                    self.rtp_timestamp,
-                                    self.rtp_ssrc)
+                if not self._tx_active:
+                    break  # Call put on hold: drop the rest of this buffer
                 
-                self.rtp_sock.sendto(header + chunk, self.remote_rtp_info)
-                
-                self.rtp_seq = (self.rtp_seq + 1) % 65536
-                self.rtp_timestamp += samples_per_packet
-                
-                time.sleep(0.02)
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                metrics.RTP_SEND_LATENESS_SECONDS.observe(max(0.0, time.monotonic() - next_send))
+                    
+                self._send_rtp_payload(chunk, payload_type, sdp_engine.payload_ticks(codec, len(chunk)))
+                next_send += interval
                 
         except Exception as e:
-            self.logger.error(f"Error sending RTP: {str(e)}")
+            self.logger.error("Error sending RTP: %s", e)
+    
+    def play_file(self, path, sample_rate=None, wait=False):
+        """Stream an audio file to the remote party
+        
+        The file is memory-mapped and encoded one packet (ptime) at a time
+        while it is sent. Files that already match the negotiated codec (.ulaw,
+        .alaw, .g722 or a G.711 WAV) are sent without any encoding work.
+        
+        Args:
+            path: WAV, raw 16-bit mono PCM, .ulaw, .alaw or .g722 file
+            sample_rate: Sample rate of a headerless PCM file
+                         (default: the negotiated codec's rate)
+            wait: Block until the whole file has been sent
+            
+        Returns:
+            Playback handle with stop() and wait(), or None without an active call
+            
+        Raises:
+            ValueError: If the file format cannot be sent with the negotiated codec
+        """
+        if not self.remote_rtp_info or not self.running:
+            return None
+        
+        config = self.get_audio_config()
+        codec = config['codec']
+        
+        source = AudioFile(path, sample_rate=sample_rate or config['sample_rate'])
+        try:
+            source.check_codec(codec, config['sample_rate'])
+        except ValueError:
+            source.close()
+            raise
+        
+        self.logger.info("▶️ Playing %s (%s → %s)", path, source.encoding, codec)
+        
+        ptime = config['ptime']
+        _, decode = self._payload_codec()
+        frames = source.frames(codec, ptime, self._encode_payload, decode)
+        playback = Playback(self, frames, config['payload_type'], ptime=ptime, on_finish=source.close,
+                            timestamp_increment=config['rtp_frame_size'])
+        playback.start()
+        
+        if wait:
+            playback.wait()
+        return playback
+    
+    def play_prompt(self, path, sample_rate=None, wait=False, cache=None):
+        """Play a frequently used prompt from the pre-encoded prompt cache
+        
+        The first playback encodes the file for the negotiated codec and
+        stores the packetized frames; later playbacks with the same codec only
+        build RTP headers and send the cached payloads.
+        
+        Args:
+            path: Prompt file, in any format accepted by play_file()
+            sample_rate: Sample rate of a headerless PCM file
+            wait: Block until the whole prompt has been sent
+            cache: PromptCache to use (default: the process-wide cache)
+            
+        Returns:
+            Playback handle, or None without an active call
+        """
+        if not self.remote_rtp_info or not self.running:
+            return None
+        
+        config = self.get_audio_config()
+        codec = config['codec']
+        ptime = config['ptime']
+        cache = cache or get_prompt_cache()
+        
+        def encode():
+            # Cached frames are replayed on other calls, so they get a fresh encoder
+            with AudioFile(path, sample_rate=sample_rate or config['sample_rate']) as source:
+                source.check_codec(codec, config['sample_rate'])
+                return list(source.frames(codec, ptime, *self._payload_codec()))
+        
+        frames = cache.get_or_encode(PromptCache.file_key(path, codec, ptime), encode)
+        
+        playback = Playback(self, frames, config['payload_type'], ptime=ptime,
+                            timestamp_increment=config['rtp_frame_size'])
+        playback.start()
+        
+        if wait:
+            playback.wait()
+        return playback
+    
+    def start_recording(self, path, mode='separate', file_format='wav', max_pending_frames=500):
+        """Record both directions of the current call to disk
+        
+        Payloads are handed to a shared background writer thread, so the RTP
+        threads never touch the filesystem. If the writer falls behind by more
+        than max_pending_frames per direction, new frames are dropped and
+        counted in the recorder's overruns.
+        
+        Args:
+            path: Output file. 'separate' mode writes <name>-rx/<name>-tx files,
+                  'stereo' mode one file with received audio on the left and
+                  sent audio on the right channel
+            mode: 'separate' or 'stereo'
+            file_format: 'wav' or 'raw' (headerless 16-bit PCM)
+            max_pending_frames: Per-direction queue bound
+            
+        Returns:
+            CallRecorder with stats() and stop()
+        """
+        self.stop_recording()
+        
+        _, rx_decode = self._payload_codec()
+        _, tx_decode = self._payload_codec()
+        self.recorder = CallRecorder(path, rx_decode, tx_decode=tx_decode,
+                                     sample_rate=self.get_audio_config()['sample_rate'],
+                                     mode=mode, file_format=file_format,
+                                     max_pending_frames=max_pending_frames)
+        self.logger.info("⏺️ Recording call to %s (%s, %s)", path, mode, file_format)
+        return self.recorder
+    
+    def stop_recording(self, wait=True):
+        """Stop the active recording, if any, and close its files"""
+        recorder = self.recorder
+        if recorder is None:
+            return None
+        
+        self.recorder = None
+        recorder.stop(wait=wait)
+        self.logger.info("⏹️ Recording stopped (%s overruns)", recorder.overruns)
+        return recorder
+    
+    def _sendto_rtp(self, packet):
+        """Send an RTP packet to the remote endpoint, encrypted if SRTP is on"""
+        session = self._srtp
+        if session is not None:
+            packet = session.protect(bytes(packet))
+        self.rtp_sock.sendto(packet, self.remote_rtp_info)
+    
+    def _send_rtp_payload(self, payload, payload_type, timestamp_increment):
+        """Send one RTP packet and advance the sequence number and timestamp"""
+        with self._rtp_send_lock:
+            if not self._tx_active:
+                return  # Held: nothing is sent and the sequence does not advance
+            packet_payload, packet_type = payload, payload_type
+            encoder = self._red_encoder
+            if encoder is not None and payload_type == (self.negotiated_payload_type or 0):
+                packet_payload = encoder.pack(payload_type, payload, self.rtp_timestamp)
+                packet_type = self.negotiated_red_payload_type
+            header = struct.pack('!BBHII', 
+                                0x80,  # Version=2, P=0, X=0, CC=0
+                                packet_type,
+                                self.rtp_seq,
+                                self.rtp_timestamp,
+                                self.rtp_ssrc)
+            
+            self._sendto_rtp(header + packet_payload)
+            
+            sent_timestamp = self.rtp_timestamp
+            self.rtp_seq = (self.rtp_seq + 1) % 65536
+            self.rtp_timestamp = (self.rtp_timestamp + timestamp_increment) % 4294967296
+        
+        metrics.RTP_PACKETS_SENT.inc()
+        metrics.RTP_BYTES_SENT.inc(12 + len(packet_payload))
+        
+        recorder = self.recorder
+        if recorder is not None and payload_type == (self.negotiated_payload_type or 0):
+            recorder.push_tx(payload, self.negotiated_codec or 'PCMU', sent_timestamp)
+    
+    def _send_rtp_event(self, payload, payload_type, timestamp, marker=False):
+        """Send one RTP packet with an explicit timestamp (telephone events)"""
+        with self._rtp_send_lock:
+            if not self._tx_active:
+                return
+            header = struct.pack('!BBHII', 
+                                0x80,
+                                (0x80 if marker else 0) | payload_type,
+                                self.rtp_seq,
+                                timestamp,
+                                self.rtp_ssrc)
+            
+            self._sendto_rtp(header + payload)
+            
+            self.rtp_seq = (self.rtp_seq + 1) % 65536
+        
+        metrics.RTP_PACKETS_SENT.inc()
+        metrics.RTP_BYTES_SENT.inc(12 + len(payload))
+    
+    def _advance_rtp_timestamp(self, start, increment):
+        """Move the RTP timestamp to at least start + increment"""
+        with self._rtp_send_lock:
+            if (self.rtp_timestamp - start) % 4294967296 < increment:
+                self.rtp_timestamp = (start + increment) % 4294967296
+    
+    def _encode_payload(self, pcm_data, codec, g722=None):
+        """Encode 16-bit PCM for the given codec name
+        
+        G.722 uses the call's encoder unless another ``g722`` state is given.
+        """
+        if codec == 'G722':
+            return (g722 or self._g722_codec()).encode(pcm_data)
+        elif codec.startswith('L16'):
+            return self._pcm_to_l16(pcm_data)
+        elif codec == 'PCMA':
+            return self._pcm_to_alaw(pcm_data)
+        else:  # PCMU or fallback
+            return self._pcm_to_ulaw(pcm_data)
+    
+    def _decode_payload(self, payload, codec, g722=None):
+        """Decode an RTP payload of the given codec name to 16-bit PCM
+        
+        G.722 uses the call's decoder unless another ``g722`` state is given.
+        """
+        if codec == 'G722':
+            return (g722 or self._g722_codec()).decode(payload)
+        elif codec.startswith('L16'):
+            return self._l16_to_pcm(payload)
+        elif codec == 'PCMA':
+            return self._alaw_to_pcm(payload)
+        else:  # PCMU or fallback
+            return self._ulaw_to_pcm(payload)
+    
+    def _dispatch_payload(self, payload_type, payload, timestamp):
+        """Hand a received payload to the handler for its payload type"""
+        if payload_type == 0:  # PCMU
+            self._handle_pcmu_payload(payload, timestamp)
+        elif payload_type == 8:  # PCMA
+            self._handle_pcma_payload(payload, timestamp)
+        elif payload_type == 9:  # G.722
+            self._handle_g722_payload(payload, timestamp)
+        elif payload_type == self.dtmf_payload_type:  # DTMF
+            self._handle_dtmf_payload(payload, timestamp)
+        elif payload_type == self.negotiated_payload_type and self.negotiated_codec.startswith('L16'):
+            self._handle_l16_payload(payload, timestamp)
     
     def _handle_pcmu_payload(self, payload, timestamp):
         """Process PCMU (G.711 μ-law) audio with jitter buffer"""
         if not payload:
             return
+        
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.push_rx(payload, 'PCMU', timestamp)
             
+        tracer = self.tracer
+        span = tracer.start(tracing.RTP_DECODE, self.call_id) if tracer is not None else None
+        start = time.perf_counter()
         pcm_data = self._ulaw_to_pcm(payload)
+        _DECODE_SECONDS['PCMU'].observe(time.perf_counter() - start)
+        if span is not None:
+            tracer.end(span)
         
         self._add_to_jitter_buffer(pcm_data, timestamp)
     
@@ -397,8 +966,18 @@ class SimpleSIPClient:
         """Process PCMA (G.711 A-law) audio with jitter buffer"""
         if not payload:
             return
+        
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.push_rx(payload, 'PCMA', timestamp)
             
+        tracer = self.tracer
+        span = tracer.start(tracing.RTP_DECODE, self.call_id) if tracer is not None else None
+        start = time.perf_counter()
         pcm_data = self._alaw_to_pcm(payload)
+        _DECODE_SECONDS['PCMA'].observe(time.perf_counter() - start)
+        if span is not None:
+            tracer.end(span)
         
         self._add_to_jitter_buffer(pcm_data, timestamp)
     
@@ -406,40 +985,107 @@ class SimpleSIPClient:
         """Process G.722 audio with jitter buffer"""
         if not payload:
             return
+        
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.push_rx(payload, 'G722', timestamp)
             
+        tracer = self.tracer
+        span = tracer.start(tracing.RTP_DECODE, self.call_id) if tracer is not None else None
+        start = time.perf_counter()
         pcm_data = self._g722_decode(payload)
+        _DECODE_SECONDS['G722'].observe(time.perf_counter() - start)
+        if span is not None:
+            tracer.end(span)
         
         self._add_to_jitter_buffer(pcm_data, timestamp)
     
-    def _handle_dtmf_payload(self, payload):
-        """Process DTMF payload (RFC2833)"""
-        if not payload or len(payload) < 4:
+    def _handle_l16_payload(self, payload, timestamp):
+        """Process L16 (linear PCM) audio: only a byte swap, no codec work"""
+        if not payload:
             return
-            
-        # Parse DTMF event
-        event, flags, duration = struct.unpack('!BBH', payload[:4])
-        volume = flags & 0x3F
-        end_flag = (flags & 0x80) != 0
-        
-        if not end_flag:  # Start of DTMF
-            dtmf_chars = '0123456789*#ABCD'
-            if event < len(dtmf_chars):
-                char = dtmf_chars[event]
-                self.logger.info(f"🔢 DTMF: {char} (volume: {volume})")
-        
-    def _add_to_jitter_buffer(self, pcm_data, timestamp):
+        
+        codec = self.negotiated_codec
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.push_rx(payload, codec, timestamp)
+        
+        tracer = self.tracer
+        span = tracer.start(tracing.RTP_DECODE, self.call_id) if tracer is not None else None
+        start = time.perf_counter()
+        pcm_data = self._l16_to_pcm(payload)
+        _DECODE_SECONDS[codec].observe(time.perf_counter() - start)
+        if span is not None:
+            tracer.end(span)
+        
+        self._add_to_jitter_buffer(pcm_data, timestamp)
+    
+    def _handle_dtmf_payload(self, payload, timestamp):
+        """Process DTMF payload (RFC 4733), reporting each keypress once"""
+        self._dtmf_receiver.handle_packet(payload, timestamp)
+    
+    def _dispatch_dtmf(self, digit, duration_ms):
+        """Deliver a completed DTMF digit to the application"""
+        self.logger.info("🔢 DTMF: %s (%sms)", digit, duration_ms)
+        
+        if self.dtmf_callback:
+            try:
+                self.dtmf_callback(digit, duration_ms)
+            except Exception as e:
+                self.logger.error("DTMF callback error: %s", e)
+        
+    def _conceal_loss(self, lost, previous_timestamp, timestamp):
+        """Deliver concealment audio in place of ``lost`` packets"""
+        codec = self.negotiated_codec or 'PCMU'
+        rate = CODEC_SAMPLE_RATES.get(codec, 8000)
+        clock = CODEC_CLOCK_RATES.get(codec, 8000)
+        ticks = ((timestamp - previous_timestamp) % 4294967296) // (lost + 1)
+        if not 0 < ticks <= clock * 120 // 1000:  # Timestamp jump: assume the negotiated ptime
+            ticks = clock * (self.negotiated_ptime or self.ptime) // 1000
+        if lost * ticks > clock // 5:
+            return  # Over 200ms is an outage, not loss; leave the gap
+        
+        for k in range(1, lost + 1):
+            pcm_data = self._concealer.conceal(ticks * rate // clock)
+            self._add_to_jitter_buffer(pcm_data, (previous_timestamp + k * ticks) % 4294967296,
+                                       concealed=True)
+        self.rtp_stats['packets_concealed'] += lost
+        metrics.RTP_PACKETS_CONCEALED.inc(lost)
+    
+    def _add_to_jitter_buffer(self, pcm_data, timestamp, concealed=False):
         """Manage jitter buffer for smooth playback"""
+        tracer = self.tracer
+        span = tracer.start(tracing.JITTER_BUFFER, self.call_id) if tracer is not None else None
+        
+        codec = self.negotiated_codec or 'PCMU'
+        rate = CODEC_SAMPLE_RATES.get(codec, 8000)
+        if not concealed and self.packet_loss_concealment:
+            pcm_data = self._concealer.receive(pcm_data, rate)
+        
+        inband_dtmf = self._inband_dtmf
+        if inband_dtmf is not None and not concealed:
+            batch = self._inband_batch
+            try:
+                if batch is not None:
+                    batch.submit(inband_dtmf, pcm_data, rate)
+                else:
+                    inband_dtmf.process(pcm_data, rate)
+            except Exception as e:
+                self.logger.error("In-band DTMF detection error: %s", e)
+        
         now = time.time() * 1000  # Current time in ms
         
         if not hasattr(self, '_first_rtp_timestamp'):
             self._first_rtp_timestamp = timestamp
             self._first_rtp_time = now
             
-        time_offset = (timestamp - self._first_rtp_timestamp) / 8  # 8kHz = 8000 samples/sec
+        time_offset = (timestamp - self._first_rtp_timestamp) * 1000 / CODEC_CLOCK_RATES.get(codec, 8000)
         play_time = self._first_rtp_time + time_offset
         
         current_delay = max(0, play_time - now)
-        target_delay = 50  # ms - adjust based on network conditions
+        # ms - at least two packets, so 40/60ms ptime still has headroom
+        frame_ms = len(pcm_data) * 1000 // (2 * rate)
+        target_delay = max(self.jitter_target_ms, 2 * frame_ms)
         
         if current_delay < target_delay:
             play_time = now
@@ -448,10 +1094,18 @@ class SimpleSIPClient:
             play_time = self._first_rtp_time + time_offset
         
         if self.audio_received_callback:
+            callback_span = tracer.start(tracing.AUDIO_CALLBACK, self.call_id) if tracer is not None else None
+            start = time.perf_counter()
             try:
                 self.audio_received_callback(pcm_data, 'pcm', play_time)
             except Exception as e:
-                self.logger.error(f"Audio callback error: {str(e)}")
+                self.logger.error("Audio callback error: %s", e)
+            metrics.AUDIO_CALLBACK_SECONDS.observe(time.perf_counter() - start)
+            if callback_span is not None:
+                tracer.end(callback_span)
+        
+        if span is not None:
+            tracer.end(span)
     
     def _rtp_receive_thread(self):
             """Improved RTP receive thread with jitter buffer"""
@@ -460,12 +1114,32 @@ class SimpleSIPClient:
             jitter_buffer_size = 50  # ms
             last_seq = None
             last_timestamp = None
+            last_transit = None
+            call_stats = None
             
             while self.running:
                 try:
                     data, addr = self.rtp_sock.recvfrom(2048)
                     if len(data) < 12:  # Minimum RTP header size
                         continue
+                    if not self._rx_active:
+                        # Held: drain without decoding; restart loss and
+                        # jitter tracking when media resumes
+                        last_seq = None
+                        last_transit = None
+                        continue
+                    session = self._srtp
+                    if session is not None:
+                        try:
+                            data = session.unprotect(data)
+                        except ValueError as e:
+                            metrics.SRTP_PACKETS_REJECTED.inc()
+                            self.logger.debug("Dropping SRTP packet: %s", e, extra={'call_id': self.call_id})
+                            continue
+                    tracer = self.tracer
+                    span = tracer.start(tracing.RTP_RECEIVE, self.call_id) if tracer is not None else None
+                    metrics.RTP_PACKETS_RECEIVED.inc()
+                    metrics.RTP_BYTES_RECEIVED.inc(len(data))
                         
                     header = struct.unpack('!BBHII', data[:12])
                     version = (header[0] >> 6) & 0x03
@@ -478,33 +1152,94 @@ class SimpleSIPClient:
                     timestamp = header[3]
                     ssrc = header[4]
                     
+                    stats = self.rtp_stats
+                    if stats is not call_stats:  # New call: restart sequence tracking
+                        call_stats = stats
+                        last_seq = None
+                        last_transit = None
+                        self._concealer.reset()
+                    stats['packets_received'] += 1
+                    
+                    lost = 0
                     if last_seq is not None:
                         diff = (sequence - last_seq) % 65536
+                        if (diff == 0 or diff >= 32768) and self.packet_loss_concealment:
+                            # Duplicate, or too late: its gap was already filled
+                            if span is not None:
+                                tracer.end(span)
+                            continue
                         if diff > 1:
-                            self.logger.debug(f"Packet loss detected: {diff-1} packets")
+                            self.logger.debug("Packet loss detected: %d packets", diff - 1,
+                                              extra={'call_id': self.call_id, 'category': log.RTP_LOSS})
+                            if diff < 32768:  # Ignore late, reordered packets
+                                metrics.RTP_PACKETS_LOST.inc(diff - 1)
+                                stats['packets_lost'] += diff - 1
+                                lost = diff - 1
+                    
+                    # RFC 3550 interarrival jitter, in 8kHz timestamp units.
+                    # Telephone events repeat their timestamp, so skip them.
+                    if payload_type != self.dtmf_payload_type:
+                        clock = CODEC_CLOCK_RATES.get(self.negotiated_codec, 8000)
+                        transit = (time.perf_counter() * clock - timestamp) * 8000 / clock
+                        if last_transit is not None:
+                            d = abs(transit - last_transit)
+                            if d < 80000:  # Ignore timestamp jumps and wraps
+                                stats['jitter'] += (d - stats['jitter']) / 16
+                        last_transit = transit
                             
+                    previous_timestamp = last_timestamp
                     last_seq = sequence
                     last_timestamp = timestamp
                     
+                    relay = self._bridge
+                    if relay is not None:
+                        relay.forward(data, payload_type, sequence, timestamp, ssrc, 12 + csrc_count * 4)
+                        if span is not None:
+                            tracer.end(span)
+                        continue
+                    
                     payload = data[12+csrc_count*4:]  # Skip CSRC if present
                     
-                    if payload_type == 0:  # PCMU
-                        self._handle_pcmu_payload(payload, timestamp)
-                    elif payload_type == 8:  # PCMA
-                        self._handle_pcma_payload(payload, timestamp)
-                    elif payload_type == 9:  # G.722
-                        self._handle_g722_payload(payload, timestamp)
-                    elif payload_type == 101:  # DTMF
-                        self._handle_dtmf_payload(payload)
+                    recovered = []
+                    if payload_type == self.negotiated_red_payload_type:
+                        try:
+                            blocks = red.unpack(payload, timestamp)
+                        except ValueError as e:
+                            self.logger.debug("Dropping RED packet: %s", e, extra={'call_id': self.call_id})
+                            if span is not None:
+                                tracer.end(span)
+                            continue
+                        payload_type, timestamp, payload = blocks[-1]
+                        if lost:
+                            # Redundant copies of frames that fall in the gap
+                            gap = (timestamp - previous_timestamp) % 4294967296
+                            recovered = [block for block in blocks[:-1]
+                                         if 0 < (block[1] - previous_timestamp) % 4294967296 < gap][-lost:]
+                            lost -= len(recovered)
+                            stats['packets_recovered'] += len(recovered)
+                            metrics.RTP_PACKETS_RECOVERED.inc(len(recovered))
+                    
+                    if lost and self.packet_loss_concealment and payload_type != self.dtmf_payload_type:
+                        self._conceal_loss(lost, previous_timestamp, recovered[0][1] if recovered else timestamp)
+                    for block_type, block_timestamp, block in recovered:
+                        self._dispatch_payload(block_type, block, block_timestamp)
+                    self._dispatch_payload(payload_type, payload, timestamp)
+                    self._dtmf_receiver.expire()
                         
                     # Update call state
-                    if self.call_state == CallState.CONNECTED:
-                        self.call_state = CallState.STREAMING
+                    if self._call_state is CallState.CONNECTED:
+                        self._transition_call_state(CallState.STREAMING, CallState.CONNECTED)
+                    
+                    if span is not None:
+                        tracer.end(span)
                         
                 except socket.timeout:
+                    self._dtmf_receiver.expire()  # Report a held digit whose end packets were lost
                     continue
                 except Exception as e:
-                    self.logger.error(f"RTP receive error: {str(e)}")
+                    if not self.running:
+                        break  # Socket closed by disconnect()
+                    self.logger.error("RTP receive error: %s", e)
                     time.sleep(0.01)
                 
     def _audio_processing_thread(self):
@@ -524,21 +1259,25 @@ class SimpleSIPClient:
                         elif self.get_audio_config()['codec'] == 'pcmu':
                             self.audio_received_callback(pcmu_data, 'pcmu')
                     except Exception as e:
-                        self.logger.error(f"Error in audio callback: {str(e)}")
+                        self.logger.error("Error in audio callback: %s", e)
                         
             time.sleep(0.02)
     
-    def set_audio_callback(self, callback_func, format='pcmu'):
+    def set_audio_callback(self, callback_func, format='pcmu', sample_rate=None):
         """Set callback function for received audio data
         
         Args:
             callback_func: Function to call when audio is received
                           Function signature: callback_func(audio_data, format)
             format: 'pcmu' for raw μ-law data, 'pcm' for 16-bit linear PCM
+            sample_rate: PCM rate the callback works at; codecs that decode
+                         to it are preferred in offers and answers
         """
         self.audio_received_callback = callback_func
         self.audio_callback_format = format
-        self.logger.info(f"📻 Audio callback registered (format: {format})")
+        if sample_rate is not None:
+            self.native_sample_rate = sample_rate
+        self.logger.info("📻 Audio callback registered (format: %s)", format)
     
     def remove_audio_callback(self):
         """Remove audio callback"""
@@ -547,219 +1286,110 @@ class SimpleSIPClient:
     
     def _ulaw_to_pcm(self, ulaw_data):
         """Convert μ-law (PCMU) to 16-bit linear PCM"""
-        try:
-            import audioop
-            return audioop.ulaw2lin(ulaw_data, 2)  # 2 = 16-bit output
-            
-        except ImportError:
-            import numpy as np
-            
-            ulaw_samples = np.frombuffer(ulaw_data, dtype=np.uint8)
-            pcm_samples = []
-            
-            for ulaw_byte in ulaw_samples:
-                ulaw_byte = int(ulaw_byte) ^ 0xFF
-                
-                sign = ulaw_byte & 0x80
-                exp = (ulaw_byte & 0x70) >> 4
-                mantissa = ulaw_byte & 0x0F
-                
-                if exp == 0:
-                    linear = int((mantissa << 4) + 0x84)
-                else:
-                    linear = int(((mantissa << 4) + 0x84) << (exp - 1))
-                
-                linear = int(linear - 0x84)
-                
-                if sign:
-                    linear = -linear
-                    
-                linear = max(-32768, min(32767, linear))
-                pcm_samples.append(linear)
-            
-            return np.array(pcm_samples, dtype=np.int16).tobytes()
+        return codecs.ulaw_decode(ulaw_data)
     
-    def _g722_encode(self, pcm_data):
-        """Encode 16-bit PCM to G.722 format"""
-        import numpy as np
+    def _g722_codec(self):
+        """G.722 state of the current call, created on first use"""
+        if self._g722 is None:
+            self._g722 = codecs.g722_codec()
+        return self._g722
     
-        samples = np.frombuffer(pcm_data, dtype=np.int16)
+    def _payload_codec(self):
+        """encode(pcm, codec) and decode(payload, codec) with G.722 state of their own
         
-        downsampled = samples[::2]
-        
-        quantized = np.clip(downsampled >> 8, -128, 127).astype(np.int8)
-        
-        return quantized.tobytes()
+        For audio that is not the call's own RTP stream, such as files,
+        cached prompts and recordings, so it does not disturb the call's state.
+        """
+        g722 = []  # Created on first G.722 use, so other codecs work without the package
+
+        def state(codec):
+            if codec != 'G722':
+                return None
+            if not g722:
+                g722.append(codecs.g722_codec())
+            return g722[0]
+
+        return (lambda pcm_data, codec: self._encode_payload(pcm_data, codec, state(codec)),
+                lambda payload, codec: self._decode_payload(payload, codec, state(codec)))
+    
+    def _g722_encode(self, pcm_data):
+        """Encode 16-bit PCM to G.722 format"""
+        return self._g722_codec().encode(pcm_data)
     
     def _g722_decode(self, g722_data):
         """Decode G.722 format to 16-bit PCM"""
-        import numpy as np
+        return self._g722_codec().decode(g722_data)
     
-        quantized = np.frombuffer(g722_data, dtype=np.int8)
-        
-        # Expand and upsample
-        expanded = quantized.astype(np.int16) << 8
-        upsampled = np.repeat(expanded, 2)  # 8kHz → 16kHz
-        
-        return upsampled.tobytes()
+    def _l16_to_pcm(self, l16_data):
+        """Convert network byte order L16 to 16-bit PCM"""
+        return codecs.l16_decode(l16_data)
+    
+    def _pcm_to_l16(self, pcm_data):
+        """Convert 16-bit PCM to network byte order L16"""
+        return codecs.l16_encode(pcm_data)
     
     def _pcm_to_ulaw(self, pcm_data):
-        """Convert 16-bit PCM to μ-law format using standard algorithm"""
-        import numpy as np
-        
-        try:
-            import audioop
-            return audioop.lin2ulaw(pcm_data, 2)  # 2 = 16-bit samples
-            
-        except ImportError:
-            pcm_samples = np.frombuffer(pcm_data, dtype=np.int16)
-            
-            ulaw_table = [
-                0, 0, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 3, 3,
-                4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4,
-                5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5,
-                5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5,
-                6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6,
-                6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6,
-                6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6,
-                6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6, 6,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7,
-                7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7
-            ]
-            
-            ulaw_samples = []
-            BIAS = 0x84
-            
-            for sample in pcm_samples:
-                sample = int(sample)
-                
-                sign = 0x80 if sample < 0 else 0x00
-                if sample < 0:
-                    sample = -sample
-                
-                sample = min(sample + BIAS, 0x7FFF)
-                
-                if sample < 0x100:
-                    segment = ulaw_table[sample >> 2]
-                    mantissa = (sample >> 1) & 0x0F
-                else:
-                    segment = ulaw_table[(sample >> 6) & 0xFF] + 1
-                    if segment >= 8:
-                        segment = 7
-                    mantissa = (sample >> (segment + 2)) & 0x0F
-                
-                ulaw_byte = (sign | (segment << 4) | mantissa) ^ 0xFF
-                ulaw_samples.append(ulaw_byte)
-            
-            return bytes(ulaw_samples)
+        """Convert 16-bit PCM to μ-law format"""
+        return codecs.ulaw_encode(pcm_data)
     
     def _pcm_to_alaw(self, pcm_data):
         """Convert 16-bit PCM to A-law format"""
-        import numpy as np
-        
-        pcm_samples = np.frombuffer(pcm_data, dtype=np.int16)
-        alaw_samples = []
-        
-        for sample in pcm_samples:
-            sign = 0x80 if sample < 0 else 0x00
-            if sample < 0:
-                sample = -sample
-            sample = min(sample, 32635)  # Clip
-            
-            if sample < 256:
-                alaw_byte = sample >> 4
-            else:
-                exp = 7
-                while exp > 0 and sample < (0x1 << (exp + 7)):
-                    exp -= 1
-                
-                mantissa = (sample >> (exp + 3)) & 0x0F
-                alaw_byte = (exp << 4) | mantissa
-            
-            alaw_byte = (alaw_byte | sign) ^ 0x55
-            alaw_samples.append(alaw_byte)
-        
-        return bytes(alaw_samples)
+        return codecs.alaw_encode(pcm_data)
     
     def _alaw_to_pcm(self, alaw_data):
         """Convert A-law to 16-bit linear PCM"""
-        import numpy as np
-        
-        alaw_samples = np.frombuffer(alaw_data, dtype=np.uint8)
-        pcm_samples = []
-        
-        for alaw_byte in alaw_samples:
-            alaw_byte = int(alaw_byte) ^ 0x55
-            
-            sign = alaw_byte & 0x80
-            exp = (alaw_byte & 0x70) >> 4
-            mantissa = alaw_byte & 0x0F
-            
-            if exp == 0:
-                linear = int((mantissa << 4) + 8)
-            else:
-                linear = int(((mantissa << 4) + 0x108) << (exp - 1))
-            
-            if sign:
-                linear = -linear
-                
-            linear = max(-32768, min(32767, linear))
-            pcm_samples.append(linear)
-        
-        return np.array(pcm_samples, dtype=np.int16).tobytes()
+        return codecs.alaw_decode(alaw_data)
 
     def get_audio_config(self):
-        """Get audio configuration based on negotiated codec"""
+        """Get audio configuration based on negotiated codec and ptime"""
         codec = self.negotiated_codec or 'PCMU'
         payload_type = self.negotiated_payload_type or 0
+        ptime = self.negotiated_ptime or self.ptime
         
-        if codec == 'G722':
+        if codec.startswith('L16'):
+            samples = CODEC_SAMPLE_RATES[codec] * ptime // 1000
             return {
                 'codec': codec,
                 'payload_type': payload_type,
+                'ptime': ptime,
+                'sample_rate': CODEC_SAMPLE_RATES[codec],
+                'rtp_clock_rate': CODEC_CLOCK_RATES[codec],
+                'frame_size': samples,
+                'rtp_frame_size': samples,
+                'payload_size': 2 * samples,  # Big-endian 16-bit samples
+                'encoding': 'l16',
+                'chunk_size': samples
+            }
+        elif codec == 'G722':
+            return {
+                'codec': codec,
+                'payload_type': payload_type,
+                'ptime': ptime,
                 'sample_rate': 16000,  # G.722 internal sampling rate
                 'rtp_clock_rate': 8000,  # G.722 RTP clock rate
-                'frame_size': 320,  # 20ms at 16kHz
-                'rtp_frame_size': 160,  # RTP timestamp increment
+                'frame_size': 16 * ptime,  # Samples per packet at 16kHz
+                'rtp_frame_size': 8 * ptime,  # RTP timestamp increment
+                'payload_size': 8 * ptime,  # Encoded bytes per packet
                 'encoding': 'g722',
-                'chunk_size': 320  # PCM samples per 20ms frame
+                'chunk_size': 16 * ptime  # PCM samples per packet
             }
         else:  # PCMU, PCMA
             return {
                 'codec': codec,
                 'payload_type': payload_type,
+                'ptime': ptime,
                 'sample_rate': 8000,
                 'rtp_clock_rate': 8000,
-                'frame_size': 160,  # 20ms at 8kHz
-                'rtp_frame_size': 160,
+                'frame_size': 8 * ptime,  # Samples per packet at 8kHz
+                'rtp_frame_size': 8 * ptime,
+                'payload_size': 8 * ptime,
                 'encoding': 'pcmu' if codec == 'PCMU' else 'pcma',
-                'chunk_size': 160  # PCM samples per 20ms frame
+                'chunk_size': 8 * ptime  # PCM samples per packet
             }
 
     def _parse_sip_message(self, message):
         """Parse SIP message headers into a dictionary"""
-        lines = message.split('\r\n')
-        headers = {}
-        
-        if lines:
-            headers['start_line'] = lines[0]
-        
-        for line in lines[1:]:
-            if ':' in line:
-                key, value = line.split(':', 1)
-                headers[key.strip().lower()] = value.strip()
-        
-        parts = message.split('\r\n\r\n', 1)
-        if len(parts) > 1:
-            headers['body'] = parts[1]
-        
-        return headers
+        return parse_sip_message(message)
 
     def _send_response(self, request_headers, status_code, reason_phrase, additional_headers=None, body=None):
         """Send a SIP response"""
@@ -813,7 +1443,7 @@ class SimpleSIPClient:
         branch = self._generate_branch()
         
         msg = f"ACK {request_uri} SIP/2.0\r\n" \
-              f"Via: SIP/2.0/UDP {self.local_ip}:5060;branch={branch}\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch}\r\n" \
               f"Max-Forwards: 70\r\n" \
               f"From: {from_header}\r\n" \
               f"To: {to_header}\r\n" \
@@ -824,27 +1454,28 @@ class SimpleSIPClient:
         
         self._send_message(msg)
         
-        self.dialogs[call_id] = {
-            'local_tag': self.tag,
-            'remote_tag': remote_tag,
-            'remote_uri': request_uri
-        }
+        self.dialogs.add(Dialog(call_id, self.tag, remote_tag, request_uri, from_header, to_header))
     
     def answer_call(self, request_headers):
-        """Answer an incoming call with proper SDP"""
-        sdp_body = self._generate_sdp_offer()
+        """Answer an incoming call with proper SDP
+        
+        Sends the answer negotiated from the INVITE's offer, or our own offer
+        when the INVITE carried no SDP.
+        """
+        cached = self._sdp_cache.get(request_headers.get('call-id', ''))
+        sdp_body = cached['answer'] if cached and cached['answer'] else self._generate_sdp_offer()
         
         additional_headers = {
-            'Contact': f'<sip:{self.username}@{self.local_ip}:5060>',
+            'Contact': f'<sip:{self.username}@{self.local_ip}:{self.local_port}>',
             'User-Agent': 'BetterSIPClient/1.0'
         }
         
         self._send_response(request_headers, 200, 'OK', additional_headers, sdp_body)
 
     def _handle_401_unauthorized(self, message):
-        """Handle 401 Unauthorized response with better parsing"""
+        """Handle 401 Unauthorized / 407 Proxy Authentication Required responses"""
         headers = self._parse_sip_message(message)
-        www_auth = headers.get('www-authenticate', '')
+        www_auth = headers.get('www-authenticate') or headers.get('proxy-authenticate', '')
         
         if not www_auth:
             self.logger.error("No WWW-Authenticate header in 401 response")
@@ -870,8 +1501,10 @@ class SimpleSIPClient:
         
         if call_id in self.current_transactions:
             transaction = self.current_transactions[call_id]
-            if transaction['type'] == 'REGISTER':
+            if transaction.method == 'REGISTER':
                 self._retry_register_with_auth(call_id)
+            elif transaction.method == 'INVITE':
+                self._retry_invite_with_auth(call_id, headers)
 
     def _calculate_auth_response(self, method, uri):
         """Calculate SIP Digest authentication response"""
@@ -913,26 +1546,28 @@ class SimpleSIPClient:
         
         auth_header = f'Digest username="{self.username}", realm="{self.auth_info["realm"]}", ' \
                      f'nonce="{self.auth_info["nonce"]}", uri="{uri}", ' \
-                     f'response="{response}", algorithm={self.auth_info["algorithm"]}"'
+                     f'response="{response}", algorithm={self.auth_info["algorithm"]}'
         
         if self.auth_info.get('opaque'):
             auth_header += f', opaque="{self.auth_info["opaque"]}"'
         
         msg = f"REGISTER {uri} SIP/2.0\r\n" \
-              f"Via: SIP/2.0/UDP {self.local_ip}:5060;branch={branch};rport\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch};rport\r\n" \
               f"Max-Forwards: 70\r\n" \
               f"From: <sip:{self.username}@{self.server}>;tag={self.tag}\r\n" \
               f"To: <sip:{self.username}@{self.server}>\r\n" \
               f"Call-ID: {call_id}\r\n" \
               f"CSeq: {self.cseq} REGISTER\r\n" \
-              f"Contact: <sip:{self.username}@{self.local_ip}:5060>;expires=3600\r\n" \
+              f"Contact: <sip:{self.username}@{self.local_ip}:{self.local_port}>;expires=3600\r\n" \
               f"Authorization: {auth_header}\r\n" \
               f"User-Agent: BetterSIPClient/1.0\r\n" \
               f"Expires: 3600\r\n" \
               f"Content-Length: 0\r\n\r\n"
         
-        self.current_transactions[call_id]['retries'] = 1
-        self.current_transactions[call_id]['branch'] = branch
+        transaction = self.current_transactions.get(call_id)
+        if transaction is not None:
+            transaction.retries = 1
+            transaction.branch = branch
         
         self._send_message(msg)
         self.cseq += 1
@@ -942,50 +1577,122 @@ class SimpleSIPClient:
         while self.running:
             try:
                 data, addr = self.sock.recvfrom(4096)
+                start = time.perf_counter()
+                tracer = self.tracer
+                span = tracer.start(tracing.SIP_RECEIVE, self.call_id) if tracer is not None else None
+                metrics.SIP_MESSAGE_BYTES_RECEIVED.inc(len(data))
                 message = data.decode()
-                first_line = message.split('\r\n')[0] if message else ''
-                self.logger.info(f"📥 SIP MESSAGE: {first_line}")
+                if self.logger.isEnabledFor(logging.INFO):
+                    self._log_sip_message(message)
                 self._handle_message(message)
+                metrics.SIP_DISPATCH_SECONDS.observe(time.perf_counter() - start)
+                if span is not None:
+                    tracer.end(span)
+                if time.monotonic() >= self._next_sweep:
+                    self._handle_timeouts()  # A busy socket never times out
             except socket.timeout:
                 self._handle_timeouts()
                 continue
             except Exception as e:
                 if self.running:
-                    self.logger.error(f"Error in receive thread: {str(e)}")
+                    self.logger.error("Error in receive thread: %s", e)
                 time.sleep(1)
 
+    def _log_sip_message(self, message):
+        """Log the first line of a received message with structured fields"""
+        first_line = message.partition('\r\n')[0]
+        extra = {'category': log.SIP_MESSAGE}
+        if first_line.startswith('SIP/2.0 '):
+            extra['status'] = first_line[8:11]
+        else:
+            extra['method'] = first_line.partition(' ')[0]
+        call_id_start = message.find('\r\nCall-ID:')
+        if call_id_start >= 0:
+            call_id_end = message.find('\r\n', call_id_start + 2)
+            extra['call_id'] = message[call_id_start + 10:call_id_end].strip()
+        self.logger.info("📥 SIP MESSAGE: %s", first_line, extra=extra)
+
     def _handle_message(self, message):
+        """Dispatch one SIP message, inside a trace span when tracing is on"""
+        tracer = self.tracer
+        if tracer is None:
+            return self._dispatch_message(message)
+        
+        span = tracer.start(tracing.SIP_HANDLE, self.call_id)
+        try:
+            return self._dispatch_message(message)
+        finally:
+            tracer.end(span)
+
+    def _dispatch_message(self, message):
         """*** ENHANCED: Handle 491 Request Pending responses ***"""
         if not message:
             return
             
+        tracer = self.tracer
+        span = tracer.start(tracing.SIP_PARSE, self.call_id) if tracer is not None else None
+        start = time.perf_counter()
         headers = self._parse_sip_message(message)
+        metrics.SIP_PARSE_SECONDS.observe(time.perf_counter() - start)
+        if span is not None:
+            tracer.end(span)
         first_line = headers.get('start_line', '')
         
+        if first_line.startswith('SIP/2.0 '):
+            kind = first_line[8:11]
+        else:
+            kind = first_line.split(' ', 1)[0]
+            if kind not in SIP_METHODS:
+                kind = 'other'
+        metrics.SIP_MESSAGES_RECEIVED.labels(kind).inc()
+        
+        if kind[0] == '1' and first_line.startswith('SIP/2.0 '):
+            # Provisional response: the INVITE may now ring until Timer C
+            transaction = self.current_transactions.touch(headers.get('call-id', ''))
+            if transaction is not None and transaction.method == 'INVITE':
+                transaction.ttl = PROCEEDING_TTL
+        
         if "SIP/2.0 491 Request Pending" in first_line:
             call_id = headers.get('call-id', '')
             
             self._send_491_ack(headers)
             
+            transaction = self.current_transactions.get(call_id)
+            if transaction is not None and transaction.reinvite:
+                self._reinvite_failed(call_id, transaction)
+                # Glare: try again after a random 2.1-4s (RFC 3261 14.1)
+                self._cancel_reinvite_retry()
+                timer = threading.Timer(random.uniform(2.1, 4.0), self._retry_reinvite,
+                                        (call_id, transaction.direction))
+                timer.daemon = True
+                self._reinvite_timer = timer
+                timer.start()
+                return
+            
             if call_id in self.current_transactions:
                 transaction = self.current_transactions[call_id]
-                if 'invite_key' in transaction:
-                    self.sent_invites.discard(transaction['invite_key'])
+                self.sent_invites.discard(transaction.invite_key)
                 if self.call_state == CallState.INVITING:
                     del self.current_transactions[call_id]
                 else:
-                    transaction['retries'] = 999  # Prevent further retries
+                    transaction.retries = 999  # Prevent further retries
             
-            if self.call_state == CallState.INVITING:
+            if self.call_state == CallState.INVITING and call_id == self.call_id:
                 self.invite_in_progress = False
                 self.call_id = None
                 self.call_state = CallState.IDLE
-                self.logger.info(f"❌ CALL STATUS: IDLE - 491 Request Pending, call reset")
+                self._close_call_trace(call_id)
+                self.logger.info("❌ CALL STATUS: IDLE - 491 Request Pending, call reset",
+                                 extra={'call_id': call_id, 'status': 491})
+                on_call_failed = getattr(self.call_manager, 'on_call_failed', None)
+                if on_call_failed:
+                    on_call_failed(call_id, 491)
             else:
-                self.logger.info(f"⚠️  491 Request Pending acknowledged - maintaining call state {self.call_state.value}")
+                self.logger.info("⚠️  491 Request Pending acknowledged - maintaining call state %s",
+                                 self.call_state.value, extra={'call_id': call_id, 'status': 491})
             return
         
-        if "SIP/2.0 401 Unauthorized" in first_line:
+        if "SIP/2.0 401 Unauthorized" in first_line or "SIP/2.0 407 " in first_line:
             self._handle_401_unauthorized(message)
         elif "SIP/2.0 200 OK" in first_line:
             self._handle_200_ok(message, headers)
@@ -993,7 +1700,8 @@ class SimpleSIPClient:
             self._handle_incoming_invite(message, headers)
         elif "SIP/2.0 180 Ringing" in first_line:
             self.call_state = CallState.RINGING
-            self.logger.info(f"🔔 CALL STATUS: RINGING - Remote party is ringing")
+            self.logger.info("🔔 CALL STATUS: RINGING - Remote party is ringing",
+                             extra={'call_id': self.call_id, 'status': 180})
         elif "SIP/2.0 183 Session Progress" in first_line:
             self._handle_session_progress(message, headers)
         elif "ACK" in first_line:
@@ -1004,6 +1712,10 @@ class SimpleSIPClient:
             self._handle_options(message, headers)
         elif "CANCEL" in first_line and "SIP/2.0" in first_line:
             self._handle_cancel(message, headers)
+        elif first_line.startswith('UPDATE '):
+            self._handle_update(message, headers)
+        elif first_line.startswith('SIP/2.0 ') and kind[0] in '3456':
+            self._handle_invite_failure(headers, int(kind))
         else:
             pass
 
@@ -1024,7 +1736,7 @@ class SimpleSIPClient:
         branch = self._generate_branch()
         
         msg = f"ACK {request_uri} SIP/2.0\r\n" \
-              f"Via: SIP/2.0/UDP {self.local_ip}:5060;branch={branch}\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch}\r\n" \
               f"Max-Forwards: 70\r\n" \
               f"From: {from_header}\r\n" \
               f"To: {to_header}\r\n" \
@@ -1045,7 +1757,7 @@ class SimpleSIPClient:
     def _handle_options(self, message, headers):
         """Handle OPTIONS request (keepalive)"""
         additional_headers = {
-            'Allow': 'INVITE, ACK, CANCEL, OPTIONS, BYE, REFER, NOTIFY, MESSAGE, SUBSCRIBE, INFO',
+            'Allow': 'INVITE, ACK, CANCEL, OPTIONS, BYE, REFER, NOTIFY, MESSAGE, SUBSCRIBE, INFO, UPDATE',
             'Accept': 'application/sdp',
             'User-Agent': 'BetterSIPClient/1.0'
         }
@@ -1060,7 +1772,8 @@ class SimpleSIPClient:
         """*** ENHANCED: 200 OK handling with invite state management ***"""
         call_id = headers.get('call-id', '')
         cseq_header = headers.get('cseq', '')
-        self.logger.info(f"✅ 200 OK received - Call-ID: {call_id}, CSeq: {cseq_header}")
+        self.logger.info("✅ 200 OK received - Call-ID: %s, CSeq: %s", call_id, cseq_header,
+                         extra={'call_id': call_id, 'status': 200})
         
         if not call_id or not cseq_header:
             return
@@ -1070,52 +1783,169 @@ class SimpleSIPClient:
         if call_id in self.current_transactions:
             transaction = self.current_transactions[call_id]
             
-            if transaction['type'] == 'INVITE' and cseq_method == 'INVITE':
-                if 'body' in headers:
-                    self._parse_sdp_answer(headers['body'])
+            if transaction.method != cseq_method:
+                return  # e.g. 200 OK to a CANCEL; the INVITE transaction stays open
+            
+            # Closed before the outcome is applied, so a caller woken by the
+            # state change can start the next transaction (e.g. hold())
+            self.sent_invites.discard(transaction.invite_key)
+            del self.current_transactions[call_id]
+            
+            if transaction.method == 'INVITE' and transaction.cancelled:
+                # Answered before our CANCEL arrived: confirm, then hang up
+                self.send_ack(headers)
+                self._send_bye(call_id)
+                self.dialogs.pop(call_id, None)
+                self._close_call_trace(call_id)
+                
+            elif transaction.method == 'INVITE' and transaction.reinvite:
+                if 'body' in headers and not self._parse_sdp_answer(headers['body']):
+                    self._reject_answer(call_id, headers)
+                else:
+                    self.send_ack(headers)
+                
+            elif transaction.method == 'INVITE':
+                if 'body' in headers and not self._parse_sdp_answer(headers['body']):
+                    self._reject_answer(call_id, headers)
+                    return
                 
                 self.send_ack(headers)
                 
                 self.invite_in_progress = False
                 self.call_state = CallState.CONNECTED
-                self.logger.info(f"✅ CALL STATUS: CONNECTED - Call established successfully")
+                self.logger.info("✅ CALL STATUS: CONNECTED - Call established successfully")
                 
-                self._send_test_rtp_packet()
+                if self.rtp_probes:
+                    self._send_test_rtp_packet()
                 
-            elif transaction['type'] == 'REGISTER':
-                pass
+                on_call_answered = getattr(self.call_manager, 'on_call_answered', None)
+                if on_call_answered:
+                    on_call_answered(call_id)
                 
-            del self.current_transactions[call_id]
+        elif cseq_method != 'INVITE':
+            pass  # 200 OK to BYE and other requests sent outside a transaction
         else:
-            self.logger.error(f"❌ No matching transaction found for Call-ID: {call_id}")
+            self.logger.error("❌ No matching transaction found for Call-ID: %s", call_id)
             if call_id == self.call_id and cseq_method == 'INVITE':
-                self.logger.info(f"🔧 Handling 200 OK without transaction for current call")
-                if 'body' in headers:
-                    self._parse_sdp_answer(headers['body'])
+                self.logger.info("🔧 Handling 200 OK without transaction for current call")
+                if 'body' in headers and not self._parse_sdp_answer(headers['body']):
+                    self._reject_answer(call_id, headers)
+                    return
                 
                 self.send_ack(headers)
                 
                 self.invite_in_progress = False
                 self.call_state = CallState.CONNECTED
-                self.logger.info(f"✅ CALL STATUS: CONNECTED - Call established successfully")
+                self.logger.info("✅ CALL STATUS: CONNECTED - Call established successfully")
                 
-                self._send_test_rtp_packet()
+                if self.rtp_probes:
+                    self._send_test_rtp_packet()
+
+    def _reject_answer(self, call_id, headers):
+        """End a call whose 200 OK carries an SDP answer we cannot use
+        
+        The 200 OK is still ACKed, which completes the INVITE, and the
+        dialog is then ended with a BYE (RFC 3261 13.2.2.4). The call is
+        reported as failed with 488.
+        """
+        self.send_ack(headers)
+        self._send_bye(call_id)
+        self.dialogs.pop(call_id, None)
+        if call_id == self.call_id:
+            self._cleanup_call_state()
+        self._close_call_trace(call_id)
+        self.logger.info("❌ CALL STATUS: IDLE - SDP answer not acceptable",
+                         extra={'call_id': call_id, 'status': 488})
+        on_call_failed = getattr(self.call_manager, 'on_call_failed', None)
+        if on_call_failed:
+            on_call_failed(call_id, 488)
 
     def _handle_incoming_invite(self, message, headers):
         """Enhanced incoming INVITE handling"""
         
         call_id = headers.get('call-id', '')
         from_uri = headers.get('from', '')
+        if call_id and call_id == self.call_id and 'tag=' in headers.get('to', ''):
+            self._handle_reinvite(headers)
+            return
+        
         if call_id:
             self.call_id = call_id
+            self.rtp_stats = self._new_rtp_stats()
+            self._remember_incoming_dialog(call_id, headers)
         
-        if 'body' in headers:
-            self._parse_sdp_answer(headers['body'])
+        if 'body' in headers and not self._accept_offer(call_id, headers):
+            self._cleanup_call_state()
+            return
         
         self.answer_call(headers)
         if self.call_manager:
             self.call_manager.on_incoming_call(call_id, from_uri)
         
+    def _accept_offer(self, call_id, headers):
+        """Negotiate the SDP offer of an INVITE; rejects it with 488 if unusable"""
+        tracer = self.tracer
+        span = tracer.start(tracing.SDP_PARSE, call_id) if tracer is not None else None
+        try:
+            answer = self._answer_offer(call_id, headers['body'])
+        finally:
+            if span is not None:
+                tracer.end(span)
+        
+        if answer is None:
+            self._send_response(headers, 488, 'Not Acceptable Here', {'User-Agent': 'BetterSIPClient/1.0'})
+            return False
+        return True
+    
+    def _remember_incoming_dialog(self, call_id, headers):
+        """Record the dialog of an INVITE we answer, seen from our side"""
+        from_header = headers.get('from', '')
+        to_header = headers.get('to', '')
+        if 'tag=' not in to_header:
+            to_header += f';tag={self.tag}'  # The tag _send_response adds
+        
+        contact = headers.get('contact', '')
+        if '<' in contact:
+            remote_uri = contact.split('<')[1].split('>')[0]
+        else:
+            remote_uri = contact.split(';')[0].strip() or f"sip:{self.username}@{self.server}"
+        
+        remote_tag = from_header.split('tag=')[1].split(';')[0] if 'tag=' in from_header else None
+        self.dialogs.add(Dialog(call_id, self.tag, remote_tag, remote_uri, to_header, from_header))
+    
+    def _handle_reinvite(self, headers):
+        """Answer a re-INVITE in the current dialog (hold, resume, media change)
+        
+        An offer with unchanged media is answered from the dialog's SDP cache.
+        """
+        call_id = headers.get('call-id', '')
+        if call_id in self.current_transactions:
+            # Both sides re-INVITEd at once (RFC 3261 14.2)
+            self._send_response(headers, 491, 'Request Pending', {'User-Agent': 'BetterSIPClient/1.0'})
+            return
+        if 'body' in headers and not self._accept_offer(call_id, headers):
+            return
+        self.answer_call(headers)
+    
+    def _handle_update(self, message, headers):
+        """Handle UPDATE (RFC 3311): a media change without a re-INVITE"""
+        call_id = headers.get('call-id', '')
+        if not call_id or call_id != self.call_id:
+            self._send_response(headers, 481, 'Call/Transaction Does Not Exist')
+            return
+        
+        answer = None
+        if 'body' in headers:
+            if not self._accept_offer(call_id, headers):
+                return
+            answer = self._sdp_cache[call_id]['answer']
+        
+        additional_headers = {
+            'Contact': f'<sip:{self.username}@{self.local_ip}:{self.local_port}>',
+            'User-Agent': 'BetterSIPClient/1.0'
+        }
+        self._send_response(headers, 200, 'OK', additional_headers, answer)
+    
     def _handle_bye(self, message, headers):
         """Enhanced BYE handling"""
         
@@ -1129,7 +1959,7 @@ class SimpleSIPClient:
             del self.dialogs[call_id]
         
         self._cleanup_call_state()
-        self.logger.info(f"📴 CALL STATUS: IDLE - Call terminated")
+        self.logger.info("📴 CALL STATUS: IDLE - Call terminated")
         if self.call_manager:
             self.call_manager.on_call_ended(call_id)
 
@@ -1139,45 +1969,100 @@ class SimpleSIPClient:
             invite_keys_to_remove = [k for k in self.sent_invites if self.call_id in k]
             for k in invite_keys_to_remove:
                 self.sent_invites.discard(k)
+            self._sdp_cache.pop(self.call_id, None)
+            self._close_call_trace(self.call_id)
+        
+        if self.recorder is not None:
+            self.stop_recording(wait=False)
+        self._dtmf_sender.clear()
+        relay = self._bridge
+        if relay is not None:
+            relay.bridge.stop()
+        timer = self._rtp_probe_timer
+        if timer is not None:
+            timer.cancel()
+            self._rtp_probe_timer = None
+        self._cancel_reinvite_retry()
         
         self.call_id = None
         self.remote_rtp_info = None
         self.remote_tag = None
         self.invite_in_progress = False
         self.call_state = CallState.IDLE
+        self.local_direction = 'sendrecv'
+        self._set_media_direction('sendrecv')
+        self.negotiated_red_payload_type = None
+        self._red_encoder = None
+        self._g722 = None
+        self._srtp = None
+        self._srtp_key = None
+        self._srtp_remote = None
+
+    def _close_call_trace(self, call_id):
+        """Let the tracer release what it holds for a call that has ended"""
+        tracer = self.tracer
+        if tracer is not None and call_id:
+            tracer.close_call(call_id)
 
     def _handle_timeouts(self):
-        """*** ENHANCED: Timeout handling with 491 prevention ***"""
-        now = datetime.now()
-        timed_out = []
+        """Retry unanswered REGISTERs and evict records past their TTL"""
+        now = time.monotonic()
+        self._next_sweep = now + 1.0
+        retry_intervals = [1.0, 2.0, 4.0]  # Slower retries
         
-        for call_id, transaction in list(self.current_transactions.items()):
-            elapsed = (now - transaction['start_time']).total_seconds()
-            
-            retry_intervals = [1.0, 2.0, 4.0]  # Slower retries
-            
-            if elapsed > 30:  # Shorter final timeout
-                timed_out.append(call_id)
-                
-                if transaction['type'] == 'INVITE':
-                    if 'invite_key' in transaction:
-                        self.sent_invites.discard(transaction['invite_key'])
-                    self.invite_in_progress = False
-                continue
-            
+        for transaction in list(self.current_transactions.values()):
+            elapsed = now - transaction.start_time
             for i, interval in enumerate(retry_intervals):
-                if elapsed > interval and transaction['retries'] == i:
-                    transaction['retries'] = i + 1
+                if elapsed > interval and transaction.retries == i:
+                    transaction.retries = i + 1
                     
-                    if transaction['type'] == 'REGISTER':
+                    if transaction.method == 'REGISTER':
                         if self.auth_info:
-                            self._retry_register_with_auth(call_id)
+                            self._retry_register_with_auth(transaction.call_id)
                         else:
                             self.register()
                     break
         
-        for call_id in timed_out:
-            del self.current_transactions[call_id]
+        for transaction in self.current_transactions.evict(now):
+            metrics.SIP_RECORDS_EVICTED.labels('transactions').inc()
+            if transaction.method == 'INVITE':
+                self.sent_invites.discard(transaction.invite_key)
+                self.invite_in_progress = False
+                if (transaction.call_id == self.call_id and not transaction.reinvite
+                        and not transaction.cancelled
+                        and self.call_state in (CallState.INVITING, CallState.RINGING)):
+                    self._invite_timed_out(transaction)
+        
+        # The current call's dialog lives as long as the call
+        evicted = self.dialogs.evict(now, keep=self.call_id)
+        if evicted:
+            metrics.SIP_RECORDS_EVICTED.labels('dialogs').inc(len(evicted))
+        stale = [call_id for call_id in self._sdp_cache
+                 if call_id != self.call_id and call_id not in self.dialogs
+                 and call_id not in self.current_transactions]
+        for call_id in stale:
+            del self._sdp_cache[call_id]
+
+    def _invite_timed_out(self, transaction):
+        """Give up on the current call when its INVITE reaches Timer B or C"""
+        call_id = transaction.call_id
+        if transaction.ttl is not None:
+            # Timer C: it rang too long. CANCEL needs the transaction back, and
+            # the 487 that answers it reports the failure.
+            self.current_transactions.add(transaction)
+            self.cancel_call()
+            return
+        # Timer B: no response at all, so there is nothing to CANCEL
+        self._cleanup_call_state()
+        self.logger.info("❌ CALL STATUS: IDLE - INVITE timed out",
+                         extra={'call_id': call_id, 'status': 408})
+        on_call_failed = getattr(self.call_manager, 'on_call_failed', None)
+        if on_call_failed:
+            on_call_failed(call_id, 408)
+
+    def _new_call_id(self):
+        """Call-ID for a new transaction or call"""
+        return f"{self.call_id_prefix}{random.randint(100000, 999999)}{random.randint(100000, 999999)}@{self.local_ip}"
 
     def _generate_branch(self):
         """Generate RFC3261 compliant branch ID"""
@@ -1187,8 +2072,9 @@ class SimpleSIPClient:
         """Enhanced message sending with better error handling"""
         try:
             self.sock.sendto(message.encode(), (self.server, self.port))
+            metrics.SIP_MESSAGES_SENT.inc()
         except Exception as e:
-            self.logger.error(f"Failed to send SIP message: {str(e)}")
+            self.logger.error("Failed to send SIP message: %s", e, extra={'call_id': self.call_id})
             raise
 
     def get_local_ip(self):
@@ -1212,26 +2098,304 @@ class SimpleSIPClient:
             except Exception:
                 return '127.0.0.1'
 
+    def make_call(self, destination, red_depth=None):
+        """Start an outbound call
+        
+        Sends an INVITE with the SDP offer and returns immediately; the call
+        moves through INVITING and RINGING to CONNECTED as responses arrive.
+        A digest challenge (401/407) is answered once. If a call_manager is
+        set, its optional ``on_call_answered(call_id)`` and
+        ``on_call_failed(call_id, status_code)`` methods are called.
+        
+        Args:
+            destination: Extension/number, or a full ``sip:`` URI
+            red_depth: Redundant frames per packet for this call (RFC 2198);
+                       None keeps ``client.red_depth``
+            
+        Returns:
+            The Call-ID of the new call if the INVITE was sent, else False.
+            Responses may end the call before this returns, so use it
+            rather than ``client.call_id`` to identify the call.
+        """
+        if not self.running or not self.sock:
+            self.logger.error("❌ Cannot make call: not connected")
+            return False
+        if self.call_id or self.invite_in_progress:
+            self.logger.warning("⚠️  Cannot make call: call %s already active", self.call_id)
+            return False
+        if red_depth is not None:
+            self.red_depth = red_depth
+        
+        uri = destination if destination.startswith('sip:') else f"sip:{destination}@{self.server}"
+        call_id = self._new_call_id()
+        
+        self.call_id = call_id
+        self.remote_tag = None
+        self.invite_in_progress = True
+        self.call_state = CallState.INVITING
+        self.rtp_stats = self._new_rtp_stats()
+        
+        self.current_transactions.add(Transaction(call_id, 'INVITE', uri=uri, sdp=self._generate_sdp_offer()))
+        
+        self.logger.info("📞 CALL STATUS: INVITING - Calling %s", uri)
+        self._send_invite(call_id)
+        return call_id
+
+    def _send_invite(self, call_id, authorization=None):
+        """Send (or re-send with credentials) the INVITE of an outbound call"""
+        transaction = self.current_transactions[call_id]
+        uri = transaction.uri
+        sdp = transaction.sdp
+        branch = self._generate_branch()
+        cseq = self.cseq
+        self.cseq += 1
+        
+        self.sent_invites.discard(transaction.invite_key)
+        transaction.branch = branch
+        transaction.cseq = cseq
+        transaction.invite_key = f"{call_id}:{cseq}"
+        self.sent_invites.add(transaction.invite_key)
+        
+        auth_line = f"{authorization[0]}: {authorization[1]}\r\n" if authorization else ""
+        
+        from_header = transaction.from_header or f"<sip:{self.username}@{self.server}>;tag={self.tag}"
+        to_header = transaction.to_header or f"<{uri}>"
+        
+        msg = f"INVITE {uri} SIP/2.0\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch};rport\r\n" \
+              f"Max-Forwards: 70\r\n" \
+              f"From: {from_header}\r\n" \
+              f"To: {to_header}\r\n" \
+              f"Call-ID: {call_id}\r\n" \
+              f"CSeq: {cseq} INVITE\r\n" \
+              f"Contact: <sip:{self.username}@{self.local_ip}:{self.local_port}>\r\n" \
+              f"{auth_line}" \
+              f"Allow: INVITE, ACK, CANCEL, OPTIONS, BYE, UPDATE\r\n" \
+              f"User-Agent: BetterSIPClient/1.0\r\n" \
+              f"Content-Type: application/sdp\r\n" \
+              f"Content-Length: {len(sdp)}\r\n\r\n" \
+              f"{sdp}"
+        
+        self._send_message(msg)
+
+    def _retry_invite_with_auth(self, call_id, headers):
+        """ACK a 401/407 to our INVITE and send it again with credentials"""
+        transaction = self.current_transactions[call_id]
+        self._ack_failure_response(headers, transaction)
+        
+        if transaction.auth_attempted or transaction.cancelled:
+            status = int(headers.get('start_line', 'SIP/2.0 401')[8:11])
+            self._handle_invite_failure(headers, status, acked=True)
+            return
+        
+        transaction.auth_attempted = True
+        uri = transaction.uri
+        response = self._calculate_auth_response("INVITE", uri)
+        
+        auth_header = f'Digest username="{self.username}", realm="{self.auth_info["realm"]}", ' \
+                      f'nonce="{self.auth_info["nonce"]}", uri="{uri}", ' \
+                      f'response="{response}", algorithm={self.auth_info["algorithm"]}'
+        if self.auth_info.get('opaque'):
+            auth_header += f', opaque="{self.auth_info["opaque"]}"'
+        
+        header_name = 'Proxy-Authorization' if 'proxy-authenticate' in headers else 'Authorization'
+        self._send_invite(call_id, (header_name, auth_header))
+
+    def _ack_failure_response(self, headers, transaction=None):
+        """ACK a non-2xx final response to our INVITE (same branch as the INVITE)"""
+        cseq_header = headers.get('cseq', '')
+        if not cseq_header.endswith('INVITE'):
+            return
+        
+        request_uri = transaction.uri if transaction else f"sip:{self.username}@{self.server}"
+        branch = transaction.branch if transaction else self._generate_branch()
+        
+        msg = f"ACK {request_uri} SIP/2.0\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch};rport\r\n" \
+              f"Max-Forwards: 70\r\n" \
+              f"From: {headers.get('from', '')}\r\n" \
+              f"To: {headers.get('to', '')}\r\n" \
+              f"Call-ID: {headers.get('call-id', '')}\r\n" \
+              f"CSeq: {cseq_header.split()[0]} ACK\r\n" \
+              f"User-Agent: BetterSIPClient/1.0\r\n" \
+              f"Content-Length: 0\r\n\r\n"
+        
+        self._send_message(msg)
+
+    def _handle_invite_failure(self, headers, status, acked=False):
+        """Handle a 3xx-6xx final response to our INVITE"""
+        call_id = headers.get('call-id', '')
+        transaction = self.current_transactions.get(call_id)
+        if transaction is None or transaction.method != 'INVITE':
+            return
+        if not headers.get('cseq', '').endswith('INVITE'):
+            return
+        
+        if not acked:
+            self._ack_failure_response(headers, transaction)
+        if transaction.reinvite:
+            self._reinvite_failed(call_id, transaction)
+            return
+        del self.current_transactions[call_id]
+        self.sent_invites.discard(transaction.invite_key)
+        
+        if call_id == self.call_id:
+            self._cleanup_call_state()
+        self._close_call_trace(call_id)
+        self.logger.info("❌ CALL STATUS: IDLE - Call failed: %s", headers.get('start_line', ''),
+                         extra={'call_id': call_id, 'status': status})
+        
+        on_call_failed = getattr(self.call_manager, 'on_call_failed', None)
+        if on_call_failed:
+            on_call_failed(call_id, status)
+
+    def cancel_call(self):
+        """Cancel an outbound call that has not been answered yet
+        
+        Returns:
+            True if a CANCEL was sent
+        """
+        call_id = self.call_id
+        transaction = self.current_transactions.get(call_id) if call_id else None
+        if transaction is None or transaction.method != 'INVITE' or transaction.branch is None:
+            return False
+        
+        msg = f"CANCEL {transaction.uri} SIP/2.0\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={transaction.branch};rport\r\n" \
+              f"Max-Forwards: 70\r\n" \
+              f"From: <sip:{self.username}@{self.server}>;tag={self.tag}\r\n" \
+              f"To: <{transaction.uri}>\r\n" \
+              f"Call-ID: {call_id}\r\n" \
+              f"CSeq: {transaction.cseq} CANCEL\r\n" \
+              f"User-Agent: BetterSIPClient/1.0\r\n" \
+              f"Content-Length: 0\r\n\r\n"
+        
+        self._send_message(msg)
+        transaction.cancelled = True
+        self._cleanup_call_state()
+        self.logger.info("🚫 CALL STATUS: IDLE - Call %s cancelled", call_id)
+        return True
+
     def hangup_call(self):
         """Enhanced call termination"""
         if not self.call_id:
                 return
         
         call_id = self.call_id
-        dialog = self.dialogs.get(call_id, {})
-        remote_tag = dialog.get('remote_tag')
-        remote_uri = dialog.get('remote_uri', f"sip:{self.username}@{self.server}")
+        self._send_bye(call_id)
         
-        branch = self._generate_branch()
+        if call_id in self.dialogs:
+            del self.dialogs[call_id]
+        
+        self._cleanup_call_state()
+        
+
+    def _dialog_headers(self, call_id):
+        """(From, To, request URI) for a request we send inside a dialog"""
+        dialog = self.dialogs.get(call_id)
+        if dialog is None:
+            dialog = Dialog(call_id, self.tag, None, f"sip:{self.username}@{self.server}", None, None)
+        remote_tag = dialog.remote_tag
+        remote_uri = dialog.remote_uri
+        
+        from_header = dialog.local_header or f"<sip:{self.username}@{self.server}>;tag={self.tag}"
+        to_header = dialog.remote_header
+        if not to_header:
+            to_header = f"<sip:{self.username}@{self.server}>"
+            if remote_tag:
+                to_header += f";tag={remote_tag}"
+        return from_header, to_header, remote_uri
+
+    def bridge_to(self, other):
+        """Connect this call's media to another client's call
+        
+        Packets pass through with only their RTP header rewritten when both
+        calls use the same codec, and are transcoded otherwise. The bridge
+        ends when either call ends.
+        
+        Args:
+            other: SimpleSIPClient with an answered call
+            
+        Returns:
+            The started Bridge; call stop() on it to unbridge
+        """
+        return Bridge(self, other).start()
+
+    def hold(self, direction='sendonly'):
+        """Put the current call on hold with a re-INVITE
+        
+        Receive decoding is parked once the peer answers; with 'inactive'
+        sending is parked as well.
+        
+        Args:
+            direction: 'sendonly' (we may keep sending, e.g. music on hold)
+                       or 'inactive'
+            
+        Returns:
+            True if the re-INVITE was sent
+        """
+        if direction not in ('sendonly', 'inactive'):
+            raise ValueError("direction must be 'sendonly' or 'inactive'")
+        return self._send_reinvite(direction)
+
+    def resume(self):
+        """Take the current call off hold with a re-INVITE
+        
+        Returns:
+            True if the re-INVITE was sent
+        """
+        return self._send_reinvite('sendrecv')
+
+    def _send_reinvite(self, direction):
+        """Offer ``direction`` to the peer in a re-INVITE of the current dialog"""
+        call_id = self.call_id
+        if not call_id or self.call_state not in (CallState.CONNECTED, CallState.STREAMING):
+            return False
+        if call_id in self.current_transactions:
+            self.logger.warning("⚠️  Cannot re-INVITE: a transaction is still pending",
+                                extra={'call_id': call_id})
+            return False
+        
+        from_header, to_header, remote_uri = self._dialog_headers(call_id)
+        previous = self.local_direction
+        self.local_direction = direction
+        self.current_transactions.add(Transaction(
+            call_id, 'INVITE', uri=remote_uri, sdp=self._generate_sdp_offer(),
+            from_header=from_header, to_header=to_header, reinvite=True,
+            direction=direction, previous_direction=previous))
+        self._send_invite(call_id)
+        self.logger.info("⏯️ re-INVITE sent (%s)", direction, extra={'call_id': call_id})
+        return True
+
+    def _retry_reinvite(self, call_id, direction):
+        """Re-send a re-INVITE that lost a glare race, if the call is still up"""
+        self._reinvite_timer = None
+        if self.running and self.call_id == call_id and self.local_direction != direction:
+            self._send_reinvite(direction)
+
+    def _cancel_reinvite_retry(self):
+        timer = self._reinvite_timer
+        if timer is not None:
+            timer.cancel()
+            self._reinvite_timer = None
+
+    def _reinvite_failed(self, call_id, transaction):
+        """Keep the call as it was after a rejected re-INVITE"""
+        self.current_transactions.pop(call_id, None)
+        self.sent_invites.discard(transaction.invite_key)
+        self.local_direction = transaction.previous_direction
+        self.logger.info("⚠️  re-INVITE rejected - media unchanged", extra={'call_id': call_id})
+
+    def _send_bye(self, call_id):
+        """Send BYE within the dialog of ``call_id``"""
+        from_header, to_header, remote_uri = self._dialog_headers(call_id)
         
-        to_header = f"<sip:{self.username}@{self.server}>"
-        if remote_tag:
-            to_header += f";tag={remote_tag}"
+        branch = self._generate_branch()
         
         msg = f"BYE {remote_uri} SIP/2.0\r\n" \
-              f"Via: SIP/2.0/UDP {self.local_ip}:5060;branch={branch}\r\n" \
+              f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};branch={branch}\r\n" \
               f"Max-Forwards: 70\r\n" \
-              f"From: <sip:{self.username}@{self.server}>;tag={self.tag}\r\n" \
+              f"From: {from_header}\r\n" \
               f"To: {to_header}\r\n" \
               f"Call-ID: {call_id}\r\n" \
               f"CSeq: {self.cseq} BYE\r\n" \
@@ -1240,12 +2404,6 @@ class SimpleSIPClient:
         
         self._send_message(msg)
         self.cseq += 1
-        
-        if call_id in self.dialogs:
-            del self.dialogs[call_id]
-        
-        self._cleanup_call_state()
-        
 
     def disconnect(self):
         """Enhanced cleanup and disconnect"""
@@ -1253,6 +2411,7 @@ class SimpleSIPClient:
         
         if self.call_id:
             self.hangup_call()
+        self._cancel_reinvite_retry()
         
         if self.sock:
             try:
@@ -1270,34 +2429,219 @@ class SimpleSIPClient:
         self.dialogs.clear()
         
 
-    def send_dtmf(self, digit):
-        """Send DTMF tone via RTP"""
+    def send_dtmf(self, digits, duration=100, gap=50):
+        """Queue DTMF digits to be sent as RFC 4733 telephone events
+        
+        Returns immediately; the digits are sent one after another by a
+        scheduler thread, interleaved with any audio on the same RTP stream.
+        
+        Args:
+            digits: One or more of 0-9, *, #, A-D
+            duration: Tone length per digit in milliseconds
+            gap: Pause between digits in milliseconds
+            
+        Returns:
+            Number of digits queued
+        """
         if not self.remote_rtp_info:
-                return
+            return 0
+        
+        return self._dtmf_sender.queue_digits(digits, duration, gap)
+    
+    def set_dtmf_callback(self, callback_func):
+        """Set callback for received DTMF digits
+        
+        Args:
+            callback_func: Called once per keypress as callback_func(digit, duration_ms)
+        """
+        self.dtmf_callback = callback_func
+        self.logger.info("🔢 DTMF callback registered")
+
+    def set_tracer(self, tracer):
+        """Install a pipeline tracer, or None to disable tracing
+        
+        The tracer's start()/end() are called around SIP receive, parse and
+        dispatch, SDP parsing, RTP receive and decode, the jitter buffer, the
+        audio callback and send_audio. See simplesip.tracing for the
+        JSONLTracer and StageProfiler adapters.
+        
+        Args:
+            tracer: simplesip.tracing.Tracer instance or None
+        """
+        self.tracer = tracer
+        self.logger.info("⏱️ Tracer %s", 'installed: ' + type(tracer).__name__ if tracer else 'removed')
+    
+    def enable_inband_dtmf(self, enabled=True, batched=True, **detector_options):
+        """Detect DTMF tones in the decoded audio stream
         
-        dtmf_map = {'0': 0, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, 
-                   '*': 10, '#': 11, 'A': 12, 'B': 13, 'C': 14, 'D': 15}
+        For trunks that send DTMF as audio rather than RFC 4733 events.
+        Detected digits are reported through the same callback as
+        set_dtmf_callback().
         
-        if digit not in dtmf_map:
+        Args:
+            enabled: Turn detection on or off
+            batched: Hand frames to the process-wide BatchDetector, which
+                classifies the frames of all calls in one pass from its own
+                thread; False classifies each frame on the receive thread
+            **detector_options: GoertzelDetector thresholds (min_energy,
+                min_tone_ratio, max_normal_twist_db, ...); by default the
+                process-wide detector is shared with other calls
+        """
+        if not enabled:
+            self._inband_dtmf = None
+            self._inband_batch = None
+            self.logger.info("🔢 In-band DTMF detection disabled")
             return
         
-        event = dtmf_map[digit]
+        from .goertzel import GoertzelDetector, InbandDTMFDetector, get_batch_detector
+        
+        detector = GoertzelDetector(**detector_options) if detector_options else None
+        self._inband_batch = get_batch_detector() if batched else None
+        self._inband_dtmf = InbandDTMFDetector(self._dispatch_dtmf, detector=detector)
+        self.logger.info("🔢 In-band DTMF detection enabled")
+
+    @staticmethod
+    def _new_rtp_stats():
+        return {'packets_received': 0, 'packets_lost': 0, 'packets_recovered': 0,
+                'packets_concealed': 0, 'jitter': 0.0}
+
+    def get_rtp_stats(self):
+        """Receive statistics of the current (or last) call
+        
+        Returns:
+            dict with packets_received, packets_lost, packets_recovered
+            (from RFC 2198 redundancy), packets_concealed, loss_percent and
+            the RFC 3550 interarrival jitter in milliseconds (jitter_ms)
+        """
+        stats = self.rtp_stats
+        received = stats['packets_received']
+        lost = stats['packets_lost']
+        return {
+            'packets_received': received,
+            'packets_lost': lost,
+            'packets_recovered': stats['packets_recovered'],
+            'packets_concealed': stats['packets_concealed'],
+            'loss_percent': 100.0 * lost / (received + lost) if received + lost else 0.0,
+            'jitter_ms': stats['jitter'] / 8.0,
+        }
+
+    @property
+    def media_sending(self):
+        """True while the media direction lets this call send audio"""
+        return self._tx_active
+
+    def encode_audio(self, pcm_data, codec=None):
+        """Encode 16-bit PCM for ``codec``, by default the negotiated one"""
+        return self._encode_payload(pcm_data, codec or self.negotiated_codec or 'PCMU')
+
+    @property
+    def call_state(self):
+        """Current CallState of the call"""
+        return self._call_state
+
+    @call_state.setter
+    def call_state(self, state):
+        self._transition_call_state(state)
+
+    def _transition_call_state(self, state, expected=None):
+        """Move to ``state``, only from ``expected`` if given
+        
+        Returns:
+            True if the state changed
+        """
+        with self._state_changed:
+            previous = self._call_state
+            if previous is state or (expected is not None and previous is not expected):
+                return False
+            self._call_state = state
+            self._state_version += 1
+            self._state_history.append((self._state_version, state))
+            self._state_changed.notify_all()
+        for listener in self._state_listeners:
+            try:
+                listener(previous, state)
+            except Exception as e:
+                self.logger.error("❌ Call state listener error: %s", e)
+        return True
+
+    def wait_for(self, states, timeout=None):
+        """Block until the call reaches one of ``states``
+        
+        Wakes as soon as the transition happens instead of polling. A state
+        the call passes through while waiting counts even if it has already
+        moved on, e.g. CONNECTED followed at once by STREAMING.
+        
+        Args:
+            states: A CallState or an iterable of them
+            timeout: Seconds to wait, or None to wait indefinitely
+        
+        Returns:
+            The state reached, or None on timeout
+        """
+        wanted = _as_states(states)
+        with self._state_changed:
+            if self._call_state in wanted:
+                return self._call_state
+            version = self._state_version
+
+            def reached():
+                for changed, state in self._state_history:
+                    if changed > version and state in wanted:
+                        return state
+                return None
+
+            return self._state_changed.wait_for(reached, timeout)
+
+    async def wait_for_async(self, states, timeout=None):
+        """wait_for() for asyncio applications
         
-        payload = struct.pack('!BBHH', event, 0x0A, 160, 0)
-        header = struct.pack('!BBHII', 0x80, 101, self.rtp_seq, self.rtp_timestamp, self.rtp_ssrc)
+        The SIP thread resolves a future on the running loop through
+        call_soon_threadsafe, so the loop is never blocked.
         
+        Returns:
+            The state reached, or None on timeout
+        """
+        import asyncio
+
+        wanted = _as_states(states)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(state):
+            if not future.done():
+                future.set_result(state)
+
+        def listener(previous, state):
+            if state in wanted:
+                loop.call_soon_threadsafe(resolve, state)
+
+        self.add_call_state_listener(listener)
         try:
-            self.rtp_sock.sendto(header + payload, self.remote_rtp_info)
-            self.rtp_seq = (self.rtp_seq + 1) % 65536
-            time.sleep(0.1)
-            
-            payload = struct.pack('!BBHH', event, 0x8A, 800, 0)  # End event
-            header = struct.pack('!BBHII', 0x80, 101, self.rtp_seq, self.rtp_timestamp, self.rtp_ssrc)
-            self.rtp_sock.sendto(header + payload, self.remote_rtp_info)
-            self.rtp_seq = (self.rtp_seq + 1) % 65536
-            
-        except Exception as e:
-            self.logger.error(f"Error sending DTMF: {str(e)}")
+            current = self._call_state
+            if current in wanted:
+                return current
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.remove_call_state_listener(listener)
+
+    def add_call_state_listener(self, callback):
+        """Call callback(previous_state, new_state) on every call state change
+        
+        Listeners run on the thread that made the change, usually the SIP
+        receive thread, so they should return quickly.
+        """
+        with self._state_changed:
+            self._state_listeners = self._state_listeners + [callback]
+
+    def remove_call_state_listener(self, callback):
+        """Stop calling a listener added with add_call_state_listener()"""
+        with self._state_changed:
+            listeners = list(self._state_listeners)
+            if callback in listeners:
+                listeners.remove(callback)
+            self._state_listeners = listeners
 
     def get_call_status(self):
         """Get current call status with detailed information"""
@@ -1308,10 +2652,15 @@ class SimpleSIPClient:
             'local_rtp_port': self.local_rtp_port,
             'active_transactions': len(self.current_transactions),
             'dialogs': len(self.dialogs),
+            'evicted_transactions': self.current_transactions.evictions,
+            'evicted_dialogs': self.dialogs.evictions,
             'sent_invites': len(self.sent_invites),
             'invite_in_progress': self.invite_in_progress,
             'auth_available': bool(self.auth_info),
-            'audio_buffer_size': len(self.audio_buffer)
+            'audio_buffer_size': len(self.audio_buffer),
+            'recording': self.recorder.stats() if self.recorder else None,
+            'media_direction': self.media_direction,
+            'rtp': self.get_rtp_stats()
         }
         
     def print_call_status(self):
@@ -1326,13 +2675,16 @@ class SimpleSIPClient:
         }
         
         emoji = state_emoji.get(status['state'], '🔵')
-        self.logger.info(f"{emoji} CALL STATUS: {status['state'].upper()}")
+        self.logger.info("%s CALL STATUS: %s", emoji, status['state'].upper())
         
         if status['call_id']:
-            self.logger.info(f"  Call ID: {status['call_id']}")
+            self.logger.info("  Call ID: %s", status['call_id'])
         if status['remote_rtp']:
-            self.logger.info(f"  Remote RTP: {status['remote_rtp']}")
+            self.logger.info("  Remote RTP: %s", status['remote_rtp'])
         if status['local_rtp_port']:
-            self.logger.info(f"  Local RTP: {self.local_ip}:{status['local_rtp_port']}")
+            self.logger.info("  Local RTP: %s:%s", self.local_ip, status['local_rtp_port'])
         if status['audio_buffer_size'] > 0:
-            self.logger.info(f"  Audio buffer: {status['audio_buffer_size']} packets")
+            self.logger.info("  Audio buffer: %s packets", status['audio_buffer_size'])
+        self.logger.info("  Transactions: %s (%s evicted), dialogs: %s (%s evicted)",
+                         status['active_transactions'], status['evicted_transactions'],
+                         status['dialogs'], status['evicted_dialogs'])
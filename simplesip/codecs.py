@@ -0,0 +1,307 @@
+"""
+Codec backends.
+
+Each conversion has several implementations: audioop (C, in the standard
+library up to Python 3.12 and from the ``audioop-lts`` package after),
+NumPy lookup tables, the ``G722`` package, and pure Python tables. G.722
+has only the ``G722`` package; without it G.722 is not negotiated. Nothing
+is imported until a conversion is first used. At that point the fastest
+available backend is probed for, and the module attribute is rebound to it,
+so later calls go straight to the implementation. backends() reports what
+was chosen.
+
+Set ``SIMPLESIP_CODEC_BACKEND`` to a backend name, e.g. ``python``, to
+prefer it over the faster ones.
+"""
+
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+Convert = Callable[[bytes], bytes]
+
+
+_PREFERENCE = {
+    "ulaw_encode": ("audioop", "numpy", "python"),
+    "ulaw_decode": ("audioop", "numpy", "python"),
+    "alaw_encode": ("audioop", "numpy", "python"),
+    "alaw_decode": ("audioop", "numpy", "python"),
+    "l16_encode": ("array", "numpy"),
+    "l16_decode": ("array", "numpy"),
+    "g722": ("G722",),
+}
+
+_chosen: Dict[str, Optional[str]] = {}  # Operation -> backend name
+_probe_seconds: Dict[str, float] = (
+    {}
+)  # Operation -> time spent choosing and loading its backend
+_tables: Dict[str, Union[bytes, List[int]]] = {}
+
+
+# --- G.711 reference conversions (ITU-T G.711, as in audioop) ---
+
+
+def _linear_to_ulaw(sample: int) -> int:
+    sample >>= 2
+    if sample < 0:
+        sample, mask = -sample, 0x7F
+    else:
+        mask = 0xFF
+    sample = min(sample, 8159) + 33
+    segment = 0
+    while segment < 8 and sample >= (0x40 << segment):
+        segment += 1
+    if segment >= 8:
+        return 0x7F ^ mask
+    return ((segment << 4) | ((sample >> (segment + 1)) & 0x0F)) ^ mask
+
+
+def _ulaw_to_linear(byte: int) -> int:
+    byte = ~byte
+    magnitude = (((byte & 0x0F) << 3) + 0x84) << ((byte & 0x70) >> 4)
+    return 0x84 - magnitude if byte & 0x80 else magnitude - 0x84
+
+
+def _linear_to_alaw(sample: int) -> int:
+    sample >>= 3
+    if sample >= 0:
+        mask = 0xD5
+    else:
+        mask, sample = 0x55, -sample - 1
+    segment = 0
+    while segment < 8 and sample >= (0x20 << segment):
+        segment += 1
+    if segment >= 8:
+        return 0x7F ^ mask
+    shift = 1 if segment < 2 else segment
+    return ((segment << 4) | ((sample >> shift) & 0x0F)) ^ mask
+
+
+def _alaw_to_linear(byte: int) -> int:
+    byte ^= 0x55
+    magnitude = (byte & 0x0F) << 4
+    segment = (byte & 0x70) >> 4
+    if segment == 0:
+        magnitude += 8
+    else:
+        magnitude = (magnitude + 0x108) << (segment - 1)
+    return magnitude if byte & 0x80 else -magnitude
+
+
+def _table(name: str) -> Any:
+    """Encode tables by unsigned 16-bit sample, decode tables by byte"""
+    table = _tables.get(name)
+    convert: Callable[[int], int]
+    if table is None:
+        if name.endswith("encode"):
+            convert = _linear_to_ulaw if name.startswith("ulaw") else _linear_to_alaw
+            table = bytes(convert(s - 65536 if s > 32767 else s) for s in range(65536))
+        else:
+            convert = _ulaw_to_linear if name.startswith("ulaw") else _alaw_to_linear
+            table = [convert(b) for b in range(256)]
+        _tables[name] = table
+    return table
+
+
+# --- Backends ---
+
+
+def _audioop(operation: str) -> Convert:
+    import audioop
+
+    function = {
+        "ulaw_encode": audioop.lin2ulaw,
+        "ulaw_decode": audioop.ulaw2lin,
+        "alaw_encode": audioop.lin2alaw,
+        "alaw_decode": audioop.alaw2lin,
+    }[operation]
+    if sys.byteorder == "big":
+        if operation.endswith("encode"):
+            return lambda pcm: function(audioop.byteswap(pcm, 2), 2)
+        return lambda data: audioop.byteswap(function(data, 2), 2)
+    return lambda data: function(data, 2)
+
+
+def _numpy(operation: str) -> Convert:
+    import numpy as np
+
+    if operation == "l16_encode":
+        return lambda pcm: np.frombuffer(pcm, dtype="<i2").astype(">i2").tobytes()
+    if operation == "l16_decode":
+        return lambda data: np.frombuffer(data, dtype=">i2").astype("<i2").tobytes()
+
+    if operation.endswith("encode"):
+        table = np.frombuffer(_table(operation), dtype=np.uint8)
+        return lambda pcm: table[np.frombuffer(pcm, dtype="<u2")].tobytes()
+    table = np.array(_table(operation), dtype="<i2")
+    return lambda data: table[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+def _python(operation: str) -> Convert:
+    import struct
+
+    if operation.endswith("encode"):
+        table = _table(operation)
+
+        def encode(pcm: bytes) -> bytes:
+            return bytes(
+                table[s]
+                for s in struct.unpack(f"<{len(pcm) // 2}H", pcm[: len(pcm) // 2 * 2])
+            )
+
+        return encode
+
+    # One 2-byte string per code, so decoding is a join
+    table = [struct.pack("<h", value) for value in _table(operation)]
+    return lambda data: b"".join([table[b] for b in data])
+
+
+def _array(operation: str) -> Convert:
+    import array
+
+    # Encoding and decoding are the same swap of each byte pair
+    def swap(data: bytes) -> bytes:
+        samples = array.array("h", data[: len(data) // 2 * 2])
+        samples.byteswap()
+        return samples.tobytes()
+
+    return swap
+
+
+def _g722_package(operation: str) -> type:
+    from G722 import G722  # noqa: F401
+
+    return _G722
+
+
+_LOADERS: Dict[str, Callable[[str], Any]] = {
+    "audioop": _audioop,
+    "numpy": _numpy,
+    "python": _python,
+    "array": _array,
+    "G722": _g722_package,
+}
+
+
+class _G722:
+    """ITU-T G.722 at 64 kbit/s from the G722 package
+
+    Keeps the ADPCM state between frames.
+    """
+
+    def __init__(self) -> None:
+        import array
+        from G722 import G722
+
+        self._array = array.array
+        self._encoder = G722(16000, 64000)
+        self._decoder = G722(16000, 64000)
+
+    def encode(self, pcm: bytes) -> bytes:
+        samples = self._array("h", pcm[: len(pcm) // 2 * 2])
+        if sys.byteorder == "big":
+            samples.byteswap()
+        return bytes(self._encoder.encode(samples))
+
+    def decode(self, data: bytes) -> bytes:
+        samples = self._decoder.decode(data)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        return bytes(samples.tobytes())
+
+
+def _select(operation: str) -> Any:
+    """Load the first backend of ``operation`` that works and bind it"""
+    start = time.perf_counter()
+    preference = _PREFERENCE[operation]
+    preferred = os.environ.get("SIMPLESIP_CODEC_BACKEND")
+    if preferred in preference:
+        preference = (preferred,) + tuple(b for b in preference if b != preferred)
+    for backend in preference:
+        try:
+            implementation = _LOADERS[backend](operation)
+        except ImportError:
+            continue
+        _chosen[operation] = backend
+        _probe_seconds[operation] = time.perf_counter() - start
+        if operation != "g722":
+            globals()[operation] = implementation
+        return implementation
+    raise ImportError(f"No backend available for {operation}")
+
+
+def backends() -> Dict[str, Optional[str]]:
+    """Backend chosen for each conversion, loading any not used yet
+
+    A conversion with no backend installed (G.722 without the ``G722``
+    package) is reported as None.
+    """
+    for operation in _PREFERENCE:
+        if operation not in _chosen:
+            try:
+                _select(operation)
+            except ImportError:
+                _chosen[operation] = None
+    return dict(_chosen)
+
+
+def probe_seconds() -> Dict[str, float]:
+    """Seconds each conversion spent choosing and loading its backend"""
+    return dict(_probe_seconds)
+
+
+# Entry points: each replaces itself with the chosen backend on first call
+
+
+def ulaw_encode(pcm: bytes) -> bytes:
+    """16-bit little-endian PCM to G.711 μ-law"""
+    return bytes(_select("ulaw_encode")(pcm))
+
+
+def ulaw_decode(data: bytes) -> bytes:
+    """G.711 μ-law to 16-bit little-endian PCM"""
+    return bytes(_select("ulaw_decode")(data))
+
+
+def alaw_encode(pcm: bytes) -> bytes:
+    """16-bit little-endian PCM to G.711 A-law"""
+    return bytes(_select("alaw_encode")(pcm))
+
+
+def alaw_decode(data: bytes) -> bytes:
+    """G.711 A-law to 16-bit little-endian PCM"""
+    return bytes(_select("alaw_decode")(data))
+
+
+def l16_encode(pcm: bytes) -> bytes:
+    """16-bit little-endian PCM to network byte order L16"""
+    return bytes(_select("l16_encode")(pcm))
+
+
+def l16_decode(data: bytes) -> bytes:
+    """Network byte order L16 to 16-bit little-endian PCM"""
+    return bytes(_select("l16_decode")(data))
+
+
+def g722_available() -> bool:
+    """Whether the ``G722`` package is installed, so G.722 can be negotiated"""
+    if "g722" not in _chosen:
+        try:
+            _select("g722")
+        except ImportError:
+            _chosen["g722"] = None
+    return _chosen["g722"] is not None
+
+
+def g722_codec() -> _G722:
+    """New G.722 encoder/decoder pair with ``encode(pcm)`` and ``decode(data)``
+
+    Each stream needs its own, since G.722 carries state from frame to frame.
+
+    Raises:
+        ImportError: if the ``G722`` package is not installed
+    """
+    if not g722_available():
+        raise ImportError("G.722 needs the 'G722' package: pip install g722")
+    return _G722()
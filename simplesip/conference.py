@@ -0,0 +1,257 @@
+"""
+N-party conference mixing.
+
+Every tick the Conference takes one frame of decoded audio from each
+participant and sums the loudest few with a single int32 NumPy reduction.
+Each participant then hears that sum minus their own frame, so nobody hears
+themselves. Everyone who is not an active speaker hears the same mix, so
+the mix is encoded once for each codec and sent to all of them. Only the
+active speakers need a mix of their own.
+"""
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from . import codecs
+from . import metrics
+from .bridge import _resample
+from .sdp import CODEC_CLOCK_RATES, CODEC_SAMPLE_RATES
+
+if TYPE_CHECKING:
+    import numpy
+
+    from .client import SimpleSIPClient
+
+
+def mix_frames(
+    frames: "numpy.ndarray", max_speakers: int = 3, threshold: float = 0
+) -> Tuple["numpy.ndarray", "numpy.ndarray", "numpy.ndarray"]:
+    """Mix a block of frames into one output per participant
+
+    Args:
+        frames: int16 NumPy array of shape (participants, samples)
+        max_speakers: Only the loudest this many frames are mixed
+        threshold: Mean absolute level a frame needs to count as speech
+
+    Returns:
+        (mixes, keys, speakers): int16 array of the distinct mixes, the row
+        of ``mixes`` each participant hears, and the indexes of the active
+        speakers. Row 0 is what non-speakers hear.
+    """
+    import numpy as np
+
+    count, samples = frames.shape
+    wide = frames.astype(np.int32)
+    level = np.abs(wide).sum(axis=1)
+    if count > max_speakers:
+        speakers = np.argpartition(-level, max_speakers - 1)[:max_speakers]
+    else:
+        speakers = np.arange(count)
+    speakers = speakers[level[speakers] > threshold * samples]
+
+    total = wide[speakers].sum(axis=0)
+    mixes = np.empty((len(speakers) + 1, samples), dtype=np.int32)
+    mixes[0] = total
+    # Each speaker hears everyone else: the total without their own frame
+    np.subtract(total, wide[speakers], out=mixes[1:])
+    np.clip(mixes, -32768, 32767, out=mixes)
+
+    keys = np.zeros(count, dtype=np.intp)
+    keys[speakers] = np.arange(1, len(speakers) + 1)
+    return mixes.astype(np.int16), keys, speakers
+
+
+class _Participant:
+    """A client in a conference and the audio it has sent since the last tick"""
+
+    def __init__(
+        self, client: "SimpleSIPClient", frame_bytes: int, sample_rate: int
+    ) -> None:
+        self.client = client
+        self.sample_rate = sample_rate
+        self.frame_bytes = frame_bytes
+        self.pending = bytearray()
+        self.lock = threading.Lock()
+
+    def push(
+        self, pcm_data: bytes, format: str, play_time: Optional[float] = None
+    ) -> None:
+        """Audio callback: queue decoded PCM at the conference rate"""
+        codec = self.client.negotiated_codec or "PCMU"
+        pcm_data = _resample(
+            pcm_data, CODEC_SAMPLE_RATES.get(codec, 8000), self.sample_rate
+        )
+        with self.lock:
+            self.pending += pcm_data
+            # Keep at most a few frames so a stalled mixer does not add delay
+            excess = len(self.pending) - 4 * self.frame_bytes
+            if excess > 0:
+                del self.pending[:excess]
+
+    def take(self) -> Optional[bytes]:
+        """One frame of queued audio, or None if a full frame has not arrived"""
+        with self.lock:
+            if len(self.pending) < self.frame_bytes:
+                return None
+            frame = bytes(self.pending[: self.frame_bytes])
+            del self.pending[: self.frame_bytes]
+            return frame
+
+
+class Conference:
+    """Mix audio between the calls of several clients
+
+    Adding a client takes over its audio callback. Each participant hears
+    the loudest ``max_speakers`` other participants.
+
+    Args:
+        sample_rate: Rate the mix runs at; 16000 keeps G.722 calls wideband
+        ptime: Length of each mixed frame in milliseconds
+        max_speakers: How many of the loudest participants are mixed
+        threshold: Mean absolute sample level below which a participant
+                   counts as silent and is left out of the mix
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 8000,
+        ptime: int = 20,
+        max_speakers: int = 3,
+        threshold: float = 64,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.ptime = ptime
+        self.max_speakers = max_speakers
+        self.threshold = threshold
+        self.samples = sample_rate * ptime // 1000
+        self.speakers: List["SimpleSIPClient"] = []  # Clients mixed in the last tick
+        self.ticks = 0
+        self.encodes = 0
+        self._participants: List[_Participant] = []
+        self._g722: Dict[Optional[_Participant], Any] = (
+            {}
+        )  # Mix owner (None for the shared mix) -> G.722 encoder state
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, client: "SimpleSIPClient") -> None:
+        """Join a client's answered call to the conference"""
+        participant = _Participant(client, self.samples * 2, self.sample_rate)
+        with self._lock:
+            if any(p.client is client for p in self._participants):
+                return
+            self._participants = self._participants + [participant]
+        client.set_audio_callback(
+            participant.push, format="pcm", sample_rate=self.sample_rate
+        )
+
+    def remove(self, client: "SimpleSIPClient") -> None:
+        """Take a client out of the conference and release its audio callback"""
+        with self._lock:
+            remaining = [p for p in self._participants if p.client is not client]
+            if len(remaining) == len(self._participants):
+                return
+            self._participants = remaining
+            self._g722 = {
+                owner: encoder
+                for owner, encoder in self._g722.items()
+                if owner is None or owner.client is not client
+            }
+        client.remove_audio_callback()
+
+    @property
+    def participants(self) -> List["SimpleSIPClient"]:
+        return [p.client for p in self._participants]
+
+    def start(self) -> "Conference":
+        """Start mixing in a background thread"""
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._mix_thread, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop mixing; participants stay joined until removed"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _mix_thread(self) -> None:
+        interval = self.ptime / 1000
+        next_tick = time.perf_counter()
+        while self._running:
+            start = time.perf_counter()
+            try:
+                self.tick()
+            except Exception as e:
+                self.logger.error("Conference mix error: %s", e)
+            metrics.CONFERENCE_MIX_SECONDS.observe(time.perf_counter() - start)
+
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()  # Fell behind: do not burst
+
+    def tick(self) -> None:
+        """Mix and send one frame to every participant"""
+        import numpy as np
+
+        participants = self._participants
+        if not participants:
+            return
+        frames = np.zeros((len(participants), self.samples), dtype=np.int16)
+        for row, participant in enumerate(participants):
+            frame = participant.take()
+            if frame is not None:
+                frames[row] = np.frombuffer(frame, dtype="<i2")
+
+        mixes, keys, speakers = mix_frames(frames, self.max_speakers, self.threshold)
+        self.speakers = [participants[i].client for i in speakers]
+
+        encoded: Dict[Tuple[int, str], bytes] = (
+            {}
+        )  # (mix row, codec) -> payload, so each distinct output is encoded once
+        for participant, key in zip(participants, keys):
+            client = participant.client
+            if client.remote_rtp_info is None or not client.media_sending:
+                continue
+            codec = client.negotiated_codec or "PCMU"
+            payload = encoded.get((key, codec))
+            if payload is None:
+                pcm = _resample(
+                    mixes[key].astype("<i2").tobytes(),
+                    self.sample_rate,
+                    CODEC_SAMPLE_RATES.get(codec, 8000),
+                )
+                if codec == "G722":
+                    # G.722 carries state between frames, so each mix keeps its
+                    # own encoder
+                    owner = participant if key else None
+                    encoder = self._g722.get(owner)
+                    if encoder is None:
+                        encoder = self._g722[owner] = codecs.g722_codec()
+                    payload = encoder.encode(pcm)
+                else:
+                    payload = client.encode_audio(pcm, codec)
+                encoded[(key, codec)] = payload
+                self.encodes += 1
+            client._send_rtp_payload(
+                payload,
+                client.negotiated_payload_type or 0,
+                CODEC_CLOCK_RATES.get(codec, 8000) * self.ptime // 1000,
+            )
+        self.ticks += 1
+
+    def __enter__(self) -> "Conference":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
@@ -0,0 +1,579 @@
+"""
+Rate-paced outbound dialer.
+
+SimpleSIPClient runs one call at a time, so the Dialer keeps a pool of
+registered clients and places each queued call on a free one. INVITEs go
+out as fast as a token bucket allows, without waiting for earlier calls to
+be answered, so up to ``max_concurrent`` can be outstanding at once. Calls
+to one destination can be capped. A 491 Request Pending is retried after a
+random 2.1-4s (RFC 3261 14.1), and a call that is not answered within the
+setup timeout is cancelled.
+
+    with Dialer('1001', 'secret', 'pbx.example.com', cps=20, max_concurrent=50,
+                per_destination=2, on_answered=play_message) as dialer:
+        calls = dialer.dial_many(numbers)
+        for call in calls:
+            call.wait()
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import metrics
+from .client import CallState, SimpleSIPClient
+from .transactions import PROCEEDING_TTL
+
+Callback = Callable[["OutboundCall"], Any]
+Timer = Tuple[float, int, Callable[..., Any], Tuple[Any, ...]]
+
+
+class TokenBucket:
+    """Limits an event rate while allowing short bursts
+
+    Not thread-safe; the Dialer only uses it from its scheduler thread.
+
+    Args:
+        rate: Tokens added per second
+        burst: Most tokens that can be saved up, i.e. events allowed back
+               to back after an idle spell
+    """
+
+    def __init__(self, rate: float, burst: float = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self._last = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def take(self, now: Optional[float] = None) -> bool:
+        """Use up a token if one is available; True if it was"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Seconds until the next token is available"""
+        self._refill(time.monotonic() if now is None else now)
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class OutboundCall:
+    """A call queued on a Dialer and the progress of its attempts
+
+    ``state`` is 'queued', 'dialing', 'answered', 'ended', 'failed' or
+    'cancelled'. ``status`` holds the final SIP status code of a failed
+    call, 'timeout' if it was not answered in time, or 'error' if the
+    INVITE could not be sent. While the call is dialing or answered,
+    ``client`` is the pooled SimpleSIPClient carrying it.
+    """
+
+    def __init__(self, dialer: "Dialer", destination: str) -> None:
+        self.dialer = dialer
+        self.destination = destination
+        self.state = "queued"
+        self.status: Union[int, str, None] = None
+        self.attempts = 0
+        self.client: Optional[SimpleSIPClient] = None
+        self.call_id: Optional[str] = None
+        self.queued_at = time.monotonic()
+        self.dialed_at: Optional[float] = None
+        self.answered_at: Optional[float] = None
+        self._settled = threading.Event()
+
+    @property
+    def setup_time(self) -> Optional[float]:
+        """Seconds from the answered INVITE being sent to the 200 OK"""
+        if self.answered_at is None or self.dialed_at is None:
+            return None
+        return self.answered_at - self.dialed_at
+
+    def wait(self, timeout: Optional[float] = None) -> str:
+        """Block until the call is answered, fails or is cancelled
+
+        Returns:
+            The call's state
+        """
+        self._settled.wait(timeout)
+        return self.state
+
+    def cancel(self) -> None:
+        """Drop the call from the queue, CANCEL it if ringing or hang it up"""
+        self.dialer.cancel(self)
+
+    def hangup(self) -> None:
+        """Hang up an answered call"""
+        self.dialer.cancel(self)
+
+    def __repr__(self) -> str:
+        return f"<OutboundCall {self.destination} {self.state}>"
+
+
+class _Slot:
+    """One pooled client and the call it is currently carrying"""
+
+    def __init__(self, dialer: "Dialer", client: SimpleSIPClient) -> None:
+        self.dialer = dialer
+        self.client = client
+        self.call: Optional[OutboundCall] = None
+        client.call_manager = self
+        client.add_call_state_listener(self._on_state)
+
+    # Call manager interface used by SimpleSIPClient
+
+    def on_call_answered(self, call_id: str) -> None:
+        self.dialer._answered(self, call_id)
+
+    def on_call_failed(self, call_id: str, status: int) -> None:
+        self.dialer._failed(self, call_id, status)
+
+    def on_call_ended(self, call_id: str) -> None:
+        pass  # The call state listener sees every hangup, local or remote
+
+    def on_incoming_call(self, call_id: str, from_uri: str) -> None:
+        pass
+
+    def _on_state(self, previous: CallState, state: CallState) -> None:
+        if state is CallState.IDLE:
+            self.dialer._ended(self)
+
+
+class Dialer:
+    """Place queued outbound calls through a pool of clients
+
+    Args:
+        username, password: Credentials used by every pooled client
+        server, port: SIP server to call through
+        cps: Most new INVITEs per second
+        burst: INVITEs that may go out back to back after an idle spell
+        max_concurrent: Size of the client pool, i.e. the most calls being
+                        set up or in progress at once
+        per_destination: Most calls to one destination at once (None for
+                         no cap)
+        setup_timeout: Seconds to wait for an answer before sending CANCEL;
+                       less than the client's Timer C (PROCEEDING_TTL)
+        max_retries: How often a call is re-sent after a 491
+        preferred_codecs: Codec preference of the pooled clients
+        on_answered, on_failed, on_ended: Optional callbacks, each called
+                         with the OutboundCall from a client thread
+    """
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        server: str,
+        port: int = 5060,
+        cps: float = 10.0,
+        burst: float = 1,
+        max_concurrent: int = 10,
+        per_destination: Optional[int] = None,
+        setup_timeout: float = 30.0,
+        max_retries: int = 3,
+        preferred_codecs: Optional[Iterable[str]] = None,
+        on_answered: Optional[Callback] = None,
+        on_failed: Optional[Callback] = None,
+        on_ended: Optional[Callback] = None,
+    ) -> None:
+        if not 0 < setup_timeout < PROCEEDING_TTL:
+            # Past Timer C the client has already cancelled the call itself
+            raise ValueError(
+                f"setup_timeout must be between 0 and {PROCEEDING_TTL:g} seconds"
+            )
+        self.username = username
+        self.password = password
+        self.server = server
+        self.port = port
+        self.max_concurrent = max_concurrent
+        self.per_destination = per_destination
+        self.setup_timeout = setup_timeout
+        self.max_retries = max_retries
+        self.preferred_codecs = preferred_codecs
+        self.on_answered = on_answered
+        self.on_failed = on_failed
+        self.on_ended = on_ended
+
+        self.logger = logging.getLogger(__name__)
+        self._bucket = TokenBucket(cps, burst)
+        self._slots: List[_Slot] = []
+        self._idle: List[_Slot] = []
+        self._pending: Deque[OutboundCall] = deque()
+        self._blocked: Dict[str, Deque[OutboundCall]] = (
+            {}
+        )  # Destination -> calls waiting for its cap
+        self._active: DefaultDict[str, int] = defaultdict(
+            int
+        )  # Destination -> calls dialing or answered
+        self._timers: List[Timer] = []  # (due, sequence, function, args)
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.dialed = 0
+        self.answered = 0
+        self.failed = 0
+        self.retried = 0
+        self.timeouts = 0
+
+    # --- Pool ---
+
+    def start(self) -> "Dialer":
+        """Register the client pool and start dialing queued calls"""
+        if self._running:
+            return self
+        for _ in range(self.max_concurrent):
+            client = SimpleSIPClient(
+                self.username, self.password, self.server, port=self.port, local_port=0
+            )
+            client.local_rtp_port = 0
+            if self.preferred_codecs:
+                client.preferred_codecs = list(self.preferred_codecs)
+            client.connect()
+            slot = _Slot(self, client)
+            self._slots.append(slot)
+            self._idle.append(slot)
+        time.sleep(0.2)  # Let registrations complete
+
+        self._running = True
+        self._thread = threading.Thread(target=self._scheduler_thread, daemon=True)
+        self._thread.start()
+        self.logger.info(
+            "📞 Dialer started: %s clients, %g calls/s",
+            self.max_concurrent,
+            self._bucket.rate,
+        )
+        return self
+
+    def stop(self) -> None:
+        """Stop dialing, cancel calls that are still ringing and close the pool"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        with self._lock:
+            calls = [slot.call for slot in self._slots if slot.call is not None]
+            calls += list(self._pending)
+            for blocked in self._blocked.values():
+                calls += list(blocked)
+            calls += [
+                args[0]
+                for _, _, function, args in self._timers
+                if function == self._requeue
+            ]
+        for call in calls:
+            self.cancel(call)
+        for slot in self._slots:
+            try:
+                slot.client.disconnect()
+            except Exception:
+                pass
+        self._slots = []
+        self._idle = []
+
+    # --- Queue ---
+
+    def dial(self, destination: str) -> OutboundCall:
+        """Queue a call to ``destination`` (extension, number or sip: URI)
+
+        Returns:
+            OutboundCall tracking it
+        """
+        call = OutboundCall(self, destination)
+        with self._lock:
+            self._pending.append(call)
+        self._wakeup.set()
+        return call
+
+    def dial_many(self, destinations: Iterable[str]) -> List[OutboundCall]:
+        """Queue a call to each destination, in order"""
+        calls = [OutboundCall(self, destination) for destination in destinations]
+        with self._lock:
+            self._pending.extend(calls)
+        self._wakeup.set()
+        return calls
+
+    def cancel(self, call: OutboundCall) -> None:
+        """Drop a queued call, CANCEL a ringing one or hang up an answered one"""
+        with self._lock:
+            if call.state == "queued":
+                # Skipped wherever it is queued
+                call.state = "cancelled"
+                call._settled.set()
+                return
+            if call.state not in ("dialing", "answered"):
+                return
+            client = call.client
+            answered = call.state == "answered"
+            if not answered:
+                slot = self._slot_of(call)
+                self._abandon(call)
+                call.state = "cancelled"
+                self._release(slot)
+                metrics.DIALER_ATTEMPTS.labels("cancelled").inc()
+                call._settled.set()
+        if answered and client is not None:
+            client.hangup_call()  # The state listener records the end
+
+    def stats(self) -> Dict[str, int]:
+        """Counts of queued, dialing and answered calls and attempt outcomes"""
+        with self._lock:
+            calls = [slot.call for slot in self._slots if slot.call is not None]
+            return {
+                "queued": len(self._pending)
+                + sum(len(q) for q in self._blocked.values())
+                + sum(
+                    1 for _, _, function, _ in self._timers if function == self._requeue
+                ),
+                "dialing": sum(1 for call in calls if call.state == "dialing"),
+                "answered_now": sum(1 for call in calls if call.state == "answered"),
+                "idle_clients": len(self._idle),
+                "dialed": self.dialed,
+                "answered": self.answered,
+                "failed": self.failed,
+                "retried": self.retried,
+                "timeouts": self.timeouts,
+            }
+
+    # --- Scheduler ---
+
+    def _scheduler_thread(self) -> None:
+        while self._running:
+            try:
+                delay = self._dispatch()
+            except Exception as e:
+                self.logger.error("❌ Dialer error: %s", e)
+                delay = 0.1
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def _dispatch(self) -> float:
+        """Run due timers and start every call a free client and token allow
+
+        Returns:
+            Seconds until there may be more to do
+        """
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > now:
+                    break
+                _, _, function, args = heapq.heappop(self._timers)
+            function(*args)
+
+        unsent = []
+        with self._lock:
+            while self._idle:
+                call = self._next_call()
+                if call is None:
+                    break
+                if not self._bucket.take(now):
+                    self._pending.appendleft(call)
+                    break
+                if not self._place(self._idle.pop(), call):
+                    unsent.append(call)
+
+            delay = 0.5
+            if self._idle and self._pending:
+                delay = self._bucket.wait_time(now)
+            if self._timers:
+                delay = min(delay, self._timers[0][0] - now)
+        for call in unsent:
+            self._notify(self.on_failed, call)
+        return max(delay, 0.0)
+
+    def _next_call(self) -> Optional[OutboundCall]:
+        """Next queued call whose destination is below its cap"""
+        while self._pending:
+            call = self._pending.popleft()
+            if call.state != "queued":
+                continue  # Cancelled while queued
+            if (
+                self.per_destination is not None
+                and self._active[call.destination] >= self.per_destination
+            ):
+                self._blocked.setdefault(call.destination, deque()).append(call)
+                continue
+            return call
+        return None
+
+    def _place(self, slot: _Slot, call: OutboundCall) -> bool:
+        """Send the INVITE of ``call`` from ``slot``'s client
+
+        Returns:
+            False if it could not be sent
+        """
+        client = slot.client
+        call.attempts += 1
+        call.client = client
+        call.dialed_at = time.monotonic()
+        self.dialed += 1
+        call_id = client.make_call(call.destination)
+        if not call_id:
+            self._idle.append(slot)
+            metrics.DIALER_ATTEMPTS.labels("failed").inc()
+            self._settle(call, "failed", "error")
+            return False
+        slot.call = call
+        call.call_id = call_id
+        call.state = "dialing"
+        self._active[call.destination] += 1
+        self._schedule(self.setup_timeout, self._setup_timeout, slot, call.call_id)
+        return True
+
+    def _schedule(self, delay: float, function: Callable[..., Any], *args: Any) -> None:
+        heapq.heappush(
+            self._timers,
+            (time.monotonic() + delay, next(self._sequence), function, args),
+        )
+
+    def _requeue(self, call: OutboundCall) -> None:
+        """Put a call that got a 491 back at the front of the queue"""
+        with self._lock:
+            if call.state == "queued":
+                self._pending.appendleft(call)
+
+    def _setup_timeout(self, slot: _Slot, call_id: str) -> None:
+        with self._lock:
+            call = slot.call
+            if call is None or call.call_id != call_id or call.state != "dialing":
+                return
+            self._abandon(call)
+            self._release(slot)
+            self.timeouts += 1
+            metrics.DIALER_ATTEMPTS.labels("timeout").inc()
+            self.logger.info(
+                "🚫 Dialer: no answer from %s in %gs",
+                call.destination,
+                self.setup_timeout,
+            )
+            callback = self._settle(call, "failed", "timeout")
+        self._notify(callback, call)
+
+    # --- Callbacks from client threads ---
+
+    def _answered(self, slot: _Slot, call_id: str) -> None:
+        with self._lock:
+            call = slot.call
+            if call is None or call.call_id != call_id or call.state != "dialing":
+                return
+            call.state = "answered"
+            call.answered_at = time.monotonic()
+            self.answered += 1
+            metrics.DIALER_ATTEMPTS.labels("answered").inc()
+            call._settled.set()
+        self._notify(self.on_answered, call)
+
+    def _failed(self, slot: _Slot, call_id: str, status: int) -> None:
+        with self._lock:
+            call = slot.call
+            if call is None or call.call_id != call_id or call.state != "dialing":
+                return
+            self._release(slot)
+            if status == 491 and call.attempts <= self.max_retries:
+                # Request Pending: try again after a random 2.1-4s (RFC 3261 14.1)
+                call.state = "queued"
+                self.retried += 1
+                metrics.DIALER_ATTEMPTS.labels("retried").inc()
+                self._schedule(random.uniform(2.1, 4.0), self._requeue, call)
+                callback = None
+            else:
+                metrics.DIALER_ATTEMPTS.labels("failed").inc()
+                callback = self._settle(call, "failed", status)
+        self._wakeup.set()
+        self._notify(callback, call)
+
+    def _ended(self, slot: _Slot) -> None:
+        with self._lock:
+            call = slot.call
+            if call is None or call.state != "answered":
+                return  # Unanswered calls are settled by _failed or the setup timeout
+            call.state = "ended"
+            self._release(slot)
+        self._wakeup.set()
+        self._notify(self.on_ended, call)
+
+    # --- Helpers; called with the lock held ---
+
+    def _abandon(self, call: OutboundCall) -> None:
+        """CANCEL an unanswered call, or drop it if there is no INVITE left to cancel"""
+        client = call.client
+        assert client is not None  # Set when the call is placed
+        if not client.cancel_call():
+            self.logger.warning(
+                "⚠️ Dialer: no INVITE to CANCEL for %s, dropping the call",
+                call.destination,
+            )
+            client._cleanup_call_state()
+
+    def _slot_of(self, call: OutboundCall) -> Optional[_Slot]:
+        for slot in self._slots:
+            if slot.call is call:
+                return slot
+        return None
+
+    def _release(self, slot: Optional[_Slot]) -> None:
+        """Return a slot to the pool and let a call blocked on its destination go"""
+        if slot is None or slot.call is None:
+            return
+        destination = slot.call.destination
+        slot.call = None
+        self._idle.append(slot)
+        self._active[destination] -= 1
+        if self._active[destination] <= 0:
+            del self._active[destination]
+        blocked = self._blocked.get(destination)
+        if blocked:
+            self._pending.appendleft(blocked.popleft())
+            if not blocked:
+                del self._blocked[destination]
+        self._wakeup.set()
+
+    def _settle(
+        self, call: OutboundCall, state: str, status: Union[int, str, None]
+    ) -> Optional[Callback]:
+        call.state = state
+        call.status = status
+        if state == "failed":
+            self.failed += 1
+        call._settled.set()
+        return self.on_failed if state == "failed" else None
+
+    def _notify(self, callback: Optional[Callback], call: OutboundCall) -> None:
+        if callback is None:
+            return
+        try:
+            callback(call)
+        except Exception as e:
+            self.logger.error("❌ Dialer callback error: %s", e)
+
+    def __enter__(self) -> "Dialer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
@@ -0,0 +1,265 @@
+"""
+RFC 4733 (formerly RFC 2833) telephone-event DTMF.
+
+DTMFSender queues digit strings and sends each event from its own scheduler
+thread: a start packet with the marker bit, interim updates every packet
+interval and three end packets, all sharing one event timestamp. The caller
+never waits for a tone to finish. Tones longer than the 16-bit duration field
+are sent as consecutive segments, each with its own timestamp (RFC 4733
+section 2.5.1.3).
+
+DTMFReceiver turns the packet stream back into exactly one callback per
+keypress, de-duplicating interim and retransmitted end packets by event
+timestamp and joining the segments of long events. An event whose end
+packets were all lost is reported once no packet has updated it for
+END_TIMEOUT seconds.
+"""
+
+import queue
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .client import SimpleSIPClient
+
+
+DTMF_EVENTS = "0123456789*#ABCD"
+DTMF_EVENT_CODES = {digit: code for code, digit in enumerate(DTMF_EVENTS)}
+
+END_FLAG = 0x80
+END_PACKET_COUNT = 3  # RFC 4733 section 2.5.1.4
+MAX_SEGMENT_DURATION = 0xFFFF  # Largest duration field, in clock ticks
+END_TIMEOUT = 0.25  # Seconds without an update before a lost end is assumed
+RTP_CLOCK_RATE = 8000  # Default; events use the clock of the audio codec
+
+
+class DTMFSender:
+    """Scheduled telephone-event sender for one SimpleSIPClient
+
+    Args:
+        client: SimpleSIPClient the events are sent on
+        payload_type: Negotiated telephone-event payload type
+        packet_interval: Milliseconds between packets of one event
+        volume: Power level in -dBm0 (0-63)
+        clock_rate: RTP clock of the negotiated audio codec
+    """
+
+    def __init__(
+        self,
+        client: "SimpleSIPClient",
+        payload_type: int = 101,
+        packet_interval: int = 20,
+        volume: int = 10,
+        clock_rate: int = RTP_CLOCK_RATE,
+    ) -> None:
+        self.client = client
+        self.payload_type = payload_type
+        self.clock_rate = clock_rate
+        self.packet_interval = packet_interval
+        self.volume = volume
+        self.events_sent = 0
+        self._queue: "queue.Queue[Tuple[str, int, int]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def queue_digits(self, digits: str, duration: int = 100, gap: int = 50) -> int:
+        """Queue a string of digits; returns the number of digits accepted
+
+        Args:
+            digits: Any of 0-9, *, #, A-D; other characters are skipped
+            duration: Tone length in milliseconds
+            gap: Pause after each tone in milliseconds
+        """
+        accepted = 0
+        for digit in str(digits).upper():
+            if digit in DTMF_EVENT_CODES:
+                self._queue.put((digit, duration, gap))
+                accepted += 1
+
+        if accepted:
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+        return accepted
+
+    def clear(self) -> None:
+        """Drop digits that have not started playing yet"""
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        client = self.client
+        while client.running:
+            try:
+                digit, duration, gap = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+
+            if not client.remote_rtp_info:
+                continue
+
+            try:
+                self._send_event(DTMF_EVENT_CODES[digit], duration)
+                self.events_sent += 1
+                client.logger.debug("DTMF sent: %s (%sms)", digit, duration)
+            except Exception as e:
+                client.logger.error("Error sending DTMF: %s", e)
+
+            if gap > 0:
+                time.sleep(gap / 1000.0)
+
+    def _send_event(self, event: int, duration_ms: int) -> None:
+        client = self.client
+        interval = self.packet_interval / 1000.0
+        step = self.clock_rate * self.packet_interval // 1000
+        total = self.clock_rate * duration_ms // 1000
+
+        # One timestamp per segment, starting at the media clock at tone start
+        start = timestamp = client.rtp_timestamp
+        remaining = total
+        next_send = time.monotonic()
+        marker = True
+
+        while True:
+            segment = min(remaining, MAX_SEGMENT_DURATION)
+            final = segment == remaining
+            duration = 0
+            while duration + step < segment:
+                duration += step
+                payload = struct.pack("!BBH", event, self.volume & 0x3F, duration)
+                client._send_rtp_event(payload, self.payload_type, timestamp, marker)
+                marker = False
+
+                next_send += interval
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            if final:
+                break
+
+            # Full segment: report its whole length, then continue the tone
+            # from a timestamp that follows it
+            payload = struct.pack("!BBH", event, self.volume & 0x3F, segment)
+            client._send_rtp_event(payload, self.payload_type, timestamp, marker)
+            marker = False
+            timestamp = (timestamp + segment) & 0xFFFFFFFF
+            remaining -= segment
+
+        payload = struct.pack("!BBH", event, END_FLAG | (self.volume & 0x3F), segment)
+        for _ in range(END_PACKET_COUNT):
+            client._send_rtp_event(payload, self.payload_type, timestamp, marker)
+            marker = False
+
+        # Make sure the next event (or audio) does not reuse this timestamp
+        client._advance_rtp_timestamp(start, total)
+
+
+class DTMFReceiver:
+    """Collapse received telephone-event packets into one event per digit
+
+    Args:
+        callback: Called as ``callback(digit, duration_ms)`` once per keypress
+        clock_rate: RTP clock of the negotiated audio codec
+        end_timeout: Seconds without an update after which an event whose end
+            packets were lost is reported
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[str, int], None]] = None,
+        clock_rate: int = RTP_CLOCK_RATE,
+        end_timeout: float = END_TIMEOUT,
+    ) -> None:
+        self.callback = callback
+        self.clock_rate = clock_rate
+        self.end_timeout = end_timeout
+        self.events_received = 0
+        self._current_timestamp: Optional[int] = None
+        self._current_event: Optional[int] = None
+        self._current_duration = 0
+        self._earlier_segments = 0  # Duration of completed segments of a long event
+        self._last_update = 0.0
+        self._last_completed: Optional[int] = None
+
+    def handle_packet(
+        self, payload: bytes, timestamp: int, now: Optional[float] = None
+    ) -> Optional[str]:
+        """Process one telephone-event payload; returns the digit when it completes"""
+        if not payload or len(payload) < 4:
+            return None
+
+        event, flags, duration = struct.unpack("!BBH", payload[:4])
+        if event >= len(DTMF_EVENTS):
+            return None
+
+        if timestamp == self._last_completed:
+            return None  # Retransmitted end packet of a reported event
+
+        completed = None
+        current = self._current_timestamp
+        if current is not None and timestamp != current:
+            if (
+                event == self._current_event
+                and timestamp == (current + MAX_SEGMENT_DURATION) & 0xFFFFFFFF
+            ):
+                # Next segment of a long event
+                self._earlier_segments += MAX_SEGMENT_DURATION
+                self._current_duration = 0
+            else:
+                # New event before the previous one ended: its end packets were lost
+                completed = self._complete()
+
+        self._current_timestamp = timestamp
+        self._current_event = event
+        self._current_duration = max(self._current_duration, duration)
+        self._last_update = time.monotonic() if now is None else now
+
+        if flags & END_FLAG:
+            completed = self._complete()
+        return completed
+
+    def expire(self, now: Optional[float] = None) -> Optional[str]:
+        """Report the current event if ``end_timeout`` seconds passed without an update
+
+        Covers events whose end packets were all lost and that no later event
+        follows. Returns the digit, or None.
+        """
+        if self._current_timestamp is None:
+            return None
+        if (
+            time.monotonic() if now is None else now
+        ) - self._last_update < self.end_timeout:
+            return None
+        return self._complete()
+
+    def _complete(self) -> str:
+        assert self._current_event is not None
+        digit = DTMF_EVENTS[self._current_event]
+        duration_ms = (
+            (self._earlier_segments + self._current_duration) * 1000 // self.clock_rate
+        )
+
+        self._last_completed = self._current_timestamp
+        self._current_timestamp = None
+        self._current_event = None
+        self._current_duration = 0
+        self._earlier_segments = 0
+        self.events_received += 1
+
+        if self.callback:
+            self.callback(digit, duration_ms)
+        return digit
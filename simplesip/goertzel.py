@@ -0,0 +1,313 @@
+"""
+In-band DTMF detection with a vectorized Goertzel filter bank.
+
+The eight DTMF frequencies are evaluated for a whole frame at once as a single
+matrix product against precomputed cosine/sine bases, which gives the same
+power as running the Goertzel recurrence per tone. Frames from many calls are
+stacked into one matrix and analysed in the same product: clients hand their
+frames to the process-wide BatchDetector, whose thread classifies everything
+that arrived in the last few milliseconds in one pass.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .dtmf import DTMF_EVENTS
+
+ROW_FREQUENCIES = (697.0, 770.0, 852.0, 941.0)
+COL_FREQUENCIES = (1209.0, 1336.0, 1477.0, 1633.0)
+
+# Keypad layout indexed [row][column]
+KEYPAD = ("123A", "456B", "789C", "*0#D")
+
+
+class GoertzelDetector:
+    """Stateless DTMF classifier for fixed-length PCM frames
+
+    Args:
+        min_energy: Minimum mean square sample value of a frame to consider
+        min_tone_ratio: Fraction of the frame energy the two strongest tones
+                        must hold (1.0 for a clean dual tone)
+        max_normal_twist_db: Maximum dB the column tone may be below the row tone
+        max_reverse_twist_db: Maximum dB the row tone may be below the column tone
+        min_peak_ratio_db: dB the strongest row/column must exceed the runner-up by
+    """
+
+    def __init__(
+        self,
+        min_energy: float = 1e4,
+        min_tone_ratio: float = 0.5,
+        max_normal_twist_db: float = 8.0,
+        max_reverse_twist_db: float = 4.0,
+        min_peak_ratio_db: float = 6.0,
+    ) -> None:
+        self.min_energy = min_energy
+        self.min_tone_ratio = min_tone_ratio
+        self.max_normal_twist = 10 ** (max_normal_twist_db / 10)
+        self.max_reverse_twist = 10 ** (max_reverse_twist_db / 10)
+        self.min_peak_ratio = 10 ** (min_peak_ratio_db / 10)
+        self._bases: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def _basis(self, frame_length: int, sample_rate: int) -> np.ndarray:
+        key = (frame_length, sample_rate)
+        basis = self._bases.get(key)
+        if basis is None:
+            freqs = np.array(ROW_FREQUENCIES + COL_FREQUENCIES)
+            phase = 2 * np.pi * np.outer(np.arange(frame_length), freqs) / sample_rate
+            basis = np.hstack((np.cos(phase), np.sin(phase))).astype(np.float32)
+            self._bases[key] = basis
+        return basis
+
+    def detect(self, frames: Any, sample_rate: int = 8000) -> np.ndarray:
+        """Classify each row of ``frames`` (frames x samples)
+
+        Returns an int array with the DTMF event code (index into
+        '0123456789*#ABCD') per frame, or -1 where no valid digit was found.
+        """
+        frames = np.asarray(frames, dtype=np.float32)
+        if frames.ndim == 1:
+            frames = frames[np.newaxis, :]
+        count, length = frames.shape
+        codes = np.full(count, -1, dtype=np.int16)
+
+        # Silence and quiet frames are rejected before touching the filter bank
+        energy = np.einsum("ij,ij->i", frames, frames)
+        loud = np.flatnonzero(energy >= self.min_energy * length)
+        if not loud.size:
+            return codes
+        frames, energy = frames[loud], energy[loud]
+
+        projection = frames @ self._basis(length, sample_rate)
+        power = projection[:, :8] ** 2 + projection[:, 8:] ** 2
+
+        rows, cols = power[:, :4], power[:, 4:]
+        row_idx = rows.argmax(axis=1)
+        col_idx = cols.argmax(axis=1)
+        index = np.arange(loud.size)
+        row_peak = rows[index, row_idx]
+        col_peak = cols[index, col_idx]
+        row_second = np.partition(rows, 2, axis=1)[:, 2]
+        col_second = np.partition(cols, 2, axis=1)[:, 2]
+
+        # A pure tone of amplitude A gives a power of (A*N/2)^2 and an energy
+        # of A^2*N/2, so 2*P/(N*E) is 1.0 for a clean dual tone.
+        tone_ratio = 2 * (row_peak + col_peak) / (length * energy)
+
+        valid = (
+            (tone_ratio >= self.min_tone_ratio)
+            & (col_peak * self.max_normal_twist >= row_peak)
+            & (row_peak * self.max_reverse_twist >= col_peak)
+            & (row_peak >= row_second * self.min_peak_ratio)
+            & (col_peak >= col_second * self.min_peak_ratio)
+        )
+
+        for i in np.flatnonzero(valid):
+            codes[loud[i]] = DTMF_EVENTS.index(KEYPAD[row_idx[i]][col_idx[i]])
+        return codes
+
+
+class InbandDTMFDetector:
+    """Per-call debouncing on top of a (possibly shared) GoertzelDetector
+
+    A digit is accepted after ``min_on_frames`` consecutive detections and
+    reported, with its duration, once ``min_off_frames`` frames without it
+    follow.
+
+    Args:
+        callback: Called as ``callback(digit, duration_ms)`` once per tone
+        detector: GoertzelDetector to use (default: the shared instance)
+        min_on_frames: Consecutive frames required to accept a digit
+        min_off_frames: Consecutive frames required to end it
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[str, int], None]] = None,
+        detector: Optional[GoertzelDetector] = None,
+        min_on_frames: int = 2,
+        min_off_frames: int = 2,
+    ) -> None:
+        self.callback = callback
+        self.detector = detector or get_goertzel_detector()
+        self.min_on_frames = min_on_frames
+        self.min_off_frames = min_off_frames
+        self.events_detected = 0
+        self._candidate = -1
+        self._candidate_frames = 0
+        self._active = -1
+        self._active_ms = 0.0
+        self._off_frames = 0
+
+    def process(self, pcm_data: bytes, sample_rate: int = 8000) -> Optional[str]:
+        """Analyse one frame of 16-bit PCM; returns a digit when one ends"""
+        samples = np.frombuffer(pcm_data, dtype=np.int16)
+        if not samples.size:
+            return None
+        code = int(self.detector.detect(samples, sample_rate)[0])
+        return self.update(code, samples.size * 1000.0 / sample_rate)
+
+    def update(self, code: int, frame_ms: float) -> Optional[str]:
+        """Advance the state machine with one classified frame"""
+        if self._active >= 0:
+            if code == self._active:
+                self._active_ms += frame_ms
+                self._off_frames = 0
+                return None
+            self._off_frames += 1
+            if self._off_frames < self.min_off_frames:
+                return None
+            return self._finish(code, frame_ms)
+
+        self._track_candidate(code, frame_ms)
+        return None
+
+    def _track_candidate(self, code: int, frame_ms: float) -> None:
+        if code < 0:
+            self._candidate, self._candidate_frames = -1, 0
+            return
+        if code == self._candidate:
+            self._candidate_frames += 1
+        else:
+            self._candidate, self._candidate_frames = code, 1
+
+        if self._candidate_frames >= self.min_on_frames:
+            self._active = code
+            self._active_ms = self._candidate_frames * frame_ms
+            self._off_frames = 0
+            self._candidate, self._candidate_frames = -1, 0
+
+    def _finish(self, code: int, frame_ms: float) -> str:
+        digit = DTMF_EVENTS[self._active]
+        duration_ms = int(self._active_ms)
+        self._active = -1
+        self._active_ms = 0.0
+        self._off_frames = 0
+        self.events_detected += 1
+
+        # The frame that ended this tone may already start the next one
+        self._track_candidate(code, frame_ms)
+
+        if self.callback:
+            self.callback(digit, duration_ms)
+        return digit
+
+
+Item = Tuple[InbandDTMFDetector, bytes, int]
+
+
+def process_batch(items: Sequence[Item]) -> List[Optional[str]]:
+    """Run one filter-bank pass over frames from many calls
+
+    Frames are grouped by detector, length and sample rate, each group is
+    classified with one matrix product, and the per-call state machines are
+    then advanced in the order of ``items``.
+
+    Args:
+        items: Sequence of (InbandDTMFDetector, pcm_bytes, sample_rate)
+
+    Returns:
+        List with the completed digit (or None) for each item
+    """
+    groups: Dict[Tuple[GoertzelDetector, int, int], List[int]] = {}
+    samples = []
+    for index, (state, pcm_data, sample_rate) in enumerate(items):
+        frame = np.frombuffer(pcm_data, dtype=np.int16)
+        samples.append(frame)
+        if frame.size:
+            key = (state.detector, frame.size, sample_rate)
+            groups.setdefault(key, []).append(index)
+
+    codes = [-1] * len(items)
+    for (detector, _, sample_rate), indices in groups.items():
+        frames = np.vstack([samples[i] for i in indices])
+        for i, code in zip(indices, detector.detect(frames, sample_rate)):
+            codes[i] = int(code)
+
+    results = []
+    for (state, _, sample_rate), frame, code in zip(items, samples, codes):
+        results.append(
+            state.update(code, frame.size * 1000.0 / sample_rate)
+            if frame.size
+            else None
+        )
+    return results
+
+
+class BatchDetector:
+    """Background thread that classifies frames from every call together
+
+    Frames submitted within ``interval`` of each other share one
+    process_batch() pass, so the cost of the filter bank is paid once per
+    batch rather than once per call. Digits are reported from this thread.
+
+    Args:
+        interval: Seconds to collect frames after the first one arrives
+    """
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self._pending: List[Item] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.frames = 0
+        self.errors = 0
+
+    def submit(
+        self, state: InbandDTMFDetector, pcm_data: bytes, sample_rate: int = 8000
+    ) -> None:
+        """Queue one frame of 16-bit PCM for ``state`` (an InbandDTMFDetector)"""
+        with self._lock:
+            self._pending.append((state, pcm_data, sample_rate))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def flush(self) -> None:
+        """Classify everything queued so far in the calling thread"""
+        with self._flush_lock:  # Batches of one call must not overlap
+            with self._lock:
+                items, self._pending = self._pending, []
+            if items:
+                try:
+                    process_batch(items)
+                except Exception:
+                    self.errors += 1
+                self.batches += 1
+                self.frames += len(items)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            time.sleep(self.interval)  # Let frames from other calls arrive
+            self.flush()
+
+
+_shared_detector: Optional[GoertzelDetector] = None
+_batch_detector: Optional[BatchDetector] = None
+_batch_detector_lock = threading.Lock()
+
+
+def get_goertzel_detector() -> GoertzelDetector:
+    """Return the process-wide detector (the basis matrices are shared)"""
+    global _shared_detector
+    if _shared_detector is None:
+        _shared_detector = GoertzelDetector()
+    return _shared_detector
+
+
+def get_batch_detector() -> BatchDetector:
+    """Return the process-wide BatchDetector, creating it on first use"""
+    global _batch_detector
+    if _batch_detector is None:
+        with _batch_detector_lock:
+            if _batch_detector is None:
+                _batch_detector = BatchDetector()
+    return _batch_detector
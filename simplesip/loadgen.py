@@ -0,0 +1,561 @@
+"""
+SIPp-style load generator that drives calls through SimpleSIPClient.
+
+Every call goes through the library's own signaling, codec and RTP code:
+a pool of ``max_concurrent`` clients (one call each at a time) is
+registered up front, and a single scheduler thread starts calls at the
+configured calls-per-second ramp, hangs them up after the hold time and
+cancels those that are not answered within the setup timeout.
+
+    simplesip-load --embedded --cps 20 --max-concurrent 50 --calls 500
+    simplesip-load --server 10.0.0.5 --user 1001 --password secret \\
+        --destination 1002 --cps 5 --ramp 30 --hold 10 --codec PCMU
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import math
+import queue
+import struct
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .client import CODEC_RTPMAP, CODEC_SAMPLE_RATES, SimpleSIPClient
+from .playback import Playback
+
+MEDIA_PATTERNS = ("silence", "tone", "none")
+
+Report = Dict[str, Any]
+Timer = Tuple[float, int, Callable[..., Any], Tuple[Any, ...]]
+
+
+def _percentiles(values: Sequence[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+    return {
+        "mean": sum(ordered) / len(ordered),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+
+class _Slot:
+    """One pooled client and the call it is currently running"""
+
+    def __init__(self, generator: "LoadGenerator", client: SimpleSIPClient) -> None:
+        self.generator = generator
+        self.client = client
+        self.call_id: Optional[str] = None
+        self.started = 0.0
+        self.answered: Optional[float] = None
+        self.playback: Optional[Playback] = None
+        client.call_manager = self
+
+    # Call manager interface used by SimpleSIPClient
+
+    def on_call_answered(self, call_id: str) -> None:
+        self.generator._answered(self, call_id)
+
+    def on_call_failed(self, call_id: str, status: int) -> None:
+        self.generator._finished(self, call_id, status)
+
+    def on_call_ended(self, call_id: str) -> None:
+        self.generator._finished(self, call_id, "remote_bye")
+
+    def on_incoming_call(self, call_id: str, from_uri: str) -> None:
+        pass
+
+
+class LoadGenerator:
+    """Drive outbound calls through a pool of SimpleSIPClient instances
+
+    Args:
+        server, port: SIP server to call through
+        username, password: Credentials used by every client
+        destination: Number or SIP URI to call
+        cps: Target calls per second
+        cps_start: Calls per second at the start of the ramp (default: cps)
+        ramp: Seconds to ramp linearly from cps_start to cps
+        max_concurrent: Size of the client pool, i.e. the concurrency limit
+        total_calls: Stop after this many call attempts
+        duration: Stop starting calls after this many seconds
+        hold_time: Seconds to keep each answered call up
+        setup_timeout: Seconds to wait for an answer before cancelling
+        codec: Offer only this codec (default: the client's preference)
+        ptime: Packetization time in milliseconds offered by every client
+        media: 'silence' or 'tone' is sent during the hold time; 'none'
+               sends nothing
+    """
+
+    def __init__(
+        self,
+        server: str,
+        port: int = 5060,
+        username: str = "load",
+        password: str = "load",
+        destination: str = "1000",
+        cps: float = 10.0,
+        cps_start: Optional[float] = None,
+        ramp: float = 0.0,
+        max_concurrent: int = 10,
+        total_calls: Optional[int] = None,
+        duration: Optional[float] = None,
+        hold_time: float = 5.0,
+        setup_timeout: float = 10.0,
+        codec: Optional[str] = None,
+        ptime: int = 20,
+        media: str = "silence",
+    ) -> None:
+        if total_calls is None and duration is None:
+            raise ValueError("Set total_calls, duration or both")
+        if media not in MEDIA_PATTERNS:
+            raise ValueError(f"media must be one of {MEDIA_PATTERNS}")
+        if codec is not None and codec not in CODEC_RTPMAP:
+            raise ValueError(f"codec must be one of {tuple(CODEC_RTPMAP)}")
+
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.destination = destination
+        self.cps = cps
+        self.cps_start = cps if cps_start is None else cps_start
+        self.ramp = ramp
+        self.max_concurrent = max_concurrent
+        self.total_calls = total_calls
+        self.duration = duration
+        self.hold_time = hold_time
+        self.setup_timeout = setup_timeout
+        self.codec = codec
+        self.ptime = ptime
+        self.media = media
+
+        self.logger = logging.getLogger(__name__)
+        self._slots: List[_Slot] = []
+        self._idle: "queue.SimpleQueue[_Slot]" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._timers: List[Timer] = []
+        self._timer_ids = itertools.count()
+        self._frames: Dict[Tuple[str, int], bytes] = {}
+
+        self.attempted = 0
+        self.answered = 0
+        self.completed = 0
+        self.skipped = 0
+        self.failures: Dict[str, int] = {}
+        self.setup_latencies: List[float] = []
+        self.rtp_received = 0
+        self.rtp_lost = 0
+        self.jitter_ms: List[float] = []
+        self.active = 0
+        self.peak_active = 0
+
+    # --- Pool ---
+
+    def _open_pool(self) -> None:
+        for _ in range(self.max_concurrent):
+            client = SimpleSIPClient(
+                self.username, self.password, self.server, port=self.port, local_port=0
+            )
+            client.local_rtp_port = 0
+            client.rtp_probes = False  # They would skew the loss and jitter figures
+            if self.codec:
+                client.preferred_codecs = [self.codec]
+            client.ptime = self.ptime
+            client.connect()
+            slot = _Slot(self, client)
+            self._slots.append(slot)
+            self._idle.put(slot)
+
+    def _close_pool(self) -> None:
+        for slot in self._slots:
+            try:
+                slot.client.disconnect()
+            except Exception:
+                pass
+
+    # --- Callbacks from client threads ---
+
+    def _answered(self, slot: _Slot, call_id: str) -> None:
+        with self._lock:
+            if slot.call_id != call_id or slot.answered is not None:
+                return
+            slot.answered = time.monotonic()
+            self.answered += 1
+            self.setup_latencies.append((slot.answered - slot.started) * 1000.0)
+            self._schedule(self.hold_time, self._hangup, slot, call_id)
+
+        if self.media != "none":
+            config = slot.client.get_audio_config()
+            ptime = config["ptime"]
+            frames = itertools.repeat(
+                self._frame(config["codec"], ptime),
+                max(1, int(self.hold_time * 1000 / ptime)),
+            )
+            slot.playback = Playback(
+                slot.client,
+                frames,
+                config["payload_type"],
+                ptime=ptime,
+                timestamp_increment=config["rtp_frame_size"],
+            ).start()
+
+    def _finished(self, slot: _Slot, call_id: str, outcome: Union[int, str]) -> None:
+        """Record the end of a call and return its client to the pool"""
+        with self._lock:
+            if slot.call_id != call_id:
+                return  # Late response for a call already accounted for
+            slot.call_id = None
+            self.active -= 1
+            if outcome == "completed" or (
+                outcome == "remote_bye" and slot.answered is not None
+            ):
+                self.completed += 1
+            else:
+                self.failures[str(outcome)] = self.failures.get(str(outcome), 0) + 1
+
+            if slot.answered is not None:
+                stats = slot.client.get_rtp_stats()
+                self.rtp_received += stats["packets_received"]
+                self.rtp_lost += stats["packets_lost"]
+                if stats["packets_received"] > 1:
+                    self.jitter_ms.append(stats["jitter_ms"])
+
+        if slot.playback is not None:
+            slot.playback.stop()
+            slot.playback = None
+        self._idle.put(slot)
+
+    # --- Scheduler ---
+
+    def _schedule(self, delay: float, function: Callable[..., Any], *args: Any) -> None:
+        heapq.heappush(
+            self._timers,
+            (time.monotonic() + delay, next(self._timer_ids), function, args),
+        )
+
+    def _run_timers(self) -> None:
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > time.monotonic():
+                    return
+                _, _, function, args = heapq.heappop(self._timers)
+            function(*args)
+
+    def _hangup(self, slot: _Slot, call_id: str) -> None:
+        if slot.call_id != call_id:
+            return
+        slot.client.hangup_call()
+        self._finished(slot, call_id, "completed")
+
+    def _check_setup(self, slot: _Slot, call_id: str) -> None:
+        if slot.call_id != call_id or slot.answered is not None:
+            return
+        if not slot.client.cancel_call():
+            slot.client._cleanup_call_state()
+        self._finished(slot, call_id, "timeout")
+
+    def _start_call(self) -> None:
+        try:
+            slot = self._idle.get_nowait()
+        except queue.Empty:
+            self.skipped += 1
+            return
+
+        client = slot.client
+        with self._lock:
+            self.attempted += 1
+            slot.started = time.monotonic()
+            slot.answered = None
+            call_id = client.make_call(self.destination)
+            if not call_id:
+                self.failures["error"] = self.failures.get("error", 0) + 1
+                self._idle.put(slot)
+                return
+            slot.call_id = call_id
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            self._schedule(self.setup_timeout, self._check_setup, slot, call_id)
+
+    def _rate_at(self, elapsed: float) -> float:
+        if self.ramp and elapsed < self.ramp:
+            return self.cps_start + (self.cps - self.cps_start) * elapsed / self.ramp
+        return self.cps
+
+    def _frame(self, codec: str, ptime: int) -> bytes:
+        frame = self._frames.get((codec, ptime))
+        if frame is None:
+            rate = CODEC_SAMPLE_RATES[codec]
+            count = rate * ptime // 1000
+            if self.media == "tone":
+                samples = (
+                    int(6000 * math.sin(2 * math.pi * 440 * n / rate))
+                    for n in range(count)
+                )
+                pcm = struct.pack(f"<{count}h", *samples)
+            else:
+                pcm = bytes(count * 2)
+            # A codec of its own, so G.722 framing leaves every call's encoder
+            # state alone
+            encode, _ = self._slots[0].client._payload_codec()
+            frame = bytes(encode(pcm, codec))
+            self._frames[(codec, ptime)] = frame
+        return frame
+
+    def run(self) -> Report:
+        """Run the load test and return the report dict"""
+        self._open_pool()
+        time.sleep(0.2)  # Let registrations complete
+
+        cpu_start = time.process_time()
+        start = time.monotonic()
+        credit = 0.0
+        last = start
+
+        try:
+            while True:
+                now = time.monotonic()
+                elapsed = now - start
+                if self.duration is not None and elapsed >= self.duration:
+                    break
+                if (
+                    self.total_calls is not None
+                    and self.attempted + self.skipped >= self.total_calls
+                ):
+                    break
+
+                credit += (now - last) * self._rate_at(elapsed)
+                last = now
+                while credit >= 1.0:
+                    credit -= 1.0
+                    self._start_call()
+                    if (
+                        self.total_calls is not None
+                        and self.attempted + self.skipped >= self.total_calls
+                    ):
+                        break
+
+                self._run_timers()
+                time.sleep(0.001)
+
+            call_window = time.monotonic() - start
+            drain_deadline = (
+                time.monotonic() + self.hold_time + self.setup_timeout + 1.0
+            )
+            while self.active > 0 and time.monotonic() < drain_deadline:
+                self._run_timers()
+                time.sleep(0.005)
+        finally:
+            cpu_seconds = time.process_time() - cpu_start
+            wall_seconds = time.monotonic() - start
+            self._close_pool()
+
+        return self.report(call_window, wall_seconds, cpu_seconds)
+
+    def report(
+        self, call_window: float, wall_seconds: float, cpu_seconds: float
+    ) -> Report:
+        """Summary of the run as a dict"""
+        total_rtp = self.rtp_received + self.rtp_lost
+        finished = self.completed + sum(self.failures.values())
+        return {
+            "calls": {
+                "attempted": self.attempted,
+                "answered": self.answered,
+                "completed": self.completed,
+                "failed": sum(self.failures.values()),
+                "skipped_no_free_slot": self.skipped,
+                "peak_concurrent": self.peak_active,
+                "achieved_cps": self.attempted / call_window if call_window else 0.0,
+            },
+            "failures": dict(sorted(self.failures.items())),
+            "setup_latency_ms": _percentiles(self.setup_latencies),
+            "rtp": {
+                "packets_received": self.rtp_received,
+                "packets_lost": self.rtp_lost,
+                "loss_percent": 100.0 * self.rtp_lost / total_rtp if total_rtp else 0.0,
+                "jitter_ms": _percentiles(self.jitter_ms),
+            },
+            "cpu": {
+                "process_seconds": cpu_seconds,
+                "wall_seconds": wall_seconds,
+                "utilisation_percent": (
+                    100.0 * cpu_seconds / wall_seconds if wall_seconds else 0.0
+                ),
+                "ms_per_call": 1000.0 * cpu_seconds / finished if finished else None,
+            },
+        }
+
+
+def format_report(report: Report) -> str:
+    """Render a report dict as text"""
+    calls = report["calls"]
+    lines = [
+        f"Calls: {calls['attempted']} attempted, {calls['answered']} answered, "
+        f"{calls['completed']} completed, {calls['failed']} failed, "
+        f"{calls['skipped_no_free_slot']} skipped (no free slot)",
+        f"Rate: {calls['achieved_cps']:.1f} calls/s, "
+        f"peak {calls['peak_concurrent']} concurrent",
+    ]
+    if report["failures"]:
+        lines.append(
+            "Failures: "
+            + ", ".join(
+                f"{status}={count}" for status, count in report["failures"].items()
+            )
+        )
+
+    latency = report["setup_latency_ms"]
+    if latency:
+        lines.append(
+            f"Setup latency (ms): mean {latency['mean']:.1f}  "
+            f"p50 {latency['p50']:.1f}  p90 {latency['p90']:.1f}  "
+            f"p99 {latency['p99']:.1f}  max {latency['max']:.1f}"
+        )
+
+    rtp = report["rtp"]
+    jitter = rtp["jitter_ms"]
+    line = (
+        f"RTP: {rtp['packets_received']} received, {rtp['packets_lost']} lost "
+        f"({rtp['loss_percent']:.2f}%)"
+    )
+    if jitter:
+        line += f", jitter p50 {jitter['p50']:.2f}ms p99 {jitter['p99']:.2f}ms"
+    lines.append(line)
+
+    cpu = report["cpu"]
+    per_call = f"{cpu['ms_per_call']:.1f}ms" if cpu["ms_per_call"] is not None else "-"
+    lines.append(
+        f"CPU: {cpu['process_seconds']:.2f}s over {cpu['wall_seconds']:.1f}s "
+        f"({cpu['utilisation_percent']:.0f}%), {per_call} per call"
+    )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of the simplesip-load command"""
+    parser = argparse.ArgumentParser(
+        prog="simplesip-load",
+        description="Drive SIP calls through simplesip and report limits",
+    )
+    parser.add_argument("--server", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5060)
+    parser.add_argument("--user", default="load")
+    parser.add_argument("--password", default="load")
+    parser.add_argument(
+        "--destination", default="1000", help="Number or SIP URI to call"
+    )
+    parser.add_argument(
+        "--embedded",
+        action="store_true",
+        help="Call an in-process SIPTestServer instead of --server",
+    )
+    parser.add_argument(
+        "--answer-delay",
+        type=float,
+        default=0.0,
+        help="Answer delay of the embedded server",
+    )
+    parser.add_argument(
+        "--cps", type=float, default=10.0, help="Target calls per second"
+    )
+    parser.add_argument(
+        "--cps-start",
+        type=float,
+        default=None,
+        help="Calls per second at the start of the ramp",
+    )
+    parser.add_argument(
+        "--ramp",
+        type=float,
+        default=0.0,
+        help="Seconds to ramp from --cps-start to --cps",
+    )
+    parser.add_argument("--max-concurrent", type=int, default=10)
+    parser.add_argument("--calls", type=int, default=None, help="Total call attempts")
+    parser.add_argument(
+        "--duration", type=float, default=None, help="Seconds to keep starting calls"
+    )
+    parser.add_argument(
+        "--hold", type=float, default=5.0, help="Seconds each call stays up"
+    )
+    parser.add_argument("--setup-timeout", type=float, default=10.0)
+    parser.add_argument("--codec", choices=tuple(CODEC_RTPMAP), default=None)
+    parser.add_argument(
+        "--ptime", type=int, default=20, help="Packetization time in milliseconds"
+    )
+    parser.add_argument("--media", choices=MEDIA_PATTERNS, default="silence")
+    parser.add_argument(
+        "--json", metavar="PATH", help="Also write the report as JSON ('-' for stdout)"
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    if args.calls is None and args.duration is None:
+        args.calls = 100
+
+    embedded = None
+    server, port = args.server, args.port
+    if args.embedded:
+        from .server import SIPTestServer
+
+        embedded = SIPTestServer(
+            port=0,
+            codecs=tuple(CODEC_RTPMAP),
+            answer_delay=args.answer_delay,
+            media="echo",
+        ).start()
+        server, port = embedded.address
+
+    generator = LoadGenerator(
+        server,
+        port,
+        username=args.user,
+        password=args.password,
+        destination=args.destination,
+        cps=args.cps,
+        cps_start=args.cps_start,
+        ramp=args.ramp,
+        max_concurrent=args.max_concurrent,
+        total_calls=args.calls,
+        duration=args.duration,
+        hold_time=args.hold,
+        setup_timeout=args.setup_timeout,
+        codec=args.codec,
+        ptime=args.ptime,
+        media=args.media,
+    )
+    try:
+        report = generator.run()
+    finally:
+        if embedded is not None:
+            embedded.stop()
+
+    print(format_report(report))
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["calls"]["attempted"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Opt-in logging setup for high call rates.
+
+The library never configures logging on its own. ``configure_logging()``
+attaches a queue handler to the ``simplesip`` logger so the signaling and
+media threads only enqueue log records; formatting and stream writes happen
+on a background listener thread. Records can carry ``call_id``, ``method``,
+``status`` and ``category`` fields (passed through ``extra=``), and
+per-category sampling and rate limits keep per-packet events such as packet
+loss from flooding the queue.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+LOGGER_NAME = "simplesip"
+
+# Record attributes rendered as structured fields
+FIELDS = ("call_id", "method", "status", "category")
+
+# Categories used by the library for high-frequency events
+RTP_LOSS = "rtp.loss"
+SIP_MESSAGE = "sip.message"
+AUDIO = "audio"
+
+# Default limits, in records per second, applied by configure_logging()
+DEFAULT_RATE_LIMITS: Dict[str, Optional[float]] = {
+    RTP_LOSS: 5,
+    AUDIO: 5,
+}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Text formatter that appends the structured fields present on a record
+
+    Output looks like ``2024-01-01 12:00:00,000 - INFO - message
+    [call_id=abc method=INVITE]``; records without fields format as before.
+    """
+
+    def __init__(
+        self,
+        fmt: str = "%(asctime)s - %(levelname)s - %(message)s",
+        datefmt: Optional[str] = None,
+    ) -> None:
+        super().__init__(fmt, datefmt)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = [
+            f"{name}={getattr(record, name)}"
+            for name in FIELDS
+            if getattr(record, name, None) is not None
+        ]
+        if getattr(record, "suppressed", 0):
+            fields.append(f"suppressed={getattr(record, 'suppressed')}")
+        return f"{text} [{' '.join(fields)}]" if fields else text
+
+
+class JSONFormatter(logging.Formatter):
+    """Formatter that writes one JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Sample and rate-limit records by their ``category`` attribute
+
+    Records without a category always pass. Dropped records are counted and
+    the count is attached as ``suppressed`` to the next record of the same
+    category that gets through.
+
+    Args:
+        rate_limits: Mapping of category to records per second (token bucket
+                     with a burst of one second's worth)
+        sample_rates: Mapping of category to the fraction of records to keep
+    """
+
+    def __init__(
+        self,
+        rate_limits: Optional[Mapping[str, float]] = None,
+        sample_rates: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        super().__init__()
+        self.rate_limits = dict(rate_limits or {})
+        self.sample_rates = dict(sample_rates or {})
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = getattr(record, "category", None)
+        if category is None:
+            return True
+
+        sample_rate = self.sample_rates.get(category)
+        if sample_rate is not None and random.random() >= sample_rate:
+            self._drop(category)
+            return False
+
+        rate = self.rate_limits.get(category)
+        if rate is not None and not self._take(category, rate):
+            self._drop(category)
+            return False
+
+        if self._suppressed.get(category):
+            with self._lock:
+                setattr(record, "suppressed", self._suppressed.pop(category, 0))
+        return True
+
+    def _take(self, category: str, rate: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(category, (rate, now))
+            tokens = min(rate, tokens + (now - last) * rate)
+            if tokens < 1.0:
+                self._buckets[category] = (tokens, now)
+                return False
+            self._buckets[category] = (tokens - 1.0, now)
+            return True
+
+    def _drop(self, category: str) -> None:
+        with self._lock:
+            self._suppressed[category] = self._suppressed.get(category, 0) + 1
+
+    def suppressed(self) -> Dict[str, int]:
+        """Records dropped per category since they were last reported"""
+        with self._lock:
+            return dict(self._suppressed)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread
+
+    The stock handler formats every record before enqueueing it. Here the
+    record is queued with its arguments untouched, so the producing thread
+    only pays for creating the record. Arguments are therefore formatted
+    later: pass values, not objects that are mutated right after logging.
+    """
+
+    def __init__(self, record_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # A full queue means the listener cannot keep up; drop rather than block
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LoggingSetup:
+    """Handler, listener and filter installed by configure_logging()"""
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        queue_handler: DeferredQueueHandler,
+        listener: logging.handlers.QueueListener,
+        rate_filter: RateLimitFilter,
+    ) -> None:
+        self.logger = logger
+        self.queue_handler = queue_handler
+        self.listener = listener
+        self.rate_filter = rate_filter
+
+    def stop(self) -> None:
+        """Flush queued records and detach the handler"""
+        self.logger.removeHandler(self.queue_handler)
+        self.listener.stop()
+
+
+_active_setup: Optional[_LoggingSetup] = None
+_setup_lock = threading.Lock()
+
+
+def configure_logging(
+    level: int = logging.INFO,
+    handler: Optional[logging.Handler] = None,
+    json_format: bool = False,
+    rate_limits: Optional[Mapping[str, Optional[float]]] = None,
+    sample_rates: Optional[Mapping[str, float]] = None,
+    queue_size: int = 10000,
+    propagate: bool = False,
+) -> _LoggingSetup:
+    """Send simplesip log records through a queue to a background handler
+
+    Calling it again replaces the previous setup.
+
+    Args:
+        level: Level of the ``simplesip`` logger
+        handler: Handler the listener thread writes to (default: stderr)
+        json_format: Use JSONFormatter instead of StructuredFormatter when
+                     ``handler`` has no formatter of its own
+        rate_limits: Records per second per category, merged over
+                     DEFAULT_RATE_LIMITS; use None as a value to lift a limit
+        sample_rates: Fraction of records to keep per category, e.g.
+                      ``{'sip.message': 0.1}``
+        queue_size: Records buffered before new ones are dropped
+        propagate: Also pass records to the root logger's handlers (which
+                   would then run on the calling thread)
+
+    Returns:
+        Object with ``stop()`` to flush and remove the handler, and
+        ``rate_filter.suppressed()`` for dropped-record counts
+    """
+    global _active_setup
+
+    if handler is None:
+        handler = logging.StreamHandler()
+    if handler.formatter is None:
+        handler.setFormatter(JSONFormatter() if json_format else StructuredFormatter())
+
+    limits = dict(DEFAULT_RATE_LIMITS)
+    limits.update(rate_limits or {})
+    rate_filter = RateLimitFilter(
+        {category: rate for category, rate in limits.items() if rate is not None},
+        sample_rates,
+    )
+
+    record_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(queue_size)
+    queue_handler = DeferredQueueHandler(record_queue)
+    queue_handler.addFilter(rate_filter)
+    listener = logging.handlers.QueueListener(
+        record_queue, handler, respect_handler_level=True
+    )
+
+    logger = logging.getLogger(LOGGER_NAME)
+    with _setup_lock:
+        if _active_setup is not None:
+            _active_setup.stop()
+        logger.setLevel(level)
+        logger.propagate = propagate
+        logger.addHandler(queue_handler)
+        listener.start()
+        _active_setup = _LoggingSetup(logger, queue_handler, listener, rate_filter)
+    return _active_setup
+
+
+def shutdown_logging() -> None:
+    """Flush and remove the handler installed by configure_logging()"""
+    global _active_setup
+    with _setup_lock:
+        if _active_setup is not None:
+            _active_setup.stop()
+            _active_setup = None
+            logging.getLogger(LOGGER_NAME).propagate = True
@@ -0,0 +1,607 @@
+"""
+Low-overhead metrics for the SIP and RTP hot paths.
+
+Counters and histograms accumulate into per-thread cells, so the media and
+signaling threads never contend on a lock or lose updates; cells are only
+summed when the registry is scraped, and a thread's cell is folded into a
+retired total when the thread exits. Metrics are exposed in the Prometheus
+text format, optionally from a small local HTTP endpoint.
+"""
+
+import threading
+import weakref
+from bisect import bisect_left
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Labels, float]
+Snapshot = List[Tuple[str, str, str, List[Sample]]]
+
+
+# Seconds; tuned for per-packet and per-message work (10us to 100ms)
+LATENCY_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class _ThreadSentinel:
+    """Kept in a thread's local storage; collected when the thread exits"""
+
+    __slots__ = ("__weakref__",)
+
+
+class _PerThreadCells:
+    """One mutable cell per writing thread, summed on read
+
+    When a thread exits its cell is folded into a retired total, so
+    short-lived threads (playbacks, timers, DTMF senders) leave nothing
+    behind.
+    """
+
+    def __init__(self, width: int) -> None:
+        self._width = width
+        self._local = threading.local()
+        self._cells: Dict[int, List[float]] = {}  # id(cell) -> cell of each live thread
+        self._retired: List[float] = [0] * width
+        self._lock = threading.Lock()
+
+    def cell(self) -> List[float]:
+        try:
+            cell: List[float] = self._local.cell
+            return cell
+        except AttributeError:
+            cell = [0] * self._width
+            sentinel = _ThreadSentinel()
+            with self._lock:
+                self._cells[id(cell)] = cell
+            weakref.finalize(sentinel, self._retire, cell)
+            self._local.sentinel = sentinel
+            self._local.cell = cell
+            return cell
+
+    def _retire(self, cell: List[float]) -> None:
+        with self._lock:
+            del self._cells[id(cell)]
+            retired = self._retired
+            for i, value in enumerate(cell):
+                retired[i] += value
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells.values())
+            totals = list(self._retired)
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+    def reset(self) -> None:
+        with self._lock:
+            self._retired = [0] * self._width
+            for cell in self._cells.values():
+                for i in range(self._width):
+                    cell[i] = 0
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    type_name = "counter"
+
+    def __init__(self) -> None:
+        self._cells = _PerThreadCells(1)
+        self._local = self._cells._local
+
+    def inc(self, amount: float = 1) -> None:
+        try:
+            self._local.cell[0] += amount
+        except AttributeError:
+            self._cells.cell()[0] += amount
+
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+    def samples(self, name: str, labels: Labels) -> Iterator[Sample]:
+        yield name, labels, self.value()
+
+    def reset(self) -> None:
+        self._cells.reset()
+
+
+class Gauge:
+    """Value that can go up and down, or be computed at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self) -> None:
+        self._value: float = 0
+        self._function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Report ``function()`` instead of the stored value"""
+        self._function = function
+
+    def value(self) -> float:
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def samples(self, name: str, labels: Labels) -> Iterator[Sample]:
+        yield name, labels, self.value()
+
+    def reset(self) -> None:
+        self._value = 0
+
+
+class Histogram:
+    """Fixed-bucket distribution of observed values"""
+
+    type_name = "histogram"
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket, one for +Inf, then the sum
+        self._cells = _PerThreadCells(len(self.buckets) + 2)
+        self._sum_index = len(self.buckets) + 1
+        self._local = self._cells._local
+
+    def observe(self, value: float) -> None:
+        try:
+            cell: List[float] = self._local.cell
+        except AttributeError:
+            cell = self._cells.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[self._sum_index] += value
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """Per-bucket (non-cumulative) counts, total count and sum"""
+        totals = self._cells.totals()
+        counts = totals[: self._sum_index]
+        return counts, sum(counts), totals[self._sum_index]
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the matching bucket"""
+        counts, total, _ = self.snapshot()
+        if not total:
+            return 0.0
+        rank = q * total
+        seen: float = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            if seen + count >= rank and count:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+    def samples(self, name: str, labels: Labels) -> Iterator[Sample]:
+        counts, total, total_sum = self.snapshot()
+        cumulative: float = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield f"{name}_bucket", labels + (
+                ("le", _format_value(float(bound))),
+            ), cumulative
+        yield f"{name}_count", labels, total
+        yield f"{name}_sum", labels, total_sum
+
+    def reset(self) -> None:
+        self._cells.reset()
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricFamily:
+    """A named metric, optionally split into children by label values"""
+
+    # Bound to the metric's own methods when the family has no labels
+    inc: Callable[..., None]
+    dec: Callable[..., None]
+    set: Callable[[float], None]
+    set_function: Callable[[Callable[[], float]], None]
+    observe: Callable[[float], None]
+    value: Callable[[], float]
+    quantile: Callable[[float], float]
+    snapshot: Callable[[], Tuple[List[float], float, float]]
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_class: Type[Metric],
+        labelnames: Iterable[str] = (),
+        **kwargs: Any,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.type_name = metric_class.type_name
+        self.labelnames = tuple(labelnames)
+        self._metric_class = metric_class
+        self._kwargs = kwargs
+        self._children: Dict[Tuple[str, ...], Metric] = {}
+        self._lock = threading.Lock()
+        self._unlabelled: Optional[Metric] = None
+
+        if not self.labelnames:
+            # Unlabelled families expose the metric's methods directly, bound
+            # once here so hot-path calls cost no extra lookup
+            self._unlabelled = metric_class(**kwargs)
+            for attr in (
+                "inc",
+                "dec",
+                "set",
+                "set_function",
+                "observe",
+                "value",
+                "quantile",
+                "snapshot",
+            ):
+                if hasattr(self._unlabelled, attr):
+                    setattr(self, attr, getattr(self._unlabelled, attr))
+
+    def labels(self, *values: str) -> Any:
+        """Return the child metric for the given label values"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._metric_class(**self._kwargs)
+                    self._children[values] = child
+        return child
+
+    def collect(self) -> Iterator[Sample]:
+        if self._unlabelled is not None:
+            yield from self._unlabelled.samples(self.name, ())
+            return
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            yield from child.samples(self.name, tuple(zip(self.labelnames, values)))
+
+    def reset(self) -> None:
+        """Zero every child (used by forked worker processes)"""
+        if self._unlabelled is not None:
+            self._unlabelled.reset()
+        with self._lock:
+            children = list(self._children.values())
+        for child in children:
+            child.reset()
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together"""
+
+    def __init__(self) -> None:
+        self._families: Dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def _register(
+        self,
+        name: str,
+        documentation: str,
+        metric_class: Type[Metric],
+        labelnames: Iterable[str],
+        **kwargs: Any,
+    ) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(
+                    name, documentation, metric_class, labelnames, **kwargs
+                )
+                self._families[name] = family
+            elif family.type_name != metric_class.type_name:
+                raise ValueError(
+                    f"Metric {name} already registered as {family.type_name}"
+                )
+            return family
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Iterable[str] = ()
+    ) -> MetricFamily:
+        return self._register(name, documentation, Counter, labelnames)
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Iterable[str] = ()
+    ) -> MetricFamily:
+        return self._register(name, documentation, Gauge, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> MetricFamily:
+        return self._register(
+            name, documentation, Histogram, labelnames, buckets=buckets
+        )
+
+    def get(self, name: str) -> Optional[MetricFamily]:
+        return self._families.get(name)
+
+    def collect(self) -> Iterator[Tuple[MetricFamily, List[Sample]]]:
+        """Yield (family, [(sample_name, labels, value), ...]) for every metric"""
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            yield family, list(family.collect())
+
+    def snapshot(self) -> Snapshot:
+        """Picklable copy of all metrics: [(name, documentation, type, samples)]"""
+        return [
+            (family.name, family.documentation, family.type_name, samples)
+            for family, samples in self.collect()
+        ]
+
+    def reset(self) -> None:
+        """Zero all metrics"""
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            family.reset()
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        return render_snapshot(self.snapshot())
+
+
+def render_snapshot(snapshot: Snapshot) -> str:
+    """Render the output of MetricsRegistry.snapshot() as Prometheus text"""
+    lines = []
+    for name, documentation, type_name, samples in snapshot:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {type_name}")
+        for sample_name, labels, value in samples:
+            lines.append(
+                f"{sample_name}{_format_labels(labels)} {_format_value(value)}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def merge_snapshots(snapshots: Iterable[Snapshot]) -> Snapshot:
+    """Sum snapshots from several processes into one
+
+    Counters, histogram buckets, counts and sums add up exactly; gauges are
+    summed too, which suits per-process totals such as active calls.
+    """
+    merged: Dict[str, Tuple[str, str, Dict[Tuple[str, Labels], float]]] = {}
+    for snapshot in snapshots:
+        for name, documentation, type_name, samples in snapshot:
+            family = merged.get(name)
+            if family is None:
+                family = merged[name] = (documentation, type_name, {})
+            values = family[2]
+            for sample_name, labels, value in samples:
+                key = (sample_name, tuple(labels))
+                values[key] = values.get(key, 0) + value
+    return [
+        (
+            name,
+            documentation,
+            type_name,
+            [
+                (sample_name, labels, value)
+                for (sample_name, labels), value in values.items()
+            ],
+        )
+        for name, (documentation, type_name, values) in merged.items()
+    ]
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Renderable(Protocol):
+    """Anything MetricsServer can serve, e.g. a registry or a ShardSupervisor"""
+
+    def render(self) -> str: ...
+
+
+class MetricsServer:
+    """Serve a registry at http://host:port/metrics from a daemon thread"""
+
+    def __init__(
+        self,
+        registry: Optional[Renderable] = None,
+        host: str = "127.0.0.1",
+        port: int = 9464,
+    ) -> None:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.registry = served = registry or REGISTRY
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = served.render().encode()
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_metrics_server(
+    port: int = 9464, host: str = "127.0.0.1", registry: Optional[Renderable] = None
+) -> MetricsServer:
+    """Start a local Prometheus scrape endpoint; returns the MetricsServer"""
+    return MetricsServer(registry, host=host, port=port).start()
+
+
+# --- Library instrumentation ---
+
+SIP_MESSAGES_RECEIVED = REGISTRY.counter(
+    "simplesip_sip_messages_received_total", "SIP messages received", ("kind",)
+)
+SIP_MESSAGE_BYTES_RECEIVED = REGISTRY.counter(
+    "simplesip_sip_message_bytes_received_total", "Bytes of SIP messages received"
+)
+SIP_MESSAGES_SENT = REGISTRY.counter(
+    "simplesip_sip_messages_sent_total", "SIP messages sent"
+)
+SIP_PARSE_SECONDS = REGISTRY.histogram(
+    "simplesip_sip_parse_seconds", "Time spent parsing SIP messages"
+)
+SIP_DISPATCH_SECONDS = REGISTRY.histogram(
+    "simplesip_sip_dispatch_seconds",
+    "Time spent handling a SIP message, including parsing",
+)
+SIP_RECORDS_EVICTED = REGISTRY.counter(
+    "simplesip_sip_records_evicted_total",
+    "Transactions and dialogs dropped after their TTL",
+    ("table",),
+)
+
+RTP_PACKETS_RECEIVED = REGISTRY.counter(
+    "simplesip_rtp_packets_received_total", "RTP packets received"
+)
+RTP_BYTES_RECEIVED = REGISTRY.counter(
+    "simplesip_rtp_bytes_received_total", "Bytes of RTP packets received"
+)
+RTP_PACKETS_LOST = REGISTRY.counter(
+    "simplesip_rtp_packets_lost_total",
+    "RTP packets missing from received sequence numbers",
+)
+RTP_PACKETS_RECOVERED = REGISTRY.counter(
+    "simplesip_rtp_packets_recovered_total",
+    "Lost RTP packets restored from RFC 2198 redundant data",
+)
+RTP_PACKETS_CONCEALED = REGISTRY.counter(
+    "simplesip_rtp_packets_concealed_total",
+    "Lost RTP packets replaced by packet loss concealment",
+)
+SRTP_PACKETS_REJECTED = REGISTRY.counter(
+    "simplesip_srtp_packets_rejected_total",
+    "SRTP packets dropped for failing authentication or replay checks",
+)
+RTP_DECODE_SECONDS = REGISTRY.histogram(
+    "simplesip_rtp_decode_seconds", "Time spent decoding one RTP payload", ("codec",)
+)
+AUDIO_CALLBACK_SECONDS = REGISTRY.histogram(
+    "simplesip_audio_callback_seconds", "Time spent in the application audio callback"
+)
+
+RTP_PACKETS_SENT = REGISTRY.counter(
+    "simplesip_rtp_packets_sent_total", "RTP packets sent"
+)
+RTP_BYTES_SENT = REGISTRY.counter(
+    "simplesip_rtp_bytes_sent_total", "Bytes of RTP packets sent"
+)
+RTP_SEND_LATENESS_SECONDS = REGISTRY.histogram(
+    "simplesip_rtp_send_lateness_seconds",
+    "How far behind its pacing deadline each packet was sent",
+)
+
+BRIDGE_PACKETS = REGISTRY.counter(
+    "simplesip_bridge_packets_total",
+    "RTP packets relayed between bridged call legs",
+    ("mode",),
+)
+CONFERENCE_MIX_SECONDS = REGISTRY.histogram(
+    "simplesip_conference_mix_seconds",
+    "Time spent mixing and sending one conference frame",
+)
+DIALER_ATTEMPTS = REGISTRY.counter(
+    "simplesip_dialer_attempts_total",
+    "Outbound call attempts finished by the Dialer",
+    ("outcome",),
+)
+
+SHARD_DATAGRAMS_DISPATCHED = REGISTRY.counter(
+    "simplesip_shard_datagrams_dispatched_total",
+    "SIP datagrams forwarded to a shard worker",
+    ("worker",),
+)
+SHARD_DATAGRAMS_DROPPED = REGISTRY.counter(
+    "simplesip_shard_datagrams_dropped_total",
+    "SIP datagrams dropped because a shard worker was busy or gone",
+    ("worker",),
+)
@@ -0,0 +1,307 @@
+"""
+Streaming file playback for SimpleSIPClient.
+
+Audio files are memory-mapped and cut into RTP payloads one frame at a time
+while they are being sent, so playing a long prompt only ever keeps a single
+frame in memory per call.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Iterable, Iterator, Optional
+
+from .metrics import RTP_SEND_LATENESS_SECONDS
+
+if TYPE_CHECKING:
+    from .client import SimpleSIPClient
+
+
+CodecFunction = Callable[[bytes, str], bytes]
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Pre-encoded payload files, recognised by extension
+ENCODED_EXTENSIONS = {
+    ".ulaw": "PCMU",
+    ".mulaw": "PCMU",
+    ".pcmu": "PCMU",
+    ".alaw": "PCMA",
+    ".pcma": "PCMA",
+    ".g722": "G722",
+}
+
+# Audio sample rate of each encoding (G.722 is 16kHz audio on an 8kHz RTP clock)
+ENCODING_SAMPLE_RATES = {
+    "PCMU": 8000,
+    "PCMA": 8000,
+    "G722": 16000,
+}
+
+# Byte value used to pad the last partial frame of a pre-encoded file
+SILENCE_BYTES = {
+    "PCMU": b"\xff",
+    "PCMA": b"\xd5",
+}
+
+
+def payload_bytes_per_ms(encoding: str, sample_rate: int = 8000) -> int:
+    """Number of bytes one millisecond of audio takes in the given encoding"""
+    if encoding == "PCM":
+        return sample_rate * 2 // 1000
+    return 8  # G.711 and G.722 are all 64 kbit/s
+
+
+class AudioFile:
+    """Memory-mapped WAV, raw 16-bit PCM or pre-encoded payload file
+
+    Args:
+        path: File to open. ``.wav`` files are parsed for their format, the
+              extensions in ``ENCODED_EXTENSIONS`` are treated as raw codec
+              payload and anything else as headerless 16-bit mono PCM.
+        sample_rate: Sample rate of a raw PCM file. Ignored for WAV and
+              pre-encoded files, which carry their own rate.
+    """
+
+    def __init__(self, path: str, sample_rate: Optional[int] = None) -> None:
+        self.path = path
+        self.encoding = "PCM"
+        self.sample_rate = sample_rate
+        self.data_offset = 0
+        self.data_length = 0
+        self._file: Optional[BinaryIO] = open(path, "rb")
+        self._mmap: Optional[mmap.mmap] = None
+
+        try:
+            fileno = self._file.fileno()
+            if os.fstat(fileno).st_size > 0:
+                self._mmap = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+            self._probe()
+        except Exception:
+            self.close()
+            raise
+
+    def _probe(self) -> None:
+        """Work out encoding, sample rate and payload location of the file"""
+        size = len(self._mmap) if self._mmap is not None else 0
+        ext = os.path.splitext(self.path)[1].lower()
+
+        if ext == ".wav":
+            self._parse_wav(size)
+        elif ext in ENCODED_EXTENSIONS:
+            self.encoding = ENCODED_EXTENSIONS[ext]
+            self.sample_rate = ENCODING_SAMPLE_RATES[self.encoding]
+            self.data_length = size
+        else:
+            self.data_length = size - size % 2
+
+    def _parse_wav(self, size: int) -> None:
+        """Locate the fmt and data chunks of a RIFF/WAVE file"""
+        data = self._mmap
+        if data is None or size < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+            raise ValueError(f"{self.path}: not a RIFF/WAVE file")
+
+        fmt = None
+        pos = 12
+        while pos + 8 <= size:
+            chunk_id = data[pos : pos + 4]
+            chunk_size = struct.unpack("<I", data[pos + 4 : pos + 8])[0]
+            body = pos + 8
+
+            if chunk_id == b"fmt ":
+                fmt = data[body : body + min(chunk_size, 40)]
+            elif chunk_id == b"data":
+                self.data_offset = body
+                self.data_length = min(chunk_size, size - body)
+                break
+
+            pos = body + chunk_size + (chunk_size & 1)
+
+        if fmt is None or len(fmt) < 16:
+            raise ValueError(f"{self.path}: missing fmt chunk")
+
+        audio_format, channels, sample_rate, _, _, bits = struct.unpack(
+            "<HHIIHH", fmt[:16]
+        )
+        if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            audio_format = struct.unpack("<H", fmt[24:26])[0]
+
+        if channels != 1:
+            raise ValueError(
+                f"{self.path}: only mono files can be played ({channels} channels)"
+            )
+
+        if audio_format == WAVE_FORMAT_PCM and bits == 16:
+            self.encoding = "PCM"
+        elif audio_format == WAVE_FORMAT_MULAW and bits == 8:
+            self.encoding = "PCMU"
+        elif audio_format == WAVE_FORMAT_ALAW and bits == 8:
+            self.encoding = "PCMA"
+        else:
+            raise ValueError(
+                f"{self.path}: unsupported WAV format {audio_format} ({bits} bit)"
+            )
+
+        self.sample_rate = sample_rate
+        if self.encoding == "PCM":
+            self.data_length -= self.data_length % 2
+
+    def check_codec(self, codec: str, codec_sample_rate: int) -> None:
+        """Raise ValueError if this file cannot be sent with ``codec``"""
+        if self.encoding == codec:
+            return
+        if self.sample_rate is not None and self.sample_rate != codec_sample_rate:
+            raise ValueError(
+                f"{self.path}: {self.encoding} at {self.sample_rate}Hz "
+                f"cannot be sent as {codec} ({codec_sample_rate}Hz) without resampling"
+            )
+
+    def frames(
+        self, codec: str, ptime: int, encode: CodecFunction, decode: CodecFunction
+    ) -> Iterator[bytes]:
+        """Yield one RTP payload per ``ptime`` milliseconds of audio
+
+        Frames that already match ``codec`` are sliced straight out of the
+        mapping; everything else is transcoded one frame at a time with the
+        ``encode(pcm, codec)`` and ``decode(payload, encoding)`` callables.
+        """
+        data = self._mmap
+        if data is None or self.data_length <= 0:
+            return
+
+        passthrough = self.encoding == codec
+        frame_bytes = (
+            payload_bytes_per_ms(self.encoding, self.sample_rate or 8000) * ptime
+        )
+        end = self.data_offset + self.data_length
+
+        for start in range(self.data_offset, end, frame_bytes):
+            chunk = data[start : min(start + frame_bytes, end)]
+
+            if len(chunk) < frame_bytes:
+                if self.encoding == "PCM":
+                    chunk += bytes(frame_bytes - len(chunk))
+                elif self.encoding in SILENCE_BYTES:
+                    chunk += SILENCE_BYTES[self.encoding] * (frame_bytes - len(chunk))
+                else:
+                    return  # A partial G.722 frame cannot be padded safely
+
+            if passthrough:
+                yield chunk
+            elif self.encoding == "PCM":
+                yield encode(chunk, codec)
+            else:
+                yield encode(decode(chunk, self.encoding), codec)
+
+    def close(self) -> None:
+        """Release the mapping and file handle"""
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except Exception:
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "AudioFile":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class Playback:
+    """Handle for audio being paced out on a call
+
+    Sends one payload from ``frames`` every ``ptime`` milliseconds on its own
+    thread, scheduling against absolute deadlines so sleep overshoot does not
+    accumulate into drift.
+    """
+
+    def __init__(
+        self,
+        client: "SimpleSIPClient",
+        frames: Iterable[bytes],
+        payload_type: int,
+        ptime: int = 20,
+        on_finish: Optional[Callable[[], None]] = None,
+        timestamp_increment: Optional[int] = None,
+    ) -> None:
+        self.client = client
+        self.payload_type = payload_type
+        self.ptime = ptime
+        self.timestamp_increment = timestamp_increment
+        self.frames_sent = 0
+        self._frames = frames
+        self._on_finish = on_finish
+        self._stop_event = threading.Event()
+        self._done_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "Playback":
+        """Start sending frames in the background"""
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop playback after the frame currently being sent"""
+        self._stop_event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until playback finishes; returns False on timeout"""
+        return self._done_event.wait(timeout)
+
+    @property
+    def done(self) -> bool:
+        """True once every frame was sent or playback was stopped"""
+        return self._done_event.is_set()
+
+    def _run(self) -> None:
+        client = self.client
+        interval = self.ptime / 1000.0
+        timestamp_increment = (
+            self.timestamp_increment or 8 * self.ptime
+        )  # 8kHz clock unless given
+        next_send = time.monotonic()
+
+        try:
+            for payload in self._frames:
+                if (
+                    self._stop_event.is_set()
+                    or not client.running
+                    or not client.remote_rtp_info
+                ):
+                    break
+                if not client.media_sending:
+                    # Call on hold: pause here and pick up the pacing afresh
+                    if not client._wait_for_send(self._stop_event):
+                        break
+                    next_send = time.monotonic()
+
+                delay = next_send - time.monotonic()
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+                RTP_SEND_LATENESS_SECONDS.observe(
+                    max(0.0, time.monotonic() - next_send)
+                )
+
+                client._send_rtp_payload(
+                    payload, self.payload_type, timestamp_increment
+                )
+                self.frames_sent += 1
+                next_send += interval
+
+        except Exception as e:
+            client.logger.error("Playback error: %s", e)
+        finally:
+            if self._on_finish:
+                self._on_finish()
+            self._done_event.set()
@@ -0,0 +1,173 @@
+"""
+Packet loss concealment for decoded audio.
+
+Follows G.711 Appendix I: the pitch period of the last good audio is found
+by normalized cross-correlation, and lost frames are filled by repeating
+that many samples. After 10ms two periods are repeated and after 20ms
+three, crossfading at each change. The fill fades out by 20% per 10ms from
+10ms on and is silent from 60ms. The first good frame after a loss is
+crossfaded with the continuing fill. The same waveform repetition runs on
+G.722's 16kHz output, with all lengths scaled to the sample rate. Only the
+decoded audio is concealed: the G.722 ADPCM decoder is not run over the gap
+and resumes from its state before the loss.
+
+Good frames only are copied into a fixed ring buffer of history. NumPy is
+imported, and the history converted, only when a loss is concealed.
+"""
+
+from typing import Any, Optional
+
+# Lengths at 8kHz, from G.711 Appendix I
+_PITCH_MIN = 40  # 200 Hz
+_PITCH_MAX = 120  # 66 Hz
+_CORR_LEN = 160  # Samples correlated when looking for the pitch
+_END_OVERLAP = 32  # 4ms crossfade into the first good frame
+_HISTORY_LEN = _CORR_LEN + 3 * _PITCH_MAX
+
+_np: Any = None
+
+
+def _numpy() -> Any:
+    """NumPy, imported on the first concealed loss"""
+    global _np
+    if _np is None:
+        import numpy
+
+        _np = numpy
+    return _np
+
+
+class Concealer:
+    """Fills the gaps in one decoded 16-bit PCM stream
+
+    Args:
+        sample_rate: Rate of the PCM, 8000 for G.711 and 16000 for G.722
+    """
+
+    def __init__(self, sample_rate: int = 8000) -> None:
+        self.reset(sample_rate)
+
+    def reset(self, sample_rate: Optional[int] = None) -> None:
+        """Forget the history, e.g. at the start of a call"""
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        scale = self.sample_rate // 8000
+        self._pitch_min = _PITCH_MIN * scale
+        self._pitch_max = _PITCH_MAX * scale
+        self._corr_len = _CORR_LEN * scale
+        self._end_overlap = _END_OVERLAP * scale
+        self._ring = bytearray(2 * _HISTORY_LEN * scale)
+        self._ring_end = 0  # Byte offset the next good sample goes to
+        self._held = 0  # Samples of history in the ring
+        self._history: Any = None  # Float copy of the ring while a loss lasts
+        self._pitch: Optional[int] = None
+        self._erased = 0  # Samples filled since the loss began
+        self.concealed_frames = 0
+
+    def receive(self, pcm_data: bytes, sample_rate: int) -> bytes:
+        """Pass a good frame through, recording it as history
+
+        Returns:
+            The frame, with its start crossfaded from the fill if it ends
+            a loss
+        """
+        if sample_rate != self.sample_rate:
+            self.reset(sample_rate)  # Codec changed by a re-INVITE
+        if self._erased:
+            pcm_data = self._end_loss(pcm_data)
+        self._remember(pcm_data)
+        return pcm_data
+
+    def conceal(self, count: int) -> bytes:
+        """``count`` samples of fill for the next part of a loss, as PCM bytes"""
+        np = _numpy()
+        if self._pitch is None:
+            if self._held < self._corr_len + self._pitch_max:
+                self._erased += count
+                return bytes(2 * count)  # Too little history at the start of a call
+            self._history = self._history_samples()
+            self._pitch = self._find_pitch()
+
+        fill = self._synthesize(self._erased, count)
+        self._erased += count
+        self.concealed_frames += 1
+        return bytes(np.clip(fill, -32768, 32767).astype("<i2").tobytes())
+
+    def _remember(self, pcm_data: bytes) -> None:
+        ring = self._ring
+        size = len(ring)
+        data = memoryview(pcm_data)[-size:]
+        length = len(data) & ~1
+        end = self._ring_end
+        first = min(length, size - end)
+        ring[end : end + first] = data[:first]
+        ring[: length - first] = data[first:length]
+        self._ring_end = (end + length) % size
+        self._held = min(self._held + length // 2, size // 2)
+
+    def _history_samples(self) -> Any:
+        """History in time order as float32"""
+        np = _numpy()
+        ring = np.frombuffer(self._ring, dtype="<i2")
+        split = self._ring_end // 2
+        return np.concatenate((ring[split:], ring[:split]))[-self._held :].astype(
+            np.float32
+        )
+
+    def _end_loss(self, pcm_data: bytes) -> bytes:
+        """Crossfade the start of the first good frame from the fill"""
+        np = _numpy()
+        samples = np.frombuffer(pcm_data, dtype="<i2").astype(np.float32)
+        overlap = min(self._end_overlap, len(samples))
+        fill = self._synthesize(self._erased, overlap)
+        ramp = np.linspace(0.0, 1.0, overlap, endpoint=False, dtype=np.float32)
+        samples[:overlap] = samples[:overlap] * ramp + fill * (1.0 - ramp)
+        self._erased = 0
+        self._pitch = None
+        self._history = None
+        return bytes(np.clip(samples, -32768, 32767).astype("<i2").tobytes())
+
+    def _find_pitch(self) -> int:
+        """Lag with the best normalized correlation to the last _CORR_LEN samples"""
+        np = _numpy()
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        history = self._history
+        target = history[-self._corr_len :]
+        # Row r holds the window ending _pitch_max - r samples before the end
+        windows = sliding_window_view(
+            history[-(self._corr_len + self._pitch_max) : -self._pitch_min],
+            self._corr_len,
+        )
+        correlation = windows @ target
+        energy = np.einsum("ij,ij->i", windows, windows) + 1.0
+        score = correlation / np.sqrt(energy)
+        return self._pitch_max - int(np.argmax(score))
+
+    def _synthesize(self, start: int, count: int) -> Any:
+        """Fill samples ``start`` .. ``start + count`` of the current loss"""
+        np = _numpy()
+        if self._pitch is None:
+            return np.zeros(count, dtype=np.float32)
+        history = self._history
+        pitch = self._pitch
+        ms = self.sample_rate // 1000
+        position = np.arange(start, start + count)
+
+        # One period for the first 10ms, then two, then three
+        periods = np.minimum(position // (10 * ms) + 1, 3)
+        length = periods * pitch
+        fill = history[len(history) - length + position % length]
+
+        # Crossfade over a quarter period from the previous number of periods
+        overlap = max(pitch // 4, 1)
+        since_change = position - (periods - 1) * 10 * ms
+        fading = (periods > 1) & (since_change < overlap)
+        if fading.any():
+            previous = length[fading] - pitch
+            earlier = history[len(history) - previous + position[fading] % previous]
+            weight = since_change[fading] / overlap
+            fill[fading] = fill[fading] * weight + earlier * (1.0 - weight)
+
+        gain = np.clip(1.0 - (position - 10 * ms) / (50.0 * ms), 0.0, 1.0)
+        return fill * gain
@@ -0,0 +1,209 @@
+"""
+Process-wide cache of pre-encoded prompt frames.
+
+Prompts that are played over and over (greetings, hold messages, IVR menus)
+are encoded once per codec and packetization time and kept as ready-to-send
+RTP payloads, so replaying them costs only the RTP header and ``sendto``.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, OrderedDict, Tuple
+
+DISK_MAGIC = b"SSPC"
+DISK_VERSION = 1
+DISK_HEADER = struct.Struct("<4sHI")  # magic, version, frame count
+
+Frames = Tuple[bytes, ...]
+
+
+class PromptCache:
+    """Size-bounded LRU cache of packetized prompt payloads
+
+    Entries are keyed by (prompt, codec, ptime). File prompts are identified
+    by their real path plus size and modification time, so editing a file on
+    disk invalidates its cached frames.
+
+    Args:
+        max_bytes: Upper bound on the payload bytes kept in memory
+        cache_dir: Optional directory used to persist encoded prompts across
+                   processes and restarts
+    """
+
+    def __init__(
+        self, max_bytes: int = 32 * 1024 * 1024, cache_dir: Optional[str] = None
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries: OrderedDict[Hashable, Frames] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_key(path: str, codec: str, ptime: int) -> Tuple[str, int, int, str, int]:
+        """Cache key for a prompt file encoded with ``codec`` at ``ptime`` ms"""
+        st = os.stat(path)
+        return (os.path.realpath(path), st.st_size, st.st_mtime_ns, codec, ptime)
+
+    def get(self, key: Hashable) -> Optional[Frames]:
+        """Return the cached frames for ``key`` or None"""
+        with self._lock:
+            frames = self._entries.get(key)
+            if frames is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return frames
+
+        frames = self._load_from_disk(key)
+        with self._lock:
+            if frames is not None:
+                self.hits += 1
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        if frames is not None:
+            self._store(key, frames)
+        return frames
+
+    def put(
+        self, key: Hashable, frames: Iterable[bytes], persist: bool = True
+    ) -> Frames:
+        """Cache ``frames`` (a sequence of payload bytes) under ``key``"""
+        stored = tuple(frames)
+        self._store(key, stored)
+        if persist:
+            self._save_to_disk(key, stored)
+        return stored
+
+    def get_or_encode(
+        self, key: Hashable, encode: Callable[[], Iterable[bytes]]
+    ) -> Frames:
+        """Return cached frames for ``key``, calling ``encode()`` on a miss"""
+        frames = self.get(key)
+        if frames is None:
+            frames = self.put(key, encode())
+        return frames
+
+    def _store(self, key: Hashable, frames: Frames) -> None:
+        size = sum(len(frame) for frame in frames)
+        if size > self.max_bytes:
+            return  # Would evict everything else; play it uncached
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= sum(len(frame) for frame in old)
+
+            self._entries[key] = frames
+            self._size += size
+
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= sum(len(frame) for frame in evicted)
+                self.evictions += 1
+
+    def _disk_path(self, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, f"{digest}.frames")
+
+    def _load_from_disk(self, key: Hashable) -> Optional[Frames]:
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        try:
+            magic, version, count = DISK_HEADER.unpack_from(data, 0)
+            if magic != DISK_MAGIC or version != DISK_VERSION:
+                return None
+            lengths = struct.unpack_from(f"<{count}H", data, DISK_HEADER.size)
+            pos = DISK_HEADER.size + 2 * count
+            frames = []
+            for length in lengths:
+                frames.append(data[pos : pos + length])
+                pos += length
+            if pos != len(data):
+                return None
+            return tuple(frames)
+        except struct.error:
+            return None
+
+    def _save_to_disk(self, key: Hashable, frames: Frames) -> None:
+        if not self.cache_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(DISK_HEADER.pack(DISK_MAGIC, DISK_VERSION, len(frames)))
+                f.write(
+                    struct.pack(f"<{len(frames)}H", *(len(frame) for frame in frames))
+                )
+                for frame in frames:
+                    f.write(frame)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Drop every in-memory entry (the disk cache is left alone)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache: Optional[PromptCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_prompt_cache() -> PromptCache:
+    """Return the process-wide prompt cache, creating it on first use"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = PromptCache()
+    return _default_cache
+
+
+def configure_prompt_cache(
+    max_bytes: int = 32 * 1024 * 1024, cache_dir: Optional[str] = None
+) -> PromptCache:
+    """Replace the process-wide prompt cache with a newly configured one"""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = PromptCache(max_bytes=max_bytes, cache_dir=cache_dir)
+    return _default_cache
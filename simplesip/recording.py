@@ -0,0 +1,346 @@
+"""
+Asynchronous call recording.
+
+The media threads only append encoded payloads to a per-call deque (atomic
+under the GIL, so no locks are taken on the RTP path). A single background
+writer thread shared by all recordings decodes the payloads, batches them and
+writes WAV or raw PCM files, flushing them periodically.
+
+Each leg is laid out on the recording's own timeline: a frame goes where its
+RTP timestamp puts it, so lost packets become silence, and where its arrival
+time puts it when there is no usable timestamp (the first frame of a leg,
+or a timestamp that disagrees with the clock by more than MAX_DRIFT).
+"""
+
+import os
+import threading
+import time
+import wave
+from collections import deque
+from typing import IO, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .sdp import CODEC_CLOCK_RATES
+
+RX = "rx"
+TX = "tx"
+
+MAX_DRIFT = 0.5  # Seconds a leg's timestamps may stray from arrival times
+
+Decode = Callable[[bytes, str], bytes]
+# (codec, payload, RTP timestamp or None, arrival time)
+Frame = Tuple[str, bytes, Optional[int], float]
+
+
+class CallRecorder:
+    """Record both legs of a call to disk
+
+    Args:
+        path: Output path. In 'separate' mode '-rx' and '-tx' are inserted
+              before the extension, in 'stereo' mode the file is written as-is
+              with the received leg on the left channel and the sent leg on
+              the right.
+        decode: Callable ``decode(payload, codec)`` returning 16-bit PCM
+        sample_rate: PCM sample rate of the call audio
+        mode: 'separate' or 'stereo'
+        file_format: 'wav' or 'raw'
+        max_pending_frames: Frames buffered per leg before new frames are
+              dropped and counted as overruns
+        writer: RecordingWriter to use (default: the process-wide writer)
+        tx_decode: Decoder for the sent leg, when it needs codec state
+              separate from ``decode`` (default: ``decode``)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        decode: Decode,
+        sample_rate: int = 8000,
+        mode: str = "separate",
+        file_format: str = "wav",
+        max_pending_frames: int = 500,
+        writer: Optional["RecordingWriter"] = None,
+        tx_decode: Optional[Decode] = None,
+    ) -> None:
+        if mode not in ("separate", "stereo"):
+            raise ValueError(f"Unknown recording mode: {mode}")
+        if file_format not in ("wav", "raw"):
+            raise ValueError(f"Unknown recording format: {file_format}")
+
+        self.path = path
+        self.mode = mode
+        self.file_format = file_format
+        self.sample_rate = sample_rate
+        self.max_pending_frames = max_pending_frames
+        self.overruns = 0
+        self.frames_written = {RX: 0, TX: 0}
+        self._decode = {RX: decode, TX: tx_decode or decode}
+        self._pending: Dict[str, Deque[Frame]] = {RX: deque(), TX: deque()}
+        self._pcm = {RX: bytearray(), TX: bytearray()}
+        self._placed = {RX: 0, TX: 0}  # Samples laid out so far per leg
+        self._next_timestamp: Dict[str, Optional[int]] = {RX: None, TX: None}
+        self._started: Optional[float] = (
+            None  # Arrival time of the first frame on either leg
+        )
+        self._files: Dict[str, Tuple[IO[bytes], Optional[wave.Wave_write]]] = {}
+        self._closing = False
+        self._closed = threading.Event()
+        self._writer = writer or get_recording_writer()
+        self._writer.add(self)
+
+    def push_rx(
+        self, payload: bytes, codec: str, timestamp: Optional[int] = None
+    ) -> None:
+        """Queue a received payload (called from the RTP receive thread)"""
+        pending = self._pending[RX]
+        if len(pending) >= self.max_pending_frames:
+            self.overruns += 1
+            return
+        pending.append((codec, payload, timestamp, time.monotonic()))
+
+    def push_tx(
+        self, payload: bytes, codec: str, timestamp: Optional[int] = None
+    ) -> None:
+        """Queue a sent payload (called from whichever thread sends audio)"""
+        pending = self._pending[TX]
+        if len(pending) >= self.max_pending_frames:
+            self.overruns += 1
+            return
+        pending.append((codec, payload, timestamp, time.monotonic()))
+
+    def stop(self, wait: bool = True, timeout: float = 5.0) -> None:
+        """Stop recording; queued frames are still written before files close"""
+        self._closing = True
+        self._writer.wake()
+        if wait:
+            self._closed.wait(timeout)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Frames written per leg, frames still queued and overrun count"""
+        return {
+            "frames_written": dict(self.frames_written),
+            "pending": {leg: len(queue) for leg, queue in self._pending.items()},
+            "overruns": self.overruns,
+            "closed": self.closed,
+        }
+
+    # --- Writer thread side ---
+
+    def _leg_path(self, leg: str) -> str:
+        if self.mode == "stereo":
+            return self.path
+        base, ext = os.path.splitext(self.path)
+        return f"{base}-{leg}{ext}"
+
+    def _open(
+        self, key: str, channels: int
+    ) -> Tuple[IO[bytes], Optional[wave.Wave_write]]:
+        if key in self._files:
+            return self._files[key]
+
+        raw = open(self._leg_path(key), "wb")
+        wav: Optional[wave.Wave_write] = None
+        if self.file_format == "wav":
+            wav = wave.open(raw, "wb")
+            wav.setnchannels(channels)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+        self._files[key] = (raw, wav)
+        return self._files[key]
+
+    def _write(self, key: str, channels: int, pcm: bytes) -> None:
+        raw, wav = self._open(key, channels)
+        if wav is not None:
+            wav.writeframes(pcm)
+        else:
+            raw.write(pcm)
+
+    def _drain_leg(self, leg: str) -> int:
+        pending = self._pending[leg]
+        pcm = self._pcm[leg]
+        decode = self._decode[leg]
+        rate = self.sample_rate
+        max_drift = int(MAX_DRIFT * rate)
+        placed = self._placed[leg]
+        next_timestamp = self._next_timestamp[leg]
+        started = self._started
+        count = 0
+        for _ in range(len(pending)):
+            codec, payload, timestamp, arrival = pending.popleft()
+            if started is None:  # Queued after _service() looked for the first frame
+                started = self._started = arrival
+            samples = decode(payload, codec)
+            clock = CODEC_CLOCK_RATES.get(codec, 8000)
+
+            position = round((arrival - started) * rate)
+            if placed:
+                expected = placed
+                if timestamp is not None and next_timestamp is not None:
+                    ticks = (
+                        timestamp - next_timestamp + 2147483648
+                    ) % 4294967296 - 2147483648
+                    expected += ticks * rate // clock
+                if abs(expected - position) <= max_drift:
+                    position = expected
+            if position > placed:
+                pcm += bytes(2 * (position - placed))  # Silence for a gap in this leg
+                placed = position
+
+            pcm += samples
+            placed += len(samples) // 2
+            if timestamp is not None:
+                next_timestamp = (
+                    timestamp + len(samples) // 2 * clock // rate
+                ) % 4294967296
+            count += 1
+        self._placed[leg] = placed
+        self._next_timestamp[leg] = next_timestamp
+        self.frames_written[leg] += count
+        return count
+
+    def _service(self, max_skew_bytes: int) -> bool:
+        """Move queued frames to disk; returns True once the recorder is closed"""
+        closing = self._closing
+        if self._started is None:
+            heads = [pending[0][3] for pending in self._pending.values() if pending]
+            if heads:
+                self._started = min(heads)
+        written = self._drain_leg(RX) + self._drain_leg(TX)
+
+        if self.mode == "separate":
+            for leg in (RX, TX):
+                if self._pcm[leg]:
+                    self._write(leg, 1, bytes(self._pcm[leg]))
+                    self._pcm[leg].clear()
+        else:
+            self._write_stereo(max_skew_bytes, flush_all=closing)
+
+        if written or closing:
+            for raw, _ in self._files.values():
+                raw.flush()
+
+        if closing and not self._pending[RX] and not self._pending[TX]:
+            self._close_files()
+            return True
+        return False
+
+    def _write_stereo(self, max_skew_bytes: int, flush_all: bool = False) -> None:
+        rx, tx = self._pcm[RX], self._pcm[TX]
+        length = min(len(rx), len(tx))
+
+        # A leg that stays silent (e.g. nothing is being sent) must not hold
+        # back the other one forever, so pad it once the skew gets large.
+        longest = max(len(rx), len(tx))
+        if flush_all or longest - length > max_skew_bytes:
+            length = longest
+            rx.extend(bytes(length - len(rx)))
+            tx.extend(bytes(length - len(tx)))
+
+        length -= length % 2
+        if not length:
+            return
+
+        import numpy as np
+
+        left = np.frombuffer(bytes(rx[:length]), dtype=np.int16)
+        right = np.frombuffer(bytes(tx[:length]), dtype=np.int16)
+        interleaved = np.empty(left.size * 2, dtype=np.int16)
+        interleaved[0::2] = left
+        interleaved[1::2] = right
+        self._write("stereo", 2, interleaved.tobytes())
+
+        del rx[:length]
+        del tx[:length]
+
+    def _close_files(self) -> None:
+        for raw, wav in self._files.values():
+            try:
+                if wav is not None:
+                    wav.close()
+            finally:
+                raw.close()
+        self._files.clear()
+        self._closed.set()
+
+
+class RecordingWriter:
+    """Background thread that services every active CallRecorder
+
+    Args:
+        flush_interval: Seconds between write batches
+        max_skew: Seconds one leg of a stereo recording may run ahead of the
+                  other before the quiet leg is padded with silence
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_skew: float = 1.0) -> None:
+        self.flush_interval = flush_interval
+        self.max_skew = max_skew
+        self._recorders: List[CallRecorder] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.errors = 0
+
+    def add(self, recorder: CallRecorder) -> None:
+        with self._lock:
+            self._recorders.append(recorder)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def active_recordings(self) -> int:
+        with self._lock:
+            return len(self._recorders)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+
+            with self._lock:
+                recorders = list(self._recorders)
+
+            finished = []
+            for recorder in recorders:
+                try:
+                    max_skew_bytes = int(recorder.sample_rate * 2 * self.max_skew)
+                    if recorder._service(max_skew_bytes):
+                        finished.append(recorder)
+                except Exception:
+                    self.errors += 1
+                    recorder._closing = True
+                    recorder._pending[RX].clear()
+                    recorder._pending[TX].clear()
+                    try:
+                        recorder._close_files()
+                    except Exception:
+                        recorder._closed.set()
+                    finished.append(recorder)
+
+            if finished:
+                with self._lock:
+                    for recorder in finished:
+                        self._recorders.remove(recorder)
+                    if not self._recorders:
+                        self._thread = None
+                        return
+
+
+_default_writer: Optional[RecordingWriter] = None
+_default_writer_lock = threading.Lock()
+
+
+def get_recording_writer() -> RecordingWriter:
+    """Return the process-wide recording writer, creating it on first use"""
+    global _default_writer
+    if _default_writer is None:
+        with _default_writer_lock:
+            if _default_writer is None:
+                _default_writer = RecordingWriter()
+    return _default_writer
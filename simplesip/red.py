@@ -0,0 +1,95 @@
+"""
+RFC 2198 redundant audio (RED).
+
+Each RED packet carries the payloads of the previous few frames ahead of
+the current one. When a packet is lost, the next one that arrives still
+holds a copy of the missing frame, and the receiver can play it instead of
+concealing the gap.
+
+A block header has 10 bits for the block length, so frames of 1024 bytes or
+more (20ms of L16 at 48kHz, 40ms at 16kHz) cannot be repeated. The client
+neither offers nor sends RED for codecs whose frames are that long.
+"""
+
+import struct
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+_BLOCK_HEADER = struct.Struct("!I")
+_MAX_OFFSET = 1 << 14  # Timestamp offset field is 14 bits
+_MAX_LENGTH = 1 << 10  # Block length field is 10 bits
+
+
+def fits(length: int) -> bool:
+    """Whether a ``length``-byte frame can be repeated in a RED block"""
+    return length < _MAX_LENGTH
+
+
+class RedundancyEncoder:
+    """Wraps each outgoing payload with copies of the ``depth`` frames before it"""
+
+    def __init__(self, depth: int) -> None:
+        self.depth = depth
+        self._history: Deque[Tuple[int, int, bytes]] = deque(maxlen=depth)
+
+    def reset(self) -> None:
+        self._history.clear()
+
+    def pack(self, payload_type: int, payload: bytes, timestamp: int) -> bytes:
+        """RED payload for ``payload`` sent with RTP timestamp ``timestamp``"""
+        headers = []
+        blocks = []
+        for block_timestamp, block_type, block in self._history:
+            offset = (timestamp - block_timestamp) % 4294967296
+            if offset >= _MAX_OFFSET or len(block) >= _MAX_LENGTH:
+                continue  # Too old or too long to describe in a block header
+            headers.append(
+                _BLOCK_HEADER.pack(
+                    0x80000000 | block_type << 24 | offset << 10 | len(block)
+                )
+            )
+            blocks.append(block)
+        if self.depth:
+            self._history.append((timestamp, payload_type, payload))
+        return b"".join(headers) + bytes((payload_type,)) + b"".join(blocks) + payload
+
+
+def unpack(payload: bytes, timestamp: int) -> List[Tuple[int, int, bytes]]:
+    """Split a RED payload into its blocks
+
+    Returns:
+        (payload type, timestamp, data) of each block, oldest first; the
+        last one is the primary encoding
+
+    Raises:
+        ValueError: if the block headers do not fit the payload
+    """
+    descriptions: List[Tuple[int, int, Optional[int]]] = []
+    position = 0
+    while True:
+        if position >= len(payload):
+            raise ValueError("RED payload ends inside its block headers")
+        if not payload[position] & 0x80:
+            descriptions.append((payload[position] & 0x7F, timestamp, None))
+            position += 1
+            break
+        if position + 4 > len(payload):
+            raise ValueError("RED payload ends inside its block headers")
+        word = _BLOCK_HEADER.unpack_from(payload, position)[0]
+        descriptions.append(
+            (
+                (word >> 24) & 0x7F,
+                (timestamp - ((word >> 10) & 0x3FFF)) % 4294967296,
+                word & 0x3FF,
+            )
+        )
+        position += 4
+
+    blocks = []
+    for block_type, block_timestamp, length in descriptions:
+        end = len(payload) if length is None else position + length
+        if end > len(payload):
+            raise ValueError("RED block runs past the end of the payload")
+        blocks.append((block_type, block_timestamp, payload[position:end]))
+        position = end
+    return blocks
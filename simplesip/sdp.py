@@ -0,0 +1,456 @@
+"""
+RFC 3264 offer/answer for the audio stream.
+
+``parse_sdp()`` turns an SDP body into a SessionDescription, ``negotiate()``
+picks the codec of a call from the remote offer or answer and our ranked
+codec list, and ``build_sdp()`` writes our offer or answer. Payload type
+numbers in an answer mirror the offer's, as RFC 3264 requires for dynamic
+types.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .srtp import SUITES as CRYPTO_SUITES
+
+# Payload type (static, or dynamic as we offer it) and rtpmap of each codec
+# the client can offer
+CODEC_RTPMAP: Dict[str, Tuple[int, str]] = {
+    "G722": (9, "G722/8000"),
+    "PCMU": (0, "PCMU/8000"),
+    "PCMA": (8, "PCMA/8000"),
+    "L16": (96, "L16/8000"),
+    "L16-16K": (97, "L16/16000"),
+    "L16-48K": (98, "L16/48000"),
+}
+
+# Audio sample rate each codec delivers to the application
+CODEC_SAMPLE_RATES: Dict[str, int] = {
+    "G722": 16000,  # 16kHz audio on an 8kHz RTP clock
+    "PCMU": 8000,
+    "PCMA": 8000,
+    "L16": 8000,
+    "L16-16K": 16000,
+    "L16-48K": 48000,
+}
+
+# RTP timestamp clock of each codec
+CODEC_CLOCK_RATES: Dict[str, int] = {
+    "G722": 8000,
+    "PCMU": 8000,
+    "PCMA": 8000,
+    "L16": 8000,
+    "L16-16K": 16000,
+    "L16-48K": 48000,
+}
+
+# RFC 3551 static payload types, used when an offer omits a=rtpmap
+STATIC_PAYLOAD_TYPES: Dict[int, str] = {
+    0: "PCMU/8000",
+    3: "GSM/8000",
+    4: "G723/8000",
+    5: "DVI4/8000",
+    6: "DVI4/16000",
+    7: "LPC/8000",
+    8: "PCMA/8000",
+    9: "G722/8000",
+    10: "L16/44100/2",
+    11: "L16/44100",
+    18: "G729/8000",
+}
+
+DIRECTIONS = ("sendrecv", "sendonly", "recvonly", "inactive")
+
+# Direction of an answer for each offered direction
+ANSWER_DIRECTIONS: Dict[str, str] = {
+    "sendrecv": "sendrecv",
+    "sendonly": "recvonly",
+    "recvonly": "sendonly",
+    "inactive": "inactive",
+}
+
+
+CodecList = Sequence[Tuple[str, int]]
+Crypto = Tuple[str, str, str]
+PayloadTypes = Union[int, Dict[int, int], None]
+
+
+def payload_ticks(codec: str, length: int) -> int:
+    """RTP timestamp ticks covered by ``length`` bytes of ``codec`` payload"""
+    if codec.startswith("L16"):
+        return length // 2  # One 16-bit sample per tick
+    return length  # G.711 and G.722: one byte per 8kHz tick
+
+
+def payload_length(codec: str, ptime: int) -> int:
+    """Bytes of ``codec`` payload in a frame of ``ptime`` milliseconds"""
+    if codec.startswith("L16"):
+        return 2 * CODEC_SAMPLE_RATES[codec] * ptime // 1000
+    return 8 * ptime  # G.711 and G.722: 8 bytes per millisecond
+
+
+def direction_allows(direction: Optional[str]) -> Tuple[bool, bool]:
+    """(send, receive) permitted by a direction attribute, from its owner's side"""
+    return direction in ("sendrecv", "sendonly"), direction in ("sendrecv", "recvonly")
+
+
+def intersect_directions(first: str, second: str) -> str:
+    """Direction that only permits what both ``first`` and ``second`` permit"""
+    send_a, receive_a = direction_allows(first)
+    send_b, receive_b = direction_allows(second)
+    send, receive = send_a and send_b, receive_a and receive_b
+    if send and receive:
+        return "sendrecv"
+    if send:
+        return "sendonly"
+    return "recvonly" if receive else "inactive"
+
+
+def _rtpmap_key(rtpmap: str) -> Tuple[str, Optional[int]]:
+    """('NAME', clock) of an rtpmap value such as 'G722/8000' or 'L16/16000/1'"""
+    parts = rtpmap.split("/")
+    clock: Optional[int]
+    try:
+        clock = int(parts[1])
+    except (IndexError, ValueError):
+        clock = None
+    return parts[0].upper(), clock
+
+
+_CODEC_KEYS = {
+    _rtpmap_key(rtpmap): codec for codec, (_, rtpmap) in CODEC_RTPMAP.items()
+}
+
+
+class MediaDescription:
+    """One m= section and the attributes we use"""
+
+    def __init__(self, media: str, port: int, proto: str, formats: List[int]) -> None:
+        self.media = media
+        self.port = port
+        self.proto = proto
+        self.formats = formats
+        self.connection: Optional[str] = None
+        self.rtpmap: Dict[int, str] = {}
+        self.fmtp: Dict[int, str] = {}
+        self.ptime: Optional[int] = None
+        self.maxptime: Optional[int] = None
+        self.direction: Optional[str] = None
+        self.crypto: List[Crypto] = []  # (tag, suite, key params) of each a=crypto line
+        self.attributes: List[str] = []  # Other a= lines, without the 'a='
+
+    def encoding(self, payload_type: int) -> Optional[str]:
+        """rtpmap value of a payload type, falling back to the static table"""
+        return self.rtpmap.get(payload_type) or STATIC_PAYLOAD_TYPES.get(payload_type)
+
+    def codec(self, payload_type: int) -> Optional[str]:
+        """Name of our codec carried by ``payload_type``, or None"""
+        encoding = self.encoding(payload_type)
+        return _CODEC_KEYS.get(_rtpmap_key(encoding)) if encoding else None
+
+
+class SessionDescription:
+    """Parsed SDP body"""
+
+    def __init__(self) -> None:
+        self.origin: Optional[Tuple[str, str, str]] = (
+            None  # (username, session id, version)
+        )
+        self.connection: Optional[str] = None
+        self.direction: Optional[str] = None
+        self.media: List[MediaDescription] = []
+
+    def audio(self) -> Optional[MediaDescription]:
+        """First audio m= section, or None"""
+        for media in self.media:
+            if media.media == "audio":
+                return media
+        return None
+
+
+def _parse_ptime(value: str) -> Optional[int]:
+    try:
+        return int(float(value.strip()))
+    except ValueError:
+        return None
+
+
+def parse_sdp(text: str) -> SessionDescription:
+    """Parse an SDP body into a SessionDescription"""
+    session = SessionDescription()
+    current: Optional[MediaDescription] = None
+
+    for line in text.splitlines():
+        if len(line) < 2 or line[1] != "=":
+            continue
+        kind, value = line[0], line[2:].strip()
+
+        if kind == "m":
+            parts = value.split()
+            if len(parts) < 3:
+                current = None
+                continue
+            try:
+                port = int(parts[1].split("/")[0])
+            except ValueError:
+                current = None
+                continue
+            formats = [int(fmt) for fmt in parts[3:] if fmt.isdigit()]
+            current = MediaDescription(parts[0], port, parts[2], formats)
+            session.media.append(current)
+        elif kind == "c":
+            parts = value.split()
+            address = parts[2].split("/")[0] if len(parts) >= 3 else None
+            if current is not None:
+                current.connection = address
+            else:
+                session.connection = address
+        elif kind == "o":
+            parts = value.split()
+            if len(parts) >= 3:
+                session.origin = (parts[0], parts[1], parts[2])
+        elif kind == "a":
+            name, _, attribute = value.partition(":")
+            if name in DIRECTIONS:
+                if current is not None:
+                    current.direction = name
+                else:
+                    session.direction = name
+            elif current is None:
+                continue
+            elif name == "rtpmap":
+                pt, _, encoding = attribute.partition(" ")
+                if pt.isdigit():
+                    current.rtpmap[int(pt)] = encoding.strip()
+            elif name == "fmtp":
+                pt, _, params = attribute.partition(" ")
+                if pt.isdigit():
+                    current.fmtp[int(pt)] = params.strip()
+            elif name == "ptime":
+                current.ptime = _parse_ptime(attribute)
+            elif name == "maxptime":
+                current.maxptime = _parse_ptime(attribute)
+            elif name == "crypto":
+                parts = attribute.split()
+                if len(parts) >= 3:
+                    current.crypto.append((parts[0], parts[1], parts[2]))
+            else:
+                current.attributes.append(value)
+
+    return session
+
+
+def media_signature(text: str) -> str:
+    """Key that stays equal while the media of an SDP body is unchanged
+
+    The o= line is left out, so a re-INVITE that only bumps the session
+    version still counts as unchanged.
+    """
+    return "\n".join(
+        line.strip()
+        for line in text.splitlines()
+        if line.strip() and not line.startswith("o=")
+    )
+
+
+def rank_codecs(
+    preferences: Iterable[str], native_rate: Optional[int] = None
+) -> List[str]:
+    """Order codecs so that those matching the consumer's sample rate come first
+
+    Decoding straight to the rate the application works at avoids a
+    resampling step; otherwise ``preferences`` keeps its order.
+    """
+    if not native_rate:
+        return list(preferences)
+    return sorted(
+        preferences, key=lambda codec: CODEC_SAMPLE_RATES.get(codec) != native_rate
+    )
+
+
+class Negotiation:
+    """Outcome of offer/answer for the audio stream
+
+    Attributes:
+        codec, payload_type: Codec to send and expect
+        codecs: Every (codec, payload type) both sides support, in order
+        dtmf_payload_type: Remote telephone-event payload type, or None
+        red_payload_type: Remote RFC 2198 redundancy payload type, or None
+        remote_address: (ip, port) to send RTP to
+        ptime, maxptime: Remote packetization attributes, or None
+        direction: Remote direction attribute (default 'sendrecv')
+        proto: Transport of the remote m= line, e.g. RTP/AVP
+        crypto: (tag, suite, key params) of the first a=crypto line with a
+                suite we support, or None
+        media: The remote MediaDescription
+    """
+
+    def __init__(
+        self,
+        codecs: List[Tuple[str, int]],
+        dtmf_payload_type: Optional[int],
+        remote_address: Optional[Tuple[str, int]],
+        media: MediaDescription,
+        direction: str,
+        red_payload_type: Optional[int] = None,
+    ) -> None:
+        self.codecs = codecs
+        self.codec, self.payload_type = codecs[0]
+        self.dtmf_payload_type = dtmf_payload_type
+        self.red_payload_type = red_payload_type
+        self.remote_address = remote_address
+        self.ptime = media.ptime
+        self.maxptime = media.maxptime
+        self.direction = direction
+        self.proto = media.proto
+        self.crypto = next(
+            (line for line in media.crypto if line[1] in CRYPTO_SUITES), None
+        )
+        self.media = media
+
+
+def negotiate(
+    remote: SessionDescription, preferences: Sequence[str], remote_is_offer: bool
+) -> Optional[Negotiation]:
+    """Choose the audio codec from a remote SessionDescription
+
+    For a remote offer the common codecs are ranked by ``preferences``; for
+    a remote answer the answerer's order is kept, as RFC 3264 asks the
+    offerer to use the first supported format of the answer.
+
+    Returns:
+        Negotiation, or None if the audio stream is missing, rejected
+        (port 0) or has no codec in common with ``preferences``
+    """
+    media = remote.audio()
+    if media is None or media.port == 0:
+        return None
+
+    offered: Dict[str, int] = {}
+    events: Dict[Optional[int], int] = (
+        {}
+    )  # Clock rate -> first telephone-event payload type
+    redundancy: Dict[Optional[int], int] = {}  # Clock rate -> first RED payload type
+    for pt in media.formats:
+        codec = media.codec(pt)
+        if codec is not None and codec in preferences:
+            offered.setdefault(codec, pt)
+            continue
+        encoding = media.encoding(pt)
+        name, clock = _rtpmap_key(encoding) if encoding else (None, None)
+        if name == "TELEPHONE-EVENT":
+            events.setdefault(clock, pt)
+        elif name == "RED":
+            redundancy.setdefault(clock, pt)
+    if not offered:
+        return None
+
+    if remote_is_offer:
+        codecs = [(codec, offered[codec]) for codec in preferences if codec in offered]
+    else:
+        codecs = list(offered.items())  # dicts keep the answer's order
+
+    # RFC 4733 and RFC 2198 payloads run on the clock of the audio codec
+    clock = CODEC_CLOCK_RATES[codecs[0][0]]
+    dtmf_payload_type = events.get(clock)
+    red_payload_type = redundancy.get(clock)
+
+    address = media.connection or remote.connection
+    direction = media.direction or remote.direction or "sendrecv"
+    return Negotiation(
+        codecs,
+        dtmf_payload_type,
+        (address, media.port) if address else None,
+        media,
+        direction,
+        red_payload_type,
+    )
+
+
+def clock_payload_types(
+    codecs: CodecList, payload_type: int, taken: Iterable[int] = ()
+) -> Dict[int, int]:
+    """Payload type for an RFC 4733 or RFC 2198 format at each clock of ``codecs``
+
+    These formats must run on the clock of the audio codec, so an offer
+    carries one per distinct clock: ``payload_type`` at the preferred codec's
+    clock and dynamic payload types no codec uses at the others.
+
+    Returns:
+        dict of clock rate -> payload type, in codec order
+    """
+    used = {pt for _, pt in codecs} | {pt for pt, _ in CODEC_RTPMAP.values()}
+    used |= set(taken) | {payload_type}
+    free = (pt for pt in range(96, 128) if pt not in used)
+    payload_types: Dict[int, Optional[int]] = {}
+    for codec, _ in codecs:
+        clock = CODEC_CLOCK_RATES[codec]
+        if clock not in payload_types:
+            payload_types[clock] = (
+                payload_type if not payload_types else next(free, None)
+            )
+    return {clock: pt for clock, pt in payload_types.items() if pt is not None}
+
+
+def build_sdp(
+    username: str,
+    session_id: Union[int, str],
+    version: Union[int, str],
+    address: str,
+    rtp_port: int,
+    codecs: CodecList,
+    dtmf_payload_type: PayloadTypes = None,
+    ptime: Optional[int] = None,
+    maxptime: Optional[int] = None,
+    direction: str = "sendrecv",
+    red_payload_type: PayloadTypes = None,
+    proto: str = "RTP/AVP",
+    crypto: Optional[Crypto] = None,
+) -> str:
+    """Write an audio offer or answer
+
+    Args:
+        codecs: (codec, payload type) pairs in order of preference
+        dtmf_payload_type: telephone-event payload type to include at the
+                           preferred codec's clock, a dict of clock rate ->
+                           payload type from clock_payload_types(), or None
+        red_payload_type: RFC 2198 redundancy payload type(s) to include,
+                          given the same way, or None
+        proto: Transport of the m= line, RTP/SAVP when offering SRTP
+        crypto: (tag, suite, key params) for an a=crypto line, or None
+    """
+    # Both run on the clock of their audio codec (RFC 2198, RFC 4733)
+    clock = CODEC_CLOCK_RATES[codecs[0][0]]
+    if red_payload_type is not None and not isinstance(red_payload_type, dict):
+        red_payload_type = {clock: red_payload_type}
+    if dtmf_payload_type is not None and not isinstance(dtmf_payload_type, dict):
+        dtmf_payload_type = {clock: dtmf_payload_type}
+
+    payload_types = [str(pt) for _, pt in codecs]
+    if red_payload_type:
+        payload_types.extend(str(pt) for pt in red_payload_type.values())
+    lines = [
+        "v=0",
+        f"o={username} {session_id} {version} IN IP4 {address}",
+        "s=SIP Call",
+        f"c=IN IP4 {address}",
+        "t=0 0",
+    ]
+    if dtmf_payload_type:
+        payload_types.extend(str(pt) for pt in dtmf_payload_type.values())
+    lines.append(f"m=audio {rtp_port} {proto} {' '.join(payload_types)}")
+    lines.extend(f"a=rtpmap:{pt} {CODEC_RTPMAP[codec][1]}" for codec, pt in codecs)
+    for clock, pt in (red_payload_type or {}).items():
+        primary = next(p for codec, p in codecs if CODEC_CLOCK_RATES[codec] == clock)
+        lines.append(f"a=rtpmap:{pt} red/{clock}")
+        lines.append(f"a=fmtp:{pt} {primary}/{primary}")
+    for clock, pt in (dtmf_payload_type or {}).items():
+        lines.append(f"a=rtpmap:{pt} telephone-event/{clock}")
+        lines.append(f"a=fmtp:{pt} 0-16")
+    if crypto is not None:
+        lines.append(f"a=crypto:{crypto[0]} {crypto[1]} {crypto[2]}")
+    if ptime:
+        lines.append(f"a=ptime:{ptime}")
+    if maxptime:
+        lines.append(f"a=maxptime:{maxptime}")
+    lines.append(f"a={direction}")
+    return "\r\n".join(lines) + "\r\n"
@@ -0,0 +1,864 @@
+"""
+Embedded SIP registrar/UAS for loopback testing.
+
+SIPTestServer stands in for a PBX on the local machine: it answers REGISTER
+(optionally behind a digest challenge), answers INVITEs with a configurable
+codec preference, ring and answer delays or a rejection status, and echoes
+or generates RTP on one shared media socket. One signaling thread and one
+media thread serve every call, and delays are scheduled on a timer heap
+rather than with a thread per call, so thousands of concurrent loopback
+calls fit in one process.
+
+    python -m simplesip.server --port 5070 --user alice:secret --media echo
+"""
+
+import argparse
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import os
+import random
+import re
+import socket
+import struct
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from . import codecs as codec_backends
+from . import sdp
+from .client import parse_sip_message
+from .sdp import ANSWER_DIRECTIONS, CODEC_CLOCK_RATES, CODEC_RTPMAP, CODEC_SAMPLE_RATES
+
+MEDIA_MODES = ("echo", "tone", "silence", "none")
+
+NONCE_LIFETIME = 300.0  # Seconds a digest challenge can be answered
+
+REASON_PHRASES = {
+    100: "Trying",
+    180: "Ringing",
+    200: "OK",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    407: "Proxy Authentication Required",
+    481: "Call/Transaction Does Not Exist",
+    486: "Busy Here",
+    487: "Request Terminated",
+    488: "Not Acceptable Here",
+    491: "Request Pending",
+    500: "Server Internal Error",
+    503: "Service Unavailable",
+    603: "Decline",
+}
+
+_AUTH_PARAM_RE = re.compile(r'(\w+)=(?:"([^"]*)"|([^,\s]+))')
+
+Address = Tuple[str, int]
+Headers = Dict[str, str]
+Timer = Tuple[float, int, Callable[..., Any], Tuple[Any, ...]]
+
+
+def _md5(text: str) -> str:
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _header_uri(value: str) -> str:
+    """URI inside a From/To/Contact header value"""
+    start = value.find("<")
+    if start >= 0:
+        end = value.find(">", start)
+        return value[start + 1 : end]
+    return value.split(";", 1)[0].strip()
+
+
+def _uri_user(uri: str) -> str:
+    user = uri.split(":", 1)[-1]
+    return user.split("@", 1)[0] if "@" in user else ""
+
+
+class ServerCall:
+    """State of one call answered by the server"""
+
+    __slots__ = (
+        "call_id",
+        "addr",
+        "invite",
+        "local_tag",
+        "state",
+        "codec",
+        "payload_type",
+        "remote_rtp",
+        "last_response",
+        "started",
+        "answered",
+        "rtp_seq",
+        "rtp_timestamp",
+        "rtp_ssrc",
+        "cseq",
+        "events",
+        "direction",
+        "ptime",
+        "next_send",
+    )
+
+    def __init__(self, call_id: str, addr: Address, invite: Headers) -> None:
+        self.call_id = call_id
+        self.addr = addr
+        self.invite = invite
+        self.local_tag = str(random.randint(100000, 999999))
+        self.state = "proceeding"  # proceeding -> answered -> confirmed -> ended
+        self.codec = ""
+        self.payload_type = 0
+        self.remote_rtp: Optional[Address] = None
+        self.last_response: Optional[str] = None
+        self.started = time.monotonic()
+        self.answered: Optional[float] = None
+        self.rtp_seq = random.randint(0, 65535)
+        self.rtp_timestamp = random.randint(0, 4294967295)
+        self.rtp_ssrc = random.randint(0, 4294967295)
+        self.cseq = 1
+        self.events: List[int] = []  # Scheduled timer entries, cancelled on CANCEL/BYE
+        self.direction = "sendrecv"  # Our side of the media, changed by re-INVITE
+        self.ptime = 20  # Milliseconds of audio per generated packet
+        self.next_send: Optional[float] = (
+            None  # Monotonic time the next generated packet is due
+        )
+
+
+class SIPTestServer:
+    """In-process SIP registrar and UAS with RTP echo
+
+    Args:
+        host: Address to bind the SIP and RTP sockets to
+        port: SIP port (0 picks a free port; see ``.port`` after start())
+        users: Mapping of username to password. When given, REGISTER (and
+               INVITE if ``challenge_invite``) must pass a digest challenge
+        realm: Digest realm
+        challenge_invite: Also challenge INVITEs with 401
+        codecs: Codec preference used to pick the answer from the offer
+        ring_delay: Seconds before sending 180 Ringing (None to skip it)
+        answer_delay: Seconds before answering (or rejecting) an INVITE
+        reject_status: Answer INVITEs with this final status instead of 200
+        hold_time: Seconds after which the server hangs up with BYE (None
+                   to wait for the caller)
+        media: 'echo' sends every RTP packet back to its source, 'tone' and
+               'silence' send each answered call one frame per ptime of the
+               offer (20ms by default) on its codec's clock, 'none' ignores
+               media
+        rtp_port: RTP port shared by all calls (0 picks a free port)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 5060,
+        users: Optional[Mapping[str, str]] = None,
+        realm: str = "simplesip",
+        challenge_invite: bool = False,
+        codecs: Iterable[str] = ("G722", "PCMU", "PCMA"),
+        ring_delay: Optional[float] = 0.0,
+        answer_delay: float = 0.0,
+        reject_status: Optional[int] = None,
+        hold_time: Optional[float] = None,
+        media: str = "echo",
+        rtp_port: int = 0,
+    ) -> None:
+        if media not in MEDIA_MODES:
+            raise ValueError(f"media must be one of {MEDIA_MODES}")
+        codecs = tuple(codecs)
+        unknown = [codec for codec in codecs if codec not in CODEC_RTPMAP]
+        if unknown:
+            raise ValueError(f"Unsupported codecs: {unknown}")
+
+        self.host = host
+        self.port = port
+        self.users = dict(users) if users else None
+        self.realm = realm
+        self.challenge_invite = challenge_invite
+        self.codecs = codecs
+        self.ring_delay = ring_delay
+        self.answer_delay = answer_delay
+        self.reject_status = reject_status
+        self.hold_time = hold_time
+        self.media = media
+        self.rtp_port = rtp_port
+
+        self.calls: Dict[str, ServerCall] = {}
+        self.registrations: Dict[str, Tuple[str, float, Address]] = (
+            {}
+        )  # username -> (contact, expires_at, source address)
+        self.stats = {
+            "registers": 0,
+            "registered": 0,
+            "challenges": 0,
+            "auth_failures": 0,
+            "invites": 0,
+            "answered": 0,
+            "rejected": 0,
+            "cancelled": 0,
+            "byes_received": 0,
+            "byes_sent": 0,
+            "reinvites": 0,
+            "rtp_received": 0,
+            "rtp_sent": 0,
+        }
+
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.sock: Optional[socket.socket] = None
+        self.rtp_sock: Optional[socket.socket] = None
+        self._nonces: Dict[str, float] = {}  # Nonce -> time issued, oldest first
+        self._timers: List[Timer] = []
+        self._timer_ids = itertools.count()
+        self._cancelled: Set[int] = set()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._frames: Dict[Tuple[str, int], bytes] = {}
+
+    # --- Lifecycle ---
+
+    def start(self) -> "SIPTestServer":
+        """Bind the sockets and start the signaling and media threads"""
+        self.sock = sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+
+        self.rtp_sock = rtp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rtp_sock.bind((self.host, self.rtp_port))
+        self.rtp_port = rtp_sock.getsockname()[1]
+        rtp_sock.settimeout(0.02)
+
+        self.running = True
+        self._threads = [
+            threading.Thread(
+                target=self._signaling_thread, name="sip-test-server", daemon=True
+            ),
+            threading.Thread(
+                target=self._media_thread, name="sip-test-server-rtp", daemon=True
+            ),
+        ]
+        for thread in self._threads:
+            thread.start()
+        self.logger.info(
+            "🧪 SIP test server on %s:%s (RTP %s, media %s)",
+            self.host,
+            self.port,
+            self.rtp_port,
+            self.media,
+        )
+        return self
+
+    def stop(self) -> None:
+        """Stop the threads and close the sockets"""
+        self.running = False
+        for thread in self._threads:
+            thread.join(1.0)
+        for sock in (self.sock, self.rtp_sock):
+            if sock is not None:
+                sock.close()
+        self.sock = self.rtp_sock = None
+
+    def __enter__(self) -> "SIPTestServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    @property
+    def address(self) -> Address:
+        """(host, port) clients should send SIP to"""
+        return self.host, self.port
+
+    # --- Timers ---
+
+    def _schedule(self, delay: float, function: Callable[..., Any], *args: Any) -> int:
+        """Run ``function(*args)`` on the signaling thread after ``delay`` seconds"""
+        timer_id = next(self._timer_ids)
+        with self._lock:
+            heapq.heappush(
+                self._timers, (time.monotonic() + delay, timer_id, function, args)
+            )
+        return timer_id
+
+    def _schedule_call(
+        self, call: ServerCall, delay: float, function: Callable[[ServerCall], Any]
+    ) -> int:
+        """Run ``function(call)`` after ``delay`` seconds
+
+        Skipped if the call's timers are cancelled first.
+        """
+        timer_id = next(self._timer_ids)
+        call.events.append(timer_id)
+        with self._lock:
+            heapq.heappush(
+                self._timers,
+                (
+                    time.monotonic() + delay,
+                    timer_id,
+                    self._fire_call_timer,
+                    (call, timer_id, function),
+                ),
+            )
+        return timer_id
+
+    def _fire_call_timer(
+        self, call: ServerCall, timer_id: int, function: Callable[[ServerCall], Any]
+    ) -> None:
+        # Only timers still pending are left to cancel
+        if timer_id in call.events:
+            call.events.remove(timer_id)
+        function(call)
+
+    def _run_due_timers(self) -> float:
+        """Run expired timers; returns seconds until the next one"""
+        while True:
+            with self._lock:
+                if not self._timers:
+                    return 0.1
+                due, timer_id, function, args = self._timers[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    return min(wait, 0.1)
+                heapq.heappop(self._timers)
+                cancelled = timer_id in self._cancelled
+                self._cancelled.discard(timer_id)
+            if not cancelled:
+                try:
+                    function(*args)
+                except Exception as e:
+                    self.logger.error("Test server timer error: %s", e)
+
+    def _cancel_call_timers(self, call: ServerCall) -> None:
+        with self._lock:
+            self._cancelled.update(call.events)
+        call.events = []
+
+    # --- Signaling ---
+
+    def _signaling_thread(self) -> None:
+        sock = self.sock
+        assert sock is not None  # Bound by start()
+        while self.running:
+            sock.settimeout(self._run_due_timers())
+            try:
+                data, addr = sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self.running:
+                    self.logger.error("Test server SIP socket error")
+                break
+            try:
+                self._handle_datagram(data.decode(errors="replace"), addr)
+            except Exception as e:
+                self.logger.error("Test server error: %s", e)
+
+    def _handle_datagram(self, message: str, addr: Address) -> None:
+        if not message.strip():
+            return  # Keepalive
+        headers = parse_sip_message(message)
+        start_line = headers["start_line"]
+        if start_line.startswith("SIP/2.0"):
+            return  # Responses (to our BYE) need no action
+
+        method = start_line.split(" ", 1)[0]
+        handler = getattr(self, f"_on_{method.lower()}", None)
+        if handler is None:
+            self._respond(headers, addr, 501, reason="Not Implemented")
+            return
+        handler(headers, addr)
+
+    def _respond(
+        self,
+        request: Headers,
+        addr: Address,
+        status: int,
+        reason: Optional[str] = None,
+        to_tag: Optional[str] = None,
+        extra_headers: Optional[Dict[str, str]] = None,
+        body: Optional[str] = None,
+    ) -> str:
+        """Build and send a response to ``request``; returns the message"""
+        to_header = request.get("to", "")
+        if to_tag and "tag=" not in to_header:
+            to_header += f";tag={to_tag}"
+
+        lines = [
+            f"SIP/2.0 {status} {reason or REASON_PHRASES.get(status, 'Unknown')}",
+            f"Via: {request.get('via', '')}",
+            f"From: {request.get('from', '')}",
+            f"To: {to_header}",
+            f"Call-ID: {request.get('call-id', '')}",
+            f"CSeq: {request.get('cseq', '')}",
+            "Server: simplesip-test-server",
+        ]
+        if extra_headers:
+            lines.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        if body:
+            lines.append("Content-Type: application/sdp")
+            lines.append(f"Content-Length: {len(body)}")
+            message = "\r\n".join(lines) + "\r\n\r\n" + body
+        else:
+            lines.append("Content-Length: 0")
+            message = "\r\n".join(lines) + "\r\n\r\n"
+
+        self._send(message, addr)
+        return message
+
+    def _send(self, message: str, addr: Address) -> None:
+        if self.sock is None:
+            return  # Stopped
+        try:
+            self.sock.sendto(message.encode(), addr)
+        except OSError as e:
+            self.logger.error("Test server send to %s failed: %s", addr, e)
+
+    # --- Digest authentication ---
+
+    def _challenge(self, request: Headers, addr: Address, stale: bool = False) -> None:
+        now = time.monotonic()
+        # Drop expired nonces; the dict is in the order they were issued
+        while self._nonces:
+            old, issued = next(iter(self._nonces.items()))
+            if now - issued < NONCE_LIFETIME:
+                break
+            del self._nonces[old]
+
+        nonce = os.urandom(16).hex()
+        self._nonces[nonce] = now
+        self.stats["challenges"] += 1
+        challenge = f'Digest realm="{self.realm}", nonce="{nonce}", algorithm=MD5'
+        if stale:
+            challenge += ", stale=true"
+        self._respond(request, addr, 401, extra_headers={"WWW-Authenticate": challenge})
+
+    def _nonce_fresh(self, nonce: str) -> bool:
+        issued = self._nonces.get(nonce)
+        return issued is not None and time.monotonic() - issued < NONCE_LIFETIME
+
+    def _authorized(self, request: Headers, method: str) -> Union[bool, str]:
+        """Check the Authorization header of a request against ``users``
+
+        Returns:
+            True, False, or 'stale' when the nonce has expired
+        """
+        header = request.get("authorization", "")
+        if not header.startswith("Digest"):
+            return False
+
+        params: Dict[str, str] = {
+            key.lower(): quoted or unquoted
+            for key, quoted, unquoted in _AUTH_PARAM_RE.findall(header[6:])
+        }
+        username = params.get("username", "")
+        nonce = params.get("nonce", "")
+        password = (self.users or {}).get(username)
+        if password is None:
+            return False
+        if not self._nonce_fresh(nonce):
+            return "stale"
+
+        ha1 = _md5(f"{username}:{self.realm}:{password}")
+        ha2 = _md5(f"{method}:{params.get('uri', '')}")
+        if params.get("qop"):
+            expected = _md5(
+                f"{ha1}:{nonce}:{params.get('nc', '')}:{params.get('cnonce', '')}:"
+                f"{params['qop']}:{ha2}"
+            )
+        else:
+            expected = _md5(f"{ha1}:{nonce}:{ha2}")
+        return params.get("response", "") == expected
+
+    def _check_auth(self, request: Headers, addr: Address, method: str) -> bool:
+        """True when the request may proceed; otherwise a response was sent"""
+        if self.users is None:
+            return True
+        if "authorization" not in request:
+            self._challenge(request, addr)
+            return False
+        authorized = self._authorized(request, method)
+        if authorized == "stale":
+            self._challenge(request, addr, stale=True)
+            return False
+        if not authorized:
+            self.stats["auth_failures"] += 1
+            self._respond(request, addr, 403)
+            return False
+        return True
+
+    # --- Request handlers ---
+
+    def _on_register(self, request: Headers, addr: Address) -> None:
+        self.stats["registers"] += 1
+        if not self._check_auth(request, addr, "REGISTER"):
+            return
+
+        user = _uri_user(_header_uri(request.get("to", "")))
+        contact = request.get("contact", "")
+        try:
+            expires = int(request.get("expires", "3600"))
+        except ValueError:
+            expires = 3600
+        if expires == 0:
+            self.registrations.pop(user, None)
+        else:
+            expires_at = time.monotonic() + expires
+            self.registrations[user] = (contact, expires_at, addr)
+            self._schedule(expires, self._expire_registration, user, expires_at)
+        self.stats["registered"] += 1
+        self._respond(
+            request,
+            addr,
+            200,
+            extra_headers={"Contact": contact, "Expires": str(expires)},
+        )
+
+    def _expire_registration(self, user: str, expires_at: float) -> None:
+        registration = self.registrations.get(user)
+        if registration is not None and registration[1] == expires_at:
+            del self.registrations[user]  # Not refreshed since
+
+    def _on_options(self, request: Headers, addr: Address) -> None:
+        self._respond(
+            request,
+            addr,
+            200,
+            extra_headers={
+                "Allow": "INVITE, ACK, CANCEL, OPTIONS, BYE, REGISTER",
+                "Accept": "application/sdp",
+            },
+        )
+
+    def _on_invite(self, request: Headers, addr: Address) -> None:
+        call_id = request.get("call-id", "")
+        call = self.calls.get(call_id)
+        if call is not None:
+            if request.get("cseq") != call.invite.get("cseq") and call.state in (
+                "answered",
+                "confirmed",
+            ):
+                self._on_reinvite(call, request, addr)
+            elif call.last_response is not None:
+                self._send(call.last_response, addr)  # Retransmitted INVITE
+            return
+
+        if self.challenge_invite and not self._check_auth(request, addr, "INVITE"):
+            return
+
+        self.stats["invites"] += 1
+        call = ServerCall(call_id, addr, request)
+        self.calls[call_id] = call
+        call.last_response = self._respond(request, addr, 100)
+
+        if self.ring_delay is not None:
+            self._schedule_call(call, self.ring_delay, self._ring)
+        self._schedule_call(call, self.answer_delay, self._answer)
+
+    def _on_reinvite(self, call: ServerCall, request: Headers, addr: Address) -> None:
+        """Answer a hold/resume or other media change in an answered call"""
+        answer = self._negotiate(call, request.get("body", ""))
+        if answer is None:
+            self._respond(request, addr, 488)
+            return
+        self._respond(
+            request,
+            addr,
+            200,
+            extra_headers={"Contact": f"<sip:uas@{self.host}:{self.port}>"},
+            body=answer,
+        )
+        self.stats["reinvites"] += 1
+
+    def _ring(self, call: ServerCall) -> None:
+        if call.state == "proceeding":
+            call.last_response = self._respond(
+                call.invite, call.addr, 180, to_tag=call.local_tag
+            )
+
+    def _answer(self, call: ServerCall) -> None:
+        if call.state != "proceeding":
+            return
+
+        if self.reject_status:
+            self._final_failure(call, self.reject_status)
+            self.stats["rejected"] += 1
+            return
+
+        offer = call.invite.get("body", "")
+        answer = self._negotiate(call, offer)
+        if answer is None:
+            self._final_failure(call, 488)
+            self.stats["rejected"] += 1
+            return
+
+        call.state = "answered"
+        call.answered = time.monotonic()
+        call.last_response = self._respond(
+            call.invite,
+            call.addr,
+            200,
+            to_tag=call.local_tag,
+            extra_headers={"Contact": f"<sip:uas@{self.host}:{self.port}>"},
+            body=answer,
+        )
+        self.stats["answered"] += 1
+        if self.hold_time is not None:
+            self._schedule_call(call, self.hold_time, self._hangup)
+
+    def _final_failure(self, call: ServerCall, status: int) -> None:
+        call.state = "ended"
+        self._respond(call.invite, call.addr, status, to_tag=call.local_tag)
+        self.calls.pop(call.call_id, None)
+
+    def _negotiate(self, call: ServerCall, offer: str) -> Optional[str]:
+        """Pick the answer codec from an SDP offer and build the SDP answer"""
+        negotiation = sdp.negotiate(
+            sdp.parse_sdp(offer), self.codecs, remote_is_offer=True
+        )
+        if negotiation is None:
+            return None
+
+        call.codec, call.payload_type = negotiation.codec, negotiation.payload_type
+        call.remote_rtp = negotiation.remote_address or (
+            call.addr[0],
+            negotiation.media.port,
+        )
+        call.direction = ANSWER_DIRECTIONS[negotiation.direction]
+        ptime = negotiation.ptime or 20
+        if negotiation.maxptime:
+            ptime = min(ptime, negotiation.maxptime)
+        call.ptime = ptime
+        return sdp.build_sdp(
+            "uas",
+            random.randint(1, 1 << 30),
+            1,
+            self.host,
+            self.rtp_port,
+            [(call.codec, call.payload_type)],
+            negotiation.dtmf_payload_type,
+            ptime=ptime,
+            direction=call.direction,
+        )
+
+    def _on_ack(self, request: Headers, addr: Address) -> None:
+        call = self.calls.get(request.get("call-id", ""))
+        if call is not None and call.state == "answered":
+            call.state = "confirmed"
+
+    def _on_cancel(self, request: Headers, addr: Address) -> None:
+        call = self.calls.get(request.get("call-id", ""))
+        if call is None or call.state != "proceeding":
+            self._respond(request, addr, 481 if call is None else 200)
+            return
+        self._respond(request, addr, 200)
+        self._cancel_call_timers(call)
+        self._final_failure(call, 487)
+        self.stats["cancelled"] += 1
+
+    def _on_bye(self, request: Headers, addr: Address) -> None:
+        call = self.calls.pop(request.get("call-id", ""), None)
+        if call is None:
+            self._respond(request, addr, 481)
+            return
+        call.state = "ended"
+        self._cancel_call_timers(call)
+        self.stats["byes_received"] += 1
+        self._respond(request, addr, 200)
+
+    def _hangup(self, call: ServerCall) -> None:
+        """Send BYE for an answered call (hold_time expired)"""
+        if self.calls.pop(call.call_id, None) is None:
+            return
+        call.state = "ended"
+        invite = call.invite
+        contact = _header_uri(invite.get("contact", "")) or _header_uri(
+            invite.get("from", "")
+        )
+        to_header = invite.get("to", "")
+        if "tag=" not in to_header:
+            to_header += f";tag={call.local_tag}"
+        call.cseq += 1
+        branch = f"z9hG4bK{random.randint(10 ** 9, 10 ** 10)}"
+        message = (
+            f"BYE {contact} SIP/2.0\r\n"
+            f"Via: SIP/2.0/UDP {self.host}:{self.port};branch={branch}\r\n"
+            f"Max-Forwards: 70\r\n"
+            f"From: {to_header}\r\n"
+            f"To: {invite.get('from', '')}\r\n"
+            f"Call-ID: {call.call_id}\r\n"
+            f"CSeq: {call.cseq} BYE\r\n"
+            f"Content-Length: 0\r\n\r\n"
+        )
+        self._send(message, call.addr)
+        self.stats["byes_sent"] += 1
+
+    # --- Media ---
+
+    def _frame(self, codec: str, ptime: int) -> bytes:
+        """One ``ptime`` payload of the generated signal for ``codec``"""
+        frame = self._frames.get((codec, ptime))
+        if frame is None:
+            rate = CODEC_SAMPLE_RATES[codec]
+            count = rate * ptime // 1000
+            if self.media == "silence":
+                pcm = bytes(2 * count)
+            else:
+                pcm = struct.pack(
+                    f"<{count}h",
+                    *(
+                        int(8000 * math.sin(2 * math.pi * 400 * n / rate))
+                        for n in range(count)
+                    ),
+                )
+            frame = self._frames[(codec, ptime)] = _encode(codec, pcm)
+        return frame
+
+    def _media_thread(self) -> None:
+        sock = self.rtp_sock
+        assert sock is not None  # Bound by start()
+        header = bytearray(12)
+        next_due = time.monotonic()
+        generate = self.media in ("tone", "silence")
+
+        while self.running:
+            try:
+                data, addr = sock.recvfrom(2048)
+                self.stats["rtp_received"] += 1
+                if self.media == "echo":
+                    sock.sendto(data, addr)
+                    self.stats["rtp_sent"] += 1
+            except socket.timeout:
+                pass
+            except OSError:
+                if self.running:
+                    self.logger.error("Test server RTP socket error")
+                break
+
+            now = time.monotonic()
+            if generate and now >= next_due:
+                next_due = self._send_frames(sock, header, now)
+                sock.settimeout(min(0.02, max(0.001, next_due - time.monotonic())))
+
+    def _send_frames(self, sock: socket.socket, header: bytearray, now: float) -> float:
+        """Send the packets that are due; returns when the next one is"""
+        next_due = now + 0.02
+        for call in list(self.calls.values()):
+            if not (
+                call.state in ("answered", "confirmed")
+                and call.remote_rtp
+                and call.direction in ("sendrecv", "sendonly")
+            ):
+                continue
+            next_send = now if call.next_send is None else call.next_send
+            if now >= next_send:
+                struct.pack_into(
+                    "!BBHII",
+                    header,
+                    0,
+                    0x80,
+                    call.payload_type,
+                    call.rtp_seq,
+                    call.rtp_timestamp,
+                    call.rtp_ssrc,
+                )
+                try:
+                    sock.sendto(
+                        bytes(header) + self._frame(call.codec, call.ptime),
+                        call.remote_rtp,
+                    )
+                    self.stats["rtp_sent"] += 1
+                except OSError:
+                    pass
+                call.rtp_seq = (call.rtp_seq + 1) % 65536
+                ticks = CODEC_CLOCK_RATES[call.codec] * call.ptime // 1000
+                call.rtp_timestamp = (call.rtp_timestamp + ticks) % 4294967296
+                # Skip ahead after a stall rather than sending a burst
+                next_send = max(next_send + call.ptime / 1000, now - 0.1)
+            call.next_send = next_send
+            next_due = min(next_due, next_send)
+        return next_due
+
+
+def _encode(codec: str, pcm: bytes) -> bytes:
+    """Encode 16-bit PCM at the codec's sample rate with a fresh encoder"""
+    if codec == "PCMU":
+        return codec_backends.ulaw_encode(pcm)
+    if codec == "PCMA":
+        return codec_backends.alaw_encode(pcm)
+    if codec == "G722":
+        return codec_backends.g722_codec().encode(pcm)
+    return codec_backends.l16_encode(pcm)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run a SIPTestServer until interrupted"""
+    parser = argparse.ArgumentParser(
+        description="Embedded SIP registrar/UAS for loopback testing"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5060)
+    parser.add_argument("--rtp-port", type=int, default=0)
+    parser.add_argument(
+        "--user",
+        action="append",
+        default=[],
+        metavar="NAME:PASSWORD",
+        help="Require digest auth for this user (repeatable)",
+    )
+    parser.add_argument("--challenge-invite", action="store_true")
+    parser.add_argument(
+        "--codecs", default="G722,PCMU,PCMA", help="Answer codec preference"
+    )
+    parser.add_argument("--ring-delay", type=float, default=0.0)
+    parser.add_argument("--answer-delay", type=float, default=0.0)
+    parser.add_argument("--reject", type=int, default=None, metavar="STATUS")
+    parser.add_argument("--hold-time", type=float, default=None)
+    parser.add_argument("--media", choices=MEDIA_MODES, default="echo")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    users = dict(user.split(":", 1) for user in args.user) or None
+    server = SIPTestServer(
+        host=args.host,
+        port=args.port,
+        users=users,
+        challenge_invite=args.challenge_invite,
+        codecs=[
+            codec.strip().upper() for codec in args.codecs.split(",") if codec.strip()
+        ],
+        ring_delay=args.ring_delay,
+        answer_delay=args.answer_delay,
+        reject_status=args.reject,
+        hold_time=args.hold_time,
+        media=args.media,
+        rtp_port=args.rtp_port,
+    ).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        server.logger.info("Test server stats: %s", server.stats)
+
+
+if __name__ == "__main__":
+    main()
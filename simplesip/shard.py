@@ -0,0 +1,535 @@
+"""
+Multi-process sharding of SIP and RTP work across CPU cores.
+
+ShardSupervisor forks N worker processes that all answer on one SIP port.
+Each worker owns a slice of the RTP port range and runs its own
+SimpleSIPClient instances, so media encoding, decoding and CallManager
+callbacks for a call run in the worker that owns the dialog, outside the
+GIL of every other worker.
+
+Two ways of sharing the SIP port are supported:
+
+- ``'dispatcher'`` (default): the supervisor owns the SIP socket and
+  forwards each datagram to a worker chosen by its Call-ID, so every
+  message of a dialog reaches the same worker. Workers reply directly on
+  the inherited socket, so peers only ever see one address.
+- ``'reuseport'``: every worker binds the port itself with SO_REUSEPORT
+  and the kernel spreads datagrams by source address. There is no extra
+  hop, and dialogs stay on one worker because a peer always hashes to the
+  same socket, but traffic from a single peer (one PBX or trunk) lands on
+  a single worker, and a worker does not see replies to requests it sent
+  unless they hash to it. Use it for IP-authenticated trunks with many
+  peers, and the dispatcher for registered user agents.
+
+Call-IDs created by a worker's clients carry a ``w<worker>c<client>-``
+prefix so replies to outgoing requests are routed back to their sender.
+"""
+
+import collections
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import socket
+import struct
+import threading
+import zlib
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .client import SimpleSIPClient
+
+MODES = ("dispatcher", "reuseport")
+
+_CALL_ID = re.compile(rb"\r\n(?:call-id|i)[ \t]*:[ \t]*([^\r\n]+)", re.IGNORECASE)
+_PREFIX = re.compile(rb"w(\d+)c(\d+)-")
+_ADDRESS = struct.Struct("!4sH")
+
+
+def extract_call_id(data: bytes) -> Optional[bytes]:
+    """Call-ID of a raw SIP datagram as bytes, or None"""
+    match = _CALL_ID.search(data)
+    return match.group(1).strip() if match else None
+
+
+def call_id_prefix(worker: int, client: int) -> str:
+    """Prefix that routes Call-IDs back to a worker's client"""
+    return f"w{worker}c{client}-"
+
+
+def route_call_id(call_id: bytes, workers: int) -> int:
+    """Index of the worker that owns ``call_id`` (bytes)"""
+    match = _PREFIX.match(call_id)
+    if match:
+        worker = int(match.group(1))
+        if worker < workers:
+            return worker
+    return zlib.crc32(call_id) % workers
+
+
+def split_ports(port_range: Tuple[int, int], workers: int) -> List[range]:
+    """Split an inclusive (first, last) port range into one range per worker"""
+    first, last = port_range
+    count = last - first + 1
+    if count < workers:
+        raise ValueError(
+            f"RTP port range {first}-{last} is too small for {workers} workers"
+        )
+    size = count // workers
+    return [
+        range(first + i * size, first + (i + 1) * size if i < workers - 1 else last + 1)
+        for i in range(workers)
+    ]
+
+
+class _ClientSocket:
+    """Socket facade handed to a worker's client
+
+    Receives the datagrams the worker routed to this client and sends on
+    the shared SIP socket.
+    """
+
+    def __init__(self, shared: socket.socket) -> None:
+        self._shared = shared
+        self._inbox: "queue.Queue[Tuple[bytes, Tuple[str, int]]]" = queue.Queue()
+        self._timeout: Optional[float] = None
+        self._closed = False
+
+    def deliver(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self._inbox.put((data, addr))
+
+    def recvfrom(self, bufsize: int) -> Tuple[bytes, Tuple[str, int]]:
+        if self._closed:
+            raise OSError("socket is closed")
+        try:
+            data, addr = self._inbox.get(timeout=self._timeout)
+        except queue.Empty:
+            raise socket.timeout("timed out")
+        return data[:bufsize], addr
+
+    def sendto(self, data: bytes, addr: Tuple[str, int]) -> int:
+        return self._shared.sendto(data, addr)
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self._timeout = timeout
+
+    def getsockname(self) -> Any:
+        return self._shared.getsockname()
+
+    def setsockopt(self, *args: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        self._closed = True
+
+
+class ShardWorker:
+    """Handle passed to the worker function inside each worker process
+
+    Attributes:
+        index: Worker number, 0 to workers - 1
+        workers: Total number of workers
+        rtp_ports: Range of RTP ports this worker may bind
+        stopping: Event set when the supervisor asks the worker to stop
+    """
+
+    def __init__(
+        self,
+        index: int,
+        workers: int,
+        mode: str,
+        sip_socket: socket.socket,
+        inbox: Optional[socket.socket],
+        rtp_ports: range,
+        control: Connection,
+    ) -> None:
+        self.index = index
+        self.workers = workers
+        self.mode = mode
+        self.rtp_ports = rtp_ports
+        self.stopping = threading.Event()
+        self.clients: List[SimpleSIPClient] = []
+
+        self.logger = logging.getLogger(__name__)
+        self._sip_socket = sip_socket
+        self._inbox = inbox
+        self._control = control
+        self._sockets: List[_ClientSocket] = []
+        self._assigned: "collections.OrderedDict[str, _ClientSocket]" = (
+            collections.OrderedDict()
+        )
+        self._next_port = 0
+        self._lock = threading.Lock()
+
+    def create_client(
+        self,
+        username: str,
+        password: str,
+        server: str,
+        port: int = 5060,
+        call_manager: Any = None,
+    ) -> SimpleSIPClient:
+        """Create and connect a SimpleSIPClient on the shared SIP port
+
+        The client gets an RTP port from this worker's slice and its
+        CallManager callbacks run in this process.
+        """
+        with self._lock:
+            index = len(self.clients)
+            client = SimpleSIPClient(
+                username, password, server, port=port, call_manager=call_manager
+            )
+            client.call_id_prefix = call_id_prefix(self.index, index)
+            client.local_rtp_port = self._allocate_rtp_port(client)
+            facade = _ClientSocket(self._sip_socket)
+            self.clients.append(client)
+            self._sockets.append(facade)
+        client.connect(sip_socket=facade)
+        return client
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the supervisor asks this worker to stop"""
+        return self.stopping.wait(timeout)
+
+    def _allocate_rtp_port(self, client: SimpleSIPClient) -> int:
+        host = client.get_local_ip()
+        for _ in range(len(self.rtp_ports)):
+            port = self.rtp_ports[self._next_port % len(self.rtp_ports)]
+            self._next_port += 1
+            probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                probe.bind((host, port))
+                return port
+            except OSError:
+                continue
+            finally:
+                probe.close()
+        raise RuntimeError(
+            f"No free RTP port left in {self.rtp_ports[0]}-{self.rtp_ports[-1]}"
+        )
+
+    # --- Receiving ---
+
+    def _start(self) -> None:
+        threading.Thread(target=self._receive_loop, daemon=True).start()
+        threading.Thread(target=self._control_loop, daemon=True).start()
+
+    def _receive(self) -> Tuple[bytes, Tuple[str, int]]:
+        if self._inbox is not None:
+            packet = self._inbox.recv(65536 + _ADDRESS.size)
+            host, port = _ADDRESS.unpack_from(packet)
+            return packet[_ADDRESS.size :], (socket.inet_ntoa(host), port)
+        return self._sip_socket.recvfrom(65536)
+
+    def _receive_loop(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                data, addr = self._receive()
+            except socket.timeout:
+                continue
+            except OSError:
+                if not self.stopping.is_set():
+                    self.logger.error("Worker %s lost its SIP socket", self.index)
+                    self.stopping.set()
+                return
+            if not data.strip():
+                continue  # CRLF keepalive
+            facade = self._route(data)
+            if facade is not None:
+                facade.deliver(data, addr)
+
+    def _route(self, data: bytes) -> Optional[_ClientSocket]:
+        """Client socket that should receive a datagram"""
+        with self._lock:
+            sockets = list(self._sockets)
+            clients = list(self.clients)
+        if not sockets:
+            return None
+
+        call_id = extract_call_id(data)
+        if call_id is None:
+            return sockets[0]
+        match = _PREFIX.match(call_id)
+        if (
+            match
+            and int(match.group(1)) == self.index
+            and int(match.group(2)) < len(sockets)
+        ):
+            return sockets[int(match.group(2))]
+
+        text_id = call_id.decode(errors="replace")
+        for client, candidate in zip(clients, sockets):
+            if client.call_id == text_id:
+                return candidate
+
+        # New dialog: remember which client took it until that client
+        # records the Call-ID itself (covers INVITE retransmissions)
+        facade = self._assigned.get(text_id)
+        if facade is None:
+            idle = [
+                facade
+                for client, facade in zip(clients, sockets)
+                if client.call_id is None
+            ]
+            facade = idle[0] if idle else sockets[zlib.crc32(call_id) % len(sockets)]
+            self._assigned[text_id] = facade
+            if len(self._assigned) > 1024:
+                self._assigned.popitem(last=False)
+        return facade
+
+    def _control_loop(self) -> None:
+        while True:
+            try:
+                command = self._control.recv()
+            except (EOFError, OSError):
+                self.stopping.set()
+                return
+            if command == "metrics":
+                self._control.send(metrics.REGISTRY.snapshot())
+            elif command == "stop":
+                self.stopping.set()
+
+    def _close(self) -> None:
+        for client in list(self.clients):
+            try:
+                client.disconnect()
+            except Exception as e:
+                self.logger.error("Worker %s disconnect failed: %s", self.index, e)
+
+
+def _worker_main(
+    index: int,
+    workers: int,
+    mode: str,
+    host: str,
+    sip_port: int,
+    shared: Optional[socket.socket],
+    inbox: Optional[socket.socket],
+    rtp_ports: range,
+    control: Connection,
+    target: Callable[[ShardWorker], Any],
+) -> None:
+    """Entry point of a forked worker process"""
+    # Counts inherited from the supervisor belong to the supervisor
+    metrics.REGISTRY.reset()
+
+    if mode == "reuseport":
+        shared = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        shared.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        shared.bind((host, sip_port))
+        shared.settimeout(0.5)
+    else:
+        assert shared is not None and inbox is not None
+        inbox.settimeout(0.5)
+
+    worker = ShardWorker(index, workers, mode, shared, inbox, rtp_ports, control)
+    worker._start()
+    try:
+        target(worker)
+    finally:
+        worker.stopping.set()
+        worker._close()
+
+
+class ShardSupervisor:
+    """Fork worker processes that share one SIP port
+
+    ``target(worker)`` runs in every worker process with a ShardWorker; it
+    typically creates one or more clients with ``worker.create_client()``
+    and then calls ``worker.wait()``. The worker exits when it returns.
+
+    Args:
+        target: Function run in each worker process
+        workers: Number of worker processes (default: CPU count)
+        host: Address to bind the SIP port on
+        sip_port: Shared SIP port (0 picks a free port)
+        rtp_port_range: Inclusive (first, last) RTP ports, split evenly
+                        between workers
+        mode: 'dispatcher' (route by Call-ID) or 'reuseport' (SO_REUSEPORT)
+    """
+
+    def __init__(
+        self,
+        target: Callable[[ShardWorker], Any],
+        workers: Optional[int] = None,
+        host: str = "0.0.0.0",
+        sip_port: int = 5060,
+        rtp_port_range: Tuple[int, int] = (10000, 20000),
+        mode: str = "dispatcher",
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if mode == "reuseport" and not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not available on this platform")
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("Sharding needs the fork start method")
+
+        self.target = target
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.sip_port = sip_port
+        self.rtp_port_ranges = split_ports(rtp_port_range, self.workers)
+        self.mode = mode
+
+        self.logger = logging.getLogger(__name__)
+        self.processes: List[BaseProcess] = []
+        self._controls: List[Connection] = []
+        self._control_locks: List[threading.Lock] = []
+        self._outboxes: List[socket.socket] = []
+        self._sock: Optional[socket.socket] = None
+        self._running = False
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def start(self) -> "ShardSupervisor":
+        """Bind the SIP port and fork the workers"""
+        context = multiprocessing.get_context("fork")
+
+        if self.mode == "dispatcher":
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.bind((self.host, self.sip_port))
+            self._sock.settimeout(0.5)
+            self.sip_port = self._sock.getsockname()[1]
+        elif self.sip_port == 0:
+            probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            probe.bind((self.host, 0))
+            self.sip_port = probe.getsockname()[1]
+            probe.close()
+
+        for index in range(self.workers):
+            inbox = None
+            if self.mode == "dispatcher":
+                outbox, inbox = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+                outbox.setblocking(False)
+                self._outboxes.append(outbox)
+            control, worker_control = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                name=f"simplesip-shard-{index}",
+                daemon=True,
+                args=(
+                    index,
+                    self.workers,
+                    self.mode,
+                    self.host,
+                    self.sip_port,
+                    self._sock,
+                    inbox,
+                    self.rtp_port_ranges[index],
+                    worker_control,
+                    self.target,
+                ),
+            )
+            process.start()
+            worker_control.close()
+            if inbox is not None:
+                inbox.close()
+            self.processes.append(process)
+            self._controls.append(control)
+            self._control_locks.append(threading.Lock())
+
+        self._running = True
+        if self.mode == "dispatcher":
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+            self._dispatcher.start()
+        self.logger.info(
+            "Started %s shard workers on port %s (%s)",
+            self.workers,
+            self.sip_port,
+            self.mode,
+        )
+        return self
+
+    def _dispatch_loop(self) -> None:
+        sent = [
+            metrics.SHARD_DATAGRAMS_DISPATCHED.labels(str(i))
+            for i in range(self.workers)
+        ]
+        dropped = [
+            metrics.SHARD_DATAGRAMS_DROPPED.labels(str(i)) for i in range(self.workers)
+        ]
+        sock = self._sock
+        assert sock is not None
+        while self._running:
+            try:
+                data, (host, port) = sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            call_id = extract_call_id(data)
+            if call_id is None:
+                continue  # keepalives and non-SIP noise
+            index = route_call_id(call_id, self.workers)
+            try:
+                self._outboxes[index].send(
+                    _ADDRESS.pack(socket.inet_aton(host), port) + data
+                )
+                sent[index].inc()
+            except OSError:
+                # Worker busy (queue full) or gone; drop like a lossy network
+                dropped[index].inc()
+
+    def alive(self) -> List[int]:
+        """Indices of the workers that are still running"""
+        return [i for i, process in enumerate(self.processes) if process.is_alive()]
+
+    def collect_metrics(self, timeout: float = 2.0) -> metrics.Snapshot:
+        """Metrics of the supervisor and all live workers, summed"""
+        snapshots = [metrics.REGISTRY.snapshot()]
+        for index in self.alive():
+            control = self._controls[index]
+            with self._control_locks[index]:
+                try:
+                    control.send("metrics")
+                    if control.poll(timeout):
+                        snapshots.append(control.recv())
+                except (EOFError, OSError):
+                    continue
+        return metrics.merge_snapshots(snapshots)
+
+    def render(self) -> str:
+        """Aggregated metrics in the Prometheus text format"""
+        return metrics.render_snapshot(self.collect_metrics())
+
+    def start_metrics_server(
+        self, port: int = 9464, host: str = "127.0.0.1"
+    ) -> metrics.MetricsServer:
+        """Serve the aggregated metrics of all workers"""
+        return metrics.start_metrics_server(port, host, registry=self)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait for all workers to exit"""
+        for process in self.processes:
+            process.join(timeout)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Ask the workers to stop, then terminate any that do not"""
+        for index in self.alive():
+            with self._control_locks[index]:
+                try:
+                    self._controls[index].send("stop")
+                except (EOFError, OSError):
+                    pass
+        self.join(timeout)
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+
+        self._running = False
+        if self._dispatcher is not None:
+            self._dispatcher.join(1.0)
+        for sock in self._outboxes + ([self._sock] if self._sock else []):
+            sock.close()
+        for control in self._controls:
+            control.close()
+
+    def __enter__(self) -> "ShardSupervisor":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
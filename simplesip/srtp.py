@@ -0,0 +1,314 @@
+"""
+SRTP and SRTCP (RFC 3711) with SDES keying (RFC 4568).
+
+Supports AES_CM_128_HMAC_SHA1_80 and AES_CM_128_HMAC_SHA1_32. The session
+keys are derived once per master key and the AES and HMAC key schedules are
+kept. Keystream comes from counter blocks whose packet index can be
+predicted: the sender's next sequence numbers, and the receiver's next
+expected ones. So AES runs once for a batch of upcoming packets rather than
+once per packet.
+
+Needs the ``cryptography`` package: ``pip install simplesip[srtp]``.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+# Suite name -> SRTP authentication tag length in bytes
+SUITES: Dict[str, int] = {
+    "AES_CM_128_HMAC_SHA1_80": 10,
+    "AES_CM_128_HMAC_SHA1_32": 4,
+}
+
+_KEY_LENGTH = 16
+_SALT_LENGTH = 14
+_SRTCP_TAG_LENGTH = 10  # SRTCP always uses the 80-bit tag
+_BATCH = 16  # Packets of keystream generated per AES call
+_REPLAY_WINDOW = 64
+
+
+def _aes_ecb(key: bytes) -> Any:
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError:
+        raise ImportError(
+            "SRTP needs the 'cryptography' package: pip install simplesip[srtp]"
+        )
+    return Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+
+
+def _xor(data: bytes, keystream: bytes) -> bytes:
+    length = len(data)
+    return (
+        int.from_bytes(data, "big") ^ int.from_bytes(keystream[:length], "big")
+    ).to_bytes(length, "big")
+
+
+def generate_key() -> str:
+    """New random master key and salt, base64 encoded for a=crypto inline:"""
+    return base64.b64encode(os.urandom(_KEY_LENGTH + _SALT_LENGTH)).decode("ascii")
+
+
+def parse_key_params(key_params: str) -> Tuple[bytes, bytes]:
+    """Master key and salt from 'inline:<base64>[|lifetime][|MKI:len]'"""
+    method, _, value = key_params.partition(":")
+    if method != "inline":
+        raise ValueError(f"Unsupported key method {method}")
+    key_salt = base64.b64decode(value.split("|")[0] + "==")
+    if len(key_salt) < _KEY_LENGTH + _SALT_LENGTH:
+        raise ValueError("SRTP master key and salt too short")
+    return key_salt[:_KEY_LENGTH], key_salt[_KEY_LENGTH : _KEY_LENGTH + _SALT_LENGTH]
+
+
+class _Keys:
+    """Session keys for one direction, derived once from a master key (RFC 3711 4.3)"""
+
+    def __init__(self, master_key: bytes, master_salt: bytes) -> None:
+        prf = _aes_ecb(master_key)
+        salt = int.from_bytes(master_salt, "big")
+
+        def derive(label: int, length: int) -> bytes:
+            x = salt ^ (label << 48)
+            blocks = b"".join(
+                ((x << 16) + j).to_bytes(16, "big") for j in range((length + 15) // 16)
+            )
+            return bytes(prf.update(blocks)[:length])
+
+        self.rtp_cipher = _aes_ecb(derive(0, _KEY_LENGTH))
+        self.rtp_auth = hmac.new(derive(1, 20), digestmod=hashlib.sha1)
+        self.rtp_salt = int.from_bytes(derive(2, _SALT_LENGTH), "big")
+        self.rtcp_cipher = _aes_ecb(derive(3, _KEY_LENGTH))
+        self.rtcp_auth = hmac.new(derive(4, 20), digestmod=hashlib.sha1)
+        self.rtcp_salt = int.from_bytes(derive(5, _SALT_LENGTH), "big")
+
+
+class _Stream:
+    """Per-SSRC index tracking, replay window and keystream batch"""
+
+    def __init__(self, cipher: Any, salt: int, ssrc: int) -> None:
+        self.cipher = cipher
+        self.iv_base = (salt ^ (ssrc << 48)) << 16
+        self.roc = 0
+        self.highest_seq: Optional[int] = None
+        self.highest_index = -1
+        self.replay = 0  # Bit n set: highest_index - n was received
+        self._batch_start = 0
+        self._batch_count = 0
+        self._batch_stride = 0
+        self._batch = b""
+
+    def keystream(self, index: int, length: int) -> bytes:
+        """AES-CM keystream for packet ``index``, from the current batch if possible"""
+        offset = index - self._batch_start
+        if not (0 <= offset < self._batch_count and length <= self._batch_stride):
+            self._fill(index, max(length, self._batch_stride))
+            offset = 0
+        start = offset * self._batch_stride
+        return self._batch[start : start + length]
+
+    def _fill(self, index: int, length: int) -> None:
+        blocks = (length + 15) // 16
+        counters = b"".join(
+            ((self.iv_base ^ ((index + n) << 16)) + j).to_bytes(16, "big")
+            for n in range(_BATCH)
+            for j in range(blocks)
+        )
+        self._batch = self.cipher.update(counters)
+        self._batch_start = index
+        self._batch_count = _BATCH
+        self._batch_stride = blocks * 16
+
+    def estimate_index(self, seq: int) -> Tuple[int, int]:
+        """(packet index, rollover counter guess) for a received sequence number
+
+        RFC 3711 3.3.1.
+        """
+        if self.highest_seq is None:
+            return seq, 0
+        roc = self.roc
+        if self.highest_seq < 32768:
+            guess = roc - 1 if seq - self.highest_seq > 32768 else roc
+        else:
+            guess = roc + 1 if self.highest_seq - 32768 > seq else roc
+        return (guess << 16) | seq, guess
+
+    def check_replay(self, index: int) -> bool:
+        if index > self.highest_index:
+            return True
+        delta = self.highest_index - index
+        return delta < _REPLAY_WINDOW and not (self.replay >> delta) & 1
+
+    def accept(self, index: int, seq: int, roc: int) -> None:
+        if index > self.highest_index:
+            self.replay = ((self.replay << (index - self.highest_index)) | 1) & (
+                (1 << _REPLAY_WINDOW) - 1
+            )
+            self.highest_index = index
+        else:
+            self.replay |= 1 << (self.highest_index - index)
+        if (
+            self.highest_seq is None
+            or roc > self.roc
+            or (roc == self.roc and seq > self.highest_seq)
+        ):
+            self.roc = roc
+            self.highest_seq = seq
+
+
+def _header_length(packet: bytes) -> int:
+    length = 12 + 4 * (packet[0] & 0x0F)
+    if packet[0] & 0x10:
+        if len(packet) < length + 4:
+            raise ValueError("RTP header extension truncated")
+        length += 4 + 4 * int.from_bytes(packet[length + 2 : length + 4], "big")
+    if len(packet) < length:
+        raise ValueError("RTP packet shorter than its header")
+    return length
+
+
+class SRTPSession:
+    """Protects outgoing and unprotects incoming packets of one call
+
+    Args:
+        local_key: Our master key and salt from generate_key(), used to send
+        remote_key_params: Key parameters of the peer's a=crypto line,
+                           e.g. 'inline:<base64>', used to receive
+        suite: Crypto suite name from SUITES
+    """
+
+    def __init__(
+        self,
+        local_key: str,
+        remote_key_params: str,
+        suite: str = "AES_CM_128_HMAC_SHA1_80",
+    ) -> None:
+        if suite not in SUITES:
+            raise ValueError(f"Unsupported SRTP suite {suite}")
+        self.suite = suite
+        self.tag_length = SUITES[suite]
+        self._tx = _Keys(*parse_key_params(f"inline:{local_key}"))
+        self._rx = _Keys(*parse_key_params(remote_key_params))
+        self._tx_streams: Dict[int, _Stream] = {}
+        self._rx_streams: Dict[int, _Stream] = {}
+        self._rtcp_index = 0
+        self._rtcp_replay: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def protect(self, packet: bytes) -> bytes:
+        """Encrypt and authenticate an RTP packet"""
+        header_length = _header_length(packet)
+        seq, ssrc = struct.unpack_from("!H4xI", packet, 2)
+        with self._lock:
+            stream = self._tx_streams.get(ssrc)
+            if stream is None:
+                stream = self._tx_streams[ssrc] = _Stream(
+                    self._tx.rtp_cipher, self._tx.rtp_salt, ssrc
+                )
+            if (
+                stream.highest_seq is not None
+                and seq < stream.highest_seq
+                and stream.highest_seq - seq > 32768
+            ):
+                stream.roc += 1  # Sequence number wrapped
+            stream.highest_seq = seq
+            roc = stream.roc
+            payload = packet[header_length:]
+            encrypted = packet[:header_length] + _xor(
+                payload, stream.keystream((roc << 16) | seq, len(payload))
+            )
+        mac = self._tx.rtp_auth.copy()
+        mac.update(encrypted)
+        mac.update(roc.to_bytes(4, "big"))
+        return encrypted + mac.digest()[: self.tag_length]
+
+    def unprotect(self, packet: bytes) -> bytes:
+        """Authenticate and decrypt an SRTP packet
+
+        Raises:
+            ValueError: if the packet fails authentication or is a replay
+        """
+        tag_length = self.tag_length
+        if len(packet) < 12 + tag_length:
+            raise ValueError("SRTP packet too short")
+        authenticated, tag = packet[:-tag_length], packet[-tag_length:]
+        header_length = _header_length(authenticated)
+        seq, ssrc = struct.unpack_from("!H4xI", packet, 2)
+
+        stream = self._rx_streams.get(ssrc)
+        if stream is None:
+            stream = self._rx_streams[ssrc] = _Stream(
+                self._rx.rtp_cipher, self._rx.rtp_salt, ssrc
+            )
+        index, roc = stream.estimate_index(seq)
+        if not stream.check_replay(index):
+            raise ValueError("SRTP replay")
+
+        mac = self._rx.rtp_auth.copy()
+        mac.update(authenticated)
+        mac.update((roc & 0xFFFFFFFF).to_bytes(4, "big"))
+        if not hmac.compare_digest(mac.digest()[:tag_length], tag):
+            raise ValueError("SRTP authentication failed")
+
+        stream.accept(index, seq, roc)
+        payload = authenticated[header_length:]
+        return authenticated[:header_length] + _xor(
+            payload, stream.keystream(index, len(payload))
+        )
+
+    def protect_rtcp(self, packet: bytes) -> bytes:
+        """Encrypt and authenticate an RTCP compound packet"""
+        ssrc = struct.unpack_from("!I", packet, 4)[0]
+        with self._lock:
+            index = self._rtcp_index
+            self._rtcp_index = (index + 1) & 0x7FFFFFFF
+        keystream = self._rtcp_keystream(self._tx, ssrc, index, len(packet) - 8)
+        encrypted = (
+            packet[:8]
+            + _xor(packet[8:], keystream)
+            + (0x80000000 | index).to_bytes(4, "big")
+        )
+        mac = self._tx.rtcp_auth.copy()
+        mac.update(encrypted)
+        return encrypted + mac.digest()[:_SRTCP_TAG_LENGTH]
+
+    def unprotect_rtcp(self, packet: bytes) -> bytes:
+        """Authenticate and decrypt an SRTCP packet
+
+        Raises:
+            ValueError: if the packet fails authentication or is a replay
+        """
+        if len(packet) < 8 + 4 + _SRTCP_TAG_LENGTH:
+            raise ValueError("SRTCP packet too short")
+        authenticated, tag = packet[:-_SRTCP_TAG_LENGTH], packet[-_SRTCP_TAG_LENGTH:]
+        mac = self._rx.rtcp_auth.copy()
+        mac.update(authenticated)
+        if not hmac.compare_digest(mac.digest()[:_SRTCP_TAG_LENGTH], tag):
+            raise ValueError("SRTCP authentication failed")
+
+        ssrc = struct.unpack_from("!I", packet, 4)[0]
+        word = int.from_bytes(authenticated[-4:], "big")
+        index = word & 0x7FFFFFFF
+        seen = self._rtcp_replay.setdefault(ssrc, set())
+        if index in seen:
+            raise ValueError("SRTCP replay")
+        seen.add(index)
+        if len(seen) > _REPLAY_WINDOW:
+            seen.discard(min(seen))
+
+        body = authenticated[8:-4]
+        if word & 0x80000000:
+            body = _xor(body, self._rtcp_keystream(self._rx, ssrc, index, len(body)))
+        return authenticated[:8] + body
+
+    @staticmethod
+    def _rtcp_keystream(keys: _Keys, ssrc: int, index: int, length: int) -> bytes:
+        iv = (keys.rtcp_salt ^ (ssrc << 48) ^ index) << 16
+        blocks = b"".join(
+            (iv + j).to_bytes(16, "big") for j in range((length + 15) // 16)
+        )
+        return bytes(keys.rtcp_cipher.update(blocks))
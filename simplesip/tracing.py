@@ -0,0 +1,294 @@
+"""
+Tracing and profiling hooks for the SIP and RTP pipeline.
+
+SimpleSIPClient calls ``tracer.start(stage, call_id)`` and ``tracer.end(span)``
+around each pipeline stage when a tracer is installed with ``set_tracer()``.
+Without one, each stage costs a single ``is not None`` check.
+
+Adapters:
+    JSONLTracer    - writes every sampled span to a JSONL file (optionally one
+                     file per call)
+    StageProfiler  - aggregates per-stage latency (count, mean, p50/p99, max)
+    MultiTracer    - fans spans out to several tracers
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from typing import IO, Any, Dict, Iterable, Optional, Tuple
+
+from .metrics import Histogram
+
+# Pipeline stages reported by SimpleSIPClient
+SIP_RECEIVE = "sip.receive"  # _receive_thread: one datagram, decode to handled
+SIP_HANDLE = "sip.handle"  # _handle_message
+SIP_PARSE = "sip.parse"  # _parse_sip_message
+SDP_PARSE = "sdp.parse"  # _parse_sdp_answer
+RTP_RECEIVE = "rtp.receive"  # _rtp_receive_thread: one packet, header to delivered
+RTP_DECODE = "rtp.decode"  # payload decode
+JITTER_BUFFER = "rtp.jitter_buffer"  # _add_to_jitter_buffer
+AUDIO_CALLBACK = "audio.callback"  # application audio callback
+SEND_AUDIO = "send_audio"  # send_audio, whole buffer
+RTP_ENCODE = "rtp.encode"  # payload encode
+
+STAGES = (
+    SIP_RECEIVE,
+    SIP_HANDLE,
+    SIP_PARSE,
+    SDP_PARSE,
+    RTP_RECEIVE,
+    RTP_DECODE,
+    JITTER_BUFFER,
+    AUDIO_CALLBACK,
+    SEND_AUDIO,
+    RTP_ENCODE,
+)
+
+_FINISHED_CALLS = 1024  # Ended calls a JSONLTracer remembers
+
+# (stage, call_id, wall time, perf_counter_ns at start)
+Span = Tuple[str, Optional[str], float, int]
+
+
+class Tracer:
+    """Base tracer with sampling; subclasses implement ``record()``
+
+    Args:
+        sample_rate: Fraction of spans to record (0.0-1.0)
+        per_call: Make the sampling decision once per Call-ID, so a sampled
+                  call is traced completely and other calls not at all
+        stages: Only trace these stages (default: all)
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        per_call: bool = True,
+        stages: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.per_call = per_call
+        self.stages = frozenset(stages) if stages else None
+        self._threshold = int(sample_rate * 0xFFFFFFFF)
+
+    def _sampled(self, call_id: Optional[str]) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        if self.sample_rate <= 0.0:
+            return False
+        if self.per_call and call_id:
+            return zlib.crc32(call_id.encode()) <= self._threshold
+        return random.random() < self.sample_rate
+
+    def start(self, stage: str, call_id: Optional[str] = None) -> Optional[Span]:
+        """Open a span; returns None when the span is not sampled"""
+        if self.stages is not None and stage not in self.stages:
+            return None
+        if not self._sampled(call_id):
+            return None
+        return (stage, call_id, time.time(), time.perf_counter_ns())
+
+    def end(self, span: Optional[Span]) -> None:
+        """Close a span returned by start()"""
+        if span is None:
+            return
+        stage, call_id, wall_time, start_ns = span
+        self.record(
+            stage, call_id, wall_time, (time.perf_counter_ns() - start_ns) / 1000.0
+        )
+
+    def record(
+        self, stage: str, call_id: Optional[str], wall_time: float, duration_us: float
+    ) -> None:
+        """Handle one finished span"""
+        raise NotImplementedError
+
+    def close_call(self, call_id: Optional[str]) -> None:
+        """Release anything held for a call that has ended"""
+
+    def close(self) -> None:
+        pass
+
+
+class MultiTracer(Tracer):
+    """Send every sampled span to several tracers"""
+
+    def __init__(
+        self,
+        *tracers: Tracer,
+        sample_rate: float = 1.0,
+        per_call: bool = True,
+        stages: Optional[Iterable[str]] = None,
+    ) -> None:
+        super().__init__(sample_rate, per_call, stages)
+        self.tracers = tracers
+
+    def record(
+        self, stage: str, call_id: Optional[str], wall_time: float, duration_us: float
+    ) -> None:
+        for tracer in self.tracers:
+            tracer.record(stage, call_id, wall_time, duration_us)
+
+    def close_call(self, call_id: Optional[str]) -> None:
+        for tracer in self.tracers:
+            tracer.close_call(call_id)
+
+    def close(self) -> None:
+        for tracer in self.tracers:
+            tracer.close()
+
+
+class JSONLTracer(Tracer):
+    """Write each span as one JSON line
+
+    Args:
+        path: Output file. If it contains ``{call_id}`` every call gets its
+              own file, e.g. ``traces/{call_id}.jsonl``.
+        max_open_files: Per-call files kept open at once; the least recently
+              opened is closed (and reopened for append if needed)
+
+    SimpleSIPClient calls ``close_call()`` when a dialog ends. Spans of that
+    call that finish later, such as the receive span of its BYE, are still
+    appended, without keeping the file open.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 1.0,
+        per_call: bool = True,
+        stages: Optional[Iterable[str]] = None,
+        max_open_files: int = 64,
+    ) -> None:
+        super().__init__(sample_rate, per_call, stages)
+        self.path = path
+        self.max_open_files = max_open_files
+        self._per_call_files = "{call_id}" in path
+        self._files: Dict[Optional[str], IO[str]] = {}
+        self._finished: Dict[Optional[str], None] = (
+            {}
+        )  # Keys of closed per-call files, oldest first
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path.split("{call_id}")[0])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _key(self, call_id: Optional[str]) -> Optional[str]:
+        return (call_id or "no-call") if self._per_call_files else None
+
+    def _path_for(self, key: Optional[str]) -> str:
+        return self.path.format(call_id=self._safe_name(key)) if key else self.path
+
+    def _file_for(self, key: Optional[str]) -> IO[str]:
+        f = self._files.get(key)
+        if f is None:
+            if len(self._files) >= self.max_open_files:
+                oldest = next(iter(self._files))
+                self._files.pop(oldest).close()
+            f = open(self._path_for(key), "a", encoding="utf-8")
+            self._files[key] = f
+        return f
+
+    @staticmethod
+    def _safe_name(call_id: str) -> str:
+        return "".join(c if c.isalnum() or c in "-_." else "_" for c in call_id)
+
+    def record(
+        self, stage: str, call_id: Optional[str], wall_time: float, duration_us: float
+    ) -> None:
+        line = json.dumps(
+            {
+                "ts": round(wall_time, 6),
+                "call_id": call_id,
+                "stage": stage,
+                "duration_us": round(duration_us, 3),
+                "thread": threading.current_thread().name,
+            }
+        )
+        key = self._key(call_id)
+        with self._lock:
+            if key in self._finished:
+                with open(self._path_for(key), "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                self._file_for(key).write(line + "\n")
+
+    def close_call(self, call_id: Optional[str]) -> None:
+        """Close the file of a finished call (per-call mode)"""
+        if not self._per_call_files:
+            return
+        key = self._key(call_id)
+        with self._lock:
+            f = self._files.pop(key, None)
+            if f is not None:
+                f.close()
+            self._finished[key] = None
+            if len(self._finished) > _FINISHED_CALLS:
+                del self._finished[next(iter(self._finished))]
+
+    def close(self) -> None:
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+class StageProfiler(Tracer):
+    """Aggregate latency per stage, optionally per call"""
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        per_call: bool = True,
+        stages: Optional[Iterable[str]] = None,
+    ) -> None:
+        super().__init__(sample_rate, per_call, stages)
+        self._histograms: Dict[str, Histogram] = {}
+        self._max: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, stage: str, call_id: Optional[str], wall_time: float, duration_us: float
+    ) -> None:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        histogram.observe(duration_us / 1e6)
+        if duration_us > self._max.get(stage, 0.0):
+            self._max[stage] = duration_us
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage count, mean, p50, p99 and max latency in microseconds"""
+        report = {}
+        for stage, histogram in sorted(self._histograms.items()):
+            _, count, total = histogram.snapshot()
+            if not count:
+                continue
+            report[stage] = {
+                "count": count,
+                "mean_us": total / count * 1e6,
+                "p50_us": histogram.quantile(0.5) * 1e6,
+                "p99_us": histogram.quantile(0.99) * 1e6,
+                "max_us": self._max.get(stage, 0.0),
+                "total_ms": total * 1e3,
+            }
+        return report
+
+    def format_report(self) -> str:
+        """Report as an aligned text table"""
+        lines = [
+            f"{'stage':<20} {'count':>9} {'mean_us':>10} {'p50_us':>10} "
+            f"{'p99_us':>10} {'max_us':>10} {'total_ms':>10}"
+        ]
+        for stage, row in self.report().items():
+            lines.append(
+                f"{stage:<20} {row['count']:>9} {row['mean_us']:>10.1f} "
+                f"{row['p50_us']:>10.1f} {row['p99_us']:>10.1f} "
+                f"{row['max_us']:>10.1f} {row['total_ms']:>10.1f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,175 @@
+"""
+Transaction and dialog records of a client.
+
+Records are small ``__slots__`` classes stamped with ``time.monotonic()``.
+They are kept in RecordTables indexed by Call-ID, which drop records older
+than their TTL. That way a call that ends abnormally, with no final
+response or no BYE, does not leave its records behind in a long-running
+process.
+"""
+
+import time
+from typing import List, Optional, OrderedDict, Union
+
+# RFC 3261 Timer B/F: 64 * T1 (500ms)
+DEFAULT_TTL = 32.0
+
+# RFC 3261 16.6 Timer C: an INVITE that got a provisional response may ring
+# for more than 3 minutes before its final response
+PROCEEDING_TTL = 185.0
+
+
+class Transaction:
+    """A request we sent that is still waiting for its final response"""
+
+    __slots__ = (
+        "call_id",
+        "method",
+        "start_time",
+        "updated",
+        "retries",
+        "branch",
+        "cseq",
+        "uri",
+        "sdp",
+        "from_header",
+        "to_header",
+        "invite_key",
+        "auth_attempted",
+        "cancelled",
+        "reinvite",
+        "direction",
+        "previous_direction",
+        "ttl",
+    )
+
+    def __init__(
+        self,
+        call_id: str,
+        method: str,
+        branch: Optional[str] = None,
+        cseq: Optional[int] = None,
+        uri: Optional[str] = None,
+        sdp: Optional[str] = None,
+        from_header: Optional[str] = None,
+        to_header: Optional[str] = None,
+        reinvite: bool = False,
+        direction: Optional[str] = None,
+        previous_direction: Optional[str] = None,
+    ) -> None:
+        self.call_id = call_id
+        self.method = method
+        self.start_time = self.updated = time.monotonic()
+        self.retries = 0
+        self.branch = branch
+        self.cseq = cseq
+        self.uri = uri
+        self.sdp = sdp
+        self.from_header = from_header
+        self.to_header = to_header
+        self.invite_key: Optional[str] = None
+        self.auth_attempted = False
+        self.cancelled = False
+        self.reinvite = reinvite
+        self.direction = direction
+        self.previous_direction = previous_direction
+        self.ttl: Optional[float] = None  # None uses the table's TTL
+
+    def __repr__(self) -> str:
+        return f"<Transaction {self.method} {self.call_id} cseq={self.cseq}>"
+
+
+class Dialog:
+    """The tags, URI and From/To headers of an established dialog"""
+
+    __slots__ = (
+        "call_id",
+        "local_tag",
+        "remote_tag",
+        "remote_uri",
+        "local_header",
+        "remote_header",
+        "updated",
+        "ttl",
+    )
+
+    def __init__(
+        self,
+        call_id: str,
+        local_tag: str,
+        remote_tag: Optional[str],
+        remote_uri: str,
+        local_header: Optional[str],
+        remote_header: Optional[str],
+    ) -> None:
+        self.call_id = call_id
+        self.local_tag = local_tag
+        self.remote_tag = remote_tag
+        self.remote_uri = remote_uri
+        self.local_header = local_header
+        self.remote_header = remote_header
+        self.updated = time.monotonic()
+        self.ttl: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return f"<Dialog {self.call_id} remote_tag={self.remote_tag}>"
+
+
+Record = Union[Transaction, Dialog]
+
+
+class RecordTable(OrderedDict[str, Record]):
+    """Records by Call-ID, oldest ``updated`` first
+
+    Adding or touching a record moves it to the end, so evict() only looks
+    at the front of the table. A record with a ``ttl`` of its own longer
+    than the table's, such as a ringing INVITE, is skipped until that
+    expires.
+
+    Args:
+        ttl: Seconds a record may go without being updated
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL) -> None:
+        super().__init__()
+        self.ttl = ttl
+        self.evictions = 0
+
+    def add(self, record: Record) -> Record:
+        """Insert (or replace) the record of ``record.call_id``"""
+        self[record.call_id] = record
+        self.move_to_end(record.call_id)
+        return record
+
+    def touch(self, call_id: str, now: Optional[float] = None) -> Optional[Record]:
+        """Restart the TTL of a record; returns the record, or None"""
+        record = self.get(call_id)
+        if record is not None:
+            record.updated = time.monotonic() if now is None else now
+            self.move_to_end(call_id)
+        return record
+
+    def evict(
+        self, now: Optional[float] = None, keep: Optional[str] = None
+    ) -> List[Record]:
+        """Remove records not updated within the TTL
+
+        Args:
+            keep: Call-ID whose record stays, e.g. the current call's dialog
+
+        Returns:
+            The evicted records
+        """
+        now = time.monotonic() if now is None else now
+        if keep is not None:
+            self.touch(keep, now)
+        deadline = now - self.ttl
+        expired = []
+        for call_id, record in self.items():
+            if record.updated > deadline:
+                break
+            if record.ttl is None or now - record.updated >= record.ttl:
+                expired.append(call_id)
+        evicted = [self.pop(call_id) for call_id in expired]
+        self.evictions += len(evicted)
+        return evicted
@@ -4,7 +4,7 @@ Simplified SIP audio client - automatic codec handling
 The client automatically detects and handles both PCMU and G.722 codecs
 """
 
-from simplesip import SimpleSIPClient
+from simplesip import SimpleSIPClient, CallState
 import time
 import threading
 import pyaudio
@@ -156,11 +156,10 @@ try:
     print("📞 Calling 1002...")
     client.make_call("1002")
     
-    # Wait for connection
-    while client.call_state.value not in ['connected', 'streaming'] and client.running:
-        time.sleep(0.1)
+    # Wait for connection; IDLE means the call failed
+    state = client.wait_for([CallState.CONNECTED, CallState.STREAMING, CallState.IDLE], timeout=60)
     
-    if client.call_state.value in ['connected', 'streaming']:
+    if state in (CallState.CONNECTED, CallState.STREAMING):
         # Get negotiated codec information
         config = client.get_audio_config()
         print(f"✅ Connected with {config['codec']} codec")
@@ -190,9 +189,9 @@ try:
         capture_thread.start()
         playback_thread.start()
         
-        # Keep running
-        while client.running and client.call_state.value != 'idle':
-            time.sleep(1)
+        # Keep running until the call ends
+        while client.running and client.wait_for(CallState.IDLE, timeout=1) is None:
+            pass
             
 except KeyboardInterrupt:
     print("\n🛑 Stopping...")
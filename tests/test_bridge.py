@@ -0,0 +1,84 @@
+import struct
+
+import pytest
+
+from simplesip import SimpleSIPClient, codecs
+from simplesip.bridge import Bridge, _resample
+
+
+def _pcm(*samples):
+    return struct.pack(f'<{len(samples)}h', *samples)
+
+
+def test_resample_down_averages_groups_of_samples():
+    assert _resample(_pcm(100, 300, -200, -400, 7), 16000, 8000) == _pcm(200, -300)
+    assert _resample(_pcm(1, 2, 3, 4, 5, 6), 48000, 16000) == _pcm(2, 5)
+
+
+def test_resample_up_interpolates_between_samples():
+    assert _resample(_pcm(0, 100, -100), 8000, 16000) == _pcm(0, 50, 100, 0, -100, -100)
+    assert len(_resample(_pcm(*range(160)), 16000, 48000)) == 2 * 480
+
+
+def test_resample_keeps_matching_rates_and_rejects_uneven_ones():
+    pcm = _pcm(1, 2, 3)
+    assert _resample(pcm, 8000, 8000) is pcm
+    with pytest.raises(ValueError):
+        _resample(pcm, 16000, 44100)
+
+
+def _leg(codec, payload_type):
+    leg = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    leg.negotiated_codec = codec
+    leg.negotiated_payload_type = payload_type
+    leg.remote_rtp_info = ('127.0.0.1', 4000)
+    leg.sent = []
+    leg._send_rtp_payload = lambda payload, payload_type, ticks: leg.sent.append(
+        (payload, payload_type, ticks))
+    leg._sendto_rtp = lambda packet: leg.sent.append(bytes(packet))
+    return leg
+
+
+def _packet(payload_type, payload, sequence=1, timestamp=160):
+    return struct.pack('!BBHII', 0x80, payload_type, sequence, timestamp, 1234) + payload
+
+
+def test_wideband_leg_is_resampled_for_a_narrowband_leg():
+    wideband = _leg('L16-16K', 97)
+    narrowband = _leg('PCMU', 0)
+    bridge = Bridge(wideband, narrowband).start()
+    assert not bridge.passthrough
+
+    pcm = _pcm(*([1000, 3000] * 160))  # 20ms at 16kHz
+    payload = wideband._encode_payload(pcm, 'L16-16K')
+    wideband._bridge.forward(_packet(97, payload), 97, 1, 320, 1234, 12)
+
+    [(encoded, payload_type, ticks)] = narrowband.sent
+    assert (payload_type, ticks) == (0, 160)
+    assert encoded == codecs.ulaw_encode(_pcm(*([2000] * 160)))
+    assert bridge.stats()['a_to_b'] == {'packets': 1, 'transcoded': 1, 'dropped': 0}
+
+
+def test_narrowband_leg_is_resampled_for_a_wideband_leg():
+    narrowband = _leg('PCMA', 8)
+    wideband = _leg('L16-16K', 97)
+    Bridge(narrowband, wideband).start()
+
+    pcm = codecs.alaw_decode(codecs.alaw_encode(_pcm(*([500] * 160))))
+    narrowband._bridge.forward(_packet(8, codecs.alaw_encode(pcm)), 8, 1, 160, 1234, 12)
+
+    [(encoded, payload_type, ticks)] = wideband.sent
+    assert (payload_type, ticks) == (97, 320)
+    assert wideband._decode_payload(encoded, 'L16-16K') == _resample(pcm, 8000, 16000)
+
+
+def test_matching_codecs_are_passed_through_unchanged():
+    leg_a = _leg('PCMU', 0)
+    leg_b = _leg('PCMU', 0)
+    with Bridge(leg_a, leg_b) as bridge:
+        assert bridge.passthrough
+        leg_a._bridge.forward(_packet(0, b'\x7f' * 160), 0, 7, 1600, 1234, 12)
+    [packet] = leg_b.sent
+    assert packet[12:] == b'\x7f' * 160
+    assert struct.unpack_from('!I', packet, 8)[0] == leg_b.rtp_ssrc
+    assert bridge.stats()['a_to_b']['transcoded'] == 0
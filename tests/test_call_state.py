@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+
+from simplesip import CallState, SimpleSIPClient
+
+
+def _client():
+    return SimpleSIPClient('alice', 'secret', '127.0.0.1')
+
+
+def _later(delay, *steps):
+    def run():
+        time.sleep(delay)
+        for step in steps:
+            step()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _move(client, state):
+    return lambda: setattr(client, 'call_state', state)
+
+
+def test_wait_for_returns_the_current_state_at_once():
+    client = _client()
+    assert client.wait_for(CallState.IDLE, timeout=0) is CallState.IDLE
+    assert client.wait_for([CallState.RINGING, CallState.IDLE], timeout=0) is CallState.IDLE
+
+
+def test_wait_for_times_out():
+    client = _client()
+    start = time.monotonic()
+    assert client.wait_for(CallState.CONNECTED, timeout=0.1) is None
+    assert 0.09 <= time.monotonic() - start < 1.0
+
+
+def test_wait_for_wakes_on_the_transition():
+    client = _client()
+    _later(0.05, _move(client, CallState.RINGING))
+    assert client.wait_for([CallState.RINGING, CallState.CONNECTED], timeout=2) is CallState.RINGING
+
+
+def test_states_passed_through_while_waiting_count():
+    client = _client()
+    thread = _later(0.05, _move(client, CallState.CONNECTED), _move(client, CallState.STREAMING),
+                    _move(client, CallState.IDLE))
+    assert client.wait_for(CallState.CONNECTED, timeout=2) is CallState.CONNECTED
+    thread.join()
+    assert client.call_state is CallState.IDLE
+
+
+def test_listeners_see_every_transition_and_survive_errors():
+    client = _client()
+    seen = []
+
+    def broken(previous, state):
+        raise RuntimeError("listener failed")
+
+    def record(previous, state):
+        seen.append((previous, state))
+
+    client.add_call_state_listener(broken)
+    client.add_call_state_listener(record)
+    client.call_state = CallState.INVITING
+    client.call_state = CallState.INVITING  # No change, no call
+    client.call_state = CallState.CONNECTED
+    client.remove_call_state_listener(record)
+    client.call_state = CallState.IDLE
+    assert seen == [(CallState.IDLE, CallState.INVITING), (CallState.INVITING, CallState.CONNECTED)]
+
+
+def test_expected_state_guards_the_transition():
+    client = _client()
+    assert not client._transition_call_state(CallState.CONNECTED, expected=CallState.RINGING)
+    assert client.call_state is CallState.IDLE
+    assert client._transition_call_state(CallState.INVITING, expected=CallState.IDLE)
+
+
+def test_wait_for_async_resolves_from_another_thread():
+    client = _client()
+
+    async def main():
+        _later(0.05, _move(client, CallState.RINGING), _move(client, CallState.CONNECTED))
+        reached = await client.wait_for_async(CallState.CONNECTED, timeout=2)
+        timed_out = await client.wait_for_async(CallState.STREAMING, timeout=0.05)
+        return reached, timed_out
+
+    assert asyncio.run(main()) == (CallState.CONNECTED, None)
+    assert client._state_listeners == []
@@ -0,0 +1,219 @@
+import time
+
+import pytest
+
+from simplesip import CallState, SimpleSIPClient, SIPTestServer
+
+
+@pytest.fixture
+def server():
+    server = SIPTestServer(host='127.0.0.1', port=0).start()
+    yield server
+    server.stop()
+
+
+def _client(server):
+    client = SimpleSIPClient('alice', 'secret', *server.address, local_port=0)
+    client.local_rtp_port = 0
+    client.connect()
+    return client
+
+
+def test_rtp_probe_timer_is_cancelled_on_hangup(server):
+    client = _client(server)
+    try:
+        client.make_call('1000')
+        assert client.wait_for(CallState.CONNECTED, timeout=2)
+        deadline = time.monotonic() + 2
+        while client._rtp_probe_timer is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client._rtp_probe_timer is not None
+        client.hangup_call()
+        assert client._rtp_probe_timer is None
+    finally:
+        client.disconnect()
+
+
+def test_rtp_probes_can_be_disabled(server):
+    client = _client(server)
+    client.rtp_probes = False
+    try:
+        client.make_call('1000')
+        assert client.wait_for(CallState.CONNECTED, timeout=2)
+        time.sleep(0.1)
+        assert client._rtp_probe_timer is None
+        client.hangup_call()
+    finally:
+        client.disconnect()
+
+
+class _Manager:
+    def __init__(self):
+        self.answered = []
+        self.failed = []
+
+    def on_call_answered(self, call_id):
+        self.answered.append(call_id)
+
+    def on_call_failed(self, call_id, status):
+        self.failed.append((call_id, status))
+
+
+def _unusable_answer(call, offer):
+    call.codec, call.payload_type = 'G729', 18
+    return ('v=0\r\no=uas 1 1 IN IP4 127.0.0.1\r\ns=-\r\nc=IN IP4 127.0.0.1\r\nt=0 0\r\n'
+            'm=audio 4000 RTP/AVP 18\r\na=rtpmap:18 G729/8000\r\n')
+
+
+def test_unusable_sdp_answer_ends_the_call(server):
+    server._negotiate = _unusable_answer
+    requests = []
+    on_ack, on_bye = server._on_ack, server._on_bye
+    server._on_ack = lambda request, addr: (requests.append('ACK'), on_ack(request, addr))
+    server._on_bye = lambda request, addr: (requests.append('BYE'), on_bye(request, addr))
+    client = _client(server)
+    client.call_manager = _Manager()
+    try:
+        call_id = client.make_call('1000')
+        deadline = time.monotonic() + 2
+        while not server.stats['byes_received'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # ACKed, then hung up with BYE, and never reported as answered
+        assert requests == ['ACK', 'BYE']
+        assert server.stats['byes_received'] == 1
+        assert client.call_manager.failed == [(call_id, 488)]
+        assert client.call_manager.answered == []
+        assert client.call_state == CallState.IDLE
+        assert CallState.CONNECTED not in [state for _, state in client._state_history]
+    finally:
+        client.disconnect()
+
+
+def _connected(server):
+    client = _client(server)
+    client.make_call('1000')
+    assert client.wait_for(CallState.CONNECTED, timeout=2)
+    return client
+
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_hold_and_resume_park_and_restore_media(server):
+    client = _connected(server)
+    try:
+        call = server.calls[client.call_id]
+        assert client.hold('sendonly')
+        assert _wait(lambda: client.media_direction == 'sendonly')
+        assert call.direction == 'recvonly'
+        assert client._tx_active and not client._rx_active
+
+        assert client.resume()
+        assert _wait(lambda: client.media_direction == 'sendrecv')
+        assert client.hold('inactive')
+        assert _wait(lambda: client.media_direction == 'inactive')
+        assert call.direction == 'inactive'
+        assert not client._tx_active and not client._rx_active
+
+        assert client.resume()
+        assert _wait(lambda: client.media_direction == 'sendrecv')
+        assert call.direction == 'sendrecv'
+        assert client._tx_active and client._rx_active
+        assert server.stats['reinvites'] == 4
+    finally:
+        client.disconnect()
+
+
+def test_held_by_the_peer_receives_only(server):
+    client = _connected(server)
+    try:
+        client._update_media_direction('sendonly')  # Peer's re-INVITE puts us on hold
+        assert client.media_direction == 'recvonly'
+        assert not client._tx_active and not client._rx_active
+        client.decode_held_media = True
+        client._update_media_direction('sendonly')
+        assert client._rx_active
+        client._update_media_direction('sendrecv')
+        assert client.media_direction == 'sendrecv' and client._tx_active
+    finally:
+        client.disconnect()
+
+
+def _glare_once(server):
+    on_reinvite = server._on_reinvite
+    glared = []
+
+    def _on_reinvite(call, request, addr):
+        if not glared:
+            glared.append(request.get('cseq'))
+            server._respond(request, addr, 491)
+        else:
+            on_reinvite(call, request, addr)
+    server._on_reinvite = _on_reinvite
+    return glared
+
+
+def test_reinvite_is_retried_after_491(server, monkeypatch):
+    from simplesip import client as client_module
+
+    monkeypatch.setattr(client_module.random, 'uniform', lambda low, high: 0.05)
+    glared = _glare_once(server)
+    client = _connected(server)
+    try:
+        assert client.hold('sendonly')
+        assert _wait(lambda: client.media_direction == 'sendonly')
+        assert len(glared) == 1
+        assert server.stats['reinvites'] == 1
+        assert client._reinvite_timer is None
+    finally:
+        client.disconnect()
+
+
+def test_491_retry_is_cancelled_on_hangup(server, monkeypatch):
+    from simplesip import client as client_module
+
+    monkeypatch.setattr(client_module.random, 'uniform', lambda low, high: 30.0)
+    glared = _glare_once(server)
+    client = _connected(server)
+    try:
+        assert client.hold('sendonly')
+        assert _wait(lambda: client._reinvite_timer is not None)
+        timer = client._reinvite_timer
+        assert timer.daemon and glared
+        client.hangup_call()
+        assert client._reinvite_timer is None
+        timer.join(1.0)
+        assert not timer.is_alive()
+    finally:
+        client.disconnect()
+
+
+def test_ptime_follows_the_peer_within_its_maxptime():
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.ptime = 20
+    assert client._choose_ptime(None, None) == 20
+    assert client._choose_ptime(30, None) == 30
+    assert client._choose_ptime(None, 10) == 10
+    assert client._choose_ptime(60, 40) == 40
+    assert client._choose_ptime(5, None) == 10  # Never below 10ms
+
+
+@pytest.mark.parametrize('codec, ptime, frame_size, rtp_frame_size, payload_size', [
+    ('PCMU', 30, 240, 240, 240),
+    ('PCMA', 10, 80, 80, 80),
+    ('G722', 20, 320, 160, 160),
+    ('L16-16K', 20, 320, 320, 640),
+])
+def test_audio_config_frames_follow_the_negotiated_ptime(codec, ptime, frame_size, rtp_frame_size,
+                                                         payload_size):
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.negotiated_codec = codec
+    client.negotiated_ptime = ptime
+    config = client.get_audio_config()
+    assert config['ptime'] == ptime
+    assert (config['frame_size'], config['rtp_frame_size'], config['payload_size']) == (
+        frame_size, rtp_frame_size, payload_size)
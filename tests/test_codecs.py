@@ -0,0 +1,48 @@
+import logging
+
+import pytest
+
+from simplesip import SimpleSIPClient, codecs, sdp
+from simplesip import client as client_module
+
+
+@pytest.fixture
+def no_g722(monkeypatch):
+    monkeypatch.setitem(codecs._chosen, 'g722', None)
+    monkeypatch.setattr(client_module, '_g722_missing_logged', False)
+
+
+def test_g722_is_not_offered_without_its_package(no_g722, caplog):
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.local_ip = '192.0.2.1'
+    with caplog.at_level(logging.WARNING):
+        offer = sdp.parse_sdp(client._generate_sdp_offer())
+        client._codec_preferences()
+    assert 9 not in offer.audio().formats
+    assert [offer.audio().codec(pt) for pt in offer.audio().formats][0] == 'PCMU'
+    assert 'G722' not in client._codec_preferences()
+    assert sum('G.722 disabled' in record.message for record in caplog.records) == 1
+
+
+def test_g722_codec_needs_its_package(no_g722):
+    assert not codecs.g722_available()
+    with pytest.raises(ImportError):
+        codecs.g722_codec()
+    assert codecs.backends()['g722'] is None
+
+
+def test_file_codecs_work_without_g722(no_g722):
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    encode, decode = client._payload_codec()
+    assert len(decode(encode(bytes(320), 'PCMU'), 'PCMU')) == 320
+    with pytest.raises(ImportError):
+        encode(bytes(640), 'G722')
+
+
+def test_g722_round_trip():
+    if not codecs.g722_available():
+        pytest.skip("G722 package not installed")
+    codec = codecs.g722_codec()
+    payload = codec.encode(bytes(640))
+    assert len(payload) == 160
+    assert len(codec.decode(payload)) == 640
@@ -0,0 +1,94 @@
+import struct
+
+import numpy as np
+
+from simplesip import SimpleSIPClient, codecs
+from simplesip.conference import Conference, mix_frames
+
+
+def test_each_speaker_hears_everyone_but_themselves():
+    frames = np.array([[1000] * 4, [200] * 4, [30] * 4], dtype=np.int16)
+    mixes, keys, speakers = mix_frames(frames, max_speakers=3, threshold=0)
+    assert sorted(speakers) == [0, 1, 2]
+    assert mixes[0].tolist() == [1230] * 4
+    heard = [mixes[key].tolist()[0] for key in keys]
+    assert heard == [230, 1030, 1200]
+
+
+def test_only_the_loudest_speakers_are_mixed():
+    frames = np.array([[10] * 4, [500] * 4, [-800] * 4, [300] * 4], dtype=np.int16)
+    mixes, keys, speakers = mix_frames(frames, max_speakers=2, threshold=0)
+    assert sorted(speakers) == [1, 2]
+    assert keys[0] == keys[3] == 0
+    assert mixes[0].tolist() == [-300] * 4
+    assert mixes[keys[1]].tolist() == [-800] * 4
+    assert mixes[keys[2]].tolist() == [500] * 4
+
+
+def test_quiet_participants_are_left_out_and_the_mix_is_clipped():
+    frames = np.array([[30000] * 4, [30000] * 4, [5] * 4], dtype=np.int16)
+    mixes, keys, speakers = mix_frames(frames, max_speakers=3, threshold=64)
+    assert sorted(speakers) == [0, 1]
+    assert keys[2] == 0
+    assert mixes[0].tolist() == [32767] * 4
+
+
+def _participant(codec, payload_type):
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.negotiated_codec = codec
+    client.negotiated_payload_type = payload_type
+    client.remote_rtp_info = ('127.0.0.1', 4000)
+    client.sent = []
+    client._send_rtp_payload = lambda payload, payload_type, ticks: client.sent.append(
+        (payload, payload_type, ticks))
+    return client
+
+
+def _frame(value, samples=160):
+    return struct.pack(f'<{samples}h', *([value] * samples))
+
+
+def test_listeners_share_one_encoded_mix():
+    speaker, first, second = (_participant('PCMU', 0) for _ in range(3))
+    conference = Conference(sample_rate=8000, ptime=20)
+    for client in (speaker, first, second):
+        conference.add(client)
+    speaker.audio_received_callback(_frame(1000), 'pcm')
+
+    conference.tick()
+    assert conference.speakers == [speaker]
+    assert conference.encodes == 2  # The shared mix and the speaker's own
+    assert first.sent == second.sent == [(codecs.ulaw_encode(_frame(1000)), 0, 160)]
+    assert speaker.sent == [(codecs.ulaw_encode(_frame(0)), 0, 160)]
+
+
+def test_mix_is_resampled_and_encoded_per_codec():
+    narrowband = _participant('PCMA', 8)
+    wideband = _participant('L16-16K', 97)
+    conference = Conference(sample_rate=16000, ptime=20)
+    conference.add(narrowband)
+    conference.add(wideband)
+    narrowband.audio_received_callback(_frame(400), 'pcm')
+    conference.tick()
+
+    [(payload, payload_type, ticks)] = wideband.sent
+    assert (payload_type, ticks) == (97, 320)
+    assert wideband._decode_payload(payload, 'L16-16K') == _frame(400, 320)
+    assert narrowband.sent[0][1:] == (8, 160)
+
+
+def test_held_participants_are_not_sent_the_mix():
+    speaker = _participant('PCMU', 0)
+    held = _participant('PCMU', 0)
+    held._set_media_direction('recvonly')
+    assert not held.media_sending
+    conference = Conference()
+    conference.add(speaker)
+    conference.add(held)
+    speaker.audio_received_callback(_frame(1000), 'pcm')
+    conference.tick()
+    assert held.sent == [] and len(speaker.sent) == 1
+
+    conference.remove(held)
+    assert conference.participants == [speaker]
+    assert held.audio_received_callback is None
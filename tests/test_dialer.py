@@ -0,0 +1,32 @@
+import time
+
+import pytest
+
+from simplesip import Dialer, SIPTestServer
+from simplesip.transactions import PROCEEDING_TTL
+
+
+def test_setup_timeout_must_end_before_timer_c():
+    with pytest.raises(ValueError):
+        Dialer('alice', 'secret', '127.0.0.1', setup_timeout=PROCEEDING_TTL)
+    with pytest.raises(ValueError):
+        Dialer('alice', 'secret', '127.0.0.1', setup_timeout=0)
+
+
+def test_setup_timeout_cancels_ringing_call():
+    server = SIPTestServer(host='127.0.0.1', port=0, answer_delay=5).start()
+    dialer = Dialer('alice', 'secret', *server.address, cps=50, max_concurrent=1,
+                    setup_timeout=1.5).start()
+    try:
+        for slot in dialer._slots:
+            slot.client.current_transactions.ttl = 0.5  # Shorter than the ring time
+        call = dialer.dial('1000')
+        assert call.wait(4)
+        assert (call.state, call.status) == ('failed', 'timeout')
+        deadline = time.monotonic() + 2
+        while server.stats['cancelled'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert server.stats['cancelled'] == 1
+    finally:
+        dialer.stop()
+        server.stop()
@@ -0,0 +1,93 @@
+import struct
+
+from simplesip import dtmf
+from simplesip.dtmf import DTMFReceiver, DTMFSender
+
+
+class _Client:
+    def __init__(self, timestamp=1000):
+        self.rtp_timestamp = timestamp
+        self.packets = []
+
+    def _send_rtp_event(self, payload, payload_type, timestamp, marker=False):
+        self.packets.append((payload, timestamp, marker))
+
+    def _advance_rtp_timestamp(self, start, increment):
+        self.rtp_timestamp = (start + increment) % 4294967296
+
+
+def _fields(packet):
+    payload, timestamp, marker = packet
+    event, flags, duration = struct.unpack('!BBH', payload)
+    return event, bool(flags & dtmf.END_FLAG), duration, timestamp, marker
+
+
+def _receive(receiver, packets):
+    return [digit for digit in (receiver.handle_packet(payload, timestamp, now=0.0)
+                                for payload, timestamp, _ in packets) if digit]
+
+
+def test_interim_and_end_packets_scale_with_the_clock():
+    client = _Client()
+    DTMFSender(client, clock_rate=16000)._send_event(dtmf.DTMF_EVENT_CODES['5'], 100)
+    fields = [_fields(packet) for packet in client.packets]
+    assert [duration for _, _, duration, _, _ in fields] == [320, 640, 960, 1280, 1600, 1600, 1600]
+    assert [end for _, end, _, _, _ in fields] == [False] * 4 + [True] * 3
+    assert {timestamp for _, _, _, timestamp, _ in fields} == {1000}
+    assert [marker for _, _, _, _, marker in fields] == [True] + [False] * 6
+    assert client.rtp_timestamp == 2600
+
+    reported = []
+    receiver = DTMFReceiver(lambda digit, ms: reported.append((digit, ms)), clock_rate=16000)
+    assert _receive(receiver, client.packets) == ['5']
+    assert reported == [('5', 100)]  # Three end packets, one report
+
+
+def test_long_events_are_sent_and_joined_in_segments():
+    client = _Client(timestamp=4294967000)  # Segments cross the timestamp wrap
+    DTMFSender(client, clock_rate=48000, packet_interval=10000)._send_event(dtmf.DTMF_EVENT_CODES['#'], 3000)
+    fields = [_fields(packet) for packet in client.packets]
+    first = 4294967000
+    second = (first + 0xFFFF) % 4294967296
+    third = (second + 0xFFFF) % 4294967296
+    assert [(end, duration, timestamp) for _, end, duration, timestamp, _ in fields] == [
+        (False, 0xFFFF, first),
+        (False, 0xFFFF, second),
+        (True, 144000 - 2 * 0xFFFF, third),
+        (True, 144000 - 2 * 0xFFFF, third),
+        (True, 144000 - 2 * 0xFFFF, third),
+    ]
+    assert [marker for _, _, _, _, marker in fields] == [True, False, False, False, False]
+    assert client.rtp_timestamp == (first + 144000) % 4294967296
+
+    reported = []
+    receiver = DTMFReceiver(lambda digit, ms: reported.append((digit, ms)), clock_rate=48000)
+    assert _receive(receiver, client.packets) == ['#']
+    assert reported == [('#', 3000)]
+
+
+def test_event_with_lost_end_packets_is_reported_after_the_timeout():
+    client = _Client()
+    DTMFSender(client)._send_event(dtmf.DTMF_EVENT_CODES['7'], 100)
+    interim = [packet for packet in client.packets if not _fields(packet)[1]]
+    end = [packet for packet in client.packets if _fields(packet)[1]]
+
+    reported = []
+    receiver = DTMFReceiver(lambda digit, ms: reported.append((digit, ms)))
+    for payload, timestamp, _ in interim:
+        assert receiver.handle_packet(payload, timestamp, now=10.0) is None
+    assert receiver.expire(now=10.0 + dtmf.END_TIMEOUT / 2) is None
+    assert receiver.expire(now=10.0 + dtmf.END_TIMEOUT) == '7'
+    assert reported == [('7', 80)]  # Longest duration seen before the loss
+
+    # Late end packets of the reported event are not a second keypress
+    assert _receive(receiver, end) == []
+    assert receiver.expire(now=20.0) is None
+    assert receiver.events_received == 1
+
+
+def test_new_event_reports_one_whose_end_packets_were_lost():
+    receiver = DTMFReceiver()
+    assert receiver.handle_packet(struct.pack('!BBH', 1, 10, 160), 1000) is None
+    assert receiver.handle_packet(struct.pack('!BBH', 2, 10, 160), 3000) == '1'
+    assert receiver.handle_packet(struct.pack('!BBH', 2, dtmf.END_FLAG | 10, 800), 3000) == '2'
@@ -0,0 +1,107 @@
+import time
+
+import numpy as np
+import pytest
+
+from simplesip import SimpleSIPClient
+from simplesip.dtmf import DTMF_EVENTS
+from simplesip.goertzel import (
+    COL_FREQUENCIES, KEYPAD, ROW_FREQUENCIES, BatchDetector, GoertzelDetector,
+    InbandDTMFDetector, process_batch,
+)
+
+
+def _tone(digit, ms=20, sample_rate=8000, level=8000, twist_db=0.0):
+    """Dual tone for ``digit``; positive twist_db puts the column tone below the row tone"""
+    row = next(r for r, keys in enumerate(KEYPAD) if digit in keys)
+    col = KEYPAD[row].index(digit)
+    t = np.arange(sample_rate * ms // 1000) / sample_rate
+    signal = (level * np.sin(2 * np.pi * ROW_FREQUENCIES[row] * t)
+              + level * 10 ** (-twist_db / 20) * np.sin(2 * np.pi * COL_FREQUENCIES[col] * t))
+    return signal.astype('<i2')
+
+
+def _code(digit):
+    return DTMF_EVENTS.index(digit)
+
+
+def test_every_digit_in_one_pass():
+    digits = '0123456789*#ABCD'
+    frames = np.vstack([_tone(digit) for digit in digits])
+    codes = GoertzelDetector().detect(frames)
+    assert [DTMF_EVENTS[code] for code in codes] == list(digits)
+
+
+@pytest.mark.parametrize('sample_rate', [8000, 16000])
+def test_digits_at_each_sample_rate(sample_rate):
+    codes = GoertzelDetector().detect(_tone('7', sample_rate=sample_rate), sample_rate)
+    assert list(codes) == [_code('7')]
+
+
+def test_twist_limits():
+    detector = GoertzelDetector()  # 8dB normal, 4dB reverse
+    assert detector.detect(_tone('5', twist_db=6))[0] == _code('5')
+    assert detector.detect(_tone('5', twist_db=12))[0] == -1
+    assert detector.detect(_tone('5', twist_db=-3))[0] == _code('5')
+    assert detector.detect(_tone('5', twist_db=-6))[0] == -1
+
+
+def test_talk_off():
+    """Speech-like audio, single tones, noise and silence are not digits"""
+    rng = np.random.default_rng(7)
+    t = np.arange(160) / 8000
+    frames = [np.zeros(160)]
+    frames.append(8000 * np.sin(2 * np.pi * 770 * t))  # Row tone alone
+    frames.append(rng.normal(0, 6000, 160))
+    for f0 in (110, 130, 170, 220, 260):  # Voiced frames: harmonics of a pitch
+        frames.append(sum(6000 / k * np.sin(2 * np.pi * f0 * k * t + rng.uniform(0, 6))
+                          for k in range(1, 20)))
+    codes = GoertzelDetector().detect(np.vstack(frames).astype('<i2'))
+    assert (codes == -1).all()
+
+
+def test_process_batch_keeps_calls_apart():
+    digits = []
+    calls = [InbandDTMFDetector(lambda digit, ms, n=n: digits.append((n, digit, ms)))
+             for n in range(3)]
+    sequences = ['1' * 4 + ' ' * 2, '#' * 3 + ' ' * 3, ' ' * 6]
+    for step in range(6):
+        items = []
+        for call, sequence in zip(calls, sequences):
+            key = sequence[step]
+            pcm = (_tone(key) if key != ' ' else np.zeros(160, dtype='<i2')).tobytes()
+            items.append((call, pcm, 8000))
+        # One call also sends 16kHz audio, which is classified in its own group
+        items.append((InbandDTMFDetector(), _tone('9', sample_rate=16000).tobytes(), 16000))
+        process_batch(items)
+    assert sorted(digits) == [(0, '1', 80), (1, '#', 60)]
+
+
+def test_batch_detector_reports_from_its_thread():
+    batch = BatchDetector(interval=0.001)
+    digits = []
+    call = InbandDTMFDetector(lambda digit, ms: digits.append(digit))
+    for key in '3333  ':
+        pcm = _tone(key) if key != ' ' else np.zeros(160, dtype='<i2')
+        batch.submit(call, pcm.tobytes())
+    batch.flush()
+    assert digits == ['3']
+    assert batch.frames == 6
+
+
+def test_client_sends_frames_to_the_batch_detector():
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.packet_loss_concealment = False
+    digits = []
+    client.set_dtmf_callback(lambda digit, ms: digits.append((digit, ms)))
+    client.enable_inband_dtmf()
+    batch = client._inband_batch
+    assert batch is not None
+
+    for n, key in enumerate('88888   '):
+        pcm = _tone(key) if key != ' ' else np.zeros(160, dtype='<i2')
+        client._add_to_jitter_buffer(pcm.tobytes(), n * 160)
+    deadline = time.monotonic() + 2
+    while not digits and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert digits == [('8', 100)]
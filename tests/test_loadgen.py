@@ -0,0 +1,32 @@
+import pytest
+
+from simplesip import SIPTestServer, codecs
+from simplesip.loadgen import LoadGenerator
+from simplesip.sdp import CODEC_RTPMAP
+
+
+def test_l16_calls_are_answered_by_the_test_server():
+    server = SIPTestServer(port=0, codecs=tuple(CODEC_RTPMAP), media='echo').start()
+    try:
+        generator = LoadGenerator(*server.address, cps=20.0, max_concurrent=2, total_calls=2,
+                                  hold_time=0.3, setup_timeout=2.0, codec='L16-16K')
+        report = generator.run()
+    finally:
+        server.stop()
+    assert report['calls']['answered'] == 2
+    assert report['failures'] == {}
+    assert report['rtp']['packets_received'] > 0
+
+
+def test_frames_do_not_touch_call_encoder_state():
+    if not codecs.g722_available():
+        pytest.skip("G722 package not installed")
+    generator = LoadGenerator('127.0.0.1', 9, total_calls=1, media='tone')
+    generator._open_pool()
+    try:
+        client = generator._slots[0].client
+        frame = generator._frame('G722', 20)
+        assert len(frame) == 160
+        assert client._g722 is None
+    finally:
+        generator._close_pool()
@@ -0,0 +1,39 @@
+import threading
+
+from simplesip.metrics import Counter, Histogram
+
+
+def _run_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_exited_threads_release_their_cells():
+    counter = Counter()
+    histogram = Histogram()
+
+    def work():
+        counter.inc()
+        histogram.observe(0.001)
+
+    _run_threads(work, 500)
+    counter.inc(5)
+    assert counter.value() == 505
+    assert len(counter._cells._cells) == 1  # Only this thread's
+    counts, total, total_sum = histogram.snapshot()
+    assert total == 500
+    assert abs(total_sum - 0.5) < 1e-9
+    assert len(histogram._cells._cells) == 0
+
+
+def test_reset_clears_retired_values():
+    counter = Counter()
+    _run_threads(counter.inc, 10)
+    assert counter.value() == 10
+    counter.reset()
+    assert counter.value() == 0
+    counter.inc()
+    assert counter.value() == 1
@@ -0,0 +1,127 @@
+import struct
+import threading
+import time
+import wave
+
+import pytest
+
+from simplesip import SimpleSIPClient, codecs
+from simplesip.playback import AudioFile, Playback
+
+
+def _pcm(count, value=1000):
+    return struct.pack(f'<{count}h', *([value] * count))
+
+
+def _write_wav(path, pcm, sample_rate=8000, channels=1):
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+
+
+def _write_ulaw_wav(path, payload):
+    fmt = struct.pack('<HHIIHH', 7, 1, 8000, 8000, 1, 8)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    body += b'data' + struct.pack('<I', len(payload)) + payload
+    path.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+
+def _codecs():
+    return SimpleSIPClient('alice', 'secret', '127.0.0.1')._payload_codec()
+
+
+def test_pcm_wav_is_encoded_frame_by_frame_and_padded(tmp_path):
+    path = tmp_path / 'prompt.wav'
+    _write_wav(path, _pcm(400))  # 50ms: two full 20ms frames and a partial one
+    with AudioFile(str(path)) as audio:
+        assert (audio.encoding, audio.sample_rate) == ('PCM', 8000)
+        frames = list(audio.frames('PCMU', 20, *_codecs()))
+    assert [len(frame) for frame in frames] == [160, 160, 160]
+    assert frames[0] == codecs.ulaw_encode(_pcm(160))
+    assert frames[2] == codecs.ulaw_encode(_pcm(80) + bytes(160))
+
+
+def test_pre_encoded_files_pass_straight_through(tmp_path):
+    payload = bytes(range(256)) + bytes(44)  # 300 bytes of PCMU
+    path = tmp_path / 'prompt.ulaw'
+    path.write_bytes(payload)
+    with AudioFile(str(path)) as audio:
+        frames = list(audio.frames('PCMU', 20, *_codecs()))
+    assert frames == [payload[:160], payload[160:] + b'\xff' * 20]
+
+
+def test_ulaw_wav_is_transcoded_to_pcma(tmp_path):
+    payload = codecs.ulaw_encode(_pcm(160, 2000))
+    path = tmp_path / 'prompt.wav'
+    _write_ulaw_wav(path, payload)
+    with AudioFile(str(path)) as audio:
+        assert audio.encoding == 'PCMU'
+        assert list(audio.frames('PCMU', 20, *_codecs())) == [payload]
+        [frame] = audio.frames('PCMA', 20, *_codecs())
+    assert frame == codecs.alaw_encode(codecs.ulaw_decode(payload))
+
+
+def test_unplayable_files_are_rejected(tmp_path):
+    stereo = tmp_path / 'stereo.wav'
+    _write_wav(stereo, _pcm(320), channels=2)
+    with pytest.raises(ValueError):
+        AudioFile(str(stereo))
+
+    bogus = tmp_path / 'bogus.wav'
+    bogus.write_bytes(b'not a wave file at all')
+    with pytest.raises(ValueError):
+        AudioFile(str(bogus))
+
+    wideband = tmp_path / 'wideband.wav'
+    _write_wav(wideband, _pcm(320), sample_rate=16000)
+    with AudioFile(str(wideband)) as audio:
+        audio.check_codec('L16-16K', 16000)
+        with pytest.raises(ValueError):
+            audio.check_codec('PCMU', 8000)
+
+
+def test_empty_file_has_no_frames(tmp_path):
+    path = tmp_path / 'empty.raw'
+    path.write_bytes(b'')
+    with AudioFile(str(path)) as audio:
+        assert list(audio.frames('PCMU', 20, *_codecs())) == []
+
+
+class _Client:
+    running = True
+    remote_rtp_info = ('127.0.0.1', 4000)
+    media_sending = True
+
+    def __init__(self):
+        self.sent = []
+        self.logger = None
+
+    def _send_rtp_payload(self, payload, payload_type, timestamp_increment):
+        self.sent.append((time.monotonic(), payload, payload_type, timestamp_increment))
+
+
+def test_playback_paces_frames_by_ptime():
+    client = _Client()
+    finished = threading.Event()
+    playback = Playback(client, iter([b'a', b'b', b'c', b'd', b'e']), 0, ptime=20,
+                        on_finish=finished.set).start()
+    assert playback.wait(2.0) and finished.is_set()
+    assert [payload for _, payload, _, _ in client.sent] == [b'a', b'b', b'c', b'd', b'e']
+    assert {increment for _, _, _, increment in client.sent} == {160}
+    elapsed = client.sent[-1][0] - client.sent[0][0]
+    assert 0.07 <= elapsed < 0.2
+    assert playback.frames_sent == 5
+
+
+def test_stopped_playback_sends_no_more_frames():
+    client = _Client()
+    playback = Playback(client, iter([b'x'] * 100), 0, ptime=20).start()
+    time.sleep(0.05)
+    playback.stop()
+    assert playback.wait(1.0)
+    sent = len(client.sent)
+    assert 0 < sent < 100
+    time.sleep(0.05)
+    assert len(client.sent) == sent
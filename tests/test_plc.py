@@ -0,0 +1,95 @@
+import numpy as np
+
+from simplesip import SimpleSIPClient, codecs
+from simplesip.plc import Concealer
+
+
+def _voiced(sample_rate, seconds=0.2, period_ms=6.25):
+    """A periodic signal with a 160 Hz pitch"""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    f0 = 1000.0 / period_ms
+    signal = 6000 * np.sin(2 * np.pi * f0 * t) + 2500 * np.sin(2 * np.pi * 3 * f0 * t)
+    return signal.astype('<i2')
+
+
+def _frames(samples, frame_length):
+    return [samples[i:i + frame_length].tobytes() for i in range(0, len(samples), frame_length)]
+
+
+def _correlation(a, b):
+    a = a.astype(float) - a.mean()
+    b = b.astype(float) - b.mean()
+    return float(a @ b / np.sqrt((a @ a) * (b @ b)))
+
+
+def test_good_frames_pass_through():
+    concealer = Concealer()
+    for frame in _frames(_voiced(8000), 160):
+        assert concealer.receive(frame, 8000) == frame
+    assert concealer.concealed_frames == 0
+
+
+def test_g711_loss_repeats_the_pitch_period():
+    signal = _voiced(8000, seconds=0.4)
+    frames = _frames(signal, 160)
+    concealer = Concealer()
+    for frame in frames[:10]:
+        concealer.receive(frame, 8000)
+
+    fill = np.frombuffer(concealer.conceal(80), dtype='<i2')
+    assert concealer._pitch % 50 == 0  # 160 Hz, or a multiple of its period
+    # The first 10ms continues the waveform
+    assert _correlation(fill, signal[1600:1680]) > 0.95
+
+    # Faded out and silent from 60ms
+    rest = np.frombuffer(concealer.conceal(480), dtype='<i2')
+    assert np.abs(rest[-80:]).max() == 0
+    assert concealer.concealed_frames == 2
+
+    # The first good frame is crossfaded from the fill, then passes through
+    resumed = concealer.receive(frames[14], 8000)
+    assert resumed[64:] == frames[14][64:]
+    assert resumed[:64] != frames[14][:64]
+    assert concealer.receive(frames[15], 8000) == frames[15]
+
+
+def test_loss_before_enough_history_is_silent():
+    concealer = Concealer()
+    concealer.receive(_frames(_voiced(8000), 160)[0], 8000)
+    assert concealer.conceal(160) == bytes(320)
+
+
+def test_history_ring_keeps_the_latest_samples():
+    signal = _voiced(8000, seconds=1.0)
+    concealer = Concealer()
+    for frame in _frames(signal, 160):
+        concealer.receive(frame, 8000)
+    held = concealer._history_samples()
+    assert np.array_equal(held, signal[-len(held):].astype(np.float32))
+
+
+def test_g722_loss_is_concealed_at_16khz():
+    signal = _voiced(16000, seconds=0.3)
+    encoder = codecs.g722_codec()
+    payloads = [encoder.encode(frame) for frame in _frames(signal, 320)]
+
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.negotiated_codec = 'G722'
+    delivered = []
+    client.audio_received_callback = lambda pcm, fmt, play_time: delivered.append(pcm)
+
+    for n, payload in enumerate(payloads[:10]):
+        client._handle_g722_payload(payload, n * 160)
+    client._conceal_loss(1, 9 * 160, 11 * 160)
+    pitch = client._concealer._pitch
+    client._handle_g722_payload(payloads[11], 11 * 160)
+
+    assert client._concealer.sample_rate == 16000
+    assert client.rtp_stats['packets_concealed'] == 1
+    assert len(delivered) == 12
+    fill = np.frombuffer(delivered[10], dtype='<i2')
+    assert len(fill) == 320
+    assert pitch % 100 == 0
+    # The first 10ms of fill repeats the last pitch period of decoded audio
+    last = np.frombuffer(delivered[9], dtype='<i2')
+    assert np.array_equal(fill[:160], last[-pitch:][:160])
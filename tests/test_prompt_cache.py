@@ -0,0 +1,74 @@
+import os
+
+from simplesip.prompt_cache import PromptCache
+
+
+def test_lookups_count_hits_and_misses():
+    cache = PromptCache()
+    calls = []
+
+    def encode():
+        calls.append(1)
+        return [b'a' * 160, b'b' * 160]
+
+    first = cache.get_or_encode(('hello', 'PCMU', 20), encode)
+    second = cache.get_or_encode(('hello', 'PCMU', 20), encode)
+    assert first == second == (b'a' * 160, b'b' * 160)
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['bytes']) == (1, 1, 1, 320)
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PromptCache(max_bytes=300)
+    cache.put('a', [b'x' * 100])
+    cache.put('b', [b'x' * 100])
+    cache.put('c', [b'x' * 100])
+    assert cache.get('a') is not None  # 'b' is now the oldest
+    cache.put('d', [b'x' * 100])
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in 'acd')
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 300
+
+
+def test_entries_larger_than_the_cache_are_not_kept():
+    cache = PromptCache(max_bytes=100)
+    cache.put('small', [b'x' * 50])
+    assert cache.put('huge', [b'x' * 200]) == (b'x' * 200,)
+    assert cache.get('huge') is None
+    assert cache.get('small') is not None
+
+
+def test_file_key_separates_codecs_and_changes_with_the_file(tmp_path):
+    path = tmp_path / 'prompt.raw'
+    path.write_bytes(bytes(320))
+    pcmu = PromptCache.file_key(str(path), 'PCMU', 20)
+    assert pcmu != PromptCache.file_key(str(path), 'PCMA', 20)
+    assert pcmu != PromptCache.file_key(str(path), 'PCMU', 30)
+    assert pcmu == PromptCache.file_key(str(tmp_path / '.' / 'prompt.raw'), 'PCMU', 20)
+
+    path.write_bytes(bytes(480))
+    os.utime(path, ns=(0, 1))
+    assert PromptCache.file_key(str(path), 'PCMU', 20) != pcmu
+
+
+def test_disk_cache_survives_a_new_process(tmp_path):
+    key = ('greeting', 'PCMA', 20)
+    PromptCache(cache_dir=str(tmp_path)).put(key, [b'\x01' * 160, b'\x02' * 80])
+
+    cache = PromptCache(cache_dir=str(tmp_path))
+    assert cache.get(key) == (b'\x01' * 160, b'\x02' * 80)
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.get(('other', 'PCMA', 20)) is None
+
+
+def test_corrupt_disk_entries_are_ignored(tmp_path):
+    key = ('greeting', 'PCMU', 20)
+    cache = PromptCache(cache_dir=str(tmp_path))
+    cache.put(key, [b'\x01' * 160])
+    with open(cache._disk_path(key), 'r+b') as f:
+        f.truncate(20)
+
+    assert PromptCache(cache_dir=str(tmp_path)).get(key) is None
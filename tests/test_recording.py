@@ -0,0 +1,65 @@
+import struct
+import wave
+from types import SimpleNamespace
+
+from simplesip import recording
+from simplesip.recording import CallRecorder, RecordingWriter
+
+
+def _frame(value, samples=160):
+    return struct.pack(f'<{samples}h', *([value] * samples))
+
+
+def test_stereo_legs_stay_aligned_across_a_lost_packet(tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, 'time', SimpleNamespace(monotonic=lambda: 100.0))
+    path = tmp_path / 'call.wav'
+    recorder = CallRecorder(str(path), lambda payload, codec: payload, mode='stereo',
+                            writer=RecordingWriter(flush_interval=0.05))
+    for index in range(10):
+        if index != 3:  # Lost on the received leg only
+            recorder.push_rx(_frame(1000), 'PCMU', 5000 + 160 * index)
+        recorder.push_tx(_frame(2000), 'PCMU', 90000 + 160 * index)
+    recorder.stop()
+
+    with wave.open(str(path), 'rb') as wav:
+        assert wav.getnchannels() == 2
+        samples = struct.unpack(f'<{2 * wav.getnframes()}h', wav.readframes(wav.getnframes()))
+    left, right = samples[0::2], samples[1::2]
+    assert len(left) == 1600
+    assert set(left[:480]) == {1000}
+    assert set(left[480:640]) == {0}  # Silence where the packet was lost
+    assert set(left[640:]) == {1000}
+    assert set(right) == {2000}
+
+
+def test_a_leg_that_starts_late_is_placed_by_arrival(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(recording, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    path = tmp_path / 'call.wav'
+    recorder = CallRecorder(str(path), lambda payload, codec: payload, mode='stereo',
+                            writer=RecordingWriter(flush_interval=0.05))
+    for index in range(10):
+        now[0] = 100.0 + 0.02 * index
+        recorder.push_tx(_frame(2000), 'PCMU', 90000 + 160 * index)
+        if index >= 5:  # Remote audio starts 100ms into the call
+            recorder.push_rx(_frame(1000), 'PCMU', 5000 + 160 * index)
+    recorder.stop()
+
+    with wave.open(str(path), 'rb') as wav:
+        samples = struct.unpack(f'<{2 * wav.getnframes()}h', wav.readframes(wav.getnframes()))
+    left, right = samples[0::2], samples[1::2]
+    assert set(left[:800]) == {0}
+    assert set(left[800:]) == {1000}
+    assert set(right) == {2000}
+
+
+def test_a_leg_without_timestamps_is_laid_out_back_to_back(tmp_path):
+    path = tmp_path / 'call.raw'
+    recorder = CallRecorder(str(path), lambda payload, codec: payload, file_format='raw',
+                            writer=RecordingWriter(flush_interval=0.05))
+    for value in (1, 2, 3):
+        recorder.push_rx(_frame(value), 'PCMU')
+    recorder.stop()
+
+    data = (tmp_path / 'call-rx.raw').read_bytes()
+    assert data == _frame(1) + _frame(2) + _frame(3)
@@ -0,0 +1,62 @@
+import logging
+
+import pytest
+
+from simplesip import SimpleSIPClient, red, sdp
+
+
+def test_pack_unpack_round_trip():
+    encoder = red.RedundancyEncoder(2)
+    frames = [bytes([n]) * 160 for n in range(4)]
+    packets = [encoder.pack(0, frame, 1000 + 160 * n) for n, frame in enumerate(frames)]
+
+    assert red.unpack(packets[0], 1000) == [(0, 1000, frames[0])]
+    assert red.unpack(packets[3], 1480) == [(0, 1160, frames[1]), (0, 1320, frames[2]),
+                                            (0, 1480, frames[3])]
+
+
+def test_frames_too_long_for_a_block_are_not_repeated():
+    assert red.fits(1023)
+    assert not red.fits(1024)
+    encoder = red.RedundancyEncoder(1)
+    encoder.pack(98, bytes(1920), 0)
+    assert red.unpack(encoder.pack(98, bytes(1920), 960), 960) == [(98, 960, bytes(1920))]
+
+
+def test_truncated_payloads_are_rejected():
+    encoder = red.RedundancyEncoder(1)
+    encoder.pack(0, bytes(160), 0)
+    packet = encoder.pack(0, bytes(160), 160)
+    with pytest.raises(ValueError):
+        red.unpack(packet[:3], 160)
+    with pytest.raises(ValueError):
+        red.unpack(packet[:100], 160)
+
+
+def _client(*codecs):
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.local_ip = '192.0.2.1'
+    client.preferred_codecs = list(codecs)
+    client.red_depth = 2
+    return client
+
+
+def test_red_is_only_offered_at_clocks_whose_frames_fit():
+    offer = sdp.parse_sdp(_client('L16-48K', 'L16-16K', 'PCMU')._generate_sdp_offer())
+    encodings = sorted(encoding for encoding in offer.audio().rtpmap.values() if encoding.startswith('red'))
+    assert encodings == ['red/16000', 'red/8000']
+
+
+def test_red_is_not_sent_for_frames_that_do_not_fit(caplog):
+    client = _client('L16-48K')
+    offer = sdp.build_sdp('bob', 1, 1, '192.0.2.2', 5004, [('L16-48K', 98)], red_payload_type=100)
+    negotiation = sdp.negotiate(sdp.parse_sdp(offer), ['L16-48K'], remote_is_offer=True)
+    with caplog.at_level(logging.INFO):
+        client._apply_negotiation(negotiation)
+    assert client._red_encoder is None
+    assert any('too long for a RED block' in record.message for record in caplog.records)
+
+    client.preferred_codecs = ['L16-16K']
+    offer = sdp.build_sdp('bob', 1, 1, '192.0.2.2', 5004, [('L16-16K', 97)], red_payload_type=100)
+    client._apply_negotiation(sdp.negotiate(sdp.parse_sdp(offer), ['L16-16K'], remote_is_offer=True))
+    assert client._red_encoder is not None
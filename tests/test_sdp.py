@@ -0,0 +1,147 @@
+from simplesip import sdp
+
+
+def _offer(codecs, **kwargs):
+    return sdp.build_sdp('alice', 1, 1, '192.0.2.1', 4000, codecs, **kwargs)
+
+
+def test_events_use_the_preferred_codec_clock():
+    offer = _offer([('L16-16K', 97), ('PCMU', 0)], dtmf_payload_type=101, red_payload_type=100)
+    assert 'a=rtpmap:101 telephone-event/16000' in offer
+    assert 'a=rtpmap:100 red/16000' in offer
+
+    negotiation = sdp.negotiate(sdp.parse_sdp(offer), ['L16-16K', 'PCMU'], remote_is_offer=True)
+    assert negotiation.dtmf_payload_type == 101
+    assert negotiation.red_payload_type == 100
+
+    # A 16kHz telephone-event cannot go with an 8kHz codec
+    negotiation = sdp.negotiate(sdp.parse_sdp(offer), ['PCMU'], remote_is_offer=True)
+    assert negotiation.codec == 'PCMU'
+    assert negotiation.dtmf_payload_type is None
+    assert negotiation.red_payload_type is None
+
+
+def _remote(*media_lines, session=()):
+    lines = ['v=0', 'o=bob 2 3 IN IP4 192.0.2.2', 's=-', *session, 't=0 0', *media_lines]
+    return sdp.parse_sdp('\r\n'.join(lines) + '\r\n')
+
+
+AUDIO = (
+    'm=audio 5004 RTP/AVP 8 0 9 101',
+    'c=IN IP4 192.0.2.2',
+    'a=rtpmap:8 PCMA/8000',
+    'a=rtpmap:0 PCMU/8000',
+    'a=rtpmap:9 G722/8000',
+    'a=rtpmap:101 telephone-event/8000',
+)
+
+
+def test_offer_is_ranked_by_our_preferences():
+    negotiation = sdp.negotiate(_remote(*AUDIO), ['PCMU', 'G722', 'PCMA'], remote_is_offer=True)
+    assert negotiation.codecs == [('PCMU', 0), ('G722', 9), ('PCMA', 8)]
+    assert (negotiation.codec, negotiation.payload_type) == ('PCMU', 0)
+
+
+def test_answer_keeps_the_answerers_order():
+    negotiation = sdp.negotiate(_remote(*AUDIO), ['PCMU', 'G722', 'PCMA'], remote_is_offer=False)
+    assert negotiation.codecs == [('PCMA', 8), ('PCMU', 0), ('G722', 9)]
+    assert negotiation.codec == 'PCMA'
+
+
+def test_static_payload_type_without_rtpmap():
+    remote = _remote('m=audio 5004 RTP/AVP 0 8', 'c=IN IP4 192.0.2.2')
+    assert remote.audio().rtpmap == {}
+    negotiation = sdp.negotiate(remote, ['PCMA', 'PCMU'], remote_is_offer=True)
+    assert negotiation.codecs == [('PCMA', 8), ('PCMU', 0)]
+
+
+def test_rejected_or_unsupported_stream():
+    rejected = _remote('m=audio 0 RTP/AVP 0', 'c=IN IP4 192.0.2.2')
+    assert sdp.negotiate(rejected, ['PCMU'], remote_is_offer=False) is None
+
+    unsupported = _remote('m=audio 5004 RTP/AVP 18', 'c=IN IP4 192.0.2.2', 'a=rtpmap:18 G729/8000')
+    assert sdp.negotiate(unsupported, ['PCMU'], remote_is_offer=True) is None
+
+
+def test_session_level_connection_and_direction():
+    remote = _remote('m=audio 5004 RTP/AVP 0', session=('c=IN IP4 192.0.2.9', 'a=sendonly'))
+    negotiation = sdp.negotiate(remote, ['PCMU'], remote_is_offer=True)
+    assert negotiation.remote_address == ('192.0.2.9', 5004)
+    assert negotiation.direction == 'sendonly'
+
+
+def test_media_level_connection_and_direction_win():
+    remote = _remote('m=audio 5004 RTP/AVP 0', 'c=IN IP4 192.0.2.3/127', 'a=recvonly',
+                     session=('c=IN IP4 192.0.2.9', 'a=sendonly'))
+    negotiation = sdp.negotiate(remote, ['PCMU'], remote_is_offer=True)
+    assert negotiation.remote_address == ('192.0.2.3', 5004)
+    assert negotiation.direction == 'recvonly'
+
+    default = sdp.negotiate(_remote(*AUDIO), ['PCMU'], remote_is_offer=True)
+    assert default.direction == 'sendrecv'
+
+
+def test_ptime_and_maxptime():
+    negotiation = sdp.negotiate(_remote(*AUDIO, 'a=ptime:30', 'a=maxptime:60.0'), ['PCMU'],
+                                remote_is_offer=True)
+    assert (negotiation.ptime, negotiation.maxptime) == (30, 60)
+
+    negotiation = sdp.negotiate(_remote(*AUDIO, 'a=ptime:abc'), ['PCMU'], remote_is_offer=True)
+    assert (negotiation.ptime, negotiation.maxptime) == (None, None)
+
+
+def test_telephone_event_and_red_detection():
+    remote = _remote('m=audio 5004 RTP/AVP 0 100 101', 'c=IN IP4 192.0.2.2',
+                     'a=rtpmap:100 red/8000', 'a=fmtp:100 0/0',
+                     'a=rtpmap:101 telephone-event/8000', 'a=fmtp:101 0-16')
+    negotiation = sdp.negotiate(remote, ['PCMU'], remote_is_offer=True)
+    assert negotiation.codecs == [('PCMU', 0)]
+    assert negotiation.dtmf_payload_type == 101
+    assert negotiation.red_payload_type == 100
+
+    plain = sdp.negotiate(_remote('m=audio 5004 RTP/AVP 0', 'c=IN IP4 192.0.2.2'), ['PCMU'],
+                          remote_is_offer=True)
+    assert plain.dtmf_payload_type is None
+    assert plain.red_payload_type is None
+
+
+def test_offer_has_events_at_every_clock():
+    codecs = [('L16-16K', 97), ('G722', 9), ('PCMU', 0)]
+    dtmf = sdp.clock_payload_types(codecs, 101, taken=(100,))
+    redundancy = sdp.clock_payload_types(codecs, 100, taken=dtmf.values())
+    assert dtmf == {16000: 101, 8000: 99}
+    assert redundancy == {16000: 100, 8000: 102}
+
+    offer = _offer(codecs, dtmf_payload_type=dtmf, red_payload_type=redundancy)
+    assert 'a=rtpmap:101 telephone-event/16000' in offer
+    assert 'a=rtpmap:99 telephone-event/8000' in offer
+    assert 'a=rtpmap:102 red/8000' in offer
+    assert 'a=fmtp:102 9/9' in offer
+
+    # A peer that only does PCMU still gets an 8kHz telephone-event
+    negotiation = sdp.negotiate(sdp.parse_sdp(offer), ['PCMU'], remote_is_offer=True)
+    assert negotiation.codec == 'PCMU'
+    assert negotiation.dtmf_payload_type == 99
+    assert negotiation.red_payload_type == 102
+
+
+def test_client_offer_keeps_dtmf_for_8khz_answers():
+    from simplesip import SimpleSIPClient
+
+    client = SimpleSIPClient('alice', 'secret', '127.0.0.1')
+    client.local_ip = '192.0.2.1'
+    client.preferred_codecs = ['L16-16K', 'PCMU']
+    offer = sdp.parse_sdp(client._generate_sdp_offer())
+    events = {pt: encoding for pt, encoding in offer.audio().rtpmap.items()
+              if encoding.startswith('telephone-event')}
+    assert sorted(events.values()) == ['telephone-event/16000', 'telephone-event/8000']
+
+
+def test_offered_ptime_and_maxptime_round_trip():
+    offer = _offer([('PCMU', 0)], ptime=30, maxptime=40)
+    assert 'a=ptime:30' in offer and 'a=maxptime:40' in offer
+    negotiation = sdp.negotiate(sdp.parse_sdp(offer), ['PCMU'], remote_is_offer=True)
+    assert (negotiation.ptime, negotiation.maxptime) == (30, 40)
+
+    offer = _offer([('PCMU', 0)])
+    assert 'a=ptime' not in offer and 'a=maxptime' not in offer
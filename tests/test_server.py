@@ -0,0 +1,100 @@
+import socket
+import struct
+import time
+
+import pytest
+
+from simplesip import CallState, SimpleSIPClient, SIPTestServer
+from simplesip import server as server_module
+
+
+@pytest.fixture
+def server():
+    server = SIPTestServer(host='127.0.0.1', port=0, users={'alice': 'secret'}, hold_time=0.2).start()
+    yield server
+    server.stop()
+
+
+def _client(server):
+    client = SimpleSIPClient('alice', 'secret', *server.address, local_port=0)
+    client.local_rtp_port = 0
+    client.connect()
+    return client
+
+
+def test_fired_timers_are_not_kept(server):
+    client = _client(server)
+    try:
+        for _ in range(3):
+            client.make_call('1000')
+            assert client.wait_for(CallState.CONNECTED, timeout=2)
+            assert client.wait_for(CallState.IDLE, timeout=2)  # Server hangs up
+        time.sleep(0.1)
+        assert server._cancelled == set()
+        assert server.calls == {}
+    finally:
+        client.disconnect()
+
+
+def test_expired_nonces_are_dropped_and_rechallenged(server, monkeypatch):
+    client = _client(server)
+    try:
+        time.sleep(0.3)
+        assert server.registrations
+        monkeypatch.setattr(server_module, 'NONCE_LIFETIME', 0.1)
+        old = list(server._nonces)
+        time.sleep(0.2)
+        request = {'authorization': f'Digest username="alice", nonce="{old[0]}", '
+                                    f'uri="sip:127.0.0.1", response="x"'}
+        assert server._authorized(request, 'REGISTER') == 'stale'
+
+        client.register()
+        time.sleep(0.3)
+        assert not set(old) & set(server._nonces)
+    finally:
+        client.disconnect()
+
+
+def test_registrations_expire_unless_refreshed(server):
+    server.registrations['bob'] = ('<sip:bob@192.0.2.1>', 10.0, ('192.0.2.1', 5060))
+    server.registrations['carol'] = ('<sip:carol@192.0.2.2>', 20.0, ('192.0.2.2', 5060))
+    server._expire_registration('bob', 10.0)
+    server._expire_registration('carol', 15.0)  # Refreshed since this timer was set
+    assert list(server.registrations) == ['carol']
+
+
+@pytest.mark.parametrize('codec, ptime', [('PCMU', 20), ('G722', 30), ('PCMA', 40)])
+def test_generated_media_follows_codec_clock_and_ptime(codec, ptime):
+    server = SIPTestServer(host='127.0.0.1', port=0, codecs=(codec,), media='tone').start()
+    client = SimpleSIPClient('alice', 'secret', *server.address, local_port=0)
+    client.local_rtp_port = 0
+    client.rtp_probes = False
+    client.ptime = ptime
+    client.preferred_codecs = [codec]
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    sink.settimeout(1.0)
+    try:
+        client.connect()
+        client.make_call('1000')
+        assert client.wait_for(CallState.CONNECTED, timeout=2)
+        call = next(iter(server.calls.values()))
+        assert call.ptime == ptime
+        call.remote_rtp = sink.getsockname()  # Capture the generated stream
+
+        packets = [sink.recvfrom(2048)[0] for _ in range(8)]
+        start = time.monotonic()
+        packets += [sink.recvfrom(2048)[0] for _ in range(5)]
+        elapsed = time.monotonic() - start
+    finally:
+        client.disconnect()
+        server.stop()
+        sink.close()
+
+    clock = 8000  # G.722 included
+    sample_rate = 16000 if codec == 'G722' else 8000
+    timestamps = [struct.unpack_from('!I', packet, 4)[0] for packet in packets[-6:]]
+    assert {b - a for a, b in zip(timestamps, timestamps[1:])} == {clock * ptime // 1000}
+    payload = sample_rate * ptime // 1000 // (2 if codec == 'G722' else 1)
+    assert {len(packet) - 12 for packet in packets} == {payload}
+    assert 4 * ptime / 1000 < elapsed < 10 * ptime / 1000
@@ -0,0 +1,44 @@
+import zlib
+
+import pytest
+
+from simplesip.shard import call_id_prefix, extract_call_id, route_call_id, split_ports
+
+
+def test_extract_call_id_reads_long_and_compact_headers():
+    full = b'INVITE sip:1000@pbx SIP/2.0\r\nVia: SIP/2.0/UDP a\r\nCall-ID:  abc@host \r\nCSeq: 1 INVITE\r\n\r\n'
+    compact = b'SIP/2.0 200 OK\r\ni: w1c0-xyz\r\n\r\n'
+    lower = b'BYE sip:a SIP/2.0\r\ncall-id:\tdef\r\n\r\n'
+    assert extract_call_id(full) == b'abc@host'
+    assert extract_call_id(compact) == b'w1c0-xyz'
+    assert extract_call_id(lower) == b'def'
+    assert extract_call_id(b'OPTIONS sip:a SIP/2.0\r\nVia: x\r\n\r\n') is None
+
+
+def test_extract_call_id_ignores_body_lookalikes():
+    data = b'MESSAGE sip:a SIP/2.0\r\nCall-ID: real\r\n\r\nxCall-ID: fake'
+    assert extract_call_id(data) == b'real'
+
+
+def test_prefixed_call_ids_route_to_their_worker():
+    call_id = (call_id_prefix(2, 5) + 'abc@host').encode()
+    assert route_call_id(call_id, 4) == 2
+    # A prefix naming a worker that does not exist falls back to hashing
+    assert route_call_id(b'w9c0-abc', 4) == zlib.crc32(b'w9c0-abc') % 4
+
+
+def test_foreign_call_ids_route_by_hash():
+    assert route_call_id(b'peer-call@pbx', 3) == zlib.crc32(b'peer-call@pbx') % 3
+    assert route_call_id(b'peer-call@pbx', 3) == route_call_id(b'peer-call@pbx', 3)
+    assert {route_call_id(f'call-{i}'.encode(), 4) for i in range(64)} == {0, 1, 2, 3}
+
+
+def test_split_ports_covers_the_range_without_overlap():
+    ranges = split_ports((10000, 10009), 3)
+    assert ranges == [range(10000, 10003), range(10003, 10006), range(10006, 10010)]
+    assert split_ports((10000, 10000), 1) == [range(10000, 10001)]
+
+
+def test_split_ports_rejects_too_small_ranges():
+    with pytest.raises(ValueError):
+        split_ports((10000, 10001), 3)
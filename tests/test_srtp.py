@@ -0,0 +1,108 @@
+import hashlib
+import hmac
+import struct
+
+import pytest
+
+pytest.importorskip('cryptography')
+
+from simplesip import srtp  # noqa: E402
+
+
+def _rtp(seq, payload=b'\x11' * 160, ssrc=0x12345678):
+    return struct.pack('!BBHII', 0x80, 0, seq, seq * 160, ssrc) + payload
+
+
+def _pair(suite='AES_CM_128_HMAC_SHA1_80'):
+    alice_key, bob_key = srtp.generate_key(), srtp.generate_key()
+    alice = srtp.SRTPSession(alice_key, f'inline:{bob_key}', suite)
+    bob = srtp.SRTPSession(bob_key, f'inline:{alice_key}', suite)
+    return alice, bob
+
+
+def test_aes_cm_keystream_vectors():
+    # RFC 3711 B.2
+    cipher = srtp._aes_ecb(bytes.fromhex('2B7E151628AED2A6ABF7158809CF4F3C'))
+    salt = int('F0F1F2F3F4F5F6F7F8F9FAFBFCFD', 16)
+    stream = srtp._Stream(cipher, salt, ssrc=0)
+    assert stream.keystream(0, 48) == bytes.fromhex(
+        'E03EAD0935C95E80E166B16DD92B4EB4'
+        'D23513162B02D0F72A43A2FE4A5F97AB'
+        '41E95B3BB0A2E8DD477901E4FCA894C0'
+    )
+
+
+def test_key_derivation_vectors():
+    # RFC 3711 B.3
+    keys = srtp._Keys(bytes.fromhex('E1F97A0D3E018BE0D64FA32C06DE4139'),
+                      bytes.fromhex('0EC675AD498AFEEBB6960B3AABE6'))
+    block = bytes(16)
+    expected_cipher = srtp._aes_ecb(bytes.fromhex('C61E7A93744F39EE10734AFE3FF7A087'))
+    assert keys.rtp_cipher.update(block) == expected_cipher.update(block)
+    assert keys.rtp_salt == int('30CBBC08863D8C85D49DB34A9AE1', 16)
+    mac = keys.rtp_auth.copy()
+    mac.update(b'packet')
+    auth_key = bytes.fromhex('CEBE321F6FF7716B6FD4AB49AF256A156D38BAA4')
+    assert mac.digest() == hmac.new(auth_key, b'packet', hashlib.sha1).digest()
+
+
+@pytest.mark.parametrize('suite', sorted(srtp.SUITES))
+def test_round_trip(suite):
+    alice, bob = _pair(suite)
+    packet = _rtp(1000)
+    protected = alice.protect(packet)
+    assert len(protected) == len(packet) + srtp.SUITES[suite]
+    assert protected[12:-srtp.SUITES[suite]] != packet[12:]
+    assert bob.unprotect(protected) == packet
+
+
+def test_rollover_counter_wraps():
+    alice, bob = _pair()
+    protected = {seq: alice.protect(_rtp(seq)) for seq in (65534, 65535, 0, 1)}
+    assert alice._tx_streams[0x12345678].roc == 1
+
+    # 65535 arrives after the wrap and still uses the old rollover counter
+    for seq in (65534, 0, 65535, 1):
+        assert bob.unprotect(protected[seq]) == _rtp(seq)
+    assert bob._rx_streams[0x12345678].roc == 1
+
+
+def test_replay_is_rejected():
+    alice, bob = _pair()
+    packets = [alice.protect(_rtp(seq)) for seq in range(100)]
+    bob.unprotect(packets[0])
+    with pytest.raises(ValueError, match='replay'):
+        bob.unprotect(packets[0])
+
+    bob.unprotect(packets[99])
+    bob.unprotect(packets[50])  # Late but inside the window
+    with pytest.raises(ValueError, match='replay'):
+        bob.unprotect(packets[50])
+    with pytest.raises(ValueError, match='replay'):
+        bob.unprotect(packets[1])  # Older than the window
+
+
+def test_tag_failure_is_rejected():
+    alice, bob = _pair()
+    protected = alice.protect(_rtp(7))
+    tampered = bytearray(protected)
+    tampered[20] ^= 0x01
+    with pytest.raises(ValueError, match='authentication'):
+        bob.unprotect(bytes(tampered))
+    # A forged packet must not mark its index as received
+    assert bob.unprotect(protected) == _rtp(7)
+
+
+def test_srtcp_round_trip():
+    alice, bob = _pair()
+    report = struct.pack('!BBHI', 0x80, 200, 6, 0x12345678) + bytes(range(20))
+    protected = alice.protect_rtcp(report)
+    assert protected[8:28] != report[8:]
+    assert bob.unprotect_rtcp(protected) == report
+    with pytest.raises(ValueError, match='replay'):
+        bob.unprotect_rtcp(protected)
+
+    tampered = bytearray(alice.protect_rtcp(report))
+    tampered[10] ^= 0x01
+    with pytest.raises(ValueError, match='authentication'):
+        bob.unprotect_rtcp(bytes(tampered))
@@ -0,0 +1,36 @@
+import json
+import time
+
+from simplesip import CallState, JSONLTracer, SimpleSIPClient, SIPTestServer
+
+
+def test_call_spans_are_written_in_order_and_the_file_closed(tmp_path):
+    server = SIPTestServer(host='127.0.0.1', port=0, hold_time=0.3, media='tone').start()
+    client = SimpleSIPClient('alice', 'secret', *server.address, local_port=0)
+    client.local_rtp_port = 0
+    tracer = JSONLTracer(str(tmp_path / '{call_id}.jsonl'))
+    try:
+        client.connect()
+        client.set_tracer(tracer)
+        call_id = client.make_call('1000')
+        assert client.wait_for(CallState.CONNECTED, timeout=2)
+        assert client.wait_for(CallState.IDLE, timeout=2)  # Server hangs up with BYE
+        time.sleep(0.1)
+    finally:
+        client.disconnect()
+        server.stop()
+
+    # The call's file was closed when the dialog ended
+    assert tracer._files == {}
+    [path] = tmp_path.iterdir()
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {span['call_id'] for span in spans} == {call_id}
+    stages = [span['stage'] for span in spans]
+
+    # Nested spans end first: parse, then dispatch, then the whole datagram
+    assert stages[:3] == ['sip.parse', 'sip.handle', 'sip.receive']
+    assert stages.index('sdp.parse') < stages.index('rtp.receive')
+    first = stages.index('rtp.receive')
+    assert stages[first - 2:first] == ['rtp.decode', 'rtp.jitter_buffer']
+    # The BYE's receive span ends after the call closed, and is still appended
+    assert stages[-3:] == ['sip.parse', 'sip.handle', 'sip.receive']
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from simplesip import CallState, SimpleSIPClient, SIPTestServer
+from simplesip.transactions import PROCEEDING_TTL, Dialog, RecordTable, Transaction
+
+
+def _eventually(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+class _Manager:
+    def __init__(self):
+        self.answered = []
+        self.failed = []
+
+    def on_call_answered(self, call_id):
+        self.answered.append(call_id)
+
+    def on_call_failed(self, call_id, status):
+        self.failed.append((call_id, status))
+
+
+@pytest.fixture
+def ringing_server():
+    server = SIPTestServer(host='127.0.0.1', port=0, answer_delay=2.5).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(ringing_server):
+    client = SimpleSIPClient('alice', 'secret', *ringing_server.address, local_port=0)
+    client.local_rtp_port = 0
+    client.call_manager = _Manager()
+    client.connect()
+    # Shorter than the ring time, as a 32s TTL would be for a long-ringing call
+    client.current_transactions.ttl = 0.5
+    yield client
+    client.disconnect()
+
+
+def test_evict_oldest_records():
+    table = RecordTable(ttl=1.0)
+    for i in range(3):
+        table.add(Dialog(f'call{i}', 'tag', None, 'sip:bob@example.com', None, None))
+    now = time.monotonic()
+    assert table.evict(now) == []
+    evicted = table.evict(now + 2, keep='call1')
+    assert [d.call_id for d in evicted] == ['call0', 'call2']
+    assert list(table) == ['call1']
+    assert table.evictions == 2
+
+
+def test_record_ttl_outlives_table_ttl():
+    table = RecordTable(ttl=1.0)
+    ringing = table.add(Transaction('ringing', 'INVITE'))
+    ringing.ttl = PROCEEDING_TTL
+    table.add(Transaction('register', 'REGISTER'))
+    now = time.monotonic()
+    assert [t.call_id for t in table.evict(now + 2)] == ['register']
+    assert [t.call_id for t in table.evict(now + PROCEEDING_TTL + 1)] == ['ringing']
+
+
+def test_long_ringing_call_is_answered(client):
+    call_id = client.make_call('1000')
+    assert client.wait_for(CallState.RINGING, timeout=2)
+    assert client.wait_for(CallState.CONNECTED, timeout=5)
+    assert _eventually(lambda: client.call_manager.answered == [call_id])
+    client.hangup_call()
+
+
+def test_long_ringing_call_can_be_cancelled(client, ringing_server):
+    client.make_call('1000')
+    assert client.wait_for(CallState.RINGING, timeout=2)
+    time.sleep(1.5)  # Past the table TTL
+    assert client.cancel_call()
+    assert _eventually(lambda: ringing_server.stats['cancelled'] == 1)
+    assert client.call_state == CallState.IDLE
+
+
+def test_timer_c_cancels_call(client, ringing_server, monkeypatch):
+    monkeypatch.setattr('simplesip.client.PROCEEDING_TTL', 1.0)
+    call_id = client.make_call('1000')
+    assert client.wait_for(CallState.RINGING, timeout=2)
+    assert client.wait_for(CallState.IDLE, timeout=2.5)
+    assert _eventually(lambda: ringing_server.stats['cancelled'] == 1)
+    assert _eventually(lambda: client.call_manager.failed == [(call_id, 487)])
+    assert client.call_manager.answered == []